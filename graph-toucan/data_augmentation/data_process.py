@@ -1,11 +1,16 @@
 import datasets,argparse
-import json,os,asyncio,logging,time,re
+import json,os,sys,asyncio,logging,time,re
 from openai import AsyncOpenAI
 from tqdm import tqdm
-async_client = AsyncOpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    # 以下是北京地域base_url，如果使用新加坡地域的模型，需要将base_url替换为：https://dashscope-intl.aliyuncs.com/compatible-mode/v1
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from llm_cache import wrap_llm_client
+async_client = wrap_llm_client(
+    AsyncOpenAI(
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        # 以下是北京地域base_url，如果使用新加坡地域的模型，需要将base_url替换为：https://dashscope-intl.aliyuncs.com/compatible-mode/v1
+        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+    ),
+    stage="data_process",
 )
 
 logger = logging.getLogger("toucan_data_process")
@@ -1061,7 +1066,8 @@ def calculate_token_statistics(batch_results):
             'avg_total_tokens': 0,
             'total_prompt_tokens': 0,
             'total_completion_tokens': 0,
-            'total_tokens': 0
+            'total_tokens': 0,
+            **async_client.cache_summary(),
         }
 
     # Calculate statistics
@@ -1079,7 +1085,8 @@ def calculate_token_statistics(batch_results):
         'avg_total_tokens': total_tokens / num_successful,
         'total_prompt_tokens': total_prompt_tokens,
         'total_completion_tokens': total_completion_tokens,
-        'total_tokens': total_tokens
+        'total_tokens': total_tokens,
+        **async_client.cache_summary(),
     }
 
 def print_token_statistics(token_stats):
@@ -1103,6 +1110,13 @@ def print_token_statistics(token_stats):
     print(f"  - Total prompt tokens: {token_stats['total_prompt_tokens']}")
     print(f"  - Total completion tokens: {token_stats['total_completion_tokens']}")
     print(f"  - Total tokens: {token_stats['total_tokens']}")
+    if 'llm_cache_hits' in token_stats:
+        print("\nLLM cache:")
+        print(f"  - Hits: {token_stats['llm_cache_hits']} (hit rate {token_stats['llm_cache_hit_rate'] * 100:.2f}%)")
+        print(f"  - Misses: {token_stats['llm_cache_misses']}")
+        print(f"  - Saved tokens: {token_stats['llm_cache_saved_tokens']}")
+        if 'llm_coalesced' in token_stats:
+            print(f"  - Coalesced in-flight requests: {token_stats['llm_coalesced']}/{token_stats['llm_requests']}")
     print("="*60)
 
 async def filter_batch(samples, batch_size=5):
@@ -0,0 +1,250 @@
+"""
+simulate_call_external_api 输出的内容寻址缓存（SQLite）。
+
+backward_to_query.simulate_call_external_api 每次执行 tool 都用 temperature=0.7 调一次 LLM 模拟外部 API 的返回。
+共享起点 / 前缀的 FSP 路径会反复用相同的参数调用同一个 tool，llm_cache 又不缓存采样请求（temperature > 0.3）。
+这里按 (tool 名, 规范化参数, tool 代码指纹) 缓存模拟结果，每个 key 可以保存多个变体：
+
+- key = sha256(tool 名 + 规范化参数 JSON（key 排序）+ call_external_api docstring / 源码的 hash)；
+  重新生成 tool 代码后旧条目自然失效
+- 复用策略（policy）：
+    "always"   有缓存就复用第一个变体（最省 token）
+    "variants" 每个 key 先生成 max_variants 个不同变体，之后在已有变体中均匀随机复用
+    "sample"   以 reuse_probability 的概率从已有变体中随机复用，否则（变体数未满 max_variants 时）重新模拟一个新变体
+- 命中时 token_usage 为 0，并累计节省的 token 数（按生成该变体时的用量）
+- 同一个 key 同一时刻只有一个模拟在进行：并发的相同调用排队等它写入缓存后再按策略选择，
+  不会各自模拟再各自写入（否则 "always" 会存下多个变体，"variants" / "sample" 会超过 max_variants）
+
+配置（config.yaml，可选，默认关闭）：
+    api_simulation_cache:
+      enabled: true
+      path: /data/lhy/datasets/graph-Toucan/cache/api_simulations.sqlite
+      policy: variants
+      max_variants: 3
+      reuse_probability: 0.8
+      seed: null
+环境变量 GRAPH_TOUCAN_API_SIM_CACHE=1 / 0 临时开启 / 关闭，GRAPH_TOUCAN_API_SIM_CACHE_PATH 覆盖缓存文件路径。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_SIM_CACHE_PATH = "/data/lhy/datasets/graph-Toucan/cache/api_simulations.sqlite"
+POLICIES = ("always", "variants", "sample")
+
+
+def canonical_params(params: Any) -> str:
+    """参数的规范化 JSON（dict 按 key 排序，无多余空白）"""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def simulation_key(tool_name: str, params: Any, context: str = "") -> str:
+    """
+    Args:
+        tool_name: tool（主函数）名
+        params: 主函数参数
+        context: 影响模拟结果的 tool 代码（call_external_api docstring + 去掉 API 的源码）
+    """
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    text = "\0".join([tool_name, canonical_params(params), context_hash])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SimulationCache:
+    """API 模拟结果的多变体缓存，线程安全；多个进程可以共享同一个文件"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_SIM_CACHE_PATH,
+        policy: str = "always",
+        max_variants: int = 1,
+        reuse_probability: float = 0.8,
+        seed: Optional[int] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown simulation cache policy: {policy}")
+        if max_variants < 1:
+            raise ValueError("max_variants must be >= 1")
+        self.path = path
+        self.policy = policy
+        self.max_variants = 1 if policy == "always" else max_variants
+        self.reuse_probability = reuse_probability
+        self.rng = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self._lock = threading.Lock()
+        # key -> (该 key 的 asyncio.Lock, 正在使用 / 等待它的调用数)；没有调用时删除
+        self._key_locks: Dict[str, List[Any]] = {}
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS simulations ("
+                " key TEXT, variant INTEGER, tool TEXT, result TEXT, total_tokens INTEGER,"
+                " created_at REAL, hits INTEGER DEFAULT 0, PRIMARY KEY (key, variant))"
+            )
+            self._conn.commit()
+
+    # ---------- 存取 ----------
+
+    def variants(self, key: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT variant, result, total_tokens FROM simulations WHERE key = ? ORDER BY variant", (key,)
+            ).fetchall()
+        return [{"variant": v, "result": json.loads(r), "total_tokens": t} for v, r, t in rows]
+
+    def add(self, key: str, tool_name: str, result: Any, total_tokens: int = 0) -> None:
+        with self._lock:
+            (next_variant,) = self._conn.execute(
+                "SELECT COALESCE(MAX(variant) + 1, 0) FROM simulations WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO simulations (key, variant, tool, result, total_tokens, created_at, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, next_variant, tool_name, json.dumps(result, ensure_ascii=False), total_tokens, time.time()),
+            )
+            self._conn.commit()
+
+    def _mark_hit(self, key: str, variant: int) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE simulations SET hits = hits + 1 WHERE key = ? AND variant = ?", (key, variant))
+            self._conn.commit()
+
+    # ---------- 复用策略 ----------
+
+    def choose(self, variants: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """按策略选一个已有变体复用；返回 None 表示需要重新模拟"""
+        if not variants:
+            return None
+        if self.policy == "always":
+            return variants[0]
+        if len(variants) < self.max_variants:
+            if self.policy == "variants" or self.rng.random() >= self.reuse_probability:
+                return None
+        return self.rng.choice(variants)
+
+    async def get_or_simulate(
+        self,
+        tool_name: str,
+        params: Any,
+        context: str,
+        simulate: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Args:
+            simulate: 未命中时调用，返回 {"result": ..., "token_usage": {...}}（simulate_call_external_api 的格式）
+
+        Returns:
+            {"result", "token_usage", "cache_hit"}
+        """
+        key = simulation_key(tool_name, params, context)
+        entry = self._key_locks.get(key)
+        if entry is None:
+            entry = self._key_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._get_or_simulate_locked(key, tool_name, simulate)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._key_locks.get(key) is entry:
+                del self._key_locks[key]
+
+    async def _get_or_simulate_locked(
+        self,
+        key: str,
+        tool_name: str,
+        simulate: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        try:
+            chosen = self.choose(self.variants(key))
+        except sqlite3.Error as e:
+            print(f"Warning: API simulation cache lookup failed: {e}")
+            chosen = None
+        if chosen is not None:
+            self.hits += 1
+            self.saved_tokens += chosen["total_tokens"] or 0
+            try:
+                self._mark_hit(key, chosen["variant"])
+            except sqlite3.Error:
+                pass
+            return {
+                "result": chosen["result"],
+                "token_usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                "cache_hit": True,
+            }
+
+        self.misses += 1
+        simulated = await simulate()
+        try:
+            self.add(key, tool_name, simulated["result"], simulated.get("token_usage", {}).get("total_tokens", 0))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Warning: API simulation cache write failed: {e}")
+        return {**simulated, "cache_hit": False}
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys, rows = self._conn.execute(
+                "SELECT COUNT(DISTINCT key), COUNT(*) FROM simulations"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "keys": keys,
+            "variants": rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+        }
+
+    def format_summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"API simulation cache ({stats['policy']}): hits={stats['hits']}, misses={stats['misses']}, "
+            f"hit rate={stats['hit_rate'] * 100:.2f}%, saved tokens={stats['saved_tokens']}, "
+            f"stored {stats['variants']} variants for {stats['keys']} calls"
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_simulation_cache(config: Optional[Dict[str, Any]] = None) -> Optional[SimulationCache]:
+    """按 config.yaml 的 api_simulation_cache 段（和环境变量）创建缓存；未开启或打不开时返回 None"""
+    settings = dict((config or {}).get("api_simulation_cache") or {})
+    enabled = settings.get("enabled", False)
+    env = os.getenv("GRAPH_TOUCAN_API_SIM_CACHE")
+    if env is not None:
+        enabled = env != "0"
+    if not enabled:
+        return None
+    path = os.getenv("GRAPH_TOUCAN_API_SIM_CACHE_PATH") or settings.get("path", DEFAULT_SIM_CACHE_PATH)
+    try:
+        return SimulationCache(
+            path,
+            policy=settings.get("policy", "always"),
+            max_variants=settings.get("max_variants", 1),
+            reuse_probability=settings.get("reuse_probability", 0.8),
+            seed=settings.get("seed"),
+        )
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: API simulation cache disabled, cannot open {path}: {e}")
+        return None
@@ -26,12 +26,10 @@ TODO:
 """
 
 import asyncio
+import contextlib
 import json
 import os
 import sys
-import importlib.util
-import ast
-import re
 import time
 import yaml
 from datetime import datetime
@@ -41,12 +39,24 @@ from typing import Any, Dict, List, Optional, Set, Tuple
 from tqdm import tqdm
 from openai import AsyncOpenAI
 
+from llm_scheduler import SlidingWindowScheduler
+from llm_cache import wrap_llm_client
+from graph_store import load_graph_store
+from function_registry import FunctionRegistry, extract_api_parts
+from api_sim_cache import build_simulation_cache
+# SafeExecutionContext 仍从本模块导出（test_safe_execution_context.py 从这里导入）
+from sandbox_executor import SafeExecutionContext, build_sandbox_pool, execute_loaded_function  # noqa: F401
+from tool_session import current_session, start_session, uses_session_state
+
 
 ROOT_DIR = "/data/lhy/datasets/graph-Toucan"
 GRAPH_DIR = os.path.join(ROOT_DIR, "graph")
 FSP_DIR = os.path.join(ROOT_DIR,"fsp_path")
 TOOL_INFO_DIR = os.path.join(ROOT_DIR, "tool_info")
 GENERATED_FUNCTIONS_DIR = os.path.join(TOOL_INFO_DIR, "generated_functions_v1")
+GENERATED_FUNCTIONS_STATEFUL_DIR = os.path.join(TOOL_INFO_DIR, "generated_functions_stateful_v1")
+# stateful tool import 的 state_manager（sys_state）所在目录
+STATE_MANAGER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "new_feature")
 
 # 安全执行配置：限制文件操作的工作目录
 SAFE_WORK_DIR = os.path.join(ROOT_DIR, "safe_work_dir")
@@ -54,206 +64,6 @@ SAFE_WORK_DIR = os.path.join(ROOT_DIR, "safe_work_dir")
 os.makedirs(SAFE_WORK_DIR, exist_ok=True)
 
 
-class SafeExecutionContext:
-    """
-    安全执行上下文，限制文件操作和危险操作
-    """
-    def __init__(self, safe_dir: str = SAFE_WORK_DIR):
-        self.safe_dir = os.path.abspath(safe_dir)
-        self.original_builtins = {}
-        self.original_modules = {}
-        self.original_os = None
-        self.original_shutil = None
-        self.original_subprocess = None
-        
-    def _check_path_safe(self, path: str) -> str:
-        """
-        检查路径是否在安全目录内，如果是则返回绝对路径，否则抛出异常
-        
-        如果路径是相对路径，会先解析为相对于安全目录的路径
-        """
-        safe_dir_abs = os.path.abspath(self.safe_dir)
-        
-        # 如果是相对路径，先解析为相对于安全目录的路径
-        if not os.path.isabs(path):
-            abs_path = os.path.abspath(os.path.join(safe_dir_abs, path))
-        else:
-            abs_path = os.path.abspath(path)
-        
-        # 检查路径是否在安全目录内
-        try:
-            # 使用 commonpath 检查路径是否在安全目录内
-            common_path = os.path.commonpath([abs_path, safe_dir_abs])
-            if common_path != safe_dir_abs:
-                raise PermissionError(
-                    f"File operation not allowed outside safe directory. "
-                    f"Attempted path: {abs_path}, Safe directory: {safe_dir_abs}"
-                )
-        except ValueError:
-            # 路径不在同一驱动器上（Windows）或完全不同
-            raise PermissionError(
-                f"File operation not allowed outside safe directory. "
-                f"Attempted path: {abs_path}, Safe directory: {safe_dir_abs}"
-            )
-        
-        return abs_path
-    
-    def _safe_open(self, file, mode='r', buffering=-1, encoding=None, errors=None, newline=None, closefd=True, opener=None):
-        """安全的 open 函数，限制文件操作在安全目录内"""
-        if isinstance(file, str):
-            file = self._check_path_safe(file)
-        return self.original_builtins['open'](file, mode, buffering, encoding, errors, newline, closefd, opener)
-    
-    def _safe_os_remove(self, path):
-        """安全的 os.remove，限制在安全目录内"""
-        self._check_path_safe(path)
-        return self.original_os.remove(path)
-    
-    def _safe_os_unlink(self, path):
-        """安全的 os.unlink，限制在安全目录内"""
-        self._check_path_safe(path)
-        return self.original_os.unlink(path)
-    
-    def _safe_os_rmdir(self, path):
-        """安全的 os.rmdir，限制在安全目录内"""
-        self._check_path_safe(path)
-        return self.original_os.rmdir(path)
-    
-    def _safe_os_makedirs(self, name, mode=0o777, exist_ok=False):
-        """安全的 os.makedirs，限制在安全目录内"""
-        self._check_path_safe(name)
-        return self.original_os.makedirs(name, mode, exist_ok)
-    
-    def _safe_os_mkdir(self, name, mode=0o777):
-        """安全的 os.mkdir，限制在安全目录内"""
-        self._check_path_safe(name)
-        return self.original_os.mkdir(name, mode)
-    
-    def _safe_shutil_rmtree(self, path, ignore_errors=False, onerror=None):
-        """安全的 shutil.rmtree，限制在安全目录内"""
-        self._check_path_safe(path)
-        return self.original_shutil.rmtree(path, ignore_errors, onerror)
-    
-    def _safe_shutil_move(self, src, dst):
-        """安全的 shutil.move，限制在安全目录内"""
-        self._check_path_safe(src)
-        self._check_path_safe(dst)
-        return self.original_shutil.move(src, dst)
-    
-    def _safe_shutil_copy(self, src, dst):
-        """安全的 shutil.copy，限制在安全目录内"""
-        self._check_path_safe(src)
-        self._check_path_safe(dst)
-        return self.original_shutil.copy(src, dst)
-    
-    def _safe_shutil_copy2(self, src, dst):
-        """安全的 shutil.copy2，限制在安全目录内"""
-        self._check_path_safe(src)
-        self._check_path_safe(dst)
-        return self.original_shutil.copy2(src, dst)
-    
-    def _safe_subprocess_run(self, *args, **kwargs):
-        """禁止 subprocess 操作"""
-        raise PermissionError("subprocess operations are not allowed in safe execution context")
-    
-    def _safe_subprocess_call(self, *args, **kwargs):
-        """禁止 subprocess 操作"""
-        raise PermissionError("subprocess operations are not allowed in safe execution context")
-    
-    def _safe_subprocess_popen(self, *args, **kwargs):
-        """禁止 subprocess 操作"""
-        raise PermissionError("subprocess operations are not allowed in safe execution context")
-    
-    def _safe_eval(self, *args, **kwargs):
-        """禁止 eval 操作"""
-        raise PermissionError("eval operations are not allowed in safe execution context")
-    
-    def _safe_exec(self, *args, **kwargs):
-        """禁止 exec 操作"""
-        raise PermissionError("exec operations are not allowed in safe execution context")
-    
-    def _safe_compile(self, *args, **kwargs):
-        """禁止 compile 操作"""
-        raise PermissionError("compile operations are not allowed in safe execution context")
-    
-    def __enter__(self):
-        """进入安全执行上下文"""
-        import builtins
-        import os as os_module
-        import shutil
-        import subprocess
-
-        # 保存原始函数
-        self.original_builtins['open'] = builtins.open
-        self.original_builtins['eval'] = builtins.eval
-        # 不再拦截 exec 和 compile，因为模块加载需要它们
-        # self.original_builtins['exec'] = builtins.exec
-        # self.original_builtins['compile'] = builtins.compile
-        self.original_os = os_module
-        self.original_shutil = shutil
-        self.original_subprocess = subprocess
-
-        # 替换为安全版本
-        builtins.open = self._safe_open
-        builtins.eval = self._safe_eval
-        # 不再替换 exec 和 compile
-        # builtins.exec = self._safe_exec
-        # builtins.compile = self._safe_compile
-        
-        # 替换 os 模块的危险函数
-        os_module.remove = self._safe_os_remove
-        os_module.unlink = self._safe_os_unlink
-        os_module.rmdir = self._safe_os_rmdir
-        os_module.makedirs = self._safe_os_makedirs
-        os_module.mkdir = self._safe_os_mkdir
-        
-        # 替换 shutil 模块的危险函数
-        shutil.rmtree = self._safe_shutil_rmtree
-        shutil.move = self._safe_shutil_move
-        shutil.copy = self._safe_shutil_copy
-        shutil.copy2 = self._safe_shutil_copy2
-        
-        # 替换 subprocess 模块的所有函数
-        subprocess.run = self._safe_subprocess_run
-        subprocess.call = self._safe_subprocess_call
-        subprocess.Popen = self._safe_subprocess_popen
-        
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """退出安全执行上下文，恢复原始函数"""
-        import builtins
-        import os as os_module
-        import shutil
-        import subprocess
-
-        # 恢复原始函数
-        builtins.open = self.original_builtins.get('open', builtins.open)
-        builtins.eval = self.original_builtins.get('eval', builtins.eval)
-        # exec 和 compile 未被修改，无需恢复
-        # builtins.exec = self.original_builtins.get('exec', builtins.exec)
-        # builtins.compile = self.original_builtins.get('compile', builtins.compile)
-        
-        if self.original_os:
-            os_module.remove = self.original_os.remove
-            os_module.unlink = self.original_os.unlink
-            os_module.rmdir = self.original_os.rmdir
-            os_module.makedirs = self.original_os.makedirs
-            os_module.mkdir = self.original_os.mkdir
-        
-        if self.original_shutil:
-            shutil.rmtree = self.original_shutil.rmtree
-            shutil.move = self.original_shutil.move
-            shutil.copy = self.original_shutil.copy
-            shutil.copy2 = self.original_shutil.copy2
-        
-        if self.original_subprocess:
-            subprocess.run = self.original_subprocess.run
-            subprocess.call = self.original_subprocess.call
-            subprocess.Popen = self.original_subprocess.Popen
-        
-        return False  # 不抑制异常
-
 RANDOM_WALK_V1_PATH = "/data/lhy/datasets/graph-Toucan/walker_path/path_v1_converted.json"
 
 TOOL_SCHEMA_SUMMARY_PATH = os.path.join(TOOL_INFO_DIR, "tool_schema_with_outputformat.json")
@@ -295,15 +105,19 @@ else:
     api_key = config["api"].get("api_key", "EMPTY")
 base_url = config["api"]["base_url"]
 
-async_client = AsyncOpenAI(
-    api_key=api_key,
-    base_url=base_url,
+async_client = wrap_llm_client(
+    AsyncOpenAI(api_key=api_key, base_url=base_url),
+    stage="backward_to_query",
+    config=config,
 )
 
 # 模型配置
 DEFAULT_MODEL = config["model"]["default"]
 SIMULATE_API_MODEL = config["model"]["simulate_api"]
 
+# simulate_call_external_api 的结果缓存（config.yaml 的 api_simulation_cache 段，默认关闭）
+API_SIMULATION_CACHE = build_simulation_cache(config)
+
 # 确保日志目录存在
 os.makedirs(LOG_DIR, exist_ok=True)
 
@@ -409,36 +223,17 @@ def log_time_and_tokens(func_name: str):
 
 def load_graph_adjacency(graph_path: str) -> Dict[str, List[str]]:
     """
-    从图 JSON 文件中加载邻接关系，返回 function_name -> [successor_function_names] 的映射。
+    通过 graph_store.load_graph_store 加载邻接关系，返回 function_name -> [successor_function_names] 的映射。
     """
     print(f"Loading graph adjacency from {graph_path}...")
-    with open(graph_path, "r", encoding="utf-8") as f:
-        graph = json.load(f)
-    
-    nodes = graph.get("nodes", [])
-    edges = graph.get("edges", [])
-    
-    # 构建 index -> name 映射
-    index_to_name: Dict[int, str] = {}
-    for node in nodes:
-        idx = node.get("index")
-        func_schema = node.get("function_schema", {}).get("function", {})
-        name = func_schema.get("name", f"node_{idx}")
-        if idx is not None:
-            index_to_name[idx] = name
-    
+    store = load_graph_store(graph_path)
+    names = [name or f"node_{idx}" for idx, name in enumerate(store.names)]
+
     # 构建 name -> successors 映射
     name_to_successors: Dict[str, List[str]] = {}
-    for edge in edges:
-        src_idx = edge.get("source")
-        tgt_idx = edge.get("target")
-        if src_idx is None or tgt_idx is None:
-            continue
-        src_name = index_to_name.get(src_idx)
-        tgt_name = index_to_name.get(tgt_idx)
-        if src_name and tgt_name:
-            name_to_successors.setdefault(src_name, []).append(tgt_name)
-    
+    for src_idx, successors in store.adjacency().items():
+        name_to_successors.setdefault(names[src_idx], []).extend(names[tgt] for tgt in successors)
+
     print(f"Loaded adjacency: {len(name_to_successors)} functions with successors")
     return name_to_successors
 
@@ -478,29 +273,7 @@ def extract_call_external_api_info(file_path: str) -> Optional[Dict[str, Any]]:
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 解析 AST
-        tree = ast.parse(content, filename=file_path)
-        
-        # 查找 call_external_api 函数
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef) and node.name == 'call_external_api':
-                # 提取 docstring
-                docstring = ast.get_docstring(node)
-                
-                # 提取函数代码
-                start_line = node.lineno - 1
-                end_line = node.end_lineno if hasattr(node, 'end_lineno') else start_line + 1
-                lines = content.split('\n')
-                function_code = '\n'.join(lines[start_line:end_line])
-                
-                return {
-                    "docstring": docstring or "",
-                    "function_code": function_code
-                }
-        
-        return None
+            return extract_api_parts(f.read(), file_path)[0]
     except Exception as e:
         print(f"Error extracting call_external_api from {file_path}: {e}")
         return None
@@ -518,27 +291,7 @@ def extract_source_code_without_call_external_api(file_path: str) -> Optional[st
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 解析 AST
-        tree = ast.parse(content, filename=file_path)
-        
-        # 找到 call_external_api 函数的位置
-        lines = content.split('\n')
-        lines_to_remove = set()
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef) and node.name == 'call_external_api':
-                start_line = node.lineno - 1
-                end_line = node.end_lineno if hasattr(node, 'end_lineno') else start_line + 1
-                # 标记要移除的行（包括前面的空行）
-                for i in range(max(0, start_line - 1), end_line):
-                    lines_to_remove.add(i)
-        
-        # 移除 call_external_api 函数
-        filtered_lines = [line for i, line in enumerate(lines) if i not in lines_to_remove]
-        
-        return '\n'.join(filtered_lines)
+            return extract_api_parts(f.read(), file_path)[1]
     except Exception as e:
         print(f"Error extracting source code from {file_path}: {e}")
         return None
@@ -550,6 +303,37 @@ async def simulate_call_external_api(
     function_params: Dict[str, Any],
     func_name: str,
     model: str = None
+) -> Dict[str, Any]:
+    """
+    模拟 call_external_api 的输出。开启 api_simulation_cache 时先按 (tool, 参数, tool 代码, 模型) 查缓存，
+    按配置的复用策略复用已有结果（命中时 token_usage 为 0），否则调用大模型并写入缓存。
+
+    Returns:
+        {"result": 模拟的 call_external_api 输出, "token_usage": {...}}（使用缓存时另有 cache_hit）
+    """
+    if model is None:
+        model = SIMULATE_API_MODEL
+    if API_SIMULATION_CACHE is None:
+        return await _simulate_call_external_api_with_llm(
+            call_external_api_docstring, source_code_without_api, function_params, func_name, model,
+        )
+    context = "\0".join([model, call_external_api_docstring or "", source_code_without_api or ""])
+    return await API_SIMULATION_CACHE.get_or_simulate(
+        func_name,
+        function_params,
+        context,
+        lambda: _simulate_call_external_api_with_llm(
+            call_external_api_docstring, source_code_without_api, function_params, func_name, model,
+        ),
+    )
+
+
+async def _simulate_call_external_api_with_llm(
+    call_external_api_docstring: str,
+    source_code_without_api: str,
+    function_params: Dict[str, Any],
+    func_name: str,
+    model: str = None
 ) -> Dict[str, Any]:
     """
     使用大模型模拟 call_external_api 的输出
@@ -672,9 +456,41 @@ Generate ONLY the JSON output that call_external_api would return. No explanatio
         ) from e
 
 
+# 函数注册表：第一次加载函数时扫描一次目录，之后按名字直接解析；已加载的函数放在 LRU 缓存中
+FUNCTION_REGISTRY = FunctionRegistry(
+    [GENERATED_FUNCTIONS_STATEFUL_DIR, GENERATED_FUNCTIONS_DIR], import_paths=[STATE_MANAGER_DIR],
+)
+
+# tool 执行的沙箱进程池（config.yaml 的 sandbox_execution 段，默认开启；关闭时在本进程的 SafeExecutionContext 中执行）
+SANDBOX_POOL = build_sandbox_pool(
+    config, FUNCTION_REGISTRY.directories, SAFE_WORK_DIR, import_paths=FUNCTION_REGISTRY.import_paths,
+)
+
+
+def start_sandbox_pool() -> None:
+    """在 asyncio.run 之前启动沙箱 worker（fork 时还没有事件循环和其他线程；未开启沙箱时什么都不做）"""
+    if SANDBOX_POOL is not None:
+        SANDBOX_POOL.start()
+
+
+async def preload_sandbox_tools(tool_names: List[str]) -> None:
+    """按 shard 中 tool 的调用次数把 tool 分给各沙箱 worker 并预加载 module（未开启沙箱时什么都不做）"""
+    if SANDBOX_POOL is None:
+        return
+    report = await SANDBOX_POOL.preload(tool_names)
+    print(
+        f"Sandbox workers ready: {report['num_tools']} tools, preloaded {report['num_preloaded']} modules, "
+        f"startup {max(report['startup_seconds'], default=0.0):.2f}s, "
+        f"preload {max(report['preload_seconds'], default=0.0):.2f}s (slowest worker)"
+    )
+    for failure in report["failed"]:
+        print(f"[WARN] Failed to preload {failure}")
+
+
 def load_function_from_file(func_name: str) -> Tuple[Any, Optional[Dict[str, Any]], Optional[str], Any]:
     """
-    从 generated_functions 目录加载函数
+    从 generated_functions 目录加载函数（经 FUNCTION_REGISTRY 解析文件名并缓存加载结果，
+    generated_functions_stateful_v1 中的同名文件优先，加载失败时回退到 generated_functions_v1）
 
     Args:
         func_name: 函数名称
@@ -685,107 +501,8 @@ def load_function_from_file(func_name: str) -> Tuple[Any, Optional[Dict[str, Any
     Raises:
         RuntimeError: 如果函数文件不存在或加载失败
     """
-    # 尝试不同的文件名格式
-    # 需要考虑斜杠、连字符、下划线、空格的各种组合，以及 -Tool 后缀
-    base_names = [
-        func_name,  # 原始名称
-        func_name.replace(" ", "-"),  # 空格 → 横线
-        func_name.replace("/", "_"),  # 斜杠 → 下划线
-        func_name.replace("-", "_"),  # 连字符 → 下划线
-        func_name.replace(" ", "-").replace("/", "_"),  # 空格 → 横线，斜杠 → 下划线
-        func_name.replace("/", "_").replace("-", "_"),  # 斜杠和连字符都 → 下划线
-        func_name.replace(" ", "-").replace("/", "_").replace("-", "_"),  # 空格、斜杠、连字符都处理
-        func_name.replace("_", "-"),  # 下划线 → 连字符
-    ]
-
-    # 生成 possible_names：base_names + base_names with -Tool suffix
-    possible_names = []
-    for base in base_names:
-        possible_names.append(base)
-        possible_names.append(base + "-Tool")  # 尝试添加 -Tool 后缀
-
-    last_error = None
-    tried_files = []
-
-    for name in possible_names:
-        file_path = os.path.join(GENERATED_FUNCTIONS_DIR, f"{name}.py")
-        if os.path.exists(file_path):
-            tried_files.append(file_path)
-            try:
-                # 使用唯一的模块名避免冲突
-                module_name = f"generated_func_{name.replace('-', '_').replace('/', '_')}"
-                spec = importlib.util.spec_from_file_location(module_name, file_path)
-                if spec is None or spec.loader is None:
-                    last_error = RuntimeError(f"Failed to create spec for module {module_name} from {file_path}")
-                    continue
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-
-                # 查找函数 - 增强匹配逻辑
-                func = None
-
-                # 1. 尝试精确匹配（标准化：使用与 fix_function_names.py 相同的逻辑）
-                # 将所有非字母数字字符替换为 _（保留 Unicode 字母，如中文）
-                func_name_normalized = re.sub(r'[^\w]', '_', func_name, flags=re.UNICODE)
-                # 移除连续的下划线
-                func_name_normalized = re.sub(r'_+', '_', func_name_normalized).strip('_')
-
-                # 尝试多种函数名变体（包括带 _Tool 后缀的）
-                func_name_variants = [
-                    func_name_normalized,
-                    func_name_normalized + "_Tool",  # 尝试添加 _Tool 后缀
-                    func_name.replace("/", "_").replace("-", "_"),
-                    func_name.replace("-", "_"),
-                    func_name.replace("/", "_"),
-                    func_name,
-                ]
-
-                # 如果函数名以数字开头，也尝试 tool_ 前缀版本
-                if func_name_normalized and func_name_normalized[0].isdigit():
-                    func_name_variants.append(f'tool_{func_name_normalized}')
-
-                # 尝试所有变体
-                for variant in func_name_variants:
-                    if hasattr(module, variant):
-                        func = getattr(module, variant)
-                        if variant != func_name_normalized:
-                            print(f"[INFO] Matched function with variant name: {variant}")
-                        break
-
-                if func:
-                    # 提取 call_external_api 信息
-                    api_info = extract_call_external_api_info(file_path)
-                    # 提取不包含 call_external_api 的源代码
-                    source_without_api = extract_source_code_without_call_external_api(file_path)
-                    return func, api_info, source_without_api, module
-                else:
-                    # 函数不存在于模块中
-                    available_funcs = [attr for attr in dir(module) if not attr.startswith('_') and callable(getattr(module, attr))]
-                    last_error = RuntimeError(
-                        f"Function '{func_name}' (normalized: '{func_name_normalized}') not found in module from {file_path}. "
-                        f"Available functions: {available_funcs}"
-                    )
-            except Exception as e:
-                # 重新抛出异常，添加上下文信息
-                import traceback
-                error_msg = f"Error loading function {func_name} from {file_path}: {str(e)}"
-                last_error = RuntimeError(error_msg)
-                last_error.__cause__ = e  # 保留原始异常链
-    
-    # 如果所有尝试都失败了，抛出异常
-    if tried_files:
-        # 尝试了文件但都失败了
-        raise RuntimeError(
-            f"Failed to load function '{func_name}' from any of the tried files: {tried_files}. "
-            f"Last error: {last_error}"
-        ) from last_error
-    else:
-        # 文件不存在
-        raise RuntimeError(
-            f"Function file not found for '{func_name}'. "
-            f"Tried file names: {[f'{name}.py' for name in possible_names]} "
-            f"in directory: {GENERATED_FUNCTIONS_DIR}"
-        )
+    loaded = FUNCTION_REGISTRY.load(func_name)
+    return loaded.func, loaded.api_info, loaded.source_without_api, loaded.module
 
 
 #@log_time_and_tokens("forward_to_fc_params")
@@ -1000,6 +717,9 @@ async def execute_function_call(
     """
     执行函数调用并获取 tool output
 
+    call_external_api 的输出在本进程中由 LLM 模拟；函数本身在 SANDBOX_POOL 的 worker 进程中执行
+    （未开启沙箱进程池时在本进程的 SafeExecutionContext 中执行）。
+
     Args:
         func_name: 函数名称
         parameters: 函数参数字典（从 forward_to_fc_params 获取）
@@ -1007,20 +727,25 @@ async def execute_function_call(
     Returns:
         tool output 字典（包含 token_usage 字段）或 None
     """
-    # 在 SafeExecutionContext 外部导入，避免触发 exec 拦截
-    import inspect
+    # 加载函数和相关信息（如果失败会抛出异常）；使用沙箱时由 worker 加载（确定实际执行的文件），
+    # 本进程只解析该文件的源码，不执行生成的 module
+    if SANDBOX_POOL is not None:
+        func, module = None, None
+        file_path = await SANDBOX_POOL.resolve(func_name)
+        api_info, source_without_api = FUNCTION_REGISTRY.api_parts(func_name, file_path)
+    else:
+        func, api_info, source_without_api, module = load_function_from_file(func_name)
 
-    # 加载函数和相关信息（如果失败会抛出异常）
-    func, api_info, source_without_api, module = load_function_from_file(func_name)
-    
     total_token_usage = {
         "prompt_tokens": 0,
         "completion_tokens": 0,
         "total_tokens": 0,
     }
-    
+
     # 如果函数依赖外部 API，需要替换 call_external_api 的实现
-    if api_info and source_without_api and module:
+    replace_api = bool(api_info and source_without_api)
+    simulated_api_output = None
+    if replace_api:
         # 模拟 call_external_api 的输出
         simulated_api_result = await simulate_call_external_api(
             call_external_api_docstring=api_info.get("docstring", ""),
@@ -1028,7 +753,7 @@ async def execute_function_call(
             function_params=parameters,
             func_name=func_name,
         )
-        
+
         # 提取 token 使用信息
         if isinstance(simulated_api_result, dict) and "token_usage" in simulated_api_result:
             token_usage = simulated_api_result.get("token_usage", {})
@@ -1039,85 +764,32 @@ async def execute_function_call(
         else:
             # 向后兼容：如果没有 token_usage，假设是旧格式
             simulated_api_output = simulated_api_result
-        
-        # 创建新的 call_external_api 函数
-        def mock_call_external_api(tool_name: str) -> Dict[str, Any]:
-            """Mock implementation of call_external_api"""
-            return simulated_api_output
-        
-        # 保存原始的 call_external_api（如果有）
-        original_call_external_api = getattr(module, 'call_external_api', None)
-        
-        # 替换模块中的 call_external_api
-        setattr(module, 'call_external_api', mock_call_external_api)
-        
-        try:
-            # 在安全执行上下文中执行函数调用
-            with SafeExecutionContext():
-                # 执行函数调用
-                if parameters:
-                    result = func(**parameters)
-                else:
-                    # 尝试无参数调用或使用默认值
-                    sig = inspect.signature(func)
-                    call_params = {}
-                    for param_name, param in sig.parameters.items():
-                        if param.default != inspect.Parameter.empty:
-                            call_params[param_name] = param.default
-                        elif param_name == "tool_name":
-                            call_params[param_name] = func_name
-                    result = func(**call_params) if call_params else func()
-            
-            # 恢复原始的 call_external_api（如果有）
-            if original_call_external_api:
-                setattr(module, 'call_external_api', original_call_external_api)
-            else:
-                # 如果没有原始函数，删除 mock
-                if hasattr(module, 'call_external_api'):
-                    delattr(module, 'call_external_api')
-            
-            final_result = result if isinstance(result, dict) else {"result": result}
-            final_result["token_usage"] = total_token_usage
-            return final_result
-        except Exception as e:
-            # 恢复原始的 call_external_api（如果有）
-            if original_call_external_api:
-                setattr(module, 'call_external_api', original_call_external_api)
-            else:
-                if hasattr(module, 'call_external_api'):
-                    delattr(module, 'call_external_api')
-            # 重新抛出异常，添加上下文信息
-            raise RuntimeError(
-                f"Error executing function {func_name} with parameters {parameters}: {e}"
-            ) from e
-    
-    # 如果没有 call_external_api 或替换失败，正常执行
+
+    # stateful tool 在当前路径的会话状态上执行（见 tool_session.py），同一会话的 stateful 调用依次执行
+    session = current_session()
+    stateful = session is not None and uses_session_state(source_without_api)
     try:
-        # 在安全执行上下文中执行函数调用
-        with SafeExecutionContext():
-            # 执行函数调用
-            if parameters:
-                result = func(**parameters)
+        async with session.lock if stateful else contextlib.nullcontext():
+            if SANDBOX_POOL is not None:
+                result = await SANDBOX_POOL.run(
+                    func_name, parameters, simulated_api_output, replace_api, session=session,
+                )
             else:
-                # 尝试无参数调用或使用默认值
-                sig = inspect.signature(func)
-                call_params = {}
-                for param_name, param in sig.parameters.items():
-                    if param.default != inspect.Parameter.empty:
-                        call_params[param_name] = param.default
-                    elif param_name == "tool_name":
-                        call_params[param_name] = func_name
-                result = func(**call_params) if call_params else func()
-        
-        final_result = result if isinstance(result, dict) else {"result": result}
-        final_result["token_usage"] = total_token_usage
-        return final_result
+                result = execute_loaded_function(
+                    func, module, func_name, parameters,
+                    api_output=simulated_api_output, replace_api=replace_api, safe_dir=SAFE_WORK_DIR,
+                    session=session,
+                )
     except Exception as e:
         # 重新抛出异常，添加上下文信息
         raise RuntimeError(
             f"Error executing function {func_name} with parameters {parameters}: {e}"
         ) from e
 
+    final_result = result if isinstance(result, dict) else {"result": result}
+    final_result["token_usage"] = total_token_usage
+    return final_result
+
 
 def build_function_documentation(
     func_name: str,
@@ -2061,6 +1733,9 @@ async def process_single_path_v1(
         if node_name in tool_schemas:
             nodes_tool_schema[node_name] = tool_schemas[node_name]
 
+    # 每条路径是一个独立的会话：stateful tool 从全新的状态开始，只看到本路径之前的写入
+    start_session()
+
     atomic_queries: List[str] = []
     all_tool_outputs: List[Dict[str, Any]] = []
     all_fc_results: List[Dict[str, Any]] = []  # 存储所有 forward_to_fc_params 的结果
@@ -2339,7 +2014,10 @@ async def process_single_path(
     for node_name in all_nodes_in_path:
         if node_name in tool_schemas:
             nodes_tool_schema[node_name] = tool_schemas[node_name]
-    
+
+    # 每条路径是一个独立的会话（见 process_single_path_v1）
+    start_session()
+
     atomic_queries: List[str] = []
     all_tool_outputs: List[Dict[str, Any]] = []
     all_fc_results: List[Dict[str, Any]] = []  # 存储所有 forward_to_fc_params 的结果
@@ -2509,15 +2187,19 @@ async def generate_queries_for_all_turns(
     batch_size: int = 5,
     resume: bool = False,
     early_stop_batches: int = 3,
+    max_concurrency: Optional[int] = None,
+    max_tokens_per_minute: Optional[int] = None,
 ) -> None:
     """
     主入口：为所有 paths 生成 atomic queries 和最终 merged queries。
 
     Args:
         max_paths: 最多处理多少个 paths（用于测试）
-        batch_size: 并发批次大小
+        batch_size: 进度汇报和早停的粒度（每完成 batch_size 个 path 汇报一次）
         resume: 是否启用断点续传（跳过已生成的 paths）
         early_stop_batches: 连续多少个 batch 全部失败后停止（0 表示不启用早停）
+        max_concurrency: 同时处理的 path 数（默认等于 batch_size）
+        max_tokens_per_minute: 可选的 TPM 限制（None 表示不限制）
     """
     paths = load_random_walk_paths_v1(RANDOM_WALK_V1_PATH)
     tool_schemas = load_tool_schemas(TOOL_SCHEMA_SUMMARY_PATH)
@@ -2574,6 +2256,8 @@ async def generate_queries_for_all_turns(
     print(f"\nFound {len(paths)} paths to process.")
     print(f"Output -> {OUTPUT_QUERIES_PATH}\n")
 
+    await preload_sandbox_tools([name for p in paths for name in p.get("node_names", [])])
+
     # 文件写入模式：
     # - 如果是 resume 模式，使用追加模式（a）
     # - 否则，使用覆盖模式（w）
@@ -2585,76 +2269,70 @@ async def generate_queries_for_all_turns(
         total = len(paths)
         overall_tokens = 0
         total_errors = 0
-        consecutive_failed_batches = 0  # 连续失败的 batch 计数
-        num_batches = (total + batch_size - 1) // batch_size
-
-        # 使用 tqdm 显示整体进度（按 path 数量）
-        for batch_idx, start in enumerate(tqdm(range(0, total, batch_size),
-                                               total=num_batches,
-                                               desc="Processing paths",
-                                               unit="batch"), start=1):
-            batch = paths[start: start + batch_size]
-            print(
-                f"\n[Batch {batch_idx}/{num_batches}] "
-                f"Processing paths {start + 1}-{start + len(batch)} "
-                f"out of {total}..."
-            )
-
-            batch_start_time = time.time()
-            batch_tokens = 0
-            batch_errors = 0  # 当前 batch 的错误数
-
-            tasks = [
-                process_single_path_v1(path, tool_schemas)
-                for path in batch
-            ]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            for path, result in zip(batch, results):
-                if isinstance(result, Exception):
-                    total_errors += 1
-                    batch_errors += 1
-                    print(f"[ERROR] Failed to process path: {result}")
-                    # 失败的记录不写入文件，这样下次 resume 时会重新处理
-                    continue
-                else:
-                    record = result
-                    # 累加该 path 的 token 使用
-                    tq = record.get("token_usage", {})
-                    batch_tokens += tq.get("total_tokens", 0)
-
-                    # 只写入成功的记录
-                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
-                    f.flush()
-
-            batch_elapsed = time.time() - batch_start_time
-            overall_tokens += batch_tokens
+        consecutive_failures = 0  # 连续失败的 path 计数
+        # batch_size 仍是进度汇报 / 早停的粒度：连续 early_stop_batches 个 batch 的 path 全部失败时早停
+        early_stop_threshold = batch_size * early_stop_batches
+        window_idx = 0
+        window_done = 0
+        window_tokens = 0
+        window_errors = 0
+        window_start_time = time.time()
+
+        # 滑动窗口：始终保持 max_concurrency 个 path 在处理中，完成一个补一个
+        scheduler = SlidingWindowScheduler(
+            max_concurrency=max_concurrency or batch_size,
+            max_tokens_per_minute=max_tokens_per_minute,
+        )
+        progress_bar = tqdm(total=total, desc="Processing paths", unit="path")
+
+        async for path, result in scheduler.run(paths, lambda p: process_single_path_v1(p, tool_schemas)):
+            progress_bar.update(1)
+            window_done += 1
+            if isinstance(result, Exception):
+                total_errors += 1
+                window_errors += 1
+                consecutive_failures += 1
+                print(f"[ERROR] Failed to process path: {result}")
+                # 失败的记录不写入文件，这样下次 resume 时会重新处理
+            else:
+                consecutive_failures = 0
+                record = result
+                # 累加该 path 的 token 使用
+                tq = record.get("token_usage", {})
+                window_tokens += tq.get("total_tokens", 0)
+                overall_tokens += tq.get("total_tokens", 0)
+
+                # 只写入成功的记录
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+
+            # 早停检查：连续失败的 path 数达到阈值
+            if early_stop_batches > 0 and consecutive_failures >= min(early_stop_threshold, total):
+                scheduler.stop()
+                print("\n" + "=" * 80)
+                print("🛑 EARLY STOPPING TRIGGERED")
+                print("=" * 80)
+                print(f"Consecutive failed paths: {consecutive_failures} "
+                      f"(= {early_stop_batches} batches of {batch_size})")
+                print(f"Stopping to prevent further failures...")
+                print("=" * 80)
+                break
 
-            # 早停检查：如果当前 batch 全部失败
-            if batch_errors == len(batch):
-                consecutive_failed_batches += 1
+            if window_done >= batch_size or progress_bar.n == total:
+                window_idx += 1
+                window_elapsed = time.time() - window_start_time
                 print(
-                    f"[Batch {batch_idx}] ❌ ALL {len(batch)} paths FAILED! "
-                    f"(consecutive failed batches: {consecutive_failed_batches}/{early_stop_batches})"
+                    f"[Batch {window_idx}] time={window_elapsed:.2f}s, "
+                    f"batch_tokens={window_tokens}, overall_tokens={overall_tokens}, "
+                    f"batch_errors={window_errors}/{window_done}"
                 )
+                window_done = 0
+                window_tokens = 0
+                window_errors = 0
+                window_start_time = time.time()
 
-                # 如果连续失败的 batch 数量达到阈值，停止处理
-                if early_stop_batches > 0 and consecutive_failed_batches >= early_stop_batches:
-                    print("\n" + "=" * 80)
-                    print("🛑 EARLY STOPPING TRIGGERED")
-                    print("=" * 80)
-                    print(f"Consecutive failed batches: {consecutive_failed_batches}")
-                    print(f"Stopping to prevent further failures...")
-                    print("=" * 80)
-                    break
-            else:
-                # 如果当前 batch 有成功的，重置连续失败计数
-                consecutive_failed_batches = 0
-                print(
-                    f"[Batch {batch_idx}] time={batch_elapsed:.2f}s, "
-                    f"batch_tokens={batch_tokens}, overall_tokens={overall_tokens}, "
-                    f"batch_errors={batch_errors}/{len(batch)}"
-                )
+        progress_bar.close()
+        print(f"Scheduler stats: {scheduler.summary()}")
     
     print("\n" + "=" * 80)
     print("PROCESSING SUMMARY")
@@ -2663,6 +2341,11 @@ async def generate_queries_for_all_turns(
     print(f"Successful paths: {total - total_errors}")
     print(f"Failed paths: {total_errors}")
     print(f"Total tokens used: {overall_tokens}")
+    print(async_client.format_cache_summary())
+    if API_SIMULATION_CACHE is not None:
+        print(API_SIMULATION_CACHE.format_summary())
+    if SANDBOX_POOL is not None:
+        print(SANDBOX_POOL.format_summary())
     print("=" * 80)
     print(f"\nAll paths processed, queries saved to: {OUTPUT_QUERIES_PATH}")
 
@@ -2682,6 +2365,10 @@ def main() -> None:
                         help='Resume from previous run (skip already processed paths)')
     parser.add_argument('--early-stop', type=int, default=1,
                         help='Stop after N consecutive batches with all failures (0 to disable)')
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help='Number of paths in flight at once (default: batch size)')
+    parser.add_argument('--max-tpm', type=int, default=None,
+                        help='Optional tokens-per-minute limit')
     parser.add_argument('--test', action='store_true',
                         help='Test mode: process only 5 paths')
 
@@ -2691,11 +2378,14 @@ def main() -> None:
         print("🧪 Running in TEST mode (5 paths only)...")
         args.max_paths = 5
 
+    start_sandbox_pool()
     asyncio.run(generate_queries_for_all_turns(
         max_paths=args.max_paths,
         batch_size=args.batch_size,
         resume=args.resume,
         early_stop_batches=args.early_stop,
+        max_concurrency=args.max_concurrency,
+        max_tokens_per_minute=args.max_tpm,
     ))
 
 
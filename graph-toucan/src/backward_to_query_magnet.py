@@ -8,6 +8,7 @@ MAGNET-style Back-and-Forth Translation
 3. Turn 内顺序执行 + 参数传递
 4. 维护完整历史输出 (支持长依赖)
 5. 处理空 turn (Split 操作)
+6. 可选的共享前缀执行 (--share-prefixes, 见 prefix_trie.py)
 """
 
 import asyncio
@@ -24,12 +25,24 @@ from typing import Any, Dict, List, Optional, Set, Tuple
 from tqdm import tqdm
 from openai import AsyncOpenAI
 
+from llm_scheduler import SlidingWindowScheduler
+from llm_cache import wrap_llm_client
+from path_stream import iter_fsp_paths
+from graph_store import load_graph_store
+from execution_order import FunctionDependencies, execution_levels
+from prefix_trie import PrefixTrie, TrieNode, run_subtree
+from tool_session import ToolSession, start_session, use_session
+
 # 导入 backward_to_query 中的工具函数和类
 from backward_to_query import (
     execute_function_call as _execute_function_call_base,
     load_function_from_file as _load_function_from_file_base,
     build_function_documentation,
     format_tool_output,
+    API_SIMULATION_CACHE,
+    SANDBOX_POOL,
+    preload_sandbox_tools,
+    start_sandbox_pool,
 )
 
 # ==================== 路径配置 ====================
@@ -41,6 +54,7 @@ TOOL_FUNCTION_DIR = os.path.join(TOOL_INFO_DIR, "tool_function")
 
 # 输入输出路径
 FSP_V2_PATH = os.path.join(ROOT_DIR, "walker_path", "fsp_v2.json")
+GRAPH_PATH = os.path.join(ROOT_DIR, "graph", "graph_v1.json")
 TOOL_SCHEMA_SUMMARY_PATH = os.path.join(TOOL_INFO_DIR, "tool_schema_with_outputformat.json")
 OUTPUT_PATH = os.path.join(FSP_DIR, "fsp_v2_queries.jsonl")
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
@@ -76,9 +90,10 @@ else:
     api_key = config["api"].get("api_key", "EMPTY")
 base_url = config["api"]["base_url"]
 
-async_client = AsyncOpenAI(
-    api_key=api_key,
-    base_url=base_url,
+async_client = wrap_llm_client(
+    AsyncOpenAI(api_key=api_key, base_url=base_url),
+    stage="backward_to_query_magnet",
+    config=config,
 )
 
 # 模型配置
@@ -103,23 +118,12 @@ def load_fsp_v2(path: str = FSP_V2_PATH) -> List[Dict[str, Any]]:
         - statistics: Dict
     """
     print(f"Loading FSP v2 from {path}...")
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # FSP v2 结构: {"node_results": {"0": {"paths": [...]}, "1": {...}, ...}}
-    node_results = data.get("node_results", {})
-
-    all_paths = []
-    for node_idx_str, node_data in node_results.items():
-        node_idx = int(node_idx_str)
-        paths = node_data.get("paths", [])
-
-        # 为每个 path 添加 node_idx
-        for path in paths:
-            path["node_idx"] = node_idx
-            all_paths.append(path)
+    # FSP v2 结构: {"node_results": {"0": {"paths": [...]}, "1": {...}, ...}}，
+    # 或 generate_fsp_v2 写出的 JSONL（每行一条 path 记录），iter_fsp_paths 为每个 path 添加 node_idx
+    all_paths = list(iter_fsp_paths(path))
+    num_nodes = len({p["node_idx"] for p in all_paths})
 
-    print(f"Loaded {len(all_paths)} FSP v2 paths from {len(node_results)} nodes")
+    print(f"Loaded {len(all_paths)} FSP v2 paths from {num_nodes} nodes")
     return all_paths
 
 
@@ -1588,29 +1592,13 @@ async def generate_query_for_turn_magnet(
     return parsed
 
 
-# ==================== 执行顺序推断 ====================
+# ==================== Forward: 分层执行 + 参数传递 ====================
 
-def infer_execution_order(
-    turn_functions: List[str],
-    tool_schemas: Dict[str, Dict],
-) -> List[str]:
-    """
-    推断 turn 内函数的执行顺序
-
-    简单策略：
-    - 如果只有 1-2 个函数，按原顺序
-    - 如果有更多函数，尝试基于输入输出类型排序
-
-    TODO: 可以改进为基于依赖图的拓扑排序
-    """
-    if len(turn_functions) <= 2:
-        return turn_functions
+def _add_token_usage(total: Dict[str, int], usage: Dict[str, int]) -> None:
+    total["prompt_tokens"] += usage.get("prompt_tokens", 0)
+    total["completion_tokens"] += usage.get("completion_tokens", 0)
+    total["total_tokens"] += usage.get("total_tokens", 0)
 
-    # 简单策略：保持原顺序（假设 FSP 生成时已经排好序）
-    return turn_functions
-
-
-# ==================== Forward: 顺序执行 + 参数传递 ====================
 
 async def forward_with_sequential_execution(
     turn_idx: int,
@@ -1618,15 +1606,18 @@ async def forward_with_sequential_execution(
     turn_functions: List[str],
     all_turn_outputs: List[List[Dict]],
     tool_schemas: Dict[str, Dict],
+    dependencies: Optional[FunctionDependencies] = None,
 ) -> Dict[str, Any]:
     """
-    Forward 阶段：顺序执行 turn 内函数，支持参数传递
+    Forward 阶段：按依赖分层执行 turn 内函数，支持参数传递
 
     核心逻辑：
-    1. 推断执行顺序
-    2. 逐个生成函数参数
-    3. 立即执行，将输出添加到可用上下文
-    4. 下一个函数可以使用前面函数的输出
+    1. 按依赖图把 turn 内函数拓扑排序并分层（execution_levels）
+    2. 同一层的函数互不依赖：并发生成参数，再并发执行
+    3. 每层执行完后，输出加入可用上下文，后面的层可以使用前面层的输出
+
+    dependencies 为 None 时每个函数单独一层，与原来的逐个执行相同。
+    tool_calls / turn_outputs 按执行顺序（层序，层内保持原顺序）排列。
 
     Returns:
         {
@@ -1634,9 +1625,10 @@ async def forward_with_sequential_execution(
             "tool_calls": List[Dict],
             "turn_outputs": List[Dict],
             "token_usage": Dict,
+            "execution_levels": List[List[str]],
         }
     """
-    execution_order = infer_execution_order(turn_functions, tool_schemas)
+    levels = execution_levels(turn_functions, dependencies)
 
     tool_calls = []
     turn_outputs = []
@@ -1646,72 +1638,71 @@ async def forward_with_sequential_execution(
         "total_tokens": 0,
     }
 
-    for func_idx, func_name in enumerate(execution_order):
-        try:
-            # 构建可用上下文：历史 + 当前 turn 已执行的输出
-            available_context = []
-            for h_outputs in all_turn_outputs:
-                available_context.extend(h_outputs)
-            available_context.extend(turn_outputs)
-
-            # 为当前函数生成参数
-            param_result = await generate_single_func_params(
+    history_context = []
+    for h_outputs in all_turn_outputs:
+        history_context.extend(h_outputs)
+
+    func_idx = 0
+    for level in levels:
+        level_start = func_idx
+        func_idx += len(level)
+
+        # 可用上下文：历史 + 当前 turn 前面各层的输出
+        available_context = history_context + turn_outputs
+
+        # 为本层所有函数并发生成参数
+        param_results = await asyncio.gather(*[
+            generate_single_func_params(
                 turn_query=turn_query,
                 func_name=func_name,
                 available_context=available_context,
                 tool_schemas=tool_schemas,
             )
+            for func_name in level
+        ], return_exceptions=True)
 
-            # 累加 token 使用
-            tq = param_result.get("token_usage", {})
-            total_token_usage["prompt_tokens"] += tq.get("prompt_tokens", 0)
-            total_token_usage["completion_tokens"] += tq.get("completion_tokens", 0)
-            total_token_usage["total_tokens"] += tq.get("total_tokens", 0)
-
-            parameters = param_result.get("parameters", {})
-            params_source = param_result.get("params_source", {})
-
-            tool_call = {
+        level_calls = []
+        for offset, (func_name, param_result) in enumerate(zip(level, param_results)):
+            if isinstance(param_result, BaseException):
+                raise RuntimeError(
+                    f"[generate_single_func_params] Failed for function '{func_name}' "
+                    f"at turn {turn_idx}, func_idx={level_start + offset}: {param_result}"
+                )
+            _add_token_usage(total_token_usage, param_result.get("token_usage", {}))
+            level_calls.append({
                 "function": func_name,
-                "parameters": parameters,
-                "params_source": params_source,
-            }
-            tool_calls.append(tool_call)
-
-        except Exception as e:
-            raise RuntimeError(
-                f"[generate_single_func_params] Failed for function '{func_name}' "
-                f"at turn {turn_idx}, func_idx={func_idx}: {e}"
-            )
+                "parameters": param_result.get("parameters", {}),
+                "params_source": param_result.get("params_source", {}),
+            })
+        tool_calls.extend(level_calls)
 
-        # 立即执行函数
-        try:
-            exec_result = await execute_function_call(
-                func_name=func_name,
-                parameters=parameters,
+        # 并发执行本层函数
+        exec_results = await asyncio.gather(*[
+            execute_function_call(
+                func_name=call["function"],
+                parameters=call["parameters"],
                 tool_schemas=tool_schemas,
             )
+            for call in level_calls
+        ], return_exceptions=True)
 
+        for offset, (call, exec_result) in enumerate(zip(level_calls, exec_results)):
+            if isinstance(exec_result, BaseException):
+                raise RuntimeError(
+                    f"[execute_function_call] Failed for function '{call['function']}' "
+                    f"at turn {turn_idx}, func_idx={level_start + offset}, "
+                    f"parameters={call['parameters']}: {exec_result}"
+                )
             # 累加执行的 token 使用 (如果有)
-            exec_tq = exec_result.get("token_usage", {})
-            total_token_usage["prompt_tokens"] += exec_tq.get("prompt_tokens", 0)
-            total_token_usage["completion_tokens"] += exec_tq.get("completion_tokens", 0)
-            total_token_usage["total_tokens"] += exec_tq.get("total_tokens", 0)
-
+            _add_token_usage(total_token_usage, exec_result.get("token_usage", {}))
             turn_outputs.append(exec_result)
 
-        except Exception as e:
-            raise RuntimeError(
-                f"[execute_function_call] Failed for function '{func_name}' "
-                f"at turn {turn_idx}, func_idx={func_idx}, "
-                f"parameters={parameters}: {e}"
-            )
-
     return {
-        "think": f"Executed {len(tool_calls)} functions in turn {turn_idx}",
+        "think": f"Executed {len(tool_calls)} functions in {len(levels)} levels in turn {turn_idx}",
         "tool_calls": tool_calls,
         "turn_outputs": turn_outputs,
         "token_usage": total_token_usage,
+        "execution_levels": levels,
     }
 
 
@@ -1878,25 +1869,188 @@ async def handle_empty_turn(
 
 # ==================== 主处理流程 ====================
 
+async def process_fsp_turn(
+    turn_idx: int,
+    turn_functions: List[str],
+    turn_operations: Dict[str, Any],
+    all_turn_outputs: List[List[Dict]],
+    tool_schemas: Dict[str, Dict],
+    dependencies: FunctionDependencies,
+    node_idx: int = -1,
+    path_idx: int = -1,
+) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    处理 FSP 路径的一个 turn：生成 query (Backward) + 按依赖分层执行函数 (Forward)，空 turn 生成 miss_func 回复。
+    执行结果追加到 all_turn_outputs（空 turn 追加 []）。
+
+    Args:
+        turn_operations: detect_turn_operations 的结果
+        dependencies: 该路径的函数依赖（已包含路径自身的 Merge / Insert 依赖）
+        node_idx / path_idx: 只用于错误信息
+
+    Returns:
+        (turn 记录, 该 turn 的 token 使用)
+    """
+    primary_style = turn_operations["primary_style"]
+    token_usage = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+    }
+
+    # 处理空 turn
+    if turn_operations["is_empty"]:
+        try:
+            empty_result = await handle_empty_turn(
+                turn_idx=turn_idx,
+                all_turn_outputs=all_turn_outputs,
+                tool_schemas=tool_schemas,
+                miss_type="miss_func",
+            )
+        except Exception as e:
+            raise RuntimeError(
+                f"[handle_empty_turn] Failed at turn {turn_idx}, "
+                f"node_idx={node_idx}, path_idx={path_idx}: {e}"
+            )
+
+        _add_token_usage(token_usage, empty_result.get("token_usage", {}))
+        # 空 turn 不添加输出
+        all_turn_outputs.append([])
+        return {
+            "turn_idx": turn_idx,
+            "turn_type": primary_style,
+            "operations": turn_operations["operations"],
+            "user_query": empty_result.get("user_query", ""),
+            "response": empty_result.get("response", ""),
+            "miss_type": empty_result.get("miss_type", ""),
+            "reason": empty_result.get("reason", ""),
+        }, token_usage
+
+    # 生成 query (Backward) + 顺序执行 (Forward) with retry
+    max_retries = 1
+    error_feedback = None
+
+    for retry_attempt in range(max_retries + 1):
+        # 生成 query (Backward)
+        try:
+            query_result = await generate_query_for_turn_magnet(
+                turn_idx=turn_idx,
+                turn_type=primary_style,
+                turn_functions=turn_functions,
+                all_turn_outputs=all_turn_outputs,
+                tool_schemas=tool_schemas,
+                turn_operations=turn_operations,
+                error_feedback=error_feedback,
+            )
+
+            user_query = query_result.get("user_query", "")
+            if not user_query:
+                raise ValueError(f"Empty user_query generated for turn {turn_idx}")
+
+            _add_token_usage(token_usage, query_result.get("token_usage", {}))
+
+        except Exception as e:
+            raise RuntimeError(
+                f"[generate_query_for_turn_magnet] Failed at turn {turn_idx}, "
+                f"node_idx={node_idx}, path_idx={path_idx}, "
+                f"turn_type={primary_style}, functions={turn_functions}: {e}"
+            )
+
+        # 分层执行 + 参数传递 (Forward)
+        try:
+            forward_result = await forward_with_sequential_execution(
+                turn_idx=turn_idx,
+                turn_query=user_query,
+                turn_functions=turn_functions,
+                all_turn_outputs=all_turn_outputs,
+                tool_schemas=tool_schemas,
+                dependencies=dependencies,
+            )
+
+            _add_token_usage(token_usage, forward_result.get("token_usage", {}))
+
+            turn_outputs = forward_result.get("turn_outputs", [])
+            all_turn_outputs.append(turn_outputs)
+
+            # 执行成功，跳出重试循环
+            break
+
+        except Exception as e:
+            # 函数执行失败
+            if retry_attempt < max_retries:
+                # 构建错误反馈，重新生成 query
+                print(f"  ⚠️  Function execution failed at turn {turn_idx}, attempt {retry_attempt + 1}/{max_retries + 1}")
+                print(f"      Error: {str(e)}")
+                error_feedback = f"""Function execution failed with error:
+{str(e)}
+
+Please revise your query to avoid this execution error. Consider:
+1. Check if the function parameters are correct
+2. Ensure all required parameters are provided
+3. Verify that parameter values are in the correct format
+"""
+                continue  # 进入下一次重试
+            else:
+                # 重试次数用尽，抛出错误
+                raise RuntimeError(
+                    f"[forward_with_sequential_execution] Failed at turn {turn_idx} after {max_retries + 1} attempts, "
+                    f"node_idx={node_idx}, path_idx={path_idx}, "
+                    f"user_query='{user_query}', functions={turn_functions}: {e}"
+                )
+
+    # 记录 turn 信息
+    return {
+        "turn_idx": turn_idx,
+        "turn_type": primary_style,
+        "operations": turn_operations["operations"],
+        "functions": turn_functions,
+        "user_query": user_query,
+        "chose_func": query_result.get("chose_func", []),
+        "reason": query_result.get("reason", ""),
+        "tool_calls": forward_result.get("tool_calls", []),
+        "execution_levels": forward_result.get("execution_levels", []),
+        "outputs": turn_outputs,
+    }, token_usage
+
+
+def _detect_turn_operations_checked(
+    turn_idx: int,
+    turn_functions: List[str],
+    path_data: Dict[str, Any],
+) -> Dict[str, Any]:
+    node_idx = path_data.get("node_idx", -1)
+    path_idx = path_data.get("path_idx", -1)
+    try:
+        return detect_turn_operations(turn_idx, turn_functions, path_data)
+    except Exception as e:
+        raise RuntimeError(
+            f"[detect_turn_operations] Failed at turn {turn_idx}, "
+            f"node_idx={node_idx}, path_idx={path_idx}, "
+            f"turn_functions={turn_functions}: {e}"
+        )
+
+
 async def process_single_fsp_path(
     path_data: Dict[str, Any],
     tool_schemas: Dict[str, Dict],
+    dependencies: Optional[FunctionDependencies] = None,
 ) -> Dict[str, Any]:
     """
     处理单个 FSP v2 路径 (MAGNET 方法)
 
     流程：
     1. 加载 FSP (List[List[int]])
-    2. 对每个 turn:
+    2. 对每个 turn（process_fsp_turn）:
        - 检测 turn 类型
        - 生成 query (Backward)
-       - 顺序执行函数 (Forward with intra-turn dependencies)
+       - 按依赖分层执行函数 (Forward with intra-turn dependencies，同层并发)
        - 累积历史输出
     3. 返回完整轨迹
 
     Args:
         path_data: FSP v2 数据
         tool_schemas: 工具 schema
+        dependencies: 依赖图上的函数依赖（会再加上路径自身的 Merge / Insert 依赖）
 
     Returns:
         {
@@ -1914,7 +2068,10 @@ async def process_single_fsp_path(
         if not fsp_final:
             raise ValueError("Empty FSP: fsp_final is empty")
 
-        # 初始化
+        path_dependencies = (dependencies or FunctionDependencies()).with_path_edges(path_data)
+
+        # 初始化（每条路径是一个独立的会话，stateful tool 从全新的状态开始）
+        start_session()
         all_turn_outputs: List[List[Dict]] = []
         turns_data: List[Dict] = []
         total_token_usage = {
@@ -1927,143 +2084,20 @@ async def process_single_fsp_path(
         for turn_idx, turn_functions in enumerate(fsp_final_names):
             print(f"  Processing Turn {turn_idx}/{len(fsp_final_names)-1}: {turn_functions}")
 
-            try:
-                # 检测 turn 操作
-                turn_operations = detect_turn_operations(turn_idx, turn_functions, path_data)
-                primary_style = turn_operations["primary_style"]
-                is_empty = turn_operations["is_empty"]
-
-            except Exception as e:
-                raise RuntimeError(
-                    f"[detect_turn_operations] Failed at turn {turn_idx}, "
-                    f"node_idx={node_idx}, path_idx={path_idx}, "
-                    f"turn_functions={turn_functions}: {e}"
-                )
-
-            # 处理空 turn
-            if is_empty:
-                try:
-                    empty_result = await handle_empty_turn(
-                        turn_idx=turn_idx,
-                        all_turn_outputs=all_turn_outputs,
-                        tool_schemas=tool_schemas,
-                        miss_type="miss_func",
-                    )
-
-                    tq = empty_result.get("token_usage", {})
-                    total_token_usage["prompt_tokens"] += tq.get("prompt_tokens", 0)
-                    total_token_usage["completion_tokens"] += tq.get("completion_tokens", 0)
-                    total_token_usage["total_tokens"] += tq.get("total_tokens", 0)
-
-                    turns_data.append({
-                        "turn_idx": turn_idx,
-                        "turn_type": primary_style,
-                        "operations": turn_operations["operations"],
-                        "user_query": empty_result.get("user_query", ""),
-                        "response": empty_result.get("response", ""),
-                        "miss_type": empty_result.get("miss_type", ""),
-                        "reason": empty_result.get("reason", ""),
-                    })
-
-                    # 空 turn 不添加输出
-                    all_turn_outputs.append([])
-                    continue
-
-                except Exception as e:
-                    raise RuntimeError(
-                        f"[handle_empty_turn] Failed at turn {turn_idx}, "
-                        f"node_idx={node_idx}, path_idx={path_idx}: {e}"
-                    )
-
-            # 生成 query (Backward) + 顺序执行 (Forward) with retry
-            max_retries = 1
-            error_feedback = None
-
-            for retry_attempt in range(max_retries + 1):
-                # 生成 query (Backward)
-                try:
-                    query_result = await generate_query_for_turn_magnet(
-                        turn_idx=turn_idx,
-                        turn_type=primary_style,
-                        turn_functions=turn_functions,
-                        all_turn_outputs=all_turn_outputs,
-                        tool_schemas=tool_schemas,
-                        turn_operations=turn_operations,
-                        error_feedback=error_feedback,
-                    )
-
-                    user_query = query_result.get("user_query", "")
-                    if not user_query:
-                        raise ValueError(f"Empty user_query generated for turn {turn_idx}")
-
-                    tq = query_result.get("token_usage", {})
-                    total_token_usage["prompt_tokens"] += tq.get("prompt_tokens", 0)
-                    total_token_usage["completion_tokens"] += tq.get("completion_tokens", 0)
-                    total_token_usage["total_tokens"] += tq.get("total_tokens", 0)
-
-                except Exception as e:
-                    raise RuntimeError(
-                        f"[generate_query_for_turn_magnet] Failed at turn {turn_idx}, "
-                        f"node_idx={node_idx}, path_idx={path_idx}, "
-                        f"turn_type={primary_style}, functions={turn_functions}: {e}"
-                    )
-
-                # 顺序执行 + 参数传递 (Forward)
-                try:
-                    forward_result = await forward_with_sequential_execution(
-                        turn_idx=turn_idx,
-                        turn_query=user_query,
-                        turn_functions=turn_functions,
-                        all_turn_outputs=all_turn_outputs,
-                        tool_schemas=tool_schemas,
-                    )
-
-                    tq = forward_result.get("token_usage", {})
-                    total_token_usage["prompt_tokens"] += tq.get("prompt_tokens", 0)
-                    total_token_usage["completion_tokens"] += tq.get("completion_tokens", 0)
-                    total_token_usage["total_tokens"] += tq.get("total_tokens", 0)
-
-                    turn_outputs = forward_result.get("turn_outputs", [])
-                    all_turn_outputs.append(turn_outputs)
-
-                    # 执行成功，跳出重试循环
-                    break
-
-                except Exception as e:
-                    # 函数执行失败
-                    if retry_attempt < max_retries:
-                        # 构建错误反馈，重新生成 query
-                        print(f"  ⚠️  Function execution failed at turn {turn_idx}, attempt {retry_attempt + 1}/{max_retries + 1}")
-                        print(f"      Error: {str(e)}")
-                        error_feedback = f"""Function execution failed with error:
-{str(e)}
-
-Please revise your query to avoid this execution error. Consider:
-1. Check if the function parameters are correct
-2. Ensure all required parameters are provided
-3. Verify that parameter values are in the correct format
-"""
-                        continue  # 进入下一次重试
-                    else:
-                        # 重试次数用尽，抛出错误
-                        raise RuntimeError(
-                            f"[forward_with_sequential_execution] Failed at turn {turn_idx} after {max_retries + 1} attempts, "
-                            f"node_idx={node_idx}, path_idx={path_idx}, "
-                            f"user_query='{user_query}', functions={turn_functions}: {e}"
-                        )
-
-            # 记录 turn 信息
-            turns_data.append({
-                "turn_idx": turn_idx,
-                "turn_type": primary_style,
-                "operations": turn_operations["operations"],
-                "functions": turn_functions,
-                "user_query": user_query,
-                "chose_func": query_result.get("chose_func", []),
-                "reason": query_result.get("reason", ""),
-                "tool_calls": forward_result.get("tool_calls", []),
-                "outputs": turn_outputs,
-            })
+            # 检测 turn 操作
+            turn_operations = _detect_turn_operations_checked(turn_idx, turn_functions, path_data)
+            turn_record, turn_token_usage = await process_fsp_turn(
+                turn_idx=turn_idx,
+                turn_functions=turn_functions,
+                turn_operations=turn_operations,
+                all_turn_outputs=all_turn_outputs,
+                tool_schemas=tool_schemas,
+                dependencies=path_dependencies,
+                node_idx=node_idx,
+                path_idx=path_idx,
+            )
+            _add_token_usage(total_token_usage, turn_token_usage)
+            turns_data.append(turn_record)
 
         return {
             "path_info": {
@@ -2085,6 +2119,124 @@ Please revise your query to avoid this execution error. Consider:
         )
 
 
+# ==================== 共享前缀执行 ====================
+
+def fsp_turn_steps(
+    path_data: Dict[str, Any],
+    dependencies: Optional[FunctionDependencies] = None,
+) -> List[Tuple[Tuple[Any, ...], Dict[str, Any]]]:
+    """
+    把 FSP 路径拆成 prefix_trie 的 step：每个 turn 一个 (key, payload)。
+
+    key 包含影响该 turn 处理结果的全部信息：turn 内函数、detect_turn_operations 的结果（含 merge / insert 日志）、
+    按依赖分出的执行层；两条路径前 k 个 turn 的 key 都相同时，前 k 个 turn 的处理可以共享。
+    """
+    path_dependencies = (dependencies or FunctionDependencies()).with_path_edges(path_data)
+    steps = []
+    for turn_idx, turn_functions in enumerate(path_data.get("fsp_final_names", [])):
+        turn_operations = _detect_turn_operations_checked(turn_idx, turn_functions, path_data)
+        levels = execution_levels(turn_functions, path_dependencies)
+        key = (
+            tuple(turn_functions),
+            json.dumps(turn_operations, sort_keys=True, ensure_ascii=False, default=str),
+            tuple(tuple(level) for level in levels),
+        )
+        steps.append((key, {
+            "turn_functions": turn_functions,
+            "turn_operations": turn_operations,
+            "dependencies": path_dependencies,
+            "node_idx": path_data.get("node_idx", -1),
+            "path_idx": path_data.get("path_idx", -1),
+        }))
+    return steps
+
+
+def build_fsp_prefix_trie(
+    paths: List[Dict[str, Any]],
+    dependencies: Optional[FunctionDependencies] = None,
+) -> PrefixTrie:
+    """按 paths 的顺序插入前缀树（路径 id 即 paths 中的下标）"""
+    trie = PrefixTrie()
+    for path_data in paths:
+        trie.add(fsp_turn_steps(path_data, dependencies) if path_data.get("fsp_final") else [])
+    return trie
+
+
+async def process_fsp_prefix_group(
+    group: TrieNode,
+    paths: List[Dict[str, Any]],
+    tool_schemas: Dict[str, Dict],
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> Dict[str, Any]:
+    """
+    执行前缀树的一个子树（第一个 turn 相同的一组路径），每个唯一前缀只处理一次，
+    分叉处 fork 历史输出和 stateful tool 的会话状态（ToolSession）。
+
+    每条路径的记录与 process_single_fsp_path 相同，另外：
+    - token_usage 只包含本路径付费的 turn（共享前缀的 token 记在第一条经过它的路径上）
+    - prefix_sharing: {"shared_turns": 与更早路径共享的 turn 数, "trajectory_token_usage": 完整轨迹的 token}
+
+    Returns:
+        {"results": [(path_data, 记录或异常), ...], "token_usage": 该组实际消耗的 token}
+    """
+    async def step(state: Dict[str, Any], node: TrieNode) -> Dict[str, Any]:
+        payload = node.payload
+        print(f"  Processing Turn {node.depth} (shared by {len(node.path_ids)} paths): {payload['turn_functions']}")
+        # 本 turn 的函数调用在这条前缀的会话上执行（run_subtree 分叉时 deepcopy 整个 state，会话随之 fork）
+        use_session(state["session"])
+        turn_record, turn_token_usage = await process_fsp_turn(
+            turn_idx=node.depth,
+            turn_functions=payload["turn_functions"],
+            turn_operations=payload["turn_operations"],
+            all_turn_outputs=state["all_turn_outputs"],
+            tool_schemas=tool_schemas,
+            dependencies=payload["dependencies"],
+            node_idx=payload["node_idx"],
+            path_idx=payload["path_idx"],
+        )
+        return {"turn": turn_record, "token_usage": turn_token_usage}
+
+    # 每组从全新的会话状态开始，与 process_single_fsp_path 中每条路径的起点相同
+    initial_state = {"all_turn_outputs": [], "session": ToolSession()}
+    outcomes = await run_subtree(group, initial_state, step, semaphore=semaphore)
+
+    results = []
+    group_token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    for path_id in group.path_ids:
+        path_data = paths[path_id]
+        node_idx = path_data.get("node_idx", -1)
+        path_idx = path_data.get("path_idx", -1)
+        outcome = outcomes[path_id]
+        if isinstance(outcome, Exception):
+            results.append((path_data, RuntimeError(
+                f"[process_fsp_prefix_group] Failed to process path "
+                f"node_idx={node_idx}, path_idx={path_idx}: {outcome}"
+            )))
+            continue
+
+        charged = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        trajectory = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        for record, owned in zip(outcome.records, outcome.owned):
+            _add_token_usage(trajectory, record["token_usage"])
+            if owned:
+                _add_token_usage(charged, record["token_usage"])
+        _add_token_usage(group_token_usage, charged)
+        results.append((path_data, {
+            "path_info": {
+                "node_idx": node_idx,
+                "path_idx": path_idx,
+            },
+            "turns_data": [record["turn"] for record in outcome.records],
+            "token_usage": charged,
+            "statistics": path_data.get("statistics", {}),
+            "prefix_sharing": {
+                "shared_turns": outcome.shared_steps,
+                "trajectory_token_usage": trajectory,
+            },
+        }))
+    return {"results": results, "token_usage": group_token_usage}
+
+
 # ==================== 批量处理 ====================
 
 async def process_all_fsp_paths(
@@ -2092,19 +2244,33 @@ async def process_all_fsp_paths(
     batch_size: int = 5,
     resume: bool = False,
     early_stop_batches: int = 3,
+    max_concurrency: Optional[int] = None,
+    max_tokens_per_minute: Optional[int] = None,
+    graph_path: Optional[str] = GRAPH_PATH,
+    share_prefixes: bool = False,
 ) -> None:
     """
     处理所有 FSP v2 路径
 
     Args:
         max_paths: 最多处理多少条路径 (用于测试)
-        batch_size: 并发批次大小
+        batch_size: 进度汇报和早停的粒度（每完成 batch_size 条路径汇报一次）
         resume: 是否启用断点续传（跳过已生成的 paths）
         early_stop_batches: 连续多少个 batch 全部失败后停止（0 表示不启用早停）
+        max_concurrency: 同时处理的路径数（默认等于 batch_size）
+        max_tokens_per_minute: 可选的 TPM 限制（None 表示不限制）
+        graph_path: 依赖图（turn 内按依赖分层执行）；文件不存在或为 None 时只用路径自身的 Merge / Insert 依赖
+        share_prefixes: 按前缀树执行（prefix_trie）：前几个 turn 完全相同的路径共享这些 turn 的
+            query / 参数 / 执行结果，每个唯一前缀只处理一次；调度单位是第一个 turn 相同的一组路径
     """
     # 加载数据
     paths = load_fsp_v2(FSP_V2_PATH)
     tool_schemas = load_tool_schemas(TOOL_SCHEMA_SUMMARY_PATH)
+    if graph_path is not None and os.path.exists(graph_path):
+        dependencies = FunctionDependencies(load_graph_store(graph_path))
+    else:
+        print(f"[WARN] Dependency graph not found ({graph_path}), using per-path dependencies only")
+        dependencies = FunctionDependencies()
 
     if max_paths is not None and max_paths < len(paths):
         paths = paths[:max_paths]
@@ -2158,6 +2324,10 @@ async def process_all_fsp_paths(
     print(f"\nTotal paths to process: {len(paths)}")
     print(f"Output -> {OUTPUT_PATH}\n")
 
+    await preload_sandbox_tools([
+        name for p in paths for turn in p.get("fsp_final_names", []) for name in turn
+    ])
+
     # 文件写入模式：
     # - 如果是 resume 模式，使用追加模式（a）
     # - 否则，使用覆盖模式（w）
@@ -2169,74 +2339,114 @@ async def process_all_fsp_paths(
         total = len(paths)
         total_errors = 0
         overall_tokens = 0
-        consecutive_failed_batches = 0  # 连续失败的 batch 计数
-        num_batches = (total + batch_size - 1) // batch_size
-
-        for batch_idx, start in enumerate(tqdm(range(0, total, batch_size),
-                                               total=num_batches,
-                                               desc="Processing FSP paths",
-                                               unit="batch"), start=1):
-            batch = paths[start: start + batch_size]
+        consecutive_failures = 0  # 连续失败的 path 计数
+        saved_tokens = 0  # 共享前缀省下的 token（share_prefixes）
+        # batch_size 仍是进度汇报 / 早停的粒度：连续 early_stop_batches 个 batch 的 path 全部失败时早停
+        early_stop_threshold = batch_size * early_stop_batches
+        window_idx = 0
+        window_done = 0
+        window_tokens = 0
+        window_errors = 0
+        window_start_time = time.time()
+
+        # 滑动窗口：始终保持 max_concurrency 条路径在处理中，完成一条补一条
+        scheduler = SlidingWindowScheduler(
+            max_concurrency=max_concurrency or batch_size,
+            max_tokens_per_minute=max_tokens_per_minute,
+        )
+        progress_bar = tqdm(total=total, desc="Processing FSP paths", unit="path")
+
+        if share_prefixes:
+            trie = build_fsp_prefix_trie(paths, dependencies)
+            trie_stats = trie.stats()
             print(
-                f"\n[Batch {batch_idx}/{num_batches}] "
-                f"Processing paths {start + 1}-{start + len(batch)} "
-                f"out of {total}..."
+                f"Prefix trie: {trie_stats['num_paths']} paths in {trie_stats['num_groups']} groups, "
+                f"{trie_stats['unique_steps']}/{trie_stats['total_steps']} unique turns "
+                f"({trie_stats['sharing_ratio'] * 100:.1f}% shared)"
             )
-
-            batch_start_time = time.time()
-            batch_tokens = 0
-            batch_errors = 0
-
-            tasks = [
-                process_single_fsp_path(path, tool_schemas)
-                for path in batch
+            step_semaphore = asyncio.Semaphore(max_concurrency or batch_size)
+            items = list(trie.root.children.values())
+            worker = lambda group: process_fsp_prefix_group(group, paths, tool_schemas, step_semaphore)
+            # 没有 turn 的路径不进入前缀树，直接记为失败
+            empty_failures = [
+                (paths[path_id], RuntimeError(
+                    f"[process_single_fsp_path] Failed to process path node_idx={paths[path_id].get('node_idx', -1)}, "
+                    f"path_idx={paths[path_id].get('path_idx', -1)}: Empty FSP: fsp_final is empty"
+                ))
+                for path_id in trie.root.terminal
             ]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            for path, result in zip(batch, results):
-                if isinstance(result, Exception):
-                    total_errors += 1
-                    batch_errors += 1
-                    print(f"[ERROR] Failed to process path: {result}")
-                    # 失败的记录不写入文件，这样下次 resume 时会重新处理
-                    continue
+        else:
+            items = paths
+            worker = lambda p: process_single_fsp_path(p, tool_schemas, dependencies)
+            empty_failures = []
+
+        async def path_results():
+            """逐条产出 (path, result)；共享前缀时一个调度单位完成后展开成组内的每条路径"""
+            for item in empty_failures:
+                yield item
+            async for item, result in scheduler.run(items, worker):
+                if not share_prefixes:
+                    yield item, result
+                elif isinstance(result, Exception):
+                    for path_id in item.path_ids:
+                        yield paths[path_id], result
                 else:
-                    record = result
-                    tq = record.get("token_usage", {})
-                    batch_tokens += tq.get("total_tokens", 0)
-
-                    # 只写入成功的记录
-                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
-                    f.flush()
-
-            batch_elapsed = time.time() - batch_start_time
-            overall_tokens += batch_tokens
-
-            # 早停检查：如果当前 batch 全部失败
-            if batch_errors == len(batch):
-                consecutive_failed_batches += 1
-                print(
-                    f"[Batch {batch_idx}] ❌ ALL {len(batch)} paths FAILED! "
-                    f"(consecutive failed batches: {consecutive_failed_batches}/{early_stop_batches})"
-                )
-
-                # 如果连续失败的 batch 数量达到阈值，停止处理
-                if early_stop_batches > 0 and consecutive_failed_batches >= early_stop_batches:
-                    print("\n" + "=" * 80)
-                    print("🛑 EARLY STOPPING TRIGGERED")
-                    print("=" * 80)
-                    print(f"Consecutive failed batches: {consecutive_failed_batches}")
-                    print(f"Stopping to prevent further failures...")
-                    print("=" * 80)
-                    break
+                    for path_result in result["results"]:
+                        yield path_result
+
+        results = path_results()
+        async for path, result in results:
+            progress_bar.update(1)
+            window_done += 1
+            if isinstance(result, Exception):
+                total_errors += 1
+                window_errors += 1
+                consecutive_failures += 1
+                print(f"[ERROR] Failed to process path: {result}")
+                # 失败的记录不写入文件，这样下次 resume 时会重新处理
             else:
-                # 如果当前 batch 有成功的，重置连续失败计数
-                consecutive_failed_batches = 0
+                consecutive_failures = 0
+                record = result
+                tq = record.get("token_usage", {})
+                window_tokens += tq.get("total_tokens", 0)
+                overall_tokens += tq.get("total_tokens", 0)
+                sharing = record.get("prefix_sharing")
+                if sharing:
+                    saved_tokens += sharing["trajectory_token_usage"]["total_tokens"] - tq.get("total_tokens", 0)
+
+                # 只写入成功的记录
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+
+            # 早停检查：连续失败的 path 数达到阈值
+            if early_stop_batches > 0 and consecutive_failures >= min(early_stop_threshold, total):
+                scheduler.stop()
+                print("\n" + "=" * 80)
+                print("🛑 EARLY STOPPING TRIGGERED")
+                print("=" * 80)
+                print(f"Consecutive failed paths: {consecutive_failures} "
+                      f"(= {early_stop_batches} batches of {batch_size})")
+                print(f"Stopping to prevent further failures...")
+                print("=" * 80)
+                break
+
+            if window_done >= batch_size or progress_bar.n == total:
+                window_idx += 1
+                window_elapsed = time.time() - window_start_time
                 print(
-                    f"[Batch {batch_idx}] time={batch_elapsed:.2f}s, "
-                    f"batch_tokens={batch_tokens}, overall_tokens={overall_tokens}, "
-                    f"batch_errors={batch_errors}/{len(batch)}"
+                    f"[Batch {window_idx}] time={window_elapsed:.2f}s, "
+                    f"batch_tokens={window_tokens}, overall_tokens={overall_tokens}, "
+                    f"batch_errors={window_errors}/{window_done}"
                 )
+                window_done = 0
+                window_tokens = 0
+                window_errors = 0
+                window_start_time = time.time()
+
+        # 早停 break 时关闭生成器（连同其中的 scheduler.run）
+        await results.aclose()
+        progress_bar.close()
+        print(f"Scheduler stats: {scheduler.summary()}")
 
     print("\n" + "=" * 80)
     print("PROCESSING SUMMARY")
@@ -2245,6 +2455,13 @@ async def process_all_fsp_paths(
     print(f"Successful paths: {total - total_errors}")
     print(f"Failed paths: {total_errors}")
     print(f"Total tokens used: {overall_tokens}")
+    if share_prefixes:
+        print(f"Tokens saved by shared prefixes: {saved_tokens}")
+    print(async_client.format_cache_summary())
+    if API_SIMULATION_CACHE is not None:
+        print(API_SIMULATION_CACHE.format_summary())
+    if SANDBOX_POOL is not None:
+        print(SANDBOX_POOL.format_summary())
     print("=" * 80)
     print(f"\nAll paths processed, results saved to: {OUTPUT_PATH}")
 
@@ -2281,6 +2498,29 @@ def main():
         default=1,
         help='Stop after N consecutive batches with all failures (0 to disable)'
     )
+    parser.add_argument(
+        '--max-concurrency',
+        type=int,
+        default=None,
+        help='Number of paths in flight at once (default: batch size)'
+    )
+    parser.add_argument(
+        '--max-tpm',
+        type=int,
+        default=None,
+        help='Optional tokens-per-minute limit'
+    )
+    parser.add_argument(
+        '--graph-path',
+        type=str,
+        default=GRAPH_PATH,
+        help='Dependency graph used to order and parallelize functions within a turn'
+    )
+    parser.add_argument(
+        '--share-prefixes',
+        action='store_true',
+        help='Process identical leading turns once per unique prefix and share them across paths'
+    )
     parser.add_argument(
         '--test',
         action='store_true',
@@ -2293,11 +2533,16 @@ def main():
         print("🧪 Running in TEST mode (3 paths only)...")
         args.max_paths = 3
 
+    start_sandbox_pool()
     asyncio.run(process_all_fsp_paths(
         max_paths=args.max_paths,
         batch_size=args.batch_size,
         resume=args.resume,
         early_stop_batches=args.early_stop,
+        max_concurrency=args.max_concurrency,
+        max_tokens_per_minute=args.max_tpm,
+        graph_path=args.graph_path,
+        share_prefixes=args.share_prefixes,
     ))
 
 
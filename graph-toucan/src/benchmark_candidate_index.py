@@ -0,0 +1,106 @@
+"""
+Benchmark：label 倒排索引 vs 两两比较的 candidate 挖掘。
+
+在合成的 tool catalog 上：
+1. 小规模（默认 2000 个 tool）对比两种实现的结果是否完全一致，并对比耗时
+2. 大规模（默认 50000 个 tool）只跑倒排索引实现，报告耗时和候选数量
+
+用法：
+    python benchmark_candidate_index.py --num-tools 50000 --check-tools 2000
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from candidate_index import LabelInvertedIndex, mine_candidates_raw, mine_candidates_tiered
+
+
+def make_synthetic_catalog(
+    num_tools: int,
+    num_labels: int = 200,
+    max_secondary: int = 3,
+    seed: int = 0,
+) -> List[Dict]:
+    """
+    生成合成 tool catalog，label 频率服从 Zipf 分布（少数 label 非常常见，模拟真实分类结果）。
+    """
+    rng = random.Random(seed)
+    labels = [f"label_{k}" for k in range(num_labels)]
+    weights = [1.0 / (k + 1) for k in range(num_labels)]
+
+    nodes = []
+    for idx in range(num_tools):
+        primary = rng.choices(labels, weights=weights, k=1)[0]
+        num_secondary = rng.randint(0, max_secondary)
+        secondary = rng.choices(labels, weights=weights, k=num_secondary)
+        nodes.append({
+            "function_schema": {"function": {"name": f"tool_{idx}"}},
+            "classification": {
+                "primary_label": primary,
+                "secondary_labels": secondary,
+            },
+        })
+    return nodes
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def check_equivalence(nodes: List[Dict], max_candidates: int = 40, min_candidates: int = 30, seed: int = 42) -> None:
+    """小规模下对比倒排索引与 graph.py 中两两比较实现的输出。"""
+    from graph import _find_candidates_raw_pairwise, _find_candidates_tiered_pairwise
+
+    print(f"\n[check] {len(nodes)} tools")
+
+    index = LabelInvertedIndex(nodes)
+    raw_index, t_index = _timed(mine_candidates_raw, index, max_candidates=max_candidates)
+    raw_pairwise, t_pairwise = _timed(_find_candidates_raw_pairwise, nodes, max_candidates=max_candidates)
+    assert raw_index == raw_pairwise, "raw candidates mismatch"
+    print(f"  raw:     index={t_index:.3f}s, pairwise={t_pairwise:.3f}s, identical=True")
+
+    bitset_index = LabelInvertedIndex(nodes, use_bitset=True)
+    raw_bitset, t_bitset = _timed(mine_candidates_raw, bitset_index, max_candidates=max_candidates)
+    assert raw_bitset == raw_pairwise, "raw candidates mismatch (bitset)"
+    print(f"  raw:     bitset={t_bitset:.3f}s, identical=True")
+
+    random.seed(seed)
+    tiered_index, t_index = _timed(mine_candidates_tiered, index, min_candidates=min_candidates)
+    random.seed(seed)
+    tiered_pairwise, t_pairwise = _timed(_find_candidates_tiered_pairwise, nodes, min_candidates=min_candidates)
+    assert tiered_index == tiered_pairwise, "v1.0.1 candidates mismatch"
+    print(f"  v1.0.1:  index={t_index:.3f}s, pairwise={t_pairwise:.3f}s, identical=True")
+
+
+def run_benchmark(nodes: List[Dict], max_candidates: int = 40, min_candidates: int = 30, seed: int = 42) -> None:
+    """大规模下只跑倒排索引实现。"""
+    print(f"\n[benchmark] {len(nodes)} tools")
+
+    index, t_build = _timed(LabelInvertedIndex, nodes)
+    print(f"  build index:       {t_build:.3f}s ({len(index.any_postings)} labels)")
+
+    raw, t_raw = _timed(mine_candidates_raw, index, max_candidates=max_candidates)
+    total_raw = sum(len(v) for v in raw.values())
+    print(f"  raw (max={max_candidates}):     {t_raw:.3f}s, {total_raw} candidate pairs")
+
+    random.seed(seed)
+    (tiered, _, _, _), t_tiered = _timed(mine_candidates_tiered, index, min_candidates=min_candidates)
+    total_tiered = sum(len(v) for v in tiered.values())
+    print(f"  v1.0.1 (min={min_candidates}):  {t_tiered:.3f}s, {total_tiered} candidate pairs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark label inverted index candidate mining")
+    parser.add_argument("--num-tools", type=int, default=50000)
+    parser.add_argument("--check-tools", type=int, default=2000,
+                        help="Catalog size for the equivalence check against the pairwise implementation (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.check_tools > 0:
+        check_equivalence(make_synthetic_catalog(args.check_tools, seed=args.seed), seed=args.seed)
+    run_benchmark(make_synthetic_catalog(args.num_tools, seed=args.seed), seed=args.seed)
@@ -0,0 +1,327 @@
+"""
+基于 label 倒排索引的 candidate 挖掘。
+
+graph.py 中的 find_candidates_for_nodes_raw / find_candidates_for_nodes 原实现对每个 node
+遍历所有其他 node 做 label 集合求交，复杂度 O(n²)。这里先构建 label -> node 的倒排索引
+（posting list 按 node index 升序），再对每个 node 只合并它自身 labels 对应的 posting list：
+
+- raw：labels(i) 所有 posting list 的并集（升序），截断到 max_candidates
+- v1.0.1：
+    1) primary label 相同的 node
+    2) node 的 secondary label 命中其他 node 的 primary label
+    3) node 的 secondary label 命中其他 node 的 secondary label
+    4) 仍不足 min_candidates 时从剩余 node 中随机补充
+
+总复杂度约为 O(n + 命中数)。输出与原实现逐项一致（包括第 4 步对全局 random 的调用顺序），
+因此在相同 seed 下得到完全相同的 candidate 列表。
+
+可选 bitset 模式：每个 label 对应一个 Python int 位图，raw 模式下对 labels(i) 的位图做 OR，
+适合 label 极少但 posting list 很长的情况。
+"""
+
+import heapq
+import random
+from bisect import bisect_left
+from itertools import islice
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def _primary_label(classification: Dict) -> str:
+    return classification.get("primary_label", "").strip()
+
+
+def _secondary_labels(classification: Dict) -> Set[str]:
+    secondary_list = classification.get("secondary_labels", []) or []
+    return {s.strip() for s in secondary_list if s and s.strip()}
+
+
+class LabelInvertedIndex:
+    """
+    label -> node index 的倒排索引。
+
+    - primary_postings: primary label -> 以该 label 为 primary 的 node（升序）
+    - secondary_postings: secondary label -> 含该 secondary label 的 node（升序）
+    - any_postings: label -> primary 或 secondary 含该 label 的 node（升序，raw 模式使用）
+    """
+
+    def __init__(self, nodes: List[Dict], use_bitset: bool = False):
+        self.num_nodes = len(nodes)
+        self.use_bitset = use_bitset
+        self.primary_labels: List[str] = []
+        self.secondary_label_sets: List[Set[str]] = []
+        self.all_label_sets: List[Set[str]] = []
+
+        self.primary_postings: Dict[str, List[int]] = {}
+        self.secondary_postings: Dict[str, List[int]] = {}
+        self.any_postings: Dict[str, List[int]] = {}
+
+        for idx, node in enumerate(nodes):
+            classification = node.get("classification", {})
+            primary = _primary_label(classification)
+            secondary = _secondary_labels(classification)
+            labels = set(secondary)
+            if primary:
+                labels.add(primary)
+                self.primary_postings.setdefault(primary, []).append(idx)
+            for label in secondary:
+                self.secondary_postings.setdefault(label, []).append(idx)
+            for label in labels:
+                self.any_postings.setdefault(label, []).append(idx)
+
+            self.primary_labels.append(primary)
+            self.secondary_label_sets.append(secondary)
+            self.all_label_sets.append(labels)
+
+        # 可选：每个 label 一个位图（bit j 表示 node j 含该 label）
+        self.any_bitsets: Dict[str, int] = {}
+        if use_bitset:
+            for label, posting in self.any_postings.items():
+                bits = 0
+                for j in posting:
+                    bits |= 1 << j
+                self.any_bitsets[label] = bits
+
+    def iter_raw_matches(self, i: int) -> Iterator[int]:
+        """按 index 升序返回与 node i 至少共享一个 label 的其他 node。"""
+        labels = self.all_label_sets[i]
+        if self.use_bitset:
+            bits = 0
+            for label in labels:
+                bits |= self.any_bitsets[label]
+            bits &= ~(1 << i)
+            while bits:
+                low = bits & -bits
+                yield low.bit_length() - 1
+                bits ^= low
+            return
+
+        yield from _merge_unique((self.any_postings[label] for label in labels), skip=i)
+
+
+def _merge_unique(postings: Iterable[List[int]], skip: int) -> Iterator[int]:
+    """合并多个升序 posting list，去重并跳过 skip。"""
+    last = -1
+    for j in heapq.merge(*postings):
+        if j == last or j == skip:
+            continue
+        last = j
+        yield j
+
+
+class _RemainingIndices(Sequence):
+    """
+    range(num_nodes) 去掉 excluded 后的只读序列视图。
+
+    等价于原实现中的 `[j for j in range(num_nodes) if j != i and j not in used]`，
+    但无需物化整个列表；random.sample 只按位置取元素，因此抽样结果完全一致。
+    """
+
+    def __init__(self, num_nodes: int, excluded: Set[int]):
+        self._excluded = sorted(j for j in excluded if 0 <= j < num_nodes)
+        self._len = num_nodes - len(self._excluded)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[x] for x in range(*k.indices(self._len))]
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError(k)
+        x = k
+        for e in self._excluded:
+            if e <= x:
+                x += 1
+            else:
+                break
+        return x
+
+
+def mine_candidates_raw(
+    index: LabelInvertedIndex,
+    max_candidates: Optional[int] = None,
+) -> Dict[int, List[int]]:
+    """
+    raw 规则：labels 有交集即为 candidate，按 index 升序并截断到 max_candidates。
+
+    Returns:
+        dict: {node_index: [candidate_indices]}
+    """
+    node_candidates: Dict[int, List[int]] = {}
+    for i in range(index.num_nodes):
+        candidates: List[int] = []
+        for j in index.iter_raw_matches(i):
+            if max_candidates is not None and len(candidates) >= max_candidates:
+                break
+            candidates.append(j)
+        node_candidates[i] = candidates
+    return node_candidates
+
+
+def mine_delta_candidates_raw(
+    index: LabelInvertedIndex,
+    dirty_indices: Iterable[int],
+    max_candidates: Optional[int] = None,
+) -> Dict[int, List[int]]:
+    """
+    raw 规则下涉及 dirty node 的 pair：与 mine_candidates_raw 的完整结果中
+    source 或 target 为 dirty node 的 pair 完全一致（增量更新 graph 时只判断这些 pair）。
+
+    - 出边：dirty node d 自己的 candidate 列表（前 max_candidates 个 raw match）
+    - 入边：与 d 共享 label 的 node j，只有当 d 落在 j 自己的前 max_candidates 个 raw match 中时才有 j -> d
+      （截断使 candidate 关系不对称，不能直接把 d 的 candidate 反过来当入边）
+
+    Returns:
+        dict: {node_index: [candidate_indices]}，每个 node 的 candidate 按 index 升序
+    """
+    dirty = set(dirty_indices)
+    sources: Set[int] = set(dirty)
+    for d in dirty:
+        sources.update(index.iter_raw_matches(d))
+
+    delta: Dict[int, List[int]] = {}
+    for i in sorted(sources):
+        candidates: List[int] = []
+        for count, j in enumerate(index.iter_raw_matches(i)):
+            if max_candidates is not None and count >= max_candidates:
+                break
+            if i in dirty or j in dirty:
+                candidates.append(j)
+        if candidates:
+            delta[i] = candidates
+    return delta
+
+
+def mine_window_shifts_raw(
+    old_index: LabelInvertedIndex,
+    old_names: List[str],
+    new_index: LabelInvertedIndex,
+    new_names: List[str],
+    dirty_indices: Iterable[int],
+    max_candidates: Optional[int] = None,
+) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    raw 规则下截断窗口发生移动的 clean node（不是 dirty 的 node）。
+
+    node j 的 candidate 是前 max_candidates 个 raw match，取决于其他 node：删除 / 重排 node、dirty node 进出窗口
+    都会把别的 node 挤进或挤出 j 的窗口。mine_delta_candidates_raw 只覆盖涉及 dirty node 的 pair，这里补上其余变化。
+    窗口按函数名比较（old_names / new_names 是两个 catalog 中各 index 的函数名）；max_candidates 为 None 时不截断，
+    两个 clean node 之间是否为 candidate 只取决于它们自己的 labels，窗口不会移动。
+
+    Returns:
+        (windows, entered)，都以新 index 表示：
+        - windows: {j: j 当前的完整窗口}，只包含窗口有变化的 clean node；旧边 j -> x 只有 x 仍在窗口内时才保留
+        - entered: {j: 新进入窗口的 clean candidate（升序）}，这些 pair 在旧 graph 中没有判断过
+    """
+    if max_candidates is None:
+        return {}, {}
+    dirty = set(dirty_indices)
+    old_positions = {name: i for i, name in enumerate(old_names)}
+
+    windows: Dict[int, List[int]] = {}
+    entered: Dict[int, List[int]] = {}
+    for j in range(new_index.num_nodes):
+        old_j = old_positions.get(new_names[j])
+        if j in dirty or old_j is None:
+            continue
+        window = list(islice(new_index.iter_raw_matches(j), max_candidates))
+        old_window = {old_names[x] for x in islice(old_index.iter_raw_matches(old_j), max_candidates)}
+        if {new_names[x] for x in window} == old_window:
+            continue
+        windows[j] = window
+        new_entries = [x for x in window if x not in dirty and new_names[x] not in old_window]
+        if new_entries:
+            entered[j] = new_entries
+    return windows, entered
+
+
+def mine_candidates_tiered(
+    index: LabelInvertedIndex,
+    min_candidates: int = 30,
+    rng: random.Random = None,
+) -> Tuple[Dict[int, List[int]], Dict[int, List[int]], Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    v1.0.1 规则的分层 candidate 挖掘。
+
+    Args:
+        index: LabelInvertedIndex
+        min_candidates: 希望至少得到的候选数量
+        rng: 用于第 4 步随机补充的随机数生成器，默认使用全局 random（与原实现一致）
+
+    Returns:
+        (node_candidates, primary_only_candidates, sec_with_primary_candidates, sec_with_sec_candidates)
+    """
+    if rng is None:
+        rng = random
+
+    num_nodes = index.num_nodes
+    node_candidates: Dict[int, List[int]] = {}
+    primary_only_candidates: Dict[int, List[int]] = {}
+    sec_with_primary_candidates: Dict[int, List[int]] = {}
+    sec_with_sec_candidates: Dict[int, List[int]] = {}
+
+    for i in range(num_nodes):
+        primary_i = index.primary_labels[i]
+        secondary_i = index.secondary_label_sets[i]
+        used: Set[int] = set()
+
+        # 1) primary label 相等（不截断）
+        primary_list: List[int] = []
+        if primary_i:
+            posting = index.primary_postings[primary_i]
+            pos = bisect_left(posting, i)
+            primary_list = posting[:pos] + posting[pos + 1:]
+        candidates: List[int] = list(primary_list)
+        if len(candidates) >= min_candidates:
+            # primary 已足够，后续各层都不会执行，无需构建 used 集合
+            node_candidates[i] = candidates
+            primary_only_candidates[i] = primary_list
+            sec_with_primary_candidates[i] = []
+            sec_with_sec_candidates[i] = []
+            continue
+        used.update(primary_list)
+
+        # 2) node 的 secondary label 与其他函数的 primary label 重合
+        sec_primary_list: List[int] = []
+        if len(candidates) < min_candidates and secondary_i:
+            postings = [index.primary_postings[l] for l in secondary_i if l in index.primary_postings]
+            for j in _merge_unique(postings, skip=i):
+                if j in used:
+                    continue
+                candidates.append(j)
+                used.add(j)
+                sec_primary_list.append(j)
+                if len(candidates) >= min_candidates:
+                    break
+
+        # 3) node 的 secondary label 与其他函数的 secondary label 重合
+        sec_sec_list: List[int] = []
+        if len(candidates) < min_candidates and secondary_i:
+            postings = [index.secondary_postings[l] for l in secondary_i]
+            for j in _merge_unique(postings, skip=i):
+                if j in used:
+                    continue
+                candidates.append(j)
+                used.add(j)
+                sec_sec_list.append(j)
+                if len(candidates) >= min_candidates:
+                    break
+
+        # 4) 如果仍不足 min_candidates，则从剩余函数中随机补充
+        if len(candidates) < min_candidates:
+            remaining_indices = _RemainingIndices(num_nodes, used | {i})
+            needed = min_candidates - len(candidates)
+            if len(remaining_indices) > 0 and needed > 0:
+                extra = rng.sample(remaining_indices, min(needed, len(remaining_indices)))
+                candidates.extend(extra)
+                used.update(extra)
+
+        node_candidates[i] = candidates
+        primary_only_candidates[i] = primary_list
+        sec_with_primary_candidates[i] = sec_primary_list
+        sec_with_sec_candidates[i] = sec_sec_list
+
+    return node_candidates, primary_only_candidates, sec_with_primary_candidates, sec_with_sec_candidates
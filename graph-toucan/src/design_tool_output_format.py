@@ -26,6 +26,8 @@ from openai import AsyncOpenAI
 import re
 from datetime import datetime
 
+from llm_cache import wrap_llm_client
+
 
 # 路径配置
 ROOT_DIR = "/data/lhy/datasets/graph-Toucan"
@@ -39,10 +41,13 @@ OUTPUT_JSON_PATH = os.path.join(TOOL_INFO_DIR, "tool_schema_with_outputformat.js
 LOG_PATH = os.path.join(TOOL_INFO_DIR, "12311436.log")
 
 
-# 异步 OpenAI 客户端（参考 contrust_graph.py）
-async_client = AsyncOpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+# 异步 OpenAI 客户端（参考 contrust_graph.py，带共享响应缓存）
+async_client = wrap_llm_client(
+    AsyncOpenAI(
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+    ),
+    stage="design_tool_output_format",
 )
 
 
@@ -498,6 +503,7 @@ async def run_all_tools() -> None:
 
     print("\n" + "=" * 80)
     print("All tools processed successfully!")
+    print(async_client.format_cache_summary())
     print(f"Results saved to: {OUTPUT_JSON_PATH}")
     print("=" * 80)
 
@@ -0,0 +1,154 @@
+"""
+edge judge 输出的解析（graph.py 的 judge_edge_async / judge_edges_batch_async 共用）。
+
+- parse_edge_judgment: 解析一个 pair 的 HAS_EDGE / CONFIDENCE / DEPENDENCY_TYPE / PARAM_MAPPING / REASONING 行
+- split_candidate_blocks: 把批量 judge 的输出按 "### CANDIDATE k" 切成每个 candidate 一块
+- assemble_batch_results: 批量输出 -> 每个 candidate 的结果；缺失或解析失败的块回退到单独判断
+
+这里只做纯文本处理，不依赖 LLM 客户端，单独的请求由调用方传入。
+"""
+
+import asyncio
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+TOKEN_USAGE_KEYS = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+
+
+def parse_edge_judgment(response_text: str) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    解析 judge 输出中的 HAS_EDGE / CONFIDENCE / DEPENDENCY_TYPE / PARAM_MAPPING / REASONING 行
+
+    Returns:
+        tuple: (judgment, parse_errors)
+            - judgment: has_edge / confidence / dependency_type / param_mapping / reasoning
+            - parse_errors: 解析问题列表（缺少 HAS_EDGE 行、PARAM_MAPPING 不是合法 JSON），空列表表示解析成功
+    """
+    has_edge = False
+    confidence = 0.0
+    dependency_type = "none"
+    reasoning = ""
+    param_mapping = {}
+    parse_errors = []
+    seen_has_edge = False
+
+    lines = response_text.split('\n')
+    for line in lines:
+        line_upper = line.upper().strip()
+        if line_upper.startswith('HAS_EDGE:'):
+            value = line.split(':', 1)[1].strip() if ':' in line else ""
+            has_edge = value.lower() in ['true', 'yes', '1', 'y']
+            seen_has_edge = True
+        elif line_upper.startswith('CONFIDENCE:'):
+            value = line.split(':', 1)[1].strip() if ':' in line else "0.0"
+            try:
+                confidence = float(value)
+            except ValueError:
+                confidence = 0.0
+        elif line_upper.startswith('DEPENDENCY_TYPE:'):
+            value = line.split(':', 1)[1].strip() if ':' in line else "none"
+            dependency_type = value.lower()
+        elif line_upper.startswith('PARAM_MAPPING:'):
+            value = line.split(':', 1)[1].strip() if ':' in line else "NONE"
+            if value.upper() != "NONE":
+                try:
+                    param_mapping = json.loads(value)
+                except json.JSONDecodeError:
+                    param_mapping = {}
+                    parse_errors.append(f"invalid PARAM_MAPPING: {value[:100]}")
+            else:
+                param_mapping = {}
+        elif line_upper.startswith('REASONING:'):
+            reasoning = line.split(':', 1)[1].strip() if ':' in line else ""
+
+    if not seen_has_edge:
+        parse_errors.append("missing HAS_EDGE")
+
+    return {
+        'has_edge': has_edge,
+        'confidence': confidence,
+        'dependency_type': dependency_type,
+        'param_mapping': param_mapping,
+        'reasoning': reasoning,
+    }, parse_errors
+
+
+def split_token_usage(token_usage: Dict[str, int], parts: int) -> List[Dict[str, int]]:
+    """把一次请求的 token 使用平均分摊到 parts 个 pair 上（余数给前面的 pair），总和保持不变"""
+    shares = [{} for _ in range(parts)]
+    for key in TOKEN_USAGE_KEYS:
+        base, remainder = divmod(token_usage.get(key, 0), parts)
+        for i in range(parts):
+            shares[i][key] = base + (1 if i < remainder else 0)
+    return shares
+
+
+def split_candidate_blocks(response_text: str) -> Dict[int, str]:
+    """按 "### CANDIDATE <k>" 标记切分批量 judge 的输出，返回 {k: block_text}（k 从 1 开始）"""
+    blocks = {}
+    matches = list(re.finditer(r'^\s*#{0,4}\s*CANDIDATE\s+C?(\d+)\s*$', response_text, flags=re.IGNORECASE | re.MULTILINE))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(response_text)
+        k = int(match.group(1))
+        # 重复的编号只保留第一个
+        blocks.setdefault(k, response_text[match.end():end])
+    return blocks
+
+
+async def assemble_batch_results(
+    response_text: str,
+    token_usage: Dict[str, int],
+    num_candidates: int,
+    make_result: Callable[[int, Dict[str, Any], Dict[str, int]], Dict[str, Any]],
+    judge_single: Callable[[int], Awaitable[Dict[str, Any]]],
+    on_parse_error: Optional[Callable[[], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    把一次批量 judge 的输出拆成每个 candidate 的结果
+
+    Args:
+        response_text: str, 批量请求的输出（请求失败时为空字符串，所有 candidate 都会回退）
+        token_usage: dict, 批量请求的 token 使用，按 candidate 平均分摊
+        num_candidates: int, candidate 个数（第 i 个 candidate 对应 "### CANDIDATE i+1" 块）
+        make_result: make_result(i, judgment, token_share) -> 解析成功的块对应的结果
+        judge_single: async judge_single(i) -> 单独判断第 i 个 candidate 的结果（格式与 judge_edge_async 相同）
+        on_parse_error: 可选，response_text 非空但有块缺失或解析失败时调用一次（例如删除该响应的 LLM 缓存）
+
+    Returns:
+        list: 与 candidate 一一对应的结果；回退的 candidate 的 token_usage 为单独判断的消耗加上分摊的部分。
+            每个结果带 judge_requests：计到该 pair 上的 LLM 请求数（批量请求只计一次，记在第一个结果上；
+            回退的 pair 各多计一次单独判断），所有结果的 judge_requests 之和等于实际发出的请求数
+    """
+    blocks = split_candidate_blocks(response_text)
+    shares = split_token_usage(token_usage, num_candidates)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * num_candidates
+    fallback_indices = []
+    for i in range(num_candidates):
+        block = blocks.get(i + 1)
+        if block is None:
+            fallback_indices.append(i)
+            continue
+        judgment, parse_errors = parse_edge_judgment(block)
+        if parse_errors:
+            fallback_indices.append(i)
+            continue
+        results[i] = make_result(i, judgment, shares[i])
+        results[i]['judge_requests'] = 0
+
+    # 缺失或解析失败的块回退到单独判断
+    if fallback_indices and response_text and on_parse_error is not None:
+        on_parse_error()
+    if fallback_indices:
+        fallback_results = await asyncio.gather(*(judge_single(i) for i in fallback_indices))
+        for i, result in zip(fallback_indices, fallback_results):
+            tu = result.get('token_usage', {}) or {}
+            result['token_usage'] = {key: tu.get(key, 0) + shares[i][key] for key in shares[i]}
+            result['judge_requests'] = 1
+            results[i] = result
+
+    # 批量请求本身（请求失败时 response_text 为空，不计）
+    if response_text and num_candidates:
+        results[0]['judge_requests'] += 1
+    return results
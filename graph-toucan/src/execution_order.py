@@ -0,0 +1,96 @@
+"""
+turn 内函数的执行顺序：按依赖图拓扑排序并分层。
+
+backward_to_query_magnet 的 forward 阶段原来按 FSP 中的顺序逐个生成参数、逐个执行。
+同一个 turn 里的函数（Merge 合并的多个意图、Insert 插入的嵌套函数）之间，有的存在依赖（source 的输出是 target 的输入 /
+前提），有的完全独立。这里把 turn 内函数按依赖边分成若干层：
+
+- 第 0 层是 turn 内没有前驱的函数，第 k 层的函数只依赖前 k 层的函数
+- 同一层的函数互不依赖，可以并发生成参数、并发执行；层与层之间仍然顺序执行，后面的层能看到前面层的输出
+- 层内保持函数在 FSP 中的原始顺序；依赖成环时（图不是 DAG）按原始顺序取环上最靠前的函数单独成一层
+
+依赖边来源（FunctionDependencies）：
+- 依赖图（graph_store.GraphStore）：同一 turn 的两个函数之间有边 source -> target（任意依赖类型）
+- 路径自身：insert_logs 中 source -> nested（嵌套函数的参数取自 source 的输出，不依赖图文件也能得到）
+
+游走路径上相邻只说明两个函数在游走时先后出现，Merge 合并的正是这样的相邻 turn（多意图），
+本身不构成数据依赖；它们之间是否有依赖以依赖图中的边为准，没有图时按相互独立处理。
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class FunctionDependencies:
+    """函数名之间的依赖边查询"""
+
+    def __init__(self, store=None, edges: Iterable[Tuple[str, str]] = ()):
+        """
+        Args:
+            store: 可选的 GraphStore（按函数名查边）
+            edges: 额外的依赖边 (source_name, target_name)
+        """
+        self.store = store
+        self.edges: Set[Tuple[str, str]] = set(edges)
+
+    def with_path_edges(self, path_data: Dict[str, Any]) -> "FunctionDependencies":
+        """加上一条 FSP 路径自身蕴含的依赖边，返回新对象（共享 store）"""
+        return FunctionDependencies(self.store, self.edges | set(path_dependency_edges(path_data)))
+
+    def depends(self, source: str, target: str) -> bool:
+        """target 是否依赖 source（source 需要先执行）"""
+        if (source, target) in self.edges:
+            return True
+        if self.store is None:
+            return False
+        name_to_index = self.store.name_to_index()
+        u = name_to_index.get(source)
+        v = name_to_index.get(target)
+        return u is not None and v is not None and self.store.has_edge(u, v)
+
+
+def path_dependency_edges(path_data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """FSP 路径自身蕴含的数据依赖边：Insert 的 source -> nested"""
+    edges = []
+    for log in path_data.get("insert_logs") or []:
+        source = log.get("source_func_name")
+        nested = log.get("nested_func_name")
+        if source and nested:
+            edges.append((source, nested))
+    return edges
+
+
+def execution_levels(
+    turn_functions: List[str],
+    dependencies: Optional[FunctionDependencies] = None,
+) -> List[List[str]]:
+    """
+    把 turn 内函数按依赖分层（见模块说明）。没有依赖信息时每个函数单独一层，等价于原来的顺序执行。
+    """
+    n = len(turn_functions)
+    if n <= 1:
+        return [list(turn_functions)] if turn_functions else []
+    if dependencies is None:
+        return [[func] for func in turn_functions]
+
+    # 按位置建图（同名函数出现多次时互不依赖）
+    successors: List[List[int]] = [[] for _ in range(n)]
+    indegree = [0] * n
+    for i, source in enumerate(turn_functions):
+        for j, target in enumerate(turn_functions):
+            if i != j and source != target and dependencies.depends(source, target):
+                successors[i].append(j)
+                indegree[j] += 1
+
+    levels: List[List[str]] = []
+    remaining = set(range(n))
+    while remaining:
+        level = [i for i in sorted(remaining) if indegree[i] == 0]
+        if not level:
+            # 依赖成环：取原始顺序最靠前的函数打破环
+            level = [min(remaining)]
+        for i in level:
+            remaining.discard(i)
+            for j in successors[i]:
+                indegree[j] -= 1
+        levels.append([turn_functions[i] for i in level])
+    return levels
@@ -0,0 +1,133 @@
+"""
+filter_output_params_async 结果的持久化缓存（按内容寻址）。
+
+graph.py 中每个 node 的 pass-through 过滤结果与 candidate 无关，同一个 node 只需调用一次 LLM：
+
+    filter_cache = FilterOutputCache(filter_cache_file, compute=filter_output_params_async, model=DEFAULT_MODEL)
+    filtered = await filter_cache.get_or_compute(node_name, node_params, node_output_schema)
+
+缓存规则：
+- key = node 名称 + hash(模型, 输入参数 schema, 输出 schema)
+- 并发的 judge 任务通过 in-flight future 共享同一次计算（不会对同一个 node 重复发请求）
+- 每次计算成功后追加写入 JSONL 文件，重启后重新加载；加载时截掉写到一半的最后一行，之后的记录从新行开始追加
+- 过滤出错（filter_reasoning 以 "Error occurred:" 开头）或 LLM 输出无法解析（以 "Parse error:" 开头）
+  的结果只返回给本次调用，不缓存，下次重试
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from path_stream import drop_partial_record
+
+# filter_output_params_async 出错时 filter_reasoning 的前缀（这些结果不缓存）
+UNCACHEABLE_REASONING_PREFIXES = ('Error occurred:', 'Parse error:')
+
+
+def is_cacheable_filter_result(result: Optional[Dict[str, Any]]) -> bool:
+    """过滤结果是否可以缓存（filter_reasoning 以出错前缀开头的不缓存）"""
+    if not isinstance(result, dict):
+        return False
+    filter_reasoning = result.get('filter_reasoning', '')
+    return not (isinstance(filter_reasoning, str) and filter_reasoning.startswith(UNCACHEABLE_REASONING_PREFIXES))
+
+
+class FilterOutputCache:
+    """见模块说明"""
+
+    def __init__(
+        self,
+        cache_file: str | None = None,
+        compute: Callable[[str, Dict, Dict], Awaitable[Dict]] | None = None,
+        model: str = '',
+    ):
+        """
+        Args:
+            cache_file: str | None, JSONL 缓存文件（None 表示只在内存中缓存）
+            compute: async compute(node_name, node_params, node_output_schema) -> 过滤结果
+                （graph.py 中为 filter_output_params_async）
+            model: str, 参与缓存 key 的模型名（换模型后旧结果不再命中）
+        """
+        self.cache_file = cache_file
+        self.compute = compute
+        self.model = model
+        self.entries: Dict[str, Dict] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.inflight_hits = 0
+        self.misses = 0
+        if cache_file and os.path.exists(cache_file):
+            self._load()
+
+    def _load(self) -> None:
+        # 崩溃时写了一半的最后一行：截掉，否则下一条记录会接在它后面
+        drop_partial_record(self.cache_file)
+        with open(self.cache_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.entries[record['key']] = record['result']
+        print(f"Loaded {len(self.entries)} cached filter results from {self.cache_file}")
+
+    def _append(self, key: str, node_name: str, result: Dict) -> None:
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            with open(self.cache_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'node_name': node_name, 'result': result}, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"Warning: Failed to persist filter cache entry for {node_name}: {e}")
+
+    def make_key(self, node_name: str, node_params: Dict, node_output_schema: Dict) -> str:
+        payload = json.dumps(
+            {'model': self.model, 'params': node_params, 'output_schema': node_output_schema},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return f"{node_name}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}"
+
+    async def get_or_compute(self, node_name: str, node_params: Dict, node_output_schema: Dict) -> Dict:
+        key = self.make_key(node_name, node_params, node_output_schema)
+
+        if key in self.entries:
+            self.hits += 1
+            return copy.deepcopy(self.entries[key])
+
+        if key in self.inflight:
+            self.inflight_hits += 1
+            return copy.deepcopy(await asyncio.shield(self.inflight[key]))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await self.compute(node_name, node_params, node_output_schema)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免没有等待者时出现 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self.inflight.pop(key, None)
+        future.set_result(result)
+
+        if is_cacheable_filter_result(result):
+            self.entries[key] = result
+            self._append(key, node_name, result)
+        return copy.deepcopy(result)
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            'filter_cache_hits': self.hits + self.inflight_hits,
+            'filter_cache_inflight_hits': self.inflight_hits,
+            'filter_cache_misses': self.misses,
+        }
@@ -13,6 +13,8 @@ from collections import defaultdict
 from typing import Dict, List, Set, Tuple, Any
 from tqdm import tqdm
 
+from graph_store import load_graph_store
+
 
 def load_graph(graph_path: str) -> Tuple[Dict[str, int], Dict[int, str], List[Dict[str, Any]]]:
     """
@@ -21,27 +23,16 @@ def load_graph(graph_path: str) -> Tuple[Dict[str, int], Dict[int, str], List[Di
     Returns:
         name_to_index: tool 名 -> 节点索引
         index_to_name: 节点索引 -> tool 名
-        edges: 边的列表，每个边包含 source, target 等信息
+        edges: 边的只读序列（graph_store.EdgeView），每个边包含 source, target 等信息
     """
     print(f"Loading graph from {graph_path}...")
-    with open(graph_path, "r", encoding="utf-8") as f:
-        graph = json.load(f)
+    store = load_graph_store(graph_path)
 
-    nodes = graph.get("nodes", [])
-    edges = graph.get("edges", [])
+    name_to_index = store.name_to_index()
+    index_to_name = store.index_to_name()
+    edges = store.edges()
 
-    name_to_index: Dict[str, int] = {}
-    index_to_name: Dict[int, str] = {}
-    
-    for node in nodes:
-        idx = node.get("index")
-        func_schema = node.get("function_schema", {}).get("function", {})
-        name = func_schema.get("name")
-        if name is not None and idx is not None:
-            name_to_index[name] = idx
-            index_to_name[idx] = name
-
-    print(f"Loaded graph: {len(nodes)} nodes, {len(edges)} edges, {len(name_to_index)} named tools")
+    print(f"Loaded graph: {store.num_nodes} nodes, {len(edges)} edges, {len(name_to_index)} named tools")
     return name_to_index, index_to_name, edges
 
 
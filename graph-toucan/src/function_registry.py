@@ -0,0 +1,290 @@
+"""
+generated_functions 目录的函数注册表：名字解析索引 + 已加载模块的 LRU 缓存。
+
+backward_to_query.load_function_from_file 原来每次执行函数都要：
+- 对 16 种文件名变体逐个 os.path.exists
+- exec_module 整个生成的文件
+- extract_call_external_api_info / extract_source_code_without_call_external_api 各 ast.parse 一遍同一个文件
+
+FunctionRegistry 在第一次使用时扫描一次函数目录（generated_functions_stateful_v1 优先，其次 generated_functions_v1），
+建立 文件名(不含 .py) -> 文件路径 的索引；之后名字变体解析只是字典查找。同名文件在前面的目录加载失败时
+回退到后面目录中的版本。加载结果
+（函数对象、module、call_external_api 的 docstring / 源码、去掉 call_external_api 后的源码）放进 LRU 缓存，
+同一个 tool 的重复执行只剩函数调用本身。
+
+generated_functions_stateful_v1 中迁移后的 tool 把原来的 call_external_api 改名为 _original_call_external_api，
+新的 call_external_api 是包装：调用 _original_call_external_api 之后在 state_manager.sys_state 上产生副作用。
+对这类文件，要模拟的 API 是 _original_call_external_api（docstring 在它上面），包装保留在源码中；
+tool `from state_manager import sys_state`，state_manager 所在目录通过 import_paths 加入 sys.path。
+
+注意：缓存的 module 在多次调用之间共享（module 级全局变量会保留）；
+execute_function_call 对 module.call_external_api 的替换 / 恢复是同步完成的，asyncio 并发下不会互相覆盖。
+"""
+
+import ast
+import importlib.util
+import os
+import re
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_CACHE_SIZE = 512
+API_FUNCTION_NAME = "call_external_api"
+# stateful tool 中被包装的原始 call_external_api
+STATEFUL_API_FUNCTION_NAME = "_original_call_external_api"
+
+
+class LoadedFunction(NamedTuple):
+    func: Any
+    api_info: Optional[Dict[str, Any]]
+    source_without_api: Optional[str]
+    module: Any
+    file_path: str
+
+
+def file_name_variants(func_name: str) -> List[str]:
+    """函数名可能对应的文件名（不含 .py），顺序与原 load_function_from_file 的探测顺序相同"""
+    # 需要考虑斜杠、连字符、下划线、空格的各种组合，以及 -Tool 后缀
+    base_names = [
+        func_name,  # 原始名称
+        func_name.replace(" ", "-"),  # 空格 → 横线
+        func_name.replace("/", "_"),  # 斜杠 → 下划线
+        func_name.replace("-", "_"),  # 连字符 → 下划线
+        func_name.replace(" ", "-").replace("/", "_"),  # 空格 → 横线，斜杠 → 下划线
+        func_name.replace("/", "_").replace("-", "_"),  # 斜杠和连字符都 → 下划线
+        func_name.replace(" ", "-").replace("/", "_").replace("-", "_"),  # 空格、斜杠、连字符都处理
+        func_name.replace("_", "-"),  # 下划线 → 连字符
+    ]
+    possible_names = []
+    for base in base_names:
+        possible_names.append(base)
+        possible_names.append(base + "-Tool")  # 尝试添加 -Tool 后缀
+    return possible_names
+
+
+def normalize_function_name(func_name: str) -> str:
+    """与 fix_function_names.py 相同的标准化：非字母数字字符替换为 _（保留 Unicode 字母），合并连续下划线"""
+    normalized = re.sub(r'[^\w]', '_', func_name, flags=re.UNICODE)
+    return re.sub(r'_+', '_', normalized).strip('_')
+
+
+def function_name_variants(func_name: str) -> List[str]:
+    """module 中函数对象可能使用的名字，按匹配优先级排列"""
+    normalized = normalize_function_name(func_name)
+    variants = [
+        normalized,
+        normalized + "_Tool",  # 尝试添加 _Tool 后缀
+        func_name.replace("/", "_").replace("-", "_"),
+        func_name.replace("-", "_"),
+        func_name.replace("/", "_"),
+        func_name,
+    ]
+    # 如果函数名以数字开头，也尝试 tool_ 前缀版本
+    if normalized and normalized[0].isdigit():
+        variants.append(f'tool_{normalized}')
+    return variants
+
+
+def api_function_name(module: Any) -> str:
+    """module 中需要被模拟（mock）的 API 函数名：stateful tool 是 _original_call_external_api，否则是 call_external_api"""
+    return STATEFUL_API_FUNCTION_NAME if hasattr(module, STATEFUL_API_FUNCTION_NAME) else API_FUNCTION_NAME
+
+
+def extract_api_parts(content: str, file_path: str = "<string>") -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    一次 ast.parse 同时得到：
+    - 被模拟的 API 函数（见 api_function_name）的 docstring 和源码（没有该函数时为 None）
+    - 去掉该函数（连同它前面一行）后的源码；stateful tool 的 call_external_api 包装保留在源码中
+    """
+    tree = ast.parse(content, filename=file_path)
+    lines = content.split('\n')
+    defined = {node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)}
+    api_name = STATEFUL_API_FUNCTION_NAME if STATEFUL_API_FUNCTION_NAME in defined else API_FUNCTION_NAME
+    api_info = None
+    lines_to_remove = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name == api_name:
+            start_line = node.lineno - 1
+            end_line = node.end_lineno if hasattr(node, 'end_lineno') else start_line + 1
+            if api_info is None:
+                api_info = {
+                    "docstring": ast.get_docstring(node) or "",
+                    "function_code": '\n'.join(lines[start_line:end_line]),
+                }
+            # 标记要移除的行（包括前面的空行）
+            for i in range(max(0, start_line - 1), end_line):
+                lines_to_remove.add(i)
+    source_without_api = '\n'.join(line for i, line in enumerate(lines) if i not in lines_to_remove)
+    return api_info, source_without_api
+
+
+class FunctionRegistry:
+    """见模块说明"""
+
+    def __init__(
+        self,
+        directories: Iterable[str],
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        import_paths: Iterable[str] = (),
+    ):
+        """
+        Args:
+            directories: 函数目录，靠前的优先（同名文件先加载第一个目录中的，失败时依次回退）
+            cache_size: 缓存的已加载函数个数上限
+            import_paths: 生成的 tool import 的模块所在目录（如 state_manager 所在的 new_feature），
+                第一次扫描时加入 sys.path
+        """
+        self.directories = [d for d in directories if d]
+        self.cache_size = cache_size
+        self.import_paths = [p for p in import_paths if p]
+        self._files: Optional[Dict[str, List[str]]] = None
+        self._cache: "OrderedDict[str, LoadedFunction]" = OrderedDict()
+        self._api_parts: Dict[str, Tuple[Optional[Dict[str, Any]], str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 名字解析 ----------
+
+    def build(self) -> None:
+        """扫描函数目录，建立 文件名 -> 路径（按目录优先级排列）的索引（重复调用会重新扫描）"""
+        for path in self.import_paths:
+            if path not in sys.path:
+                sys.path.append(path)
+        files: Dict[str, List[str]] = {}
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".py") and entry.is_file():
+                        files.setdefault(entry.name[:-3], []).append(entry.path)
+        self._files = files
+
+    @property
+    def files(self) -> Dict[str, List[str]]:
+        if self._files is None:
+            self.build()
+        return self._files
+
+    def resolve(self, func_name: str) -> List[str]:
+        """函数名对应的候选文件（按变体优先级、同一变体内按目录优先级排列，去重）"""
+        files = self.files
+        paths = []
+        for name in file_name_variants(func_name):
+            for path in files.get(name, ()):
+                if path not in paths:
+                    paths.append(path)
+        return paths
+
+    # ---------- 加载 ----------
+
+    def _load_from_file(self, func_name: str, file_path: str) -> LoadedFunction:
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        # 使用唯一的模块名避免冲突
+        module_name = f"generated_func_{stem.replace('-', '_').replace('/', '_')}"
+        spec = importlib.util.spec_from_file_location(module_name, file_path)
+        if spec is None or spec.loader is None:
+            raise RuntimeError(f"Failed to create spec for module {module_name} from {file_path}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        func = None
+        normalized = normalize_function_name(func_name)
+        for variant in function_name_variants(func_name):
+            if hasattr(module, variant):
+                func = getattr(module, variant)
+                if variant != normalized:
+                    print(f"[INFO] Matched function with variant name: {variant}")
+                break
+        if func is None:
+            available_funcs = [attr for attr in dir(module) if not attr.startswith('_') and callable(getattr(module, attr))]
+            raise RuntimeError(
+                f"Function '{func_name}' (normalized: '{normalized}') not found in module from {file_path}. "
+                f"Available functions: {available_funcs}"
+            )
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                api_info, source_without_api = extract_api_parts(f.read(), file_path)
+        except Exception as e:
+            print(f"Error extracting call_external_api from {file_path}: {e}")
+            api_info, source_without_api = None, None
+        return LoadedFunction(func, api_info, source_without_api, module, file_path)
+
+    def load(self, func_name: str) -> LoadedFunction:
+        """
+        加载函数（命中缓存时直接返回）。
+
+        Raises:
+            RuntimeError: 函数文件不存在或加载失败（失败不缓存）
+        """
+        cached = self._cache.get(func_name)
+        if cached is not None:
+            self._cache.move_to_end(func_name)
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        tried_files = self.resolve(func_name)
+        if not tried_files:
+            raise RuntimeError(
+                f"Function file not found for '{func_name}'. "
+                f"Tried file names: {[f'{name}.py' for name in file_name_variants(func_name)]} "
+                f"in directories: {self.directories}"
+            )
+
+        last_error = None
+        for file_path in tried_files:
+            try:
+                loaded = self._load_from_file(func_name, file_path)
+            except Exception as e:
+                last_error = RuntimeError(f"Error loading function {func_name} from {file_path}: {str(e)}")
+                last_error.__cause__ = e  # 保留原始异常链
+                continue
+            self._cache[func_name] = loaded
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return loaded
+
+        raise RuntimeError(
+            f"Failed to load function '{func_name}' from any of the tried files: {tried_files}. "
+            f"Last error: {last_error}"
+        ) from last_error
+
+    def api_parts(self, func_name: str, file_path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        只解析源码、不执行 module，得到 (call_external_api 信息, 去掉 call_external_api 后的源码)。
+        给不在本进程执行函数的调用方（sandbox_executor）使用。
+
+        Args:
+            file_path: 执行方实际加载的文件（SandboxPool.resolve，与 load 的解析和回退规则相同），
+                保证模拟 API 用的源码就是将要执行的代码
+
+        Raises:
+            RuntimeError: 文件无法读取或解析
+        """
+        cached = self._cache.get(func_name)
+        if cached is not None and cached.file_path == file_path:
+            return cached.api_info, cached.source_without_api
+        parts = self._api_parts.get(file_path)
+        if parts is None:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    parts = extract_api_parts(f.read(), file_path)
+            except Exception as e:
+                raise RuntimeError(f"Error parsing function file {file_path} for {func_name}: {e}") from e
+            self._api_parts[file_path] = parts
+        return parts
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+        self._api_parts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexed_files": len(self._files) if self._files is not None else 0,
+            "cached_functions": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -8,12 +8,26 @@ Pipeline:
    - Insert: 添加嵌套函数（短依赖/长依赖）
    - Split: 创建信息缺失场景（miss_func/miss_params）
 3. 保存增强后的 FSP 到 fsp_v2.json
+
+输入 / 输出都支持 path_stream 的流式 JSONL 格式（.jsonl / .jsonl.gz 等）：按路径逐条读取、处理、写出，
+内存不随路径条数增长；follow=True 时可以在 random_walker 还在写 JSONL 的时候开始消费。
+
+并行与可复现：
+- 每条路径用自己的 random.Random(fsp_path_seed(seed, node_idx, path_idx))，输出与 worker 数、分块大小无关
+- num_workers > 1 时按 chunk_size 条路径一块分发到进程池（每个 worker 在 initializer 中加载一次图），
+  按提交顺序取回结果，同时在途的块数有上限，内存不随输入增长
+- 统计信息由每条路径的 statistics 累加，不需要保留已处理的路径
+- resume=True（未压缩 JSONL 输出）时跳过输出中已有的路径 ID（node_idx, path_idx），在文件末尾续写
 """
 
 import json
 import os
 import random
-from typing import Dict, List, Any
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from path_dedup import GlobalPathDeduper, format_dedup_stats
+from path_stream import RecordWriter, is_compressed_path, is_jsonl_path, iter_fsp_paths, iter_records, iter_walk_paths
 from random_walker import (
     load_graph_for_walk,
     convert_flat_path_to_fsp,
@@ -21,6 +35,221 @@ from random_walker import (
     apply_insert_operation,
     apply_split_operation,
 )
+from walk_engine import derive_seed
+
+# 与 random_walker 的 merge rng（stream 0）错开
+FSP_SEED_STREAM = 1 << 32
+
+
+def fsp_path_seed(seed: int, node_idx: int, path_idx: int) -> int:
+    """路径 (node_idx, path_idx) 的随机种子"""
+    return derive_seed(seed, node_idx, stream=FSP_SEED_STREAM + path_idx)
+
+
+def build_enhanced_path(
+    path: List[int],
+    path_idx: int,
+    rng: random.Random,
+    adj,
+    index_to_name: Dict[int, str],
+    merge_probability: float,
+    insert_probability: float,
+    long_dependency_probability: float,
+    split_probability: float,
+) -> Dict[str, Any]:
+    """对一条路径依次做 Merge / Insert / Split，返回写入 FSP 输出的路径数据"""
+    # 转换为 FSP 格式（每个节点一个 turn）
+    fsp_initial = convert_flat_path_to_fsp(path)
+
+    # 应用 Merge 操作（论文推荐先做 Merge）
+    fsp_merged, merge_logs = apply_merge_operation(
+        fsp=fsp_initial,
+        merge_probability=merge_probability,
+        rng=rng,
+        index_to_name=index_to_name,
+    )
+
+    # 应用 Insert 操作（论文推荐在 Merge 后做 Insert）
+    fsp_after_insert, insert_logs = apply_insert_operation(
+        fsp=fsp_merged,
+        adj=adj,
+        insert_probability=insert_probability,
+        long_dependency_probability=long_dependency_probability,
+        rng=rng,
+        index_to_name=index_to_name,
+    )
+
+    # 应用 Split 操作（论文推荐最后做 Split）
+    fsp_final, split_logs = apply_split_operation(
+        fsp=fsp_after_insert,
+        split_probability=split_probability,
+        rng=rng,
+        index_to_name=index_to_name,
+    )
+
+    # 修复：Split 后更新所有受影响的 logs 的 turn_idx
+    # Bug fix: 当 split 在某个位置插入空 turn 时，所有后续 turn 的索引 +1
+    # 需要更新 insert_logs 和 merge_logs 中的 turn_idx
+    if split_logs:
+        for split_log in split_logs:
+            insert_position = split_log["insert_position"]
+
+            # 更新 insert_logs 中受影响的 turn_idx
+            for insert_log in insert_logs:
+                # target_turn_idx: 嵌套函数所在的 turn
+                if insert_log.get("target_turn_idx", -1) > insert_position:
+                    insert_log["target_turn_idx"] += 1
+
+                # source_turn_idx: source 函数所在的 turn（long dependency）
+                if insert_log.get("source_turn_idx", -1) > insert_position:
+                    insert_log["source_turn_idx"] += 1
+
+            # 更新 merge_logs 中受影响的 turn_idx
+            for merge_log in merge_logs:
+                if merge_log.get("turn_idx", -1) > insert_position:
+                    merge_log["turn_idx"] += 1
+
+    # 构建增强路径数据
+    return {
+        "path_idx": path_idx,
+        "original_path": path,
+        "original_path_names": [
+            index_to_name.get(idx, f"node_{idx}") for idx in path
+        ],
+        "fsp_initial": fsp_initial,
+        "fsp_merged": fsp_merged,
+        "fsp_after_insert": fsp_after_insert,
+        "fsp_final": fsp_final,
+        "fsp_final_names": [
+            [index_to_name.get(idx, f"node_{idx}") for idx in turn]
+            for turn in fsp_final
+        ],
+        "statistics": {
+            "turns_initial": len(fsp_initial),
+            "turns_merged": len(fsp_merged),
+            "turns_after_insert": len(fsp_after_insert),
+            "turns_final": len(fsp_final),
+            "functions_initial": len(path),
+            "functions_final": sum(len(turn) for turn in fsp_final),
+            "num_merges": len(merge_logs),
+            "num_inserts": len(insert_logs),
+            "short_dependency_inserts": sum(
+                1 for log in insert_logs if log["insert_type"] == "short_dependency"
+            ),
+            "long_dependency_inserts": sum(
+                1 for log in insert_logs if log["insert_type"] == "long_dependency"
+            ),
+            "num_splits": len(split_logs),
+        },
+        "merge_logs": merge_logs,
+        "insert_logs": insert_logs,
+        "split_logs": split_logs,
+    }
+
+
+# 汇总统计字段 <- 单条路径 statistics 字段
+_STAT_FIELDS = {
+    "total_turns_before": "turns_initial",
+    "total_turns_after_merge": "turns_merged",
+    "total_turns_after_insert": "turns_after_insert",
+    "total_turns_final": "turns_final",
+    "total_functions_before": "functions_initial",
+    "total_functions_final": "functions_final",
+    "total_merges": "num_merges",
+    "total_inserts": "num_inserts",
+    "short_dependency_inserts": "short_dependency_inserts",
+    "long_dependency_inserts": "long_dependency_inserts",
+    "total_splits": "num_splits",
+}
+
+
+def new_fsp_stats() -> Dict[str, Any]:
+    return {"total_paths": 0, **{field: 0 for field in _STAT_FIELDS}}
+
+
+def accumulate_fsp_stats(stats: Dict[str, Any], path_stats: Dict[str, int]) -> None:
+    stats["total_paths"] += 1
+    for field, path_field in _STAT_FIELDS.items():
+        stats[field] += path_stats[path_field]
+
+
+def load_resume_state(output_path: str) -> Tuple[Set[Tuple[int, int]], Dict[str, Any]]:
+    """
+    读取中断的 FSP JSONL 输出：已完成的路径 ID 集合 + 由已有路径累加的统计。
+    输出不存在时返回空状态。
+    """
+    done: Set[Tuple[int, int]] = set()
+    stats = new_fsp_stats()
+    if not os.path.exists(output_path):
+        return done, stats
+    try:
+        for record in iter_records(output_path):
+            if record.get("type") == "path":
+                done.add((record["node_idx"], record["path_idx"]))
+                accumulate_fsp_stats(stats, record["statistics"])
+    except ValueError:
+        # 末尾写了一半的记录：RecordWriter(append=True) 会把它截掉
+        pass
+    return done, stats
+
+
+# 进程池 worker 的状态（每个 worker 在 initializer 中加载一次图）
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_fsp_worker(graph_path: str, params: Dict[str, Any]) -> None:
+    _, _, index_to_name, adj = load_graph_for_walk(graph_path)
+    _WORKER_STATE.update({"adj": adj, "index_to_name": index_to_name, **params})
+
+
+def _process_chunk_with_state(
+    state: Dict[str, Any],
+    chunk: List[Tuple[int, str, int, List[int]]],
+) -> List[Tuple[int, str, int, Optional[Dict[str, Any]]]]:
+    """一块路径：(node_idx, node_name, path_idx, node_indices) -> (..., enhanced_path)；空路径返回 None"""
+    results = []
+    for node_idx, node_name, path_idx, path in chunk:
+        enhanced_path = None
+        if path:
+            enhanced_path = build_enhanced_path(
+                path,
+                path_idx,
+                random.Random(fsp_path_seed(state["seed"], node_idx, path_idx)),
+                state["adj"],
+                state["index_to_name"],
+                merge_probability=state["merge_probability"],
+                insert_probability=state["insert_probability"],
+                long_dependency_probability=state["long_dependency_probability"],
+                split_probability=state["split_probability"],
+            )
+        results.append((node_idx, node_name, path_idx, enhanced_path))
+    return results
+
+
+def _process_chunk(chunk: List[Tuple[int, str, int, List[int]]]) -> List[Tuple[int, str, int, Optional[Dict[str, Any]]]]:
+    return _process_chunk_with_state(_WORKER_STATE, chunk)
+
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ordered_map(executor: ProcessPoolExecutor, fn: Callable, items: Iterable[Any], max_pending: int) -> Iterator[Any]:
+    """按提交顺序返回结果的 executor.map，最多 max_pending 个任务在途（不会一次读完输入）"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
 
 def generate_fsp_v2(
@@ -32,20 +261,34 @@ def generate_fsp_v2(
     long_dependency_probability: float = 0.3,
     split_probability: float = 0.15,
     seed: int = 42,
+    follow: bool = False,
+    global_dedup: Optional[str] = None,
+    num_workers: int = 1,
+    chunk_size: int = 256,
+    resume: bool = False,
 ):
     """
     从现有的随机游走路径生成 FSP v2。
 
     Args:
-        input_path: 输入的路径文件（path_v1.json）
-        output_path: 输出的 FSP 文件（fsp_v2.json）
+        input_path: 输入的路径文件（path_v1.json，或 random_walker 写出的 JSONL）
+        output_path: 输出的 FSP 文件（fsp_v2.json；以 .jsonl / .jsonl.gz 等结尾时逐条流式写出）
         graph_path: 图文件路径
         merge_probability: Merge 操作的概率（论文推荐 0.3）
         insert_probability: Insert 操作的概率（每个 turn）
         long_dependency_probability: Insert 为长依赖的概率
         split_probability: Split 操作的概率（论文推荐 0.15）
-        seed: 随机种子
+        seed: 随机种子（每条路径的 rng 由 (seed, node_idx, path_idx) 派生）
+        follow: 输入为未压缩 JSONL 时，等待上游继续写入直到读到 summary 记录
+        global_dedup: 跨起点的全局去重（path_dedup.GlobalPathDeduper 的 subsumption 模式：
+            "none" 只做精确去重，"prefix" / "suffix" / "subpath" 还会丢弃被更长路径包含的路径）；None 表示不做
+        num_workers: 进程数（1 表示在当前进程处理；输出与进程数无关）
+        chunk_size: 每个任务包含的路径数
+        resume: 输出为未压缩 JSONL 且上次中断（没有 summary）时，跳过已写出的路径继续写
     """
+    if resume and (not is_jsonl_path(output_path) or is_compressed_path(output_path)):
+        raise ValueError(f"resume requires an uncompressed JSONL output: {output_path}")
+
     print("=" * 80)
     print("生成 FSP v2：应用 Merge、Insert 和 Split 操作")
     print("=" * 80)
@@ -56,198 +299,122 @@ def generate_fsp_v2(
     print(f"   - 节点数: {len(nodes)}")
     print(f"   - 边数: {len(edges)}")
 
-    # 2. 加载现有路径
-    print(f"\n2. 加载现有路径: {input_path}")
-    with open(input_path, "r", encoding="utf-8") as f:
-        path_data = json.load(f)
-
-    node_results = path_data.get("node_results", {})
-    print(f"   - 节点数: {len(node_results)}")
-
-    # 3. 统计信息
-    stats = {
-        "total_paths": 0,
-        "total_turns_before": 0,
-        "total_turns_after_merge": 0,
-        "total_turns_after_insert": 0,
-        "total_turns_final": 0,
-        "total_functions_before": 0,
-        "total_functions_final": 0,
-        "total_merges": 0,
-        "total_inserts": 0,
-        "short_dependency_inserts": 0,
-        "long_dependency_inserts": 0,
-        "total_splits": 0,
-    }
+    # 2. 流式读取现有路径
+    print(f"\n2. 读取现有路径: {input_path}")
+    deduper: Optional[GlobalPathDeduper] = None
+    if global_dedup is not None:
+        deduper = GlobalPathDeduper(subsumption=global_dedup)
+        walk_paths = deduper.iter_unique(input_path, follow=follow)
+    else:
+        walk_paths = iter_walk_paths(input_path, follow=follow)
 
-    # 4. 处理每个节点的路径
+    # 3. 处理每个节点的路径
     print(f"\n3. 应用节点操作（Merge + Insert + Split）")
     print(f"   - Merge 概率: {merge_probability}")
     print(f"   - Insert 概率: {insert_probability}")
     print(f"   - 长依赖概率: {long_dependency_probability}")
     print(f"   - Split 概率: {split_probability}")
+    if num_workers > 1:
+        print(f"   - 进程数: {num_workers}（每块 {chunk_size} 条路径）")
+
+    params = {
+        "merge_probability": merge_probability,
+        "insert_probability": insert_probability,
+        "long_dependency_probability": long_dependency_probability,
+        "split_probability": split_probability,
+        "seed": seed,
+    }
+    meta = {
+        "input_path": input_path,
+        "graph_path": graph_path,
+        "global_dedup": global_dedup,
+        **params,
+    }
 
-    rng = random.Random(seed)
+    # JSONL 输出逐条写；JSON 输出仍然在内存中按节点汇总
+    # 续写时 RecordWriter 先核对已有 header 的 meta，参数不同的两次运行不会混写进同一个文件
+    writer: Optional[RecordWriter] = None
     enhanced_results = {}
-
-    for node_idx_str, node_data in node_results.items():
-        node_idx = int(node_idx_str)
-        node_name = node_data.get("name", f"node_{node_idx}")
-
-        # 只处理去重后的路径
-        paths_after_dedup = node_data.get("paths_after_dedup", [])
-
-        if not paths_after_dedup:
-            continue
-
-        enhanced_paths = []
-
-        for path_idx, path_data in enumerate(paths_after_dedup):
-            # 提取节点索引列表
-            if isinstance(path_data, dict):
-                path = path_data.get("node_indices", [])
-            else:
-                path = path_data
-
-            if not path:
-                continue
-
-            # 转换为 FSP 格式（每个节点一个 turn）
-            fsp_initial = convert_flat_path_to_fsp(path)
-
-            # 应用 Merge 操作（论文推荐先做 Merge）
-            fsp_merged, merge_logs = apply_merge_operation(
-                fsp=fsp_initial,
-                merge_probability=merge_probability,
-                rng=rng,
-                index_to_name=index_to_name,
-            )
-
-            # 应用 Insert 操作（论文推荐在 Merge 后做 Insert）
-            fsp_after_insert, insert_logs = apply_insert_operation(
-                fsp=fsp_merged,
-                adj=adj,
-                insert_probability=insert_probability,
-                long_dependency_probability=long_dependency_probability,
-                rng=rng,
-                index_to_name=index_to_name,
-            )
-
-            # 应用 Split 操作（论文推荐最后做 Split）
-            fsp_final, split_logs = apply_split_operation(
-                fsp=fsp_after_insert,
-                split_probability=split_probability,
-                rng=rng,
-                index_to_name=index_to_name,
-            )
-
-            # 修复：Split 后更新所有受影响的 logs 的 turn_idx
-            # Bug fix: 当 split 在某个位置插入空 turn 时，所有后续 turn 的索引 +1
-            # 需要更新 insert_logs 和 merge_logs 中的 turn_idx
-            if split_logs:
-                for split_log in split_logs:
-                    insert_position = split_log["insert_position"]
-
-                    # 更新 insert_logs 中受影响的 turn_idx
-                    for insert_log in insert_logs:
-                        # target_turn_idx: 嵌套函数所在的 turn
-                        if insert_log.get("target_turn_idx", -1) > insert_position:
-                            insert_log["target_turn_idx"] += 1
-
-                        # source_turn_idx: source 函数所在的 turn（long dependency）
-                        if insert_log.get("source_turn_idx", -1) > insert_position:
-                            insert_log["source_turn_idx"] += 1
-
-                    # 更新 merge_logs 中受影响的 turn_idx
-                    for merge_log in merge_logs:
-                        if merge_log.get("turn_idx", -1) > insert_position:
-                            merge_log["turn_idx"] += 1
-
-            # 统计
-            stats["total_paths"] += 1
-            stats["total_turns_before"] += len(fsp_initial)
-            stats["total_turns_after_merge"] += len(fsp_merged)
-            stats["total_turns_after_insert"] += len(fsp_after_insert)
-            stats["total_turns_final"] += len(fsp_final)
-            stats["total_functions_before"] += len(path)
-            stats["total_functions_final"] += sum(len(turn) for turn in fsp_final)
-            stats["total_merges"] += len(merge_logs)
-            stats["total_inserts"] += len(insert_logs)
-            stats["short_dependency_inserts"] += sum(
-                1 for log in insert_logs if log["insert_type"] == "short_dependency"
-            )
-            stats["long_dependency_inserts"] += sum(
-                1 for log in insert_logs if log["insert_type"] == "long_dependency"
-            )
-            stats["total_splits"] += len(split_logs)
-
-            # 构建增强路径数据
-            enhanced_path = {
-                "path_idx": path_idx,
-                "original_path": path,
-                "original_path_names": [
-                    index_to_name.get(idx, f"node_{idx}") for idx in path
-                ],
-                "fsp_initial": fsp_initial,
-                "fsp_merged": fsp_merged,
-                "fsp_after_insert": fsp_after_insert,
-                "fsp_final": fsp_final,
-                "fsp_final_names": [
-                    [index_to_name.get(idx, f"node_{idx}") for idx in turn]
-                    for turn in fsp_final
-                ],
-                "statistics": {
-                    "turns_initial": len(fsp_initial),
-                    "turns_merged": len(fsp_merged),
-                    "turns_after_insert": len(fsp_after_insert),
-                    "turns_final": len(fsp_final),
-                    "functions_initial": len(path),
-                    "functions_final": sum(len(turn) for turn in fsp_final),
-                    "num_merges": len(merge_logs),
-                    "num_inserts": len(insert_logs),
-                    "short_dependency_inserts": sum(
-                        1 for log in insert_logs if log["insert_type"] == "short_dependency"
-                    ),
-                    "long_dependency_inserts": sum(
-                        1 for log in insert_logs if log["insert_type"] == "long_dependency"
-                    ),
-                    "num_splits": len(split_logs),
-                },
-                "merge_logs": merge_logs,
-                "insert_logs": insert_logs,
-                "split_logs": split_logs,
-            }
-
-            enhanced_paths.append(enhanced_path)
-
-        enhanced_results[node_idx_str] = {
-            "node_idx": node_idx,
-            "node_name": node_name,
-            "num_paths": len(enhanced_paths),
-            "paths": enhanced_paths,
-        }
-
-    # 5. 保存结果
+    if is_jsonl_path(output_path):
+        writer = RecordWriter(output_path, kind="fsp_v2", meta=meta, append=resume and os.path.exists(output_path))
+
+    # 统计信息（断点续跑时从已有输出累加）
+    done: Set[Tuple[int, int]] = set()
+    stats = new_fsp_stats()
+    if resume:
+        done, stats = load_resume_state(output_path)
+        if done:
+            print(f"   - 断点续跑: 跳过已生成的 {len(done)} 条路径")
+
+    pending_paths = (
+        (node_idx, node_name, path_idx, path_data.get("node_indices", []))
+        for node_idx, node_name, path_idx, path_data in walk_paths
+        if (node_idx, path_idx) not in done
+    )
+    chunks = _chunked(pending_paths, chunk_size)
+    executor: Optional[ProcessPoolExecutor] = None
+    if num_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_fsp_worker,
+            initargs=(graph_path, params),
+        )
+        results = _ordered_map(executor, _process_chunk, chunks, max_pending=num_workers * 2)
+    else:
+        state = {"adj": adj, "index_to_name": index_to_name, **params}
+        results = (_process_chunk_with_state(state, chunk) for chunk in chunks)
+
+    try:
+        for chunk_results in results:
+            for node_idx, node_name, path_idx, enhanced_path in chunk_results:
+                if writer is None and str(node_idx) not in enhanced_results:
+                    enhanced_results[str(node_idx)] = {
+                        "node_idx": node_idx,
+                        "node_name": node_name,
+                        "num_paths": 0,
+                        "paths": [],
+                    }
+                if enhanced_path is None:
+                    continue
+
+                accumulate_fsp_stats(stats, enhanced_path["statistics"])
+                if writer is not None:
+                    writer.write({"type": "path", "node_idx": node_idx, "node_name": node_name, **enhanced_path})
+                else:
+                    node_entry = enhanced_results[str(node_idx)]
+                    node_entry["paths"].append(enhanced_path)
+                    node_entry["num_paths"] += 1
+            if writer is not None:
+                writer.flush()
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if deduper is not None:
+        stats["global_dedup"] = deduper.stats()
+        print(f"\n   - {format_dedup_stats(stats['global_dedup'])}")
+
+    # 4. 保存结果
     print(f"\n4. 保存结果到: {output_path}")
 
-    output_data = {
-        "meta": {
-            "input_path": input_path,
-            "graph_path": graph_path,
-            "merge_probability": merge_probability,
-            "insert_probability": insert_probability,
-            "long_dependency_probability": long_dependency_probability,
-            "seed": seed,
-        },
-        "statistics": stats,
-        "node_results": enhanced_results,
-    }
+    if writer is not None:
+        writer.close(statistics=stats)
+    else:
+        output_data = {
+            "meta": meta,
+            "statistics": stats,
+            "node_results": enhanced_results,
+        }
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=2)
 
-    # 6. 打印统计信息
+    # 5. 打印统计信息
     print(f"\n" + "=" * 80)
     print("生成完成！统计信息：")
     print("=" * 80)
@@ -286,77 +453,70 @@ def print_sample_paths(fsp_path: str, num_samples: int = 3):
     print(f"示例路径（展示前 {num_samples} 条）")
     print("=" * 80)
 
-    with open(fsp_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    node_results = data.get("node_results", {})
     count = 0
+    seen_nodes = set()
 
-    for node_idx, node_data in node_results.items():
+    for path in iter_fsp_paths(fsp_path):
         if count >= num_samples:
             break
 
-        paths = node_data.get("paths", [])
-        if not paths:
+        # 每个节点只展示第一条路径
+        if path["node_idx"] in seen_nodes:
             continue
-
-        for path in paths[:1]:  # 每个节点只展示第一条路径
-            if count >= num_samples:
-                break
-
-            print(f"\n路径 {count + 1}: 节点 {node_data['node_name']}")
-            print("-" * 80)
-
-            # 原始路径
-            print(f"原始路径 ({path['statistics']['functions_initial']} 函数, {path['statistics']['turns_initial']} turns):")
-            for i, name in enumerate(path['original_path_names']):
-                print(f"  Turn {i}: [{name}]")
-
-            # Merge 后
-            if path['statistics']['num_merges'] > 0:
-                print(f"\nMerge 后 ({path['statistics']['num_merges']} 次合并, {path['statistics']['turns_merged']} turns):")
-                for i, turn in enumerate(path['fsp_merged']):
-                    turn_names = [data['meta'].get('index_to_name', {}).get(str(idx), f"node_{idx}") for idx in turn]
-                    print(f"  Turn {i}: {turn_names}")
-
-            # Insert 后
-            if path['statistics']['num_inserts'] > 0:
-                print(f"\nInsert 后 ({path['statistics']['num_inserts']} 次插入, {path['statistics']['turns_after_insert']} turns):")
-                for i, turn in enumerate(path['fsp_after_insert']):
-                    turn_names = [data.get('node_results', {}).get('0', {}).get('paths', [{}])[0].get('fsp_final_names', [[]])[0] if i == 0 else [] for idx in turn]
-                    # 简化：直接显示索引
-                    print(f"  Turn {i}: {turn}")
-
-                # 打印 Insert 详情
-                print(f"\nInsert 详情:")
-                for log in path['insert_logs']:
-                    print(f"  - Turn {log['source_turn_idx']}: {log['source_func_name']} "
-                          f"→ 插入 {log['nested_func_name']} "
-                          f"到 Turn {log['target_turn_idx']} ({log['insert_type']})")
-
-            # Split 后（最终）
-            if path['statistics']['num_splits'] > 0:
-                print(f"\n最终 FSP ({path['statistics']['num_splits']} 次 split, {path['statistics']['turns_final']} turns):")
-                for i, (turn, turn_names) in enumerate(zip(path['fsp_final'], path['fsp_final_names'])):
-                    if not turn:  # 空 turn（split 插入的）
-                        print(f"  Turn {i}: [] ← 空 turn (miss_func/miss_params)")
-                    else:
-                        print(f"  Turn {i}: {turn_names}")
-
-                # 打印 Split 详情
-                print(f"\nSplit 详情:")
-                for log in path['split_logs']:
-                    print(f"  - 在 Turn {log['insert_position']} 后插入空 turn")
-                    print(f"    类型: {log['miss_type']}")
-                    print(f"    前: {log['turn_before_names']}")
-                    print(f"    后: {log['turn_after_names']}")
-            elif path['statistics']['num_inserts'] > 0:
-                # 如果没有 split，显示 insert 后的最终结果
-                print(f"\n最终 FSP ({path['statistics']['functions_final']} 函数, {path['statistics']['turns_final']} turns):")
-                for i, (turn, turn_names) in enumerate(zip(path['fsp_final'], path['fsp_final_names'])):
+        seen_nodes.add(path["node_idx"])
+
+        print(f"\n路径 {count + 1}: 节点 {path['node_name']}")
+        print("-" * 80)
+
+        # 原始路径
+        print(f"原始路径 ({path['statistics']['functions_initial']} 函数, {path['statistics']['turns_initial']} turns):")
+        for i, name in enumerate(path['original_path_names']):
+            print(f"  Turn {i}: [{name}]")
+
+        # Merge 后
+        if path['statistics']['num_merges'] > 0:
+            print(f"\nMerge 后 ({path['statistics']['num_merges']} 次合并, {path['statistics']['turns_merged']} turns):")
+            for i, turn in enumerate(path['fsp_merged']):
+                turn_names = [f"node_{idx}" for idx in turn]
+                print(f"  Turn {i}: {turn_names}")
+
+        # Insert 后
+        if path['statistics']['num_inserts'] > 0:
+            print(f"\nInsert 后 ({path['statistics']['num_inserts']} 次插入, {path['statistics']['turns_after_insert']} turns):")
+            for i, turn in enumerate(path['fsp_after_insert']):
+                # 简化：直接显示索引
+                print(f"  Turn {i}: {turn}")
+
+            # 打印 Insert 详情
+            print(f"\nInsert 详情:")
+            for log in path['insert_logs']:
+                print(f"  - Turn {log['source_turn_idx']}: {log['source_func_name']} "
+                      f"→ 插入 {log['nested_func_name']} "
+                      f"到 Turn {log['target_turn_idx']} ({log['insert_type']})")
+
+        # Split 后（最终）
+        if path['statistics']['num_splits'] > 0:
+            print(f"\n最终 FSP ({path['statistics']['num_splits']} 次 split, {path['statistics']['turns_final']} turns):")
+            for i, (turn, turn_names) in enumerate(zip(path['fsp_final'], path['fsp_final_names'])):
+                if not turn:  # 空 turn（split 插入的）
+                    print(f"  Turn {i}: [] ← 空 turn (miss_func/miss_params)")
+                else:
                     print(f"  Turn {i}: {turn_names}")
 
-            count += 1
+            # 打印 Split 详情
+            print(f"\nSplit 详情:")
+            for log in path['split_logs']:
+                print(f"  - 在 Turn {log['insert_position']} 后插入空 turn")
+                print(f"    类型: {log['miss_type']}")
+                print(f"    前: {log['turn_before_names']}")
+                print(f"    后: {log['turn_after_names']}")
+        elif path['statistics']['num_inserts'] > 0:
+            # 如果没有 split，显示 insert 后的最终结果
+            print(f"\n最终 FSP ({path['statistics']['functions_final']} 函数, {path['statistics']['turns_final']} turns):")
+            for i, (turn, turn_names) in enumerate(zip(path['fsp_final'], path['fsp_final_names'])):
+                print(f"  Turn {i}: {turn_names}")
+
+        count += 1
 
 
 if __name__ == "__main__":
@@ -6,6 +6,8 @@ import json
 import os
 import random
 import asyncio
+import copy
+import hashlib
 import yaml
 from collections import Counter, defaultdict
 from typing import Any, Dict, List, Set, Tuple
@@ -13,6 +15,13 @@ from tqdm import tqdm
 from openai import AsyncOpenAI
 import matplotlib.pyplot as plt
 import networkx as nx
+from candidate_index import LabelInvertedIndex, mine_candidates_raw, mine_candidates_tiered
+from progress_journal import ProgressJournal
+from llm_scheduler import SlidingWindowScheduler, batch_token_counter
+from schema_matcher import StaticSchemaMatcher
+from llm_cache import wrap_llm_client
+from filter_cache import FilterOutputCache
+from edge_judgment import assemble_batch_results, parse_edge_judgment
 
 # 配置文件路径
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.yaml")
@@ -49,9 +58,10 @@ else:
     api_key = config["api"].get("api_key", "EMPTY")
 base_url = config["api"]["base_url"]
 
-async_client = AsyncOpenAI(
-    api_key=api_key,
-    base_url=base_url,
+async_client = wrap_llm_client(
+    AsyncOpenAI(api_key=api_key, base_url=base_url),
+    stage="graph",
+    config=config,
 )
 
 # 模型配置
@@ -259,7 +269,7 @@ def get_function_labels(classification):
     return labels
 
 
-def find_candidates_for_nodes_raw(nodes, max_candidates: int | None = None):
+def find_candidates_for_nodes_raw(nodes, max_candidates: int | None = None, use_index: bool = True, use_bitset: bool = False):
     """
     为每个节点找到可能的 candidates（raw 版本）
     
@@ -269,12 +279,37 @@ def find_candidates_for_nodes_raw(nodes, max_candidates: int | None = None):
     Args:
         nodes: list, 节点列表
         max_candidates: int | None, 每个节点最多保留的 candidates 数量，None 表示不限制
+        use_index: bool, 是否使用 label 倒排索引（O(n + 命中数)，结果与两两比较完全一致）
+        use_bitset: bool, 倒排索引是否使用 per-label 位图（仅 use_index=True 时生效）
         
     Returns:
         dict: {node_index: [candidate_indices]}
     """
     print("Finding candidates for each node using raw label matching...")
     
+    if use_index:
+        index = LabelInvertedIndex(nodes, use_bitset=use_bitset)
+        node_candidates = mine_candidates_raw(index, max_candidates=max_candidates)
+    else:
+        node_candidates = _find_candidates_raw_pairwise(nodes, max_candidates=max_candidates)
+    
+    # 统计信息
+    candidate_counts = [len(cands) for cands in node_candidates.values()]
+    if candidate_counts:
+        avg_cands = sum(candidate_counts) / len(candidate_counts)
+        print(f"Average candidates per node (raw): {avg_cands:.2f}")
+        print(f"Max candidates: {max(candidate_counts)}")
+        print(f"Min candidates: {min(candidate_counts)}")
+        if max_candidates is not None:
+            print(f"Max candidates limit: {max_candidates}")
+    
+    return node_candidates
+
+
+def _find_candidates_raw_pairwise(nodes, max_candidates: int | None = None):
+    """
+    raw 版本的两两比较实现（O(n²)），保留作为倒排索引实现的对照基准。
+    """
     # 收集每个节点的所有 labels
     node_labels = []
     for node in nodes:
@@ -304,20 +339,10 @@ def find_candidates_for_nodes_raw(nodes, max_candidates: int | None = None):
         
         node_candidates[i] = candidates
     
-    # 统计信息
-    candidate_counts = [len(cands) for cands in node_candidates.values()]
-    if candidate_counts:
-        avg_cands = sum(candidate_counts) / len(candidate_counts)
-        print(f"Average candidates per node (raw): {avg_cands:.2f}")
-        print(f"Max candidates: {max(candidate_counts)}")
-        print(f"Min candidates: {min(candidate_counts)}")
-        if max_candidates is not None:
-            print(f"Max candidates limit: {max_candidates}")
-    
     return node_candidates
 
 
-def find_candidates_for_nodes(nodes, min_candidates: int = 30):
+def find_candidates_for_nodes(nodes, min_candidates: int = 30, use_index: bool = True):
     """
     为每个节点找到可能的 candidates（v1.0.1 规则）
     
@@ -329,12 +354,72 @@ def find_candidates_for_nodes(nodes, min_candidates: int = 30):
     Args:
         nodes: list, 节点列表
         min_candidates: int, 希望至少得到的候选数量（用于统计；真正使用时仍会在 sample 阶段截断为固定数量）
+        use_index: bool, 是否使用 label 倒排索引（O(n + 命中数)，相同 seed 下结果与两两比较完全一致）
         
     Returns:
         dict: {node_index: [candidate_indices]}
     """
     print("Finding candidates for each node using v1.0.1 rules...")
     
+    if use_index:
+        index = LabelInvertedIndex(nodes)
+        (
+            node_candidates,
+            primary_only_candidates,
+            sec_with_primary_candidates,
+            sec_with_sec_candidates,
+        ) = mine_candidates_tiered(index, min_candidates=min_candidates)
+    else:
+        (
+            node_candidates,
+            primary_only_candidates,
+            sec_with_primary_candidates,
+            sec_with_sec_candidates,
+        ) = _find_candidates_tiered_pairwise(nodes, min_candidates=min_candidates)
+    
+    # 统计信息
+    candidate_counts = [len(cands) for cands in node_candidates.values()]
+    if candidate_counts:
+        avg_cands = sum(candidate_counts) / len(candidate_counts)
+        print(f"Average candidates per node (v1.0.1): {avg_cands:.2f}")
+        print(f"Max candidates: {max(candidate_counts)}")
+        print(f"Min candidates: {min(candidate_counts)}")
+    else:
+        print("No candidates found.")
+
+    # 打印不同来源的 candidates 统计
+    print("\n" + "-" * 80)
+    print("Candidate source statistics (per node)")
+    print("-" * 80)
+    primary_counts = [len(v) for v in primary_only_candidates.values()]
+    sec_primary_counts = [len(v) for v in sec_with_primary_candidates.values()]
+    sec_sec_counts = [len(v) for v in sec_with_sec_candidates.values()]
+    if primary_counts:
+        print(f"  From same primary_label:")
+        print(f"    Avg: {sum(primary_counts)/len(primary_counts):.2f}, "
+              f"Max: {max(primary_counts)}, Min: {min(primary_counts)}")
+    if sec_primary_counts:
+        print(f"  From secondary_label with other primary_label:")
+        print(f"    Avg: {sum(sec_primary_counts)/len(sec_primary_counts):.2f}, "
+              f"Max: {max(sec_primary_counts)}, Min: {min(sec_primary_counts)}")
+    if sec_sec_counts:
+        print(f"  From secondary_label with other secondary_label:")
+        print(f"    Avg: {sum(sec_sec_counts)/len(sec_sec_counts):.2f}, "
+              f"Max: {max(sec_sec_counts)}, Min: {min(sec_sec_counts)}")
+
+    # 对候选集做一次 candidate pairs 去重分析
+    analyze_candidate_pairs(node_candidates, label="after candidate mining")
+
+    return node_candidates
+
+
+def _find_candidates_tiered_pairwise(nodes, min_candidates: int = 30):
+    """
+    v1.0.1 规则的两两比较实现（O(n²)），保留作为倒排索引实现的对照基准。
+
+    Returns:
+        (node_candidates, primary_only_candidates, sec_with_primary_candidates, sec_with_sec_candidates)
+    """
     # 收集每个节点的 primary / secondary labels
     primary_labels = []
     secondary_label_sets = []
@@ -416,40 +501,7 @@ def find_candidates_for_nodes(nodes, min_candidates: int = 30):
         sec_with_primary_candidates[i] = sec_primary_list
         sec_with_sec_candidates[i] = sec_sec_list
     
-    # 统计信息
-    candidate_counts = [len(cands) for cands in node_candidates.values()]
-    if candidate_counts:
-        avg_cands = sum(candidate_counts) / len(candidate_counts)
-        print(f"Average candidates per node (v1.0.1): {avg_cands:.2f}")
-        print(f"Max candidates: {max(candidate_counts)}")
-        print(f"Min candidates: {min(candidate_counts)}")
-    else:
-        print("No candidates found.")
-
-    # 打印不同来源的 candidates 统计
-    print("\n" + "-" * 80)
-    print("Candidate source statistics (per node)")
-    print("-" * 80)
-    primary_counts = [len(v) for v in primary_only_candidates.values()]
-    sec_primary_counts = [len(v) for v in sec_with_primary_candidates.values()]
-    sec_sec_counts = [len(v) for v in sec_with_sec_candidates.values()]
-    if primary_counts:
-        print(f"  From same primary_label:")
-        print(f"    Avg: {sum(primary_counts)/len(primary_counts):.2f}, "
-              f"Max: {max(primary_counts)}, Min: {min(primary_counts)}")
-    if sec_primary_counts:
-        print(f"  From secondary_label with other primary_label:")
-        print(f"    Avg: {sum(sec_primary_counts)/len(sec_primary_counts):.2f}, "
-              f"Max: {max(sec_primary_counts)}, Min: {min(sec_primary_counts)}")
-    if sec_sec_counts:
-        print(f"  From secondary_label with other secondary_label:")
-        print(f"    Avg: {sum(sec_sec_counts)/len(sec_sec_counts):.2f}, "
-              f"Max: {max(sec_sec_counts)}, Min: {min(sec_sec_counts)}")
-
-    # 对候选集做一次 candidate pairs 去重分析
-    analyze_candidate_pairs(node_candidates, label="after candidate mining")
-
-    return node_candidates
+    return node_candidates, primary_only_candidates, sec_with_primary_candidates, sec_with_sec_candidates
 
 
 def analyze_candidate_pairs(node_candidates: dict[int, list[int]], label: str = ""):
@@ -654,54 +706,52 @@ Your output (JSON object only):"""
         return filtered_output
 
 
-async def judge_edge_async(node_func, candidate_func):
-    """
-    使用 LLM 判断是否应该建立从 node_func 到 candidate_func 的有向边
+def _candidate_description(candidate_schema: Dict) -> str:
+    return (
+        f"- Name: {candidate_schema.get('name', 'Unknown')}\n"
+        f"- Description: {candidate_schema.get('description', '')}\n"
+        f"- Input Parameters: {json.dumps(candidate_schema.get('parameters', {}), indent=2, ensure_ascii=False)}"
+    )
 
-    Args:
-        node_func: dict, 源函数（node function）
-        candidate_func: dict, 目标函数（candidate function）
 
-    Returns:
-        dict: 包含判断结果的字典
-            - has_edge: bool, 是否应该有边
-            - confidence: float, 置信度
-            - reasoning: str, 判断理由
-            - dependency_type: str, 依赖类型（full/partial/prerequisite/none）
-            - param_mapping: dict, 参数映射关系（对于 data dependency）
+def _build_judge_request(node_name: str, node_desc: str, output_schema_for_llm: Dict, candidate_schemas: List[Dict]) -> Dict:
     """
-    node_schema = node_func.get('function_schema', {}).get('function', {})
-    candidate_schema = candidate_func.get('function_schema', {}).get('function', {})
+    judge_edge_async / judge_edges_batch_async 共用的请求参数。
 
-    node_name = node_schema.get('name', 'Unknown')
-    node_desc = node_schema.get('description', '')
-    node_params = node_schema.get('parameters', {})
-    node_output_schema = node_func.get('output_schema',{})
-    candidate_name = candidate_schema.get('name', 'Unknown')
-    candidate_desc = candidate_schema.get('description', '')
-    candidate_params = candidate_schema.get('parameters', {})
-
-    # 先过滤输出参数
-    filtered_output_schema = await filter_output_params_async(node_name, node_params, node_output_schema)
-
-    # 构建只包含 fields 的 schema 用于传递给 LLM（不包含过滤元数据）
-    output_schema_for_llm = {'fields': filtered_output_schema.get('fields', [])}
+    node 描述、判断场景、输出格式和请求参数两者相同；只有一个 candidate 时是单对判断的提示词，
+    多个 candidate 时每个 candidate 一个 "### CANDIDATE k" 段落，要求按同样的格式逐块输出
+    """
+    if len(candidate_schemas) == 1:
+        task = "Determine if there should be a directed edge from the node function to the candidate function."
+        candidates_text = "Candidate Function (Target):\n" + _candidate_description(candidate_schemas[0])
+        analyze = "Analyze whether"
+        output_header = "Your output MUST be in the following format:\n"
+    else:
+        task = (
+            "For EACH candidate function below, determine if there should be a directed edge from the node function "
+            "to that candidate function. Judge every candidate independently."
+        )
+        candidates_text = "Candidate Functions (Targets):\n" + "\n\n".join(
+            f"### CANDIDATE {k}\n{_candidate_description(schema)}"
+            for k, schema in enumerate(candidate_schemas, start=1)
+        )
+        analyze = "For each candidate, analyze whether"
+        output_header = (
+            "Your output MUST contain exactly one block per candidate, in order, each in the following format:\n"
+            "### CANDIDATE [k]\n"
+        )
 
-    # 构建提示词
-    prompt = f"""You are an expert in analyzing function dependencies. Determine if there should be a directed edge from the node function to the candidate function.
+    prompt = f"""You are an expert in analyzing function dependencies. {task}
 
 Node Function (Source):
 - Name: {node_name}
 - Description: {node_desc}
 - Output Schema (already filtered, excluding pass-through params): {json.dumps(output_schema_for_llm, indent=2, ensure_ascii=False)}
 
-Candidate Function (Target):
-- Name: {candidate_name}
-- Description: {candidate_desc}
-- Input Parameters: {json.dumps(candidate_params, indent=2, ensure_ascii=False)}
+{candidates_text}
 
 
-Analyze whether there should be a directed edge from node function to candidate function. Consider the following scenarios:
+{analyze} there should be a directed edge from node function to candidate function. Consider the following scenarios:
 
 1. **Data Dependency**: Can the node function's filtered output be used as part or all of the candidate function's input?
    - Example: node function returns a file path, candidate function needs that path as input
@@ -716,8 +766,7 @@ A directed edge should exist if:
 - The node function's filtered output can be used as input for the candidate function (data dependency), OR
 - The node function's output determines whether it's appropriate/safe to call the candidate function (prerequisite dependency)
 
-Your output MUST be in the following format:
-HAS_EDGE: [true/false]
+{output_header}HAS_EDGE: [true/false]
 DEPENDENCY_TYPE: [full/partial/prerequisite/none]
 PARAM_MAPPING: [JSON object mapping node output params to candidate input params, or "NONE" if no data dependency]
 REASONING: [detailed explanation]
@@ -732,53 +781,73 @@ REASONING: [detailed explanation]
 - REASONING: explain your thinking process, including which output parameters you used and how they map to candidate input parameters.
 """
 
+    return dict(
+        model=DEFAULT_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert analyst specializing in determining function dependencies and data flow."},
+            {"role": "user", "content": prompt},
+        ],
+        stream=False,
+        temperature=0.3,
+        # 每个 candidate 的输出预算相同
+        max_completion_tokens=1024 * len(candidate_schemas)
+    )
+
+
+async def _filter_node_output(node_func, filter_cache: FilterOutputCache | None) -> Dict:
+    """过滤 node 的输出参数（同一个 node 的过滤结果可以复用）"""
+    node_schema = node_func.get('function_schema', {}).get('function', {})
+    node_name = node_schema.get('name', 'Unknown')
+    node_params = node_schema.get('parameters', {})
+    node_output_schema = node_func.get('output_schema',{})
+    if filter_cache is not None:
+        return await filter_cache.get_or_compute(node_name, node_params, node_output_schema)
+    return await filter_output_params_async(node_name, node_params, node_output_schema)
+
+
+async def judge_edge_async(node_func, candidate_func, filter_cache: FilterOutputCache | None = None):
+    """
+    使用 LLM 判断是否应该建立从 node_func 到 candidate_func 的有向边
+
+    Args:
+        node_func: dict, 源函数（node function）
+        candidate_func: dict, 目标函数（candidate function）
+        filter_cache: FilterOutputCache | None, node 输出过滤结果的缓存（None 表示每次都调用 LLM）
+
+    Returns:
+        dict: 包含判断结果的字典
+            - has_edge: bool, 是否应该有边
+            - confidence: float, 置信度
+            - reasoning: str, 判断理由
+            - dependency_type: str, 依赖类型（full/partial/prerequisite/none）
+            - param_mapping: dict, 参数映射关系（对于 data dependency）
+    """
+    node_schema = node_func.get('function_schema', {}).get('function', {})
+    candidate_schema = candidate_func.get('function_schema', {}).get('function', {})
+
+    filtered_output_schema = await _filter_node_output(node_func, filter_cache)
+
+    # 构建只包含 fields 的 schema 用于传递给 LLM（不包含过滤元数据）
+    output_schema_for_llm = {'fields': filtered_output_schema.get('fields', [])}
+
+    request = _build_judge_request(
+        node_schema.get('name', 'Unknown'), node_schema.get('description', ''), output_schema_for_llm, [candidate_schema]
+    )
+    completion = None
     try:
-        completion = await async_client.chat.completions.create(
-            model=DEFAULT_MODEL,
-            messages=[
-                {"role": "system", "content": "You are an expert analyst specializing in determining function dependencies and data flow."},
-                {"role": "user", "content": prompt},
-            ],
-            stream=False,
-            temperature=0.3,
-            max_completion_tokens=1024
-        )
+        completion = await async_client.chat.completions.create(**request)
 
         response_text = completion.choices[0].message.content
 
-        # 解析响应
-        has_edge = False
-        confidence = 0.0
-        dependency_type = "none"
-        reasoning = ""
-        param_mapping = {}
-
-        lines = response_text.split('\n')
-        for line in lines:
-            line_upper = line.upper().strip()
-            if line_upper.startswith('HAS_EDGE:'):
-                value = line.split(':', 1)[1].strip() if ':' in line else ""
-                has_edge = value.lower() in ['true', 'yes', '1', 'y']
-            elif line_upper.startswith('CONFIDENCE:'):
-                value = line.split(':', 1)[1].strip() if ':' in line else "0.0"
-                try:
-                    confidence = float(value)
-                except ValueError:
-                    confidence = 0.0
-            elif line_upper.startswith('DEPENDENCY_TYPE:'):
-                value = line.split(':', 1)[1].strip() if ':' in line else "none"
-                dependency_type = value.lower()
-            elif line_upper.startswith('PARAM_MAPPING:'):
-                value = line.split(':', 1)[1].strip() if ':' in line else "NONE"
-                if value.upper() != "NONE":
-                    try:
-                        param_mapping = json.loads(value)
-                    except json.JSONDecodeError:
-                        param_mapping = {}
-                else:
-                    param_mapping = {}
-            elif line_upper.startswith('REASONING:'):
-                reasoning = line.split(':', 1)[1].strip() if ':' in line else ""
+        # 解析响应；解析失败的回复从 LLM 缓存中删除，重跑时重新请求
+        judgment, parse_errors = parse_edge_judgment(response_text)
+        if parse_errors:
+            async_client.invalidate(**request)
+        has_edge = judgment['has_edge']
+        confidence = judgment['confidence']
+        dependency_type = judgment['dependency_type']
+        param_mapping = judgment['param_mapping']
+        reasoning = judgment['reasoning']
 
         token_usage = {
             'prompt_tokens': completion.usage.prompt_tokens,
@@ -799,6 +868,8 @@ REASONING: [detailed explanation]
         }
 
     except Exception as e:
+        if completion is not None:
+            async_client.invalidate(**request)
         return {
             'has_edge': False,
             'confidence': 0.0,
@@ -810,15 +881,129 @@ REASONING: [detailed explanation]
         }
 
 
-async def build_graph_v1(nodes, sampled_candidates, batch_size=10, progress_file=None):
+async def judge_edges_batch_async(node_func, candidate_funcs, filter_cache: FilterOutputCache | None = None):
+    """
+    在一次请求中判断 node_func 到多个 candidate 的有向边（node 描述和过滤后的输出 schema 只出现一次）
+
+    每个 candidate 对应输出中的一个 "### CANDIDATE k" 块，块内格式与 judge_edge_async 相同。
+    任何解析失败的块（缺失、缺少 HAS_EDGE、PARAM_MAPPING 不是合法 JSON）会回退到 judge_edge_async 单独判断。
+
+    Args:
+        node_func: dict, 源函数（node function）
+        candidate_funcs: list, 目标函数列表
+        filter_cache: FilterOutputCache | None, node 输出过滤结果的缓存
+
+    Returns:
+        list: 与 candidate_funcs 一一对应的判断结果，格式与 judge_edge_async 相同；
+            token_usage 为本次批量请求按 candidate 平均分摊的部分（回退时再加上单独判断的消耗）
+    """
+    if len(candidate_funcs) == 1:
+        return [await judge_edge_async(node_func, candidate_funcs[0], filter_cache=filter_cache)]
+
+    node_schema = node_func.get('function_schema', {}).get('function', {})
+    node_name = node_schema.get('name', 'Unknown')
+
+    filtered_output_schema = await _filter_node_output(node_func, filter_cache)
+
+    output_schema_for_llm = {'fields': filtered_output_schema.get('fields', [])}
+
+    request = _build_judge_request(
+        node_name, node_schema.get('description', ''), output_schema_for_llm,
+        [candidate_func.get('function_schema', {}).get('function', {}) for candidate_func in candidate_funcs],
+    )
+    try:
+        completion = await async_client.chat.completions.create(**request)
+        response_text = completion.choices[0].message.content or ""
+        token_usage = {
+            'prompt_tokens': completion.usage.prompt_tokens,
+            'completion_tokens': completion.usage.completion_tokens,
+            'total_tokens': completion.usage.total_tokens
+        }
+    except Exception as e:
+        print(f"Warning: batched judge failed for {node_name}, falling back to single-pair judging: {e}")
+        response_text = ""
+        token_usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+    def make_result(i, judgment, token_share):
+        return {
+            **judgment,
+            'token_usage': token_share,
+            'node_func': node_func['function_schema'],
+            'candidate_func': candidate_funcs[i]['function_schema'],
+            'filtered_output_schema': copy.deepcopy(filtered_output_schema),
+        }
+
+    # 解析失败的块回退到单独判断（有 filter_cache 时 filter 结果直接命中缓存）
+    async def judge_single(i):
+        return await judge_edge_async(node_func, candidate_funcs[i], filter_cache=filter_cache)
+
+    # 有块缺失或解析失败时不让这次批量回复留在 LLM 缓存里
+    results = await assemble_batch_results(
+        response_text, token_usage, len(candidate_funcs), make_result, judge_single,
+        on_parse_error=lambda: async_client.invalidate(**request),
+    )
+    return results
+
+
+def node_fingerprint(node: Dict) -> str:
+    """
+    node 内容的指纹（function_schema + classification + output_schema），用于增量更新时识别新增/修改的 tool
+    """
+    payload = json.dumps(
+        {
+            'function_schema': node.get('function_schema', {}),
+            'classification': node.get('classification', {}),
+            'output_schema': node.get('output_schema') or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def graph_node_record(index: int, node: Dict) -> Dict:
+    """
+    graph JSON 中的 node 记录
+
+    - index: 在本版本 graph 中的位置（edges 的 source/target 使用 index）
+    - id: 稳定的 node ID（function name），跨版本不变
+    - fingerprint: node_fingerprint，增量更新时用于判断 node 是否变化
+    """
+    return {
+        'index': index,
+        'id': node.get('function_schema', {}).get('function', {}).get('name', ''),
+        'fingerprint': node_fingerprint(node),
+        'function_schema': node['function_schema'],
+        'classification': node.get('classification', {}),
+    }
+
+
+async def build_graph_v1(
+    nodes,
+    sampled_candidates,
+    batch_size=10,
+    progress_file=None,
+    filter_cache_file=None,
+    compact_every=50,
+    max_concurrency=None,
+    max_tokens_per_minute=None,
+    static_matcher: StaticSchemaMatcher | None = None,
+    judge_batch_size=1,
+):
     """
     构建 graph v1.0.0，支持增量保存和断点续传
 
     Args:
         nodes: list, 节点列表
         sampled_candidates: dict, {node_index: [candidate_indices]}
-        batch_size: int, 批处理大小
+        batch_size: int, checkpoint 和早停的粒度（每完成 batch_size 个 pair 保存一次；连续 batch_size 个失败则早停）
         progress_file: str, 进度文件路径（用于断点续传和增量保存）
+        filter_cache_file: str, node 输出过滤结果的持久化缓存文件（JSONL），None 表示只在内存中缓存
+        compact_every: int, 每隔多少个 batch 把 journal 合并成完整的 progress 文件（0 表示只在结束时合并）
+        max_concurrency: int, 同时在飞的 LLM 判断请求数（默认等于 batch_size）
+        max_tokens_per_minute: int, 可选的 TPM 限制（None 表示不限制）
+        static_matcher: StaticSchemaMatcher | None, 静态 schema 预筛（None 表示所有 pair 都交给 LLM 判断）
+        judge_batch_size: int, 一次 LLM 请求判断同一个 node 的多少个 candidate（1 表示逐个判断）
 
     Returns:
         dict: 图的结构，包含 nodes 和 edges
@@ -833,10 +1018,15 @@ async def build_graph_v1(nodes, sampled_candidates, batch_size=10, progress_file
     total_prompt_tokens = 0
     total_completion_tokens = 0
     total_tokens = 0
+    # 批量 judge 时一次请求判断多个 pair：successful_calls 计成功的 LLM 请求数，judged_pairs 计由 LLM 判断完的 pair 数
     successful_calls = 0
+    judged_pairs = 0
 
     print(f"Total candidate pairs to evaluate: {total_pairs}")
 
+    # 每个 node 的输出过滤结果只需计算一次，所有 candidate 共享
+    filter_cache = FilterOutputCache(filter_cache_file, compute=filter_output_params_async, model=DEFAULT_MODEL)
+
     # 收集所有需要判断的边
     edge_tasks = []
     for node_idx, candidate_indices in sampled_candidates.items():
@@ -846,64 +1036,66 @@ async def build_graph_v1(nodes, sampled_candidates, batch_size=10, progress_file
             edge_tasks.append((node_idx, candidate_idx, node_func, candidate_func))
 
     # 检查是否有进度文件（断点续传）
+    # 进度由 snapshot（progress_file）+ 追加式 journal 组成，每个 batch 只追加本 batch 的结果
+    journal = ProgressJournal(progress_file, compact_every=compact_every) if progress_file else None
     processed_pairs = set()
     previous_processed_batches = 0  # 记录之前已经处理的批次数量（用于累加）
-    if progress_file and os.path.exists(progress_file):
+    if journal and journal.exists():
         print(f"\n==> Found progress file: {progress_file}")
         print("==> Loading previously processed pairs...")
         try:
-            with open(progress_file, 'r', encoding='utf-8') as f:
-                progress_data = json.load(f)
-                # 恢复之前的结果
-                edges = progress_data.get('edges', [])
-                edge_details = progress_data.get('edge_details', [])
-                stats = progress_data.get('token_usage_summary', {})
-                total_prompt_tokens = stats.get('total_prompt_tokens', 0)
-                total_completion_tokens = stats.get('total_completion_tokens', 0)
-                total_tokens = stats.get('total_tokens', 0)
-                successful_calls = stats.get('successful_calls', 0)
-                
-                # 恢复之前已经处理的批次数量（用于累加）
-                progress_info = progress_data.get('progress', {})
-                previous_processed_batches = progress_info.get('processed_batches', 0)
-
-                # 恢复已处理的pairs（所有的，不只是有边的）
-                processed_pairs_list = progress_data.get('processed_pairs', [])
-                processed_pairs_raw = set(tuple(pair) for pair in processed_pairs_list)
-                
-                # 构建 function name -> index 的映射（用于验证和转换）
-                name_to_index = {}
-                for idx, node in enumerate(nodes):
-                    func_name = node.get('function_schema', {}).get('function', {}).get('name', '')
-                    if func_name:
-                        name_to_index[func_name] = idx
-                
-                # 如果有保存的 function name pairs，优先使用（向后兼容）
-                processed_pairs_by_name = progress_data.get('processed_pairs_by_name', [])
-                if processed_pairs_by_name:
-                    # 通过 function name 转换索引
-                    processed_pairs = set()
-                    for pair_names in processed_pairs_by_name:
-                        if len(pair_names) == 2:
-                            node_name, candidate_name = pair_names
-                            node_idx = name_to_index.get(node_name)
-                            candidate_idx = name_to_index.get(candidate_name)
-                            if node_idx is not None and candidate_idx is not None:
-                                processed_pairs.add((node_idx, candidate_idx))
-                    print(f"==> Converted {len(processed_pairs)} pairs from function names")
-                else:
-                    # 使用索引，但验证有效性
-                    num_nodes = len(nodes)
-                    valid_pairs = set()
-                    for pair in processed_pairs_raw:
-                        if len(pair) == 2:
-                            node_idx, candidate_idx = pair
-                            # 验证索引是否在有效范围内
-                            if 0 <= node_idx < num_nodes and 0 <= candidate_idx < num_nodes:
-                                valid_pairs.add(pair)
-                    processed_pairs = valid_pairs
-                    if len(processed_pairs) < len(processed_pairs_raw):
-                        print(f"==> Warning: {len(processed_pairs_raw) - len(processed_pairs)} pairs have invalid indices (likely due to node order change)")
+            progress_data = journal.load()
+            # 恢复之前的结果
+            edges = progress_data.get('edges', [])
+            edge_details = progress_data.get('edge_details', [])
+            stats = progress_data.get('token_usage_summary', {})
+            total_prompt_tokens = stats.get('total_prompt_tokens', 0)
+            total_completion_tokens = stats.get('total_completion_tokens', 0)
+            total_tokens = stats.get('total_tokens', 0)
+            successful_calls = stats.get('successful_calls', 0)
+            judged_pairs = stats.get('judged_pairs', successful_calls)
+            
+            # 恢复之前已经处理的批次数量（用于累加）
+            progress_info = progress_data.get('progress', {})
+            previous_processed_batches = progress_info.get('processed_batches', 0)
+
+            # 恢复已处理的pairs（所有的，不只是有边的）
+            processed_pairs_list = progress_data.get('processed_pairs', [])
+            processed_pairs_raw = set(tuple(pair) for pair in processed_pairs_list)
+            
+            # 构建 function name -> index 的映射（用于验证和转换）
+            name_to_index = {}
+            for idx, node in enumerate(nodes):
+                func_name = node.get('function_schema', {}).get('function', {}).get('name', '')
+                if func_name:
+                    name_to_index[func_name] = idx
+            
+            # 如果有保存的 function name pairs，优先使用（向后兼容）
+            processed_pairs_by_name = progress_data.get('processed_pairs_by_name', [])
+            if processed_pairs_by_name:
+                # 通过 function name 转换索引
+                processed_pairs = set()
+                for pair_names in processed_pairs_by_name:
+                    if len(pair_names) == 2:
+                        node_name, candidate_name = pair_names
+                        node_idx = name_to_index.get(node_name)
+                        candidate_idx = name_to_index.get(candidate_name)
+                        if node_idx is not None and candidate_idx is not None:
+                            processed_pairs.add((node_idx, candidate_idx))
+                print(f"==> Converted {len(processed_pairs)} pairs from function names")
+            else:
+                # 使用索引，但验证有效性
+                num_nodes = len(nodes)
+                valid_pairs = set()
+                for pair in processed_pairs_raw:
+                    if len(pair) == 2:
+                        node_idx, candidate_idx = pair
+                        # 验证索引是否在有效范围内
+                        if 0 <= node_idx < num_nodes and 0 <= candidate_idx < num_nodes:
+                            valid_pairs.add(pair)
+                processed_pairs = valid_pairs
+                if len(processed_pairs) < len(processed_pairs_raw):
+                    print(f"==> Warning: {len(processed_pairs_raw) - len(processed_pairs)} pairs have invalid indices (likely due to node order change)")
 
             print(f"==> Resumed: {len(processed_pairs)} pairs already processed, {len(edges)} edges found")
         except Exception as e:
@@ -936,203 +1128,308 @@ async def build_graph_v1(nodes, sampled_candidates, batch_size=10, progress_file
         # 更新processed_pairs为只包含有效的pairs（用于后续保存，避免累积无效数据）
         processed_pairs = valid_processed_pairs
 
+    # 静态 schema 预筛（不调用 LLM）：低分 pair 直接跳过，所有 required 参数都能精确匹配的 pair 直接建边
+    # 跳过的 pair 不写入进度，resume 时会重新（确定性地）打分
+    static_summary = {}
+    if static_matcher is not None and edge_tasks:
+        edge_tasks, static_accepted, static_skipped = static_matcher.partition(edge_tasks)
+        static_records = []
+        for (node_idx, candidate_idx, node_func, candidate_func), match in static_accepted:
+            edge = {
+                'source': node_idx,
+                'target': candidate_idx,
+                'confidence': match['score'],
+                'dependency_type': match['dependency_type'],
+                'param_mapping': match['param_mapping']
+            }
+            edge_detail = {
+                'source': node_idx,
+                'target': candidate_idx,
+                'source_name': node_func['function_schema']['function'].get('name', ''),
+                'target_name': candidate_func['function_schema']['function'].get('name', ''),
+                'confidence': match['score'],
+                'dependency_type': match['dependency_type'],
+                'param_mapping': match['param_mapping'],
+                'filtered_output_schema': {},
+                'reasoning': 'Static schema match: every required input is covered by an output field with the same normalized name and a compatible type',
+                'token_usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                'match_source': 'static_schema',
+            }
+            edges.append(edge)
+            edge_details.append(edge_detail)
+            processed_pairs.add((node_idx, candidate_idx))
+            static_records.append({
+                'pair': [node_idx, candidate_idx],
+                'pair_names': [edge_detail['source_name'], edge_detail['target_name']],
+                'token_usage': edge_detail['token_usage'],
+                'edge': edge,
+                'edge_detail': edge_detail,
+                'source': 'static',
+            })
+        if journal and static_records:
+            try:
+                journal.append_batch(static_records)
+            except Exception as e:
+                print(f"Warning: Failed to save static matches: {e}")
+        static_summary = static_matcher.summary()
+        print(f"==> Static schema prefilter: skipped {len(static_skipped)}, accepted {len(static_accepted)}, "
+              f"{len(edge_tasks)} pairs left for LLM judgment")
+
     if not edge_tasks:
         print("==> All pairs already processed!")
         # 直接返回已有结果
         token_summary = {
             'successful_calls': successful_calls,
+            'judged_pairs': judged_pairs,
             'total_prompt_tokens': total_prompt_tokens,
             'total_completion_tokens': total_completion_tokens,
             'total_tokens': total_tokens,
             'avg_prompt_tokens_per_call': total_prompt_tokens / successful_calls if successful_calls > 0 else 0.0,
             'avg_completion_tokens_per_call': total_completion_tokens / successful_calls if successful_calls > 0 else 0.0,
             'avg_total_tokens_per_call': total_tokens / successful_calls if successful_calls > 0 else 0.0,
+            'avg_total_tokens_per_pair': total_tokens / judged_pairs if judged_pairs > 0 else 0.0,
+            **filter_cache.summary(),
+            **static_summary,
+            **async_client.cache_summary(),
         }
         return {
             'version': '1.0.0',
             'num_nodes': len(nodes),
             'num_edges': len(edges),
-            'nodes': [
-                {
-                    'index': i,
-                    'function_schema': node['function_schema'],
-                    'classification': node.get('classification', {})
-                }
-                for i, node in enumerate(nodes)
-            ],
+            'nodes': [graph_node_record(i, node) for i, node in enumerate(nodes)],
             'edges': edges,
             'edge_details': edge_details,
             'token_usage_summary': token_summary,
         }
 
-    # 批量处理
-    total_batches = (len(edge_tasks) + batch_size - 1) // batch_size
-    batch_iterator = tqdm(
-        range(0, len(edge_tasks), batch_size),
-        total=total_batches,
-        desc="Judging edges",
-        unit="batch"
-    )
+    def build_progress_snapshot(processed_batches: int) -> Dict[str, Any]:
+        """构建完整的进度 snapshot（compaction 时使用）"""
+        # 构建 function name pairs（用于向后兼容，即使 nodes 顺序变化也能恢复）
+        processed_pairs_by_name = []
+        for node_idx, candidate_idx in processed_pairs:
+            node_name = nodes[node_idx].get('function_schema', {}).get('function', {}).get('name', '')
+            candidate_name = nodes[candidate_idx].get('function_schema', {}).get('function', {}).get('name', '')
+            if node_name and candidate_name:
+                processed_pairs_by_name.append([node_name, candidate_name])
 
-    for i in batch_iterator:
-        batch = edge_tasks[i:i+batch_size]
-        batch_num = i // batch_size + 1
+        return {
+            'version': '1.0.0',
+            'progress': {
+                'processed_batches': processed_batches,  # 累加批次数量
+                'total_batches': (total_pairs + batch_size - 1) // batch_size,
+                'processed_pairs': len(processed_pairs),
+                'total_pairs': total_pairs,
+            },
+            'processed_pairs': list(processed_pairs),  # 保存索引对（向后兼容）
+            'processed_pairs_by_name': processed_pairs_by_name,  # 保存 function name 对（用于索引转换）
+            'edges': edges,
+            'edge_details': edge_details,
+            'token_usage_summary': {
+                'successful_calls': successful_calls,
+                'judged_pairs': judged_pairs,
+                'total_prompt_tokens': total_prompt_tokens,
+                'total_completion_tokens': total_completion_tokens,
+                'total_tokens': total_tokens,
+            }
+        }
 
-        # 创建异步任务
-        tasks = [judge_edge_async(node_func, candidate_func) for _, _, node_func, candidate_func in batch]
-        batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+    def save_batch(records: List[Dict[str, Any]], batch_num: int) -> None:
+        """把一个 batch 的结果追加到 journal（O(batch)），定期 compaction 成完整 snapshot"""
+        if not journal:
+            return
+        try:
+            journal.append_batch(records)
+            if journal.should_compact(batch_num):
+                journal.compact(build_progress_snapshot(previous_processed_batches + batch_num))
+        except Exception as e:
+            tqdm.write(f"Warning: Failed to save progress: {e}")
+
+    # 批量 judge：同一个 node 的 candidate 按 judge_batch_size 分组，一次请求判断一组
+    # （node 描述和过滤后的输出 schema 只发送一次）；judge_batch_size=1 时每个 pair 单独请求
+    judge_groups = []
+    if judge_batch_size > 1:
+        tasks_by_node = defaultdict(list)
+        for task in edge_tasks:
+            tasks_by_node[task[0]].append(task)
+        for node_tasks in tasks_by_node.values():
+            for start in range(0, len(node_tasks), judge_batch_size):
+                judge_groups.append(node_tasks[start:start + judge_batch_size])
+    else:
+        judge_groups = [[task] for task in edge_tasks]
+
+    async def judge_group(group):
+        node_func = group[0][2]
+        if len(group) == 1:
+            return [await judge_edge_async(node_func, group[0][3], filter_cache=filter_cache)]
+        return await judge_edges_batch_async(node_func, [task[3] for task in group], filter_cache=filter_cache)
+
+    # 滑动窗口调度：始终保持 max_concurrency 个判断请求（每个请求一组 pair）在飞，不再等待整个 batch 的最慢请求。
+    # batch_size 仍然是 checkpoint 和早停的粒度：每完成 batch_size 个 pair 追加一次 journal；
+    # 连续 batch_size 个 pair 全部失败时早停（等价于原来「整个 batch 都失败」）
+    scheduler = SlidingWindowScheduler(
+        max_concurrency=max_concurrency or batch_size,
+        max_tokens_per_minute=max_tokens_per_minute,
+        # judge_group 返回一组 pair 的结果列表，TPM 按整组的 token 计
+        token_counter=batch_token_counter,
+    )
+    total_batches = (len(edge_tasks) + batch_size - 1) // batch_size
+    progress_bar = tqdm(total=len(edge_tasks), desc="Judging edges", unit="pair")
 
-        # 统计这个batch中成功处理的数量（用于早停检测）
-        batch_success_count = 0
+    batch_num = 0
+    batch_done = 0  # 当前 batch 已完成的 pair 数（成功 + 失败）
+    batch_records = []  # 当前 batch 成功处理的 pair 记录（追加到 journal）
+    consecutive_failed_tasks = []  # 连续失败的 pair（用于早停检测）
 
-        # 处理结果
-        for idx, result in enumerate(batch_results):
-            node_idx, candidate_idx, _, _ = batch[idx]
+    async for group, group_results in scheduler.run(judge_groups, judge_group):
+        if isinstance(group_results, Exception):
+            group_results = [group_results] * len(group)
+        for task, result in zip(group, group_results):
+            node_idx, candidate_idx, _, _ = task
+            progress_bar.update(1)
+            batch_done += 1
 
             # 检查是否是异常类型
             if isinstance(result, Exception):
                 tqdm.write(f"  Error judging edge {node_idx} -> {candidate_idx}: {str(result)}")
                 # 出错的pair不记录到processed_pairs，下次重启时会重试
-                continue
-
+                consecutive_failed_tasks.append(task)
             # 检查是否是函数内部捕获的错误（reasoning 以 "Error:" 开头）
-            reasoning = result.get('reasoning', '')
-            if reasoning.startswith('Error:'):
-                tqdm.write(f"  Error in judge_edge_async for {node_idx} -> {candidate_idx}: {reasoning}")
-                # 出错的pair不记录到processed_pairs，下次重启时会重试
-                continue
-
+            elif result.get('reasoning', '').startswith('Error:'):
+                tqdm.write(f"  Error in judge_edge_async for {node_idx} -> {candidate_idx}: {result.get('reasoning', '')}")
+                consecutive_failed_tasks.append(task)
             # 检查 filter 过程是否出错
-            filtered_schema = result.get('filtered_output_schema', {})
-            filter_reasoning = filtered_schema.get('filter_reasoning', '')
-            if filter_reasoning.startswith('Error occurred:'):
+            elif result.get('filtered_output_schema', {}).get('filter_reasoning', '').startswith('Error occurred:'):
+                filter_reasoning = result.get('filtered_output_schema', {}).get('filter_reasoning', '')
                 tqdm.write(f"  Error in filter_output_params for {node_idx} -> {candidate_idx}: {filter_reasoning}")
-                # 出错的pair不记录到processed_pairs，下次重启时会重试
-                continue
-
-            # 成功处理（无论是否有边）
-            batch_success_count += 1
-
-            # 记录已成功处理的pair（无论是否有边）
-            processed_pairs.add((node_idx, candidate_idx))
-
-            # 累计 token 使用（无论是否判定为有边）
-            tu = result.get('token_usage', {}) or {}
-            total_prompt_tokens += tu.get('prompt_tokens', 0)
-            total_completion_tokens += tu.get('completion_tokens', 0)
-            total_tokens += tu.get('total_tokens', 0)
-            successful_calls += 1
-
-            if result.get('has_edge', False):
-                edges.append({
-                    'source': node_idx,
-                    'target': candidate_idx,
-                    'confidence': result.get('confidence', 0.0),
-                    'dependency_type': result.get('dependency_type', 'none'),
-                    'param_mapping': result.get('param_mapping', {})
-                })
-                edge_details.append({
-                    'source': node_idx,
-                    'target': candidate_idx,
-                    'source_name': nodes[node_idx]['function_schema']['function'].get('name', ''),
-                    'target_name': nodes[candidate_idx]['function_schema']['function'].get('name', ''),
-                    'confidence': result.get('confidence', 0.0),
-                    'dependency_type': result.get('dependency_type', 'none'),
-                    'param_mapping': result.get('param_mapping', {}),
-                    'filtered_output_schema': result.get('filtered_output_schema', {}),
-                    'reasoning': result.get('reasoning', ''),
-                    'token_usage': tu
+                consecutive_failed_tasks.append(task)
+            else:
+                # 成功处理（无论是否有边）
+                consecutive_failed_tasks.clear()
+
+                # 记录已成功处理的pair（无论是否有边）
+                processed_pairs.add((node_idx, candidate_idx))
+
+                # 累计 token 使用（无论是否判定为有边）
+                tu = result.get('token_usage', {}) or {}
+                total_prompt_tokens += tu.get('prompt_tokens', 0)
+                total_completion_tokens += tu.get('completion_tokens', 0)
+                total_tokens += tu.get('total_tokens', 0)
+                # 批量请求只计在组内第一个结果上（见 assemble_batch_results）；单独判断的结果没有该字段，计 1 次
+                judge_requests = result.get('judge_requests', 1)
+                successful_calls += judge_requests
+                judged_pairs += 1
+
+                edge = None
+                edge_detail = None
+                if result.get('has_edge', False):
+                    edge = {
+                        'source': node_idx,
+                        'target': candidate_idx,
+                        'confidence': result.get('confidence', 0.0),
+                        'dependency_type': result.get('dependency_type', 'none'),
+                        'param_mapping': result.get('param_mapping', {})
+                    }
+                    edge_detail = {
+                        'source': node_idx,
+                        'target': candidate_idx,
+                        'source_name': nodes[node_idx]['function_schema']['function'].get('name', ''),
+                        'target_name': nodes[candidate_idx]['function_schema']['function'].get('name', ''),
+                        'confidence': result.get('confidence', 0.0),
+                        'dependency_type': result.get('dependency_type', 'none'),
+                        'param_mapping': result.get('param_mapping', {}),
+                        'filtered_output_schema': result.get('filtered_output_schema', {}),
+                        'reasoning': result.get('reasoning', ''),
+                        'token_usage': tu
+                    }
+                    edges.append(edge)
+                    edge_details.append(edge_detail)
+
+                batch_records.append({
+                    'pair': [node_idx, candidate_idx],
+                    'pair_names': [
+                        nodes[node_idx].get('function_schema', {}).get('function', {}).get('name', ''),
+                        nodes[candidate_idx].get('function_schema', {}).get('function', {}).get('name', ''),
+                    ],
+                    'token_usage': tu,
+                    'judge_requests': judge_requests,
+                    'edge': edge,
+                    'edge_detail': edge_detail,
                 })
 
-        # 早停机制：如果这个batch的所有任务都失败了，停止程序
-        if batch_success_count == 0:
-            error_msg = f"\n{'='*80}\nEARLY STOP: All tasks in batch {batch_num} failed!\n{'='*80}"
-            tqdm.write(error_msg)
-            print(error_msg)
-            print(f"Batch size: {len(batch)}")
-            print(f"Successful tasks: {batch_success_count}")
-            print(f"Failed tasks: {len(batch)}")
-            print("\nThis indicates a critical issue (API down, rate limit, network error, etc.)")
-            print("Please check the error messages above and fix the issue before retrying.")
-
-            # 打印失败batch中的所有函数对
-            print("\n" + "="*80)
-            print("Failed batch details:")
-            print("="*80)
-            for idx, (node_idx, candidate_idx, node_func, candidate_func) in enumerate(batch):
-                node_name = node_func.get('function_schema', {}).get('function', {}).get('name', 'Unknown')
-                candidate_name = candidate_func.get('function_schema', {}).get('function', {}).get('name', 'Unknown')
-                print(f"\nTask {idx + 1}:")
-                print(f"  Node (source): [{node_idx}] {node_name}")
-                print(f"  Candidate (target): [{candidate_idx}] {candidate_name}")
-            print("="*80 + "\n")
-
-            assert False, "All tasks in current batch failed - stopping execution"
-
-        # 每个batch完成后，写入进度文件（增量保存）
-        if progress_file:
-            # 构建 function name pairs（用于向后兼容，即使 nodes 顺序变化也能恢复）
-            processed_pairs_by_name = []
-            for node_idx, candidate_idx in processed_pairs:
-                node_name = nodes[node_idx].get('function_schema', {}).get('function', {}).get('name', '')
-                candidate_name = nodes[candidate_idx].get('function_schema', {}).get('function', {}).get('name', '')
-                if node_name and candidate_name:
-                    processed_pairs_by_name.append([node_name, candidate_name])
-            
-            progress_data = {
-                'version': '1.0.0',
-                'progress': {
-                    'processed_batches': previous_processed_batches + batch_num,  # 累加批次数量
-                    'total_batches': (total_pairs + batch_size - 1) // batch_size,
-                    'processed_pairs': len(processed_pairs),
-                    'total_pairs': total_pairs,
-                },
-                'processed_pairs': list(processed_pairs),  # 保存索引对（向后兼容）
-                'processed_pairs_by_name': processed_pairs_by_name,  # 保存 function name 对（用于索引转换）
-                'edges': edges,
-                'edge_details': edge_details,
-                'token_usage_summary': {
-                    'successful_calls': successful_calls,
-                    'total_prompt_tokens': total_prompt_tokens,
-                    'total_completion_tokens': total_completion_tokens,
-                    'total_tokens': total_tokens,
-                }
-            }
-            try:
-                os.makedirs(os.path.dirname(progress_file), exist_ok=True)
-                with open(progress_file, 'w', encoding='utf-8') as f:
-                    json.dump(progress_data, f, indent=2, ensure_ascii=False)
-            except Exception as e:
-                tqdm.write(f"Warning: Failed to save progress: {e}")
-
-        batch_iterator.set_postfix_str(f"batch={batch_num}/{total_batches}, edges={len(edges)}")
-
-    batch_iterator.close()
+            # 早停机制：如果连续 batch_size 个任务都失败了，停止程序
+            if len(consecutive_failed_tasks) >= min(batch_size, len(edge_tasks)):
+                scheduler.stop()
+                progress_bar.close()
+                # 先保存已经成功的结果
+                if batch_records:
+                    save_batch(batch_records, batch_num + 1)
+
+                error_msg = f"\n{'='*80}\nEARLY STOP: {len(consecutive_failed_tasks)} consecutive tasks failed!\n{'='*80}"
+                tqdm.write(error_msg)
+                print(error_msg)
+                print(f"Batch size: {batch_size}")
+                print(f"Failed tasks: {len(consecutive_failed_tasks)}")
+                print("\nThis indicates a critical issue (API down, rate limit, network error, etc.)")
+                print("Please check the error messages above and fix the issue before retrying.")
+
+                # 打印连续失败的所有函数对
+                print("\n" + "="*80)
+                print("Failed batch details:")
+                print("="*80)
+                for idx, (node_idx, candidate_idx, node_func, candidate_func) in enumerate(consecutive_failed_tasks):
+                    node_name = node_func.get('function_schema', {}).get('function', {}).get('name', 'Unknown')
+                    candidate_name = candidate_func.get('function_schema', {}).get('function', {}).get('name', 'Unknown')
+                    print(f"\nTask {idx + 1}:")
+                    print(f"  Node (source): [{node_idx}] {node_name}")
+                    print(f"  Candidate (target): [{candidate_idx}] {candidate_name}")
+                print("="*80 + "\n")
+
+                assert False, "All tasks in current batch failed - stopping execution"
+
+            # 每完成 batch_size 个 pair 做一次 checkpoint
+            if batch_done >= batch_size:
+                batch_num += 1
+                save_batch(batch_records, batch_num)
+                batch_done = 0
+                batch_records = []
+                progress_bar.set_postfix_str(f"batch={batch_num}/{total_batches}, edges={len(edges)}")
+
+    if batch_done > 0:
+        batch_num += 1
+        save_batch(batch_records, batch_num)
+
+    progress_bar.close()
+    print(f"Scheduler stats: {scheduler.summary()}")
+
+    # 运行结束时做一次 compaction，progress_file 中保存完整状态
+    if journal:
+        try:
+            journal.compact(build_progress_snapshot(previous_processed_batches + batch_num))
+        except Exception as e:
+            print(f"Warning: Failed to compact progress journal: {e}")
     
     # 构建图结构
     # 统计整体 token 使用
     token_summary = {
         'successful_calls': successful_calls,
+        'judged_pairs': judged_pairs,
         'total_prompt_tokens': total_prompt_tokens,
         'total_completion_tokens': total_completion_tokens,
         'total_tokens': total_tokens,
         'avg_prompt_tokens_per_call': total_prompt_tokens / successful_calls if successful_calls > 0 else 0.0,
         'avg_completion_tokens_per_call': total_completion_tokens / successful_calls if successful_calls > 0 else 0.0,
         'avg_total_tokens_per_call': total_tokens / successful_calls if successful_calls > 0 else 0.0,
+        'avg_total_tokens_per_pair': total_tokens / judged_pairs if judged_pairs > 0 else 0.0,
+        **filter_cache.summary(),
+        **static_summary,
+        **async_client.cache_summary(),
     }
     
     graph = {
         'version': '1.0.0',
         'num_nodes': len(nodes),
         'num_edges': len(edges),
-        'nodes': [
-            {
-                'index': i,
-                'function_schema': node['function_schema'],
-                'classification': node.get('classification', {})
-            }
-            for i, node in enumerate(nodes)
-        ],
+        'nodes': [graph_node_record(i, node) for i, node in enumerate(nodes)],
         'edges': edges,
         'edge_details': edge_details,
         'token_usage_summary': token_summary,
@@ -1144,11 +1441,20 @@ async def build_graph_v1(nodes, sampled_candidates, batch_size=10, progress_file
     print(f"  Edge density: {len(edges) / (len(nodes) * (len(nodes) - 1)) * 100:.4f}%")
     print("\nToken usage summary (edge judgments):")
     print(f"  Successful calls: {successful_calls}")
+    print(f"  Judged pairs: {judged_pairs}")
     print(f"  Total prompt tokens: {total_prompt_tokens}")
     print(f"  Total completion tokens: {total_completion_tokens}")
     print(f"  Total tokens: {total_tokens}")
     if successful_calls > 0:
         print(f"  Avg tokens per call: {total_tokens / successful_calls:.2f}")
+    if judged_pairs > 0:
+        print(f"  Avg tokens per pair: {total_tokens / judged_pairs:.2f}")
+    print(f"  Filter cache: hits={token_summary['filter_cache_hits']} "
+          f"(in-flight {token_summary['filter_cache_inflight_hits']}), misses={token_summary['filter_cache_misses']}")
+    if static_summary:
+        print(f"  Static prefilter: skipped={static_summary['static_skipped']}, "
+              f"accepted={static_summary['static_accepted']}, sent to LLM={static_summary['static_to_llm']}")
+    print(f"  {async_client.format_cache_summary()}")
     
     return graph
 
@@ -1276,19 +1582,15 @@ def load_node_candidates_mapping(
     return index_based_mapping
 
 
-def main():
+def load_graph_nodes(classification_file: str, schema_file: str) -> List[Dict]:
     """
-    主函数：构建 graph v1.0.0
+    加载 graph 的 nodes：同时存在于 classification results 和 output schema 文件中的 tools，
+    按 function name 排序（保证 node 顺序固定），并把 output_schema_parsed 合并到 node['output_schema']。
     """
-    input_file = '/data/lhy/datasets/graph-Toucan/tool_info/tool_classification_results_v1.json'
-    output_file = '/data/lhy/datasets/graph-Toucan/graph/graph_v1.json'
-    candidates_mapping_file = '/data/lhy/datasets/graph-Toucan/graph/node_candidates_mapping.json'
-
     # 1. 加载工具分类结果
-    results = load_tool_classification_results(input_file)
+    results = load_tool_classification_results(classification_file)
 
     # 2. 从 tool_schema_with_outputformat.json 获取有 output schema 的 tools
-    schema_file = '/data/lhy/datasets/graph-Toucan/tool_info/tool_schema_with_outputformat.json'
     tools_with_output_schema, schema_data = load_tools_with_output_schema(schema_file)
 
     # 2.1 筛选出同时存在于 classification results 和 output schema 中的 tools
@@ -1319,6 +1621,21 @@ def main():
     print(f"  - Total tools with output schema: {len(tools_with_output_schema)}")
     print(f"  - Intersection: {len(nodes)}")
 
+    return nodes
+
+
+def main():
+    """
+    主函数：构建 graph v1.0.0
+    """
+    input_file = '/data/lhy/datasets/graph-Toucan/tool_info/tool_classification_results_v1.json'
+    output_file = '/data/lhy/datasets/graph-Toucan/graph/graph_v1.json'
+    candidates_mapping_file = '/data/lhy/datasets/graph-Toucan/graph/node_candidates_mapping.json'
+
+    # 1-2. 加载同时有 classification 和 output schema 的 tools 作为 nodes
+    schema_file = '/data/lhy/datasets/graph-Toucan/tool_info/tool_schema_with_outputformat.json'
+    nodes = load_graph_nodes(input_file, schema_file)
+
     # 3. 找到每个节点的 candidates（基于 label 重合）
     # 检查是否已有映射文件，如果有则直接加载，否则重新计算
     if os.path.exists(candidates_mapping_file):
@@ -1335,7 +1652,14 @@ def main():
 
     # 5. 使用 LLM 判断边，构建图（支持增量保存和断点续传）
     progress_file = '/data/lhy/datasets/graph-Toucan/graph/graph_v1_progress.json'
-    graph = asyncio.run(build_graph_v1(nodes, node_candidates, batch_size=20, progress_file=progress_file))
+    filter_cache_file = '/data/lhy/datasets/graph-Toucan/graph/filter_output_cache.jsonl'
+    graph = asyncio.run(build_graph_v1(
+        nodes,
+        node_candidates,
+        batch_size=20,
+        progress_file=progress_file,
+        filter_cache_file=filter_cache_file,
+    ))
     
     # 6. 保存图
     print(f"\nSaving graph to {output_file}...")
@@ -0,0 +1,341 @@
+"""
+graph 的增量更新：新增 / 修改 MCP tools 后不必从头重跑 graph.py main()。
+
+输入已有的 graph JSON 和刷新后的 tool catalog（load_graph_nodes），流程：
+1. 按稳定的 node ID（function name）对比新旧 nodes，得到 added / changed / removed
+   - 新版 graph 的 node 记录带 fingerprint（graph.node_fingerprint），直接比较
+   - 旧版 graph（没有 fingerprint）只比较 function_schema 和 classification
+2. 只为涉及变化 node 的 pair 计算 candidates（label 倒排索引，规则与 find_candidates_for_nodes_raw 相同）：
+   - 出边：changed node -> 与它共享 label 的前 max_candidates 个 node
+   - 入边：共享 label 的 node j -> changed node，仅当 changed node 在 j 自己的前 max_candidates 个 candidate 中
+     （与从头重跑时的 pair 集合一致）
+   - 窗口移动：删除 / 重排 node、dirty node 进出窗口会改变没有变化的 node 的前 max_candidates 个 candidate，
+     新进入窗口的 pair 也要判断（mine_window_shifts_raw，对比旧 graph 的 nodes 得到）
+3. 只对这些 pair 调用 build_graph_v1（LLM 判断），其余边按 function name 从旧 graph 直接搬过来
+   （两端都没有变化、且 target 仍在 source 窗口内的边保留；涉及 changed / removed node 的旧边丢弃，
+   changed node 的边由第 2 步重新判断）
+   进度文件按本次运行的输入（旧 graph、当前 catalog、变化的 node、max_candidates）加 hash 后缀，
+   中断后用相同输入重跑会断点续传；合并成功后删除，下一次增量更新从空的进度开始
+4. 输出新版本 graph：node 带稳定的 id 和 fingerprint，version 的 patch 号 +1，并记录本次增量的摘要
+
+LLM 判断量与变化的 node 数成正比，与 catalog 大小无关。
+
+用法：
+    python graph_incremental.py --old-graph graph_v1.json --output graph_v1_incremental.json
+    python graph_incremental.py --changed tool_a,tool_b   # 强制重新判断指定 tool
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from candidate_index import LabelInvertedIndex, mine_delta_candidates_raw, mine_window_shifts_raw
+from graph import (
+    build_graph_v1,
+    graph_node_record,
+    load_graph_nodes,
+    load_node_candidates_mapping,
+    node_fingerprint,
+    save_node_candidates_mapping,
+)
+from progress_journal import ProgressJournal, keyed_progress_file
+from schema_matcher import StaticSchemaMatcher
+
+GRAPH_DIR = '/data/lhy/datasets/graph-Toucan/graph'
+CLASSIFICATION_FILE = '/data/lhy/datasets/graph-Toucan/tool_info/tool_classification_results_v1.json'
+SCHEMA_FILE = '/data/lhy/datasets/graph-Toucan/tool_info/tool_schema_with_outputformat.json'
+
+
+def _node_name(node: Dict) -> str:
+    return node.get('id') or node.get('function_schema', {}).get('function', {}).get('name', '')
+
+
+def diff_nodes(
+    old_graph: Dict[str, Any],
+    nodes: List[Dict],
+    force_changed: Optional[Iterable[str]] = None,
+) -> Tuple[Set[str], Set[str], Set[str]]:
+    """
+    对比旧 graph 的 nodes 和当前 nodes。
+
+    Returns:
+        (added, changed, removed): function name 集合
+    """
+    old_by_name = {_node_name(node): node for node in old_graph.get('nodes', [])}
+    new_by_name = {_node_name(node): node for node in nodes}
+    force_changed = set(force_changed or [])
+
+    added = set(new_by_name) - set(old_by_name)
+    removed = set(old_by_name) - set(new_by_name)
+    changed = set()
+    for name in set(new_by_name) & set(old_by_name):
+        new_node = new_by_name[name]
+        old_node = old_by_name[name]
+        old_fp = old_node.get('fingerprint')
+        if old_fp is None:
+            # 旧版 graph 没有保存 output schema，只能比较 function_schema 和 classification
+            old_fp = node_fingerprint({**old_node, 'output_schema': new_node.get('output_schema')})
+        if name in force_changed or old_fp != node_fingerprint(new_node):
+            changed.add(name)
+    return added, changed, removed
+
+
+def compute_delta_candidates(
+    nodes: List[Dict],
+    dirty_indices: Set[int],
+    max_candidates: Optional[int] = 40,
+) -> Dict[int, List[int]]:
+    """
+    只为涉及 dirty node 的 pair 计算 candidates（出边和入边）。
+
+    结果与对全部 nodes 重新运行 find_candidates_for_nodes_raw 后、source 或 target 为 dirty node 的 pair 完全一致：
+    入边 j -> d 只在 d 落在 j 自己的前 max_candidates 个 candidate 中时才判断（见 mine_delta_candidates_raw）。
+    两端都没有变化、但因窗口移动新进入窗口的 pair 见 compute_window_shifts。
+
+    Returns:
+        dict: {node_index: [candidate_indices]}，只包含需要判断的 pair
+    """
+    return mine_delta_candidates_raw(LabelInvertedIndex(nodes), dirty_indices, max_candidates=max_candidates)
+
+
+def _old_nodes_by_index(old_graph: Dict[str, Any]) -> List[Dict]:
+    """旧 graph 的 nodes，按其 index 排序（LabelInvertedIndex 的位置即旧 index）"""
+    indexed = [(node.get('index', i), node) for i, node in enumerate(old_graph.get('nodes', []))]
+    return [node for _, node in sorted(indexed, key=lambda item: item[0])]
+
+
+def compute_window_shifts(
+    old_graph: Dict[str, Any],
+    nodes: List[Dict],
+    dirty_indices: Set[int],
+    max_candidates: Optional[int] = 40,
+) -> Tuple[Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    没有变化的 node 中，前 max_candidates 个 candidate 与旧 graph 不同的那些（见 mine_window_shifts_raw）。
+
+    Returns:
+        (windows, entered)：windows 传给 carry_over_edges / merge_candidates_mapping，entered 是需要补判断的 pair
+    """
+    old_nodes = _old_nodes_by_index(old_graph)
+    return mine_window_shifts_raw(
+        LabelInvertedIndex(old_nodes),
+        [_node_name(node) for node in old_nodes],
+        LabelInvertedIndex(nodes),
+        [_node_name(node) for node in nodes],
+        dirty_indices,
+        max_candidates=max_candidates,
+    )
+
+
+def carry_over_edges(
+    old_graph: Dict[str, Any],
+    nodes: List[Dict],
+    stale_names: Set[str],
+    windows: Optional[Dict[int, List[int]]] = None,
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    把两端都没有变化的旧边按 function name 映射到新的 node index。
+
+    Args:
+        windows: 可选，窗口移动的 source -> 当前窗口（compute_window_shifts）；这些 source 只保留 target 仍在窗口内的边
+
+    Returns:
+        (edges, edge_details)
+    """
+    old_index_to_name = {node.get('index', i): _node_name(node) for i, node in enumerate(old_graph.get('nodes', []))}
+    name_to_index = {_node_name(node): idx for idx, node in enumerate(nodes)}
+    window_sets = {src: set(window) for src, window in (windows or {}).items()}
+
+    def remap(record: Dict) -> Optional[Dict]:
+        src_name = old_index_to_name.get(record.get('source'))
+        tgt_name = old_index_to_name.get(record.get('target'))
+        if src_name in stale_names or tgt_name in stale_names:
+            return None
+        src, tgt = name_to_index.get(src_name), name_to_index.get(tgt_name)
+        if src is None or tgt is None:
+            return None
+        if src in window_sets and tgt not in window_sets[src]:
+            return None
+        return {**record, 'source': src, 'target': tgt}
+
+    edges = [e for e in (remap(edge) for edge in old_graph.get('edges', [])) if e is not None]
+    edge_details = [e for e in (remap(detail) for detail in old_graph.get('edge_details', [])) if e is not None]
+    return edges, edge_details
+
+
+def bump_version(version: str) -> str:
+    """1.0.0 -> 1.0.1（无法解析时原样返回）"""
+    prefix = "v" if isinstance(version, str) and version.startswith("v") else ""
+    try:
+        major, minor, patch = str(version).lstrip("v").split(".")[:3]
+        return f"{prefix}{major}.{minor}.{int(patch) + 1}"
+    except ValueError:
+        return version
+
+
+def merge_candidates_mapping(
+    nodes: List[Dict],
+    old_mapping: Dict[int, List[int]],
+    delta_candidates: Dict[int, List[int]],
+    dirty_indices: Set[int],
+    windows: Optional[Dict[int, List[int]]] = None,
+) -> Dict[int, List[int]]:
+    """
+    旧映射（已按 name 对齐到当前 nodes）+ 本次增量：dirty node 的出边列表替换，入边追加到对应 node；
+    窗口移动的 node 直接换成当前窗口
+    """
+    merged = {idx: [c for c in cands if c not in dirty_indices] for idx, cands in old_mapping.items()}
+    for src, candidates in delta_candidates.items():
+        if src in dirty_indices:
+            merged[src] = list(candidates)
+        else:
+            existing = merged.setdefault(src, [])
+            existing.extend(c for c in candidates if c not in existing)
+    for src, window in (windows or {}).items():
+        merged[src] = list(window)
+    return merged
+
+
+async def update_graph_incremental(
+    old_graph: Dict[str, Any],
+    nodes: List[Dict],
+    force_changed: Optional[Iterable[str]] = None,
+    max_candidates: Optional[int] = 40,
+    candidates_mapping_file: Optional[str] = None,
+    **build_kwargs,
+) -> Dict[str, Any]:
+    """
+    增量更新 graph。
+
+    Args:
+        old_graph: dict, 已有的 graph（build_graph_v1 或上一次增量更新的输出）
+        nodes: list, 刷新后的 nodes（load_graph_nodes）
+        force_changed: 强制视为已修改的 function name
+        max_candidates: 每个 changed node 的 candidate 上限（与 main() 中 find_candidates_for_nodes_raw 一致）
+        candidates_mapping_file: str, 可选，同步更新 node_candidates_mapping.json
+        **build_kwargs: 传给 build_graph_v1（progress_file / batch_size / judge_batch_size 等）；
+            progress_file 会加上本次输入的 hash 后缀（见 keyed_progress_file），合并成功后删除
+
+    Returns:
+        dict: 新版本的 graph
+    """
+    added, changed, removed = diff_nodes(old_graph, nodes, force_changed)
+    print(f"\n==> Incremental update: {len(added)} added, {len(changed)} changed, {len(removed)} removed "
+          f"(catalog size {len(nodes)})")
+
+    dirty_names = added | changed
+    dirty_indices = {idx for idx, node in enumerate(nodes) if _node_name(node) in dirty_names}
+    delta_candidates = compute_delta_candidates(nodes, dirty_indices, max_candidates=max_candidates)
+    # 没有变化的 node 的窗口也可能移动：新进入窗口的 pair 一起判断，离开窗口的旧边不再搬过来
+    windows, entered = compute_window_shifts(old_graph, nodes, dirty_indices, max_candidates=max_candidates)
+    for src, candidates in entered.items():
+        delta_candidates[src] = sorted(set(delta_candidates.get(src, [])) | set(candidates))
+    if windows:
+        print(f"==> Candidate windows shifted for {len(windows)} unchanged nodes "
+              f"({sum(len(c) for c in entered.values())} pairs entered)")
+    num_pairs = sum(len(c) for c in delta_candidates.values())
+    print(f"==> Pairs to judge: {num_pairs}")
+
+    carried_edges, carried_details = carry_over_edges(old_graph, nodes, stale_names=changed | removed, windows=windows)
+
+    progress_file = build_kwargs.pop('progress_file', None)
+    if progress_file:
+        # 进度中的 pair 只对同样的输入有效：换了旧 graph / catalog / 变化的 node 就换一个进度文件
+        old_graph_digest = hashlib.sha256(
+            json.dumps(old_graph, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        progress_file = keyed_progress_file(progress_file, {
+            'old_graph': old_graph_digest,
+            'nodes': [node_fingerprint(node) for node in nodes],
+            'dirty': sorted(dirty_names),
+            'max_candidates': max_candidates,
+        })
+        print(f"==> Progress file for this update: {progress_file}")
+
+    if num_pairs:
+        delta_graph = await build_graph_v1(nodes, delta_candidates, progress_file=progress_file, **build_kwargs)
+        new_edges = delta_graph['edges']
+        new_details = delta_graph['edge_details']
+        token_summary = delta_graph['token_usage_summary']
+    else:
+        new_edges, new_details, token_summary = [], [], {}
+
+    if candidates_mapping_file:
+        old_mapping = (
+            load_node_candidates_mapping(nodes, candidates_mapping_file)
+            if os.path.exists(candidates_mapping_file) else {}
+        )
+        merged = merge_candidates_mapping(nodes, old_mapping, delta_candidates, dirty_indices, windows=windows)
+        save_node_candidates_mapping(nodes, merged, candidates_mapping_file)
+
+    edges = carried_edges + new_edges
+    edge_details = carried_details + new_details
+    graph = {
+        'version': bump_version(old_graph.get('version', '1.0.0')),
+        'num_nodes': len(nodes),
+        'num_edges': len(edges),
+        'nodes': [graph_node_record(i, node) for i, node in enumerate(nodes)],
+        'edges': edges,
+        'edge_details': edge_details,
+        'token_usage_summary': token_summary,
+        'incremental_update': {
+            'parent_version': old_graph.get('version'),
+            'added': sorted(added),
+            'changed': sorted(changed),
+            'removed': sorted(removed),
+            'judged_pairs': num_pairs,
+            'shifted_windows': len(windows),
+            'carried_edges': len(carried_edges),
+            'new_edges': len(new_edges),
+        },
+    }
+    print(f"==> Graph {graph['version']}: {len(carried_edges)} carried edges + {len(new_edges)} new edges")
+
+    # 结果已合并到新 graph，删除本次运行的进度文件
+    if progress_file:
+        ProgressJournal(progress_file).clear()
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally update the tool graph after catalog changes")
+    parser.add_argument("--old-graph", default=os.path.join(GRAPH_DIR, 'graph_v1.json'))
+    parser.add_argument("--output", default=os.path.join(GRAPH_DIR, 'graph_v1_incremental.json'))
+    parser.add_argument("--candidates-mapping-file", default=os.path.join(GRAPH_DIR, 'node_candidates_mapping.json'))
+    parser.add_argument("--progress-file", default=os.path.join(GRAPH_DIR, 'graph_v1_incremental_progress.json'))
+    parser.add_argument("--changed", default="", help="Comma-separated tool names to re-judge even if unchanged")
+    parser.add_argument("--max-candidates", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--judge-batch-size", type=int, default=1, help="Candidates judged per LLM request (1 = one pair per request)")
+    parser.add_argument("--static-prefilter", action="store_true", help="Decide obvious pairs with the static schema matcher before LLM judging")
+    args = parser.parse_args()
+
+    with open(args.old_graph, 'r', encoding='utf-8') as f:
+        old_graph = json.load(f)
+    nodes = load_graph_nodes(CLASSIFICATION_FILE, SCHEMA_FILE)
+    force_changed = [name.strip() for name in args.changed.split(",") if name.strip()]
+
+    graph = asyncio.run(update_graph_incremental(
+        old_graph,
+        nodes,
+        force_changed=force_changed,
+        max_candidates=args.max_candidates,
+        candidates_mapping_file=args.candidates_mapping_file,
+        batch_size=args.batch_size,
+        progress_file=args.progress_file,
+        filter_cache_file=os.path.join(GRAPH_DIR, 'filter_output_cache.jsonl'),
+        static_matcher=StaticSchemaMatcher() if args.static_prefilter else None,
+        judge_batch_size=args.judge_batch_size,
+    ))
+
+    print(f"\nSaving graph to {args.output}...")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(graph, f, indent=2, ensure_ascii=False)
+    print("Graph saved successfully!")
+
+
+if __name__ == "__main__":
+    main()
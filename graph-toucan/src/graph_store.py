@@ -0,0 +1,493 @@
+"""
+紧凑的二进制 CSR 图格式 + 所有图消费者共用的加载接口。
+
+原来 load_graph_for_walk / validate.load_graph / find_more_edge.load_graph /
+backward_to_query.load_graph_adjacency / verify_structural_consistency.load_graph
+各自 json.load 整个图文件（包括带 reasoning 文本的 edge_details），再各自构建 dict-of-lists 邻接表。
+
+这里把图编译成一个 .csr 文件（默认放在 JSON 旁边：graph_v1.json -> graph_v1.json.csr），通过 mmap 打开：
+
+    [0:8)    magic b"GTCSR001"
+    [8:16)   header 长度（little-endian uint64）
+    header   JSON：num_nodes / num_edges / dependency_types / sections（每段的 offset、元素个数、typecode）
+    sections（8 字节对齐）：
+        offsets      int64[num_nodes + 1]  CSR 行偏移（按 source 分组，组内保持原 JSON 中的边顺序）
+        sources      int32[num_edges]
+        targets      int32[num_edges]
+        dep_types    uint8[num_edges]      dependency_types 中的下标
+        confidence   float32[num_edges]
+        name_offsets int64[num_nodes + 1] + names（utf-8）  node 名称表（下标即 node index）
+        attr_offsets int64[num_edges + 1] + attrs（utf-8 JSON）  其余边属性（如 param_mapping），按需解码
+
+各列通过 memoryview.cast 直接映射，打开文件只读 header，启动时间和 RSS 与图大小基本无关。
+不依赖 numpy；安装了 numpy 时 GraphStore.as_numpy() 返回零拷贝的 ndarray 视图。
+
+用法：
+    store = load_graph_store(graph_path)          # 有最新的 .csr 就 mmap 打开，否则解析 JSON 并写入 .csr
+    store.successors(i, exclude_types=("prerequisite",))
+    store.adjacency()  / store.edges()  / store.name_to_index()
+
+    python graph_store.py graph_v1.json           # 显式编译
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"GTCSR001"
+CSR_SUFFIX = ".csr"
+BASE_DEPENDENCY_TYPES = ["full", "partial", "prerequisite", "none"]
+_CORE_EDGE_KEYS = ("source", "target", "dependency_type", "confidence")
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _node_name(node: Dict[str, Any]) -> str:
+    return node.get("function_schema", {}).get("function", {}).get("name") or node.get("id") or ""
+
+
+def serialize_graph(graph: Dict[str, Any]) -> bytes:
+    """把 graph JSON（build_graph_v1 的输出格式）编码成 .csr 字节串（不包含 edge_details）"""
+    nodes = graph.get("nodes", [])
+    num_nodes = 0
+    for position, node in enumerate(nodes):
+        idx = node.get("index", position)
+        num_nodes = max(num_nodes, idx + 1)
+    names = [""] * num_nodes
+    for position, node in enumerate(nodes):
+        names[node.get("index", position)] = _node_name(node)
+
+    dependency_types = list(BASE_DEPENDENCY_TYPES)
+    type_ids = {t: i for i, t in enumerate(dependency_types)}
+
+    edges = [
+        edge for edge in graph.get("edges", [])
+        if edge.get("source") is not None and edge.get("target") is not None
+    ]
+    # 按 source 稳定排序：同一 source 的后继保持原 JSON 中的顺序（与 dict-of-lists 邻接表一致）
+    edges.sort(key=lambda edge: edge["source"])
+
+    offsets = array("q", [0] * (num_nodes + 1))
+    sources = array("i")
+    targets = array("i")
+    dep_types = array("B")
+    confidence = array("f")
+    attr_chunks: List[bytes] = []
+    attr_offsets = array("q", [0])
+    type_counts: Dict[str, int] = {}
+
+    for edge in edges:
+        dep_type = edge.get("dependency_type", "none") or "none"
+        if dep_type not in type_ids:
+            type_ids[dep_type] = len(dependency_types)
+            dependency_types.append(dep_type)
+        type_counts[dep_type] = type_counts.get(dep_type, 0) + 1
+        offsets[edge["source"] + 1] += 1
+        sources.append(edge["source"])
+        targets.append(edge["target"])
+        dep_types.append(type_ids[dep_type])
+        confidence.append(float(edge.get("confidence", 0.0) or 0.0))
+        attrs = {k: v for k, v in edge.items() if k not in _CORE_EDGE_KEYS}
+        chunk = json.dumps(attrs, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if attrs else b""
+        attr_chunks.append(chunk)
+        attr_offsets.append(attr_offsets[-1] + len(chunk))
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+
+    name_bytes = [name.encode("utf-8") for name in names]
+    name_offsets = array("q", [0])
+    for chunk in name_bytes:
+        name_offsets.append(name_offsets[-1] + len(chunk))
+
+    columns: List[Tuple[str, bytes, str, int]] = [
+        ("offsets", offsets.tobytes(), "q", len(offsets)),
+        ("sources", sources.tobytes(), "i", len(sources)),
+        ("targets", targets.tobytes(), "i", len(targets)),
+        ("dep_types", dep_types.tobytes(), "B", len(dep_types)),
+        ("confidence", confidence.tobytes(), "f", len(confidence)),
+        ("name_offsets", name_offsets.tobytes(), "q", len(name_offsets)),
+        ("names", b"".join(name_bytes), "B", int(name_offsets[-1])),
+        ("attr_offsets", attr_offsets.tobytes(), "q", len(attr_offsets)),
+        ("attrs", b"".join(attr_chunks), "B", int(attr_offsets[-1])),
+    ]
+
+    return pack_sections(MAGIC, {
+        "format_version": 1,
+        "graph_version": graph.get("version"),
+        "num_nodes": num_nodes,
+        "num_edges": len(edges),
+        "dependency_types": dependency_types,
+        "type_counts": type_counts,
+    }, columns)
+
+
+def pack_sections(magic: bytes, header_fields: Dict[str, Any], columns: List[Tuple[str, bytes, str, int]]) -> bytes:
+    """
+    magic + header 长度 + JSON header + 8 字节对齐的列，columns 为 (name, data, typecode, count)。
+    .csr 与 walk_bias 的 alias 表文件共用这个布局。
+    """
+    def build_header(sections: Dict[str, List]) -> bytes:
+        return json.dumps({**header_fields, "byteorder": sys.byteorder, "sections": sections}).encode("utf-8")
+
+    # header 长度依赖 section offset 的位数，迭代到稳定
+    sections: Dict[str, List] = {name: [0, count, code] for name, _, code, count in columns}
+    while True:
+        header = build_header(sections)
+        pos = _align8(16 + len(header))
+        new_sections = {}
+        for name, data, code, count in columns:
+            new_sections[name] = [pos, count, code]
+            pos = _align8(pos + len(data))
+        if new_sections == sections:
+            break
+        sections = new_sections
+
+    out = bytearray(magic)
+    out += struct.pack("<Q", len(header))
+    out += header
+    for name, data, _, _ in columns:
+        out += b"\0" * (sections[name][0] - len(out))
+        out += data
+    out += b"\0" * (_align8(len(out)) - len(out))
+    return bytes(out)
+
+
+def unpack_sections(buffer, magic: bytes, path: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, memoryview], List[memoryview]]:
+    """
+    pack_sections 的逆过程：返回 (header, {name: 零拷贝的 typed memoryview}, 需要在关闭时 release 的 views)
+    """
+    view = memoryview(buffer)
+    if bytes(view[:8]) != magic:
+        raise ValueError(f"Not a {magic.decode()} file: {path or '<buffer>'}")
+    (header_len,) = struct.unpack("<Q", view[8:16])
+    header = json.loads(bytes(view[16:16 + header_len]).decode("utf-8"))
+    if header.get("byteorder", sys.byteorder) != sys.byteorder:
+        raise ValueError(f"{path or '<buffer>'} was written with {header['byteorder']}-endian byte order")
+
+    views: List[memoryview] = [view]
+    columns: Dict[str, memoryview] = {}
+    for name, (offset, count, code) in header["sections"].items():
+        itemsize = struct.calcsize(code)
+        column = view[offset:offset + count * itemsize].cast(code)
+        views.append(column)
+        columns[name] = column
+    return header, columns, views
+
+
+class AdjacencyView(Mapping):
+    """
+    与 dict-of-lists 邻接表兼容的只读视图：index -> List[successor index]。
+
+    只包含（过滤后）至少有一条出边的 node，行为与原来 adj.setdefault(src, []).append(tgt) 构建的 dict 一致。
+    """
+
+    def __init__(self, store: "GraphStore", exclude_types: Iterable[str] = ()):
+        self._store = store
+        self.exclude_types = tuple(exclude_types)
+        self._exclude = store._type_ids(self.exclude_types)
+        self._len: Optional[int] = None
+
+    @property
+    def store(self) -> "GraphStore":
+        return self._store
+
+    def __getitem__(self, idx: int) -> List[int]:
+        if not isinstance(idx, int) or not 0 <= idx < self._store.num_nodes:
+            raise KeyError(idx)
+        row = self._store.successors(idx, exclude_ids=self._exclude)
+        if not row:
+            raise KeyError(idx)
+        return row
+
+    def __iter__(self) -> Iterator[int]:
+        for idx in range(self._store.num_nodes):
+            if self._store.successors(idx, exclude_ids=self._exclude):
+                yield idx
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = sum(1 for _ in self)
+        return self._len
+
+
+class EdgeView(Sequence):
+    """边列表视图：每个元素按需解码成 {"source", "target", "dependency_type", "confidence", ...其余属性}"""
+
+    def __init__(self, store: "GraphStore", exclude_types: Iterable[str] = ()):
+        self._store = store
+        exclude = store._type_ids(exclude_types)
+        if exclude:
+            dep_types = store._dep_types
+            self._ids: Optional[List[int]] = [k for k in range(store.num_edges) if dep_types[k] not in exclude]
+        else:
+            self._ids = None
+
+    def __len__(self) -> int:
+        return self._store.num_edges if self._ids is None else len(self._ids)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[x] for x in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError(k)
+        return self._store.edge(k if self._ids is None else self._ids[k])
+
+
+class NodeView(Sequence):
+    """node 列表视图：{"index", "id", "function_schema": {"function": {"name"}}}（只含名称，不含完整 schema）"""
+
+    def __init__(self, store: "GraphStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.num_nodes
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[x] for x in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError(k)
+        name = self._store.name(k)
+        return {"index": k, "id": name, "function_schema": {"function": {"name": name}}}
+
+
+class GraphStore:
+    """
+    CSR 图的只读访问接口（底层是 mmap 或内存中的 .csr 字节串）。
+    """
+
+    def __init__(self, buffer, path: Optional[str] = None):
+        self.path = path
+        self._buffer = buffer
+        self.header, self._columns, self._views = unpack_sections(buffer, MAGIC, path)
+
+        self.num_nodes: int = self.header["num_nodes"]
+        self.num_edges: int = self.header["num_edges"]
+        self.dependency_types: List[str] = self.header["dependency_types"]
+        self.graph_version = self.header.get("graph_version")
+
+        self._offsets = self._columns["offsets"]
+        self._sources = self._columns["sources"]
+        self._targets = self._columns["targets"]
+        self._dep_types = self._columns["dep_types"]
+        self._confidence = self._columns["confidence"]
+        self._names_cache: Optional[List[str]] = None
+        self._name_to_index: Optional[Dict[str, int]] = None
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def open(cls, path: str) -> "GraphStore":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, path=path)
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._columns = {}
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    # ---------- nodes ----------
+
+    def name(self, idx: int) -> str:
+        if self._names_cache is not None:
+            return self._names_cache[idx]
+        name_offsets = self._columns["name_offsets"]
+        return bytes(self._columns["names"][name_offsets[idx]:name_offsets[idx + 1]]).decode("utf-8")
+
+    @property
+    def names(self) -> List[str]:
+        if self._names_cache is None:
+            self._names_cache = [self.name(i) for i in range(self.num_nodes)]
+        return self._names_cache
+
+    def index_to_name(self) -> Dict[int, str]:
+        """index -> name（只包含有名称的 node）"""
+        return {i: name for i, name in enumerate(self.names) if name}
+
+    def name_to_index(self) -> Dict[str, int]:
+        if self._name_to_index is None:
+            self._name_to_index = {name: i for i, name in enumerate(self.names) if name}
+        return self._name_to_index
+
+    def nodes(self) -> NodeView:
+        return NodeView(self)
+
+    # ---------- edges ----------
+
+    def _type_ids(self, types: Iterable[str]) -> frozenset:
+        return frozenset(self.dependency_types.index(t) for t in types if t in self.dependency_types)
+
+    def edge_range(self, idx: int) -> range:
+        if not 0 <= idx < self.num_nodes:
+            return range(0)
+        return range(self._offsets[idx], self._offsets[idx + 1])
+
+    def successors(
+        self,
+        idx: int,
+        exclude_types: Iterable[str] = (),
+        exclude_ids: Optional[frozenset] = None,
+    ) -> List[int]:
+        """idx 的后继（保持原 JSON 中的边顺序），可按 dependency_type 过滤"""
+        if not 0 <= idx < self.num_nodes:
+            return []
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        if exclude_ids is None:
+            exclude_ids = self._type_ids(exclude_types)
+        if not exclude_ids:
+            return self._targets[start:end].tolist()
+        dep_types = self._dep_types
+        targets = self._targets
+        return [targets[k] for k in range(start, end) if dep_types[k] not in exclude_ids]
+
+    def filtered_csr(self, exclude_types: Iterable[str] = ()) -> Tuple[Sequence, Sequence]:
+        """
+        (offsets, targets) 两列：去掉 exclude_types 之后的 CSR（组内顺序不变）。
+        没有需要过滤的边时直接返回底层 memoryview（零拷贝），否则返回新的 array。
+        """
+        exclude_ids = self._type_ids(exclude_types)
+        if not exclude_ids:
+            return self._offsets, self._targets
+        offsets = array("q", [0])
+        targets = array("i")
+        dep_types = self._dep_types
+        for idx in range(self.num_nodes):
+            for k in range(self._offsets[idx], self._offsets[idx + 1]):
+                if dep_types[k] not in exclude_ids:
+                    targets.append(self._targets[k])
+            offsets.append(len(targets))
+        return offsets, targets
+
+    def find_edge(self, source: int, target: int) -> Optional[int]:
+        """
+        source -> target 的边 id（不存在时返回 None）。
+        graph JSON 中有重复的 (source, target) 时返回最后一条，与原来按 (source, target) 建 dict 的结果一致
+        """
+        targets = self._targets
+        for k in reversed(self.edge_range(source)):
+            if targets[k] == target:
+                return k
+        return None
+
+    def has_edge(self, source: int, target: int) -> bool:
+        return self.find_edge(source, target) is not None
+
+    def edge(self, k: int) -> Dict[str, Any]:
+        """解码第 k 条边（与 graph JSON 中的 edge 字段一致）"""
+        record = {
+            "source": self._sources[k],
+            "target": self._targets[k],
+            "confidence": round(self._confidence[k], 6),
+            "dependency_type": self.dependency_types[self._dep_types[k]],
+        }
+        attr_offsets = self._columns["attr_offsets"]
+        start, end = attr_offsets[k], attr_offsets[k + 1]
+        if end > start:
+            record.update(json.loads(bytes(self._columns["attrs"][start:end]).decode("utf-8")))
+        return record
+
+    def edges(self, exclude_types: Iterable[str] = ()) -> EdgeView:
+        return EdgeView(self, exclude_types)
+
+    def adjacency(self, exclude_types: Iterable[str] = ()) -> AdjacencyView:
+        return AdjacencyView(self, exclude_types)
+
+    def fingerprint(self) -> str:
+        """游走相关列（offsets / targets / dep_types / confidence）的内容哈希，用于派生缓存（如 alias 表）的失效判断"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1(json.dumps(self.dependency_types).encode("utf-8"))
+            for name in ("offsets", "targets", "dep_types", "confidence"):
+                digest.update(self._columns[name].cast("B"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def as_numpy(self) -> Dict[str, Any]:
+        """零拷贝的 numpy 视图（需要安装 numpy）"""
+        import numpy as np
+
+        return {
+            name: np.frombuffer(self._columns[name], dtype=np.dtype(code))
+            for name, code in (
+                ("offsets", "q"), ("sources", "i"), ("targets", "i"), ("dep_types", "B"), ("confidence", "f"),
+            )
+        }
+
+
+def csr_path_for(graph_path: str) -> str:
+    return graph_path if graph_path.endswith(CSR_SUFFIX) else graph_path + CSR_SUFFIX
+
+
+def compile_graph(graph_path: str, output_path: Optional[str] = None) -> str:
+    """把 graph JSON 编译成 .csr 文件（先写临时文件再 os.replace）"""
+    output_path = output_path or csr_path_for(graph_path)
+    with open(graph_path, "r", encoding="utf-8") as f:
+        graph = json.load(f)
+    payload = serialize_graph(graph)
+    _write_atomic(output_path, payload)
+    return output_path
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_graph_store(graph_path: str, use_cache: bool = True) -> GraphStore:
+    """
+    所有图消费者共用的加载入口。
+
+    - graph_path 是 .csr 文件：直接 mmap 打开
+    - graph_path 是 JSON 且旁边有不旧于它的 .csr：mmap 打开 .csr
+    - 否则解析 JSON；use_cache=True 时顺便写出 .csr，下次启动直接 mmap
+    """
+    if graph_path.endswith(CSR_SUFFIX):
+        return GraphStore.open(graph_path)
+
+    cache_path = csr_path_for(graph_path)
+    if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(graph_path):
+        try:
+            return GraphStore.open(cache_path)
+        except ValueError as e:
+            print(f"Warning: ignoring unreadable graph cache {cache_path}: {e}")
+
+    with open(graph_path, "r", encoding="utf-8") as f:
+        graph = json.load(f)
+    payload = serialize_graph(graph)
+    if use_cache:
+        try:
+            _write_atomic(cache_path, payload)
+            return GraphStore.open(cache_path)
+        except OSError as e:
+            print(f"Warning: failed to write graph cache {cache_path}: {e}")
+    return GraphStore(payload, path=graph_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a graph JSON file into the memory-mapped CSR format")
+    parser.add_argument("graph_path")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args()
+
+    output = compile_graph(args.graph_path, args.output)
+    store = GraphStore.open(output)
+    print(f"Wrote {output}: {store.num_nodes} nodes, {store.num_edges} edges, "
+          f"{os.path.getsize(output)} bytes")
+    store.close()
@@ -0,0 +1,399 @@
+"""
+所有 pipeline 阶段共享的 LLM 响应持久化缓存（SQLite）。
+
+各模块（graph.py / backward_to_query*.py / positive_distill*.py / process_mcp.py /
+design_tool_output_format.py / llm_fix_code.py / data_process.py）仍然各自创建 AsyncOpenAI 客户端，
+只需要再包一层：
+
+    async_client = wrap_llm_client(AsyncOpenAI(...), stage="graph", config=config)
+
+调用方式不变（async_client.chat.completions.create(**kwargs)），返回的仍是 ChatCompletion。
+
+缓存规则：
+- key = sha256(请求参数)：model / messages / temperature / tools / max_tokens 以及其它影响输出的参数，
+  timeout / extra_headers 等与输出无关的参数不参与
+- 默认只缓存确定性请求（temperature <= max_temperature，默认 0.3；没有传 temperature 视为非确定性）
+- 单次调用可以用 cache=True / cache=False 强制开启 / 关闭（这个参数不会传给 API）
+- stream=True 或 n > 1 的请求不缓存
+- TTL 过期和总条数 / 总字节数超限时按最近访问时间淘汰
+- 多个进程 / 阶段共享同一个 SQLite 文件（WAL 模式）
+- 响应在调用方解析之前就写入缓存；调用方解析失败时用 async_client.invalidate(**kwargs)（与 create 相同的参数）
+  删除该条目，之后重跑会重新请求，而不是在整个 TTL 内重放同一个坏响应
+
+命中统计按阶段记录，各阶段在 token summary 中通过 async_client.cache_summary() 报告命中率。
+命中时返回的 completion 的 usage 为 0（没有花费 token，不计入各阶段的 token 统计和 llm_scheduler 的 TPM 预算），
+原来的用量只计入 cache_summary 的 llm_cache_saved_tokens。
+
+配置（config.yaml，可选）：
+    llm_cache:
+      enabled: true
+      path: /data/lhy/datasets/graph-Toucan/cache/llm_responses.sqlite
+      ttl_days: 30
+      max_entries: 500000
+      max_mb: 2048
+      max_temperature: 0.3
+      coalesce: true            # llm_coalesce：并发的相同请求共享一次 HTTP 调用
+      coalesce_exclude: []
+环境变量 GRAPH_TOUCAN_LLM_CACHE=0 可以临时关闭缓存，GRAPH_TOUCAN_LLM_CACHE_PATH 覆盖缓存文件路径。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Optional
+
+DEFAULT_CACHE_PATH = "/data/lhy/datasets/graph-Toucan/cache/llm_responses.sqlite"
+DEFAULT_MAX_TEMPERATURE = 0.3
+# 与输出无关、不参与缓存 key 的请求参数（coalesce 是 llm_coalesce 的开关，不会传给 API）
+NON_SEMANTIC_PARAMS = frozenset({"timeout", "extra_headers", "extra_query", "user", "stream_options", "coalesce"})
+# 每写入多少条检查一次淘汰
+EVICT_EVERY = 200
+ZERO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+
+def zero_usage(completion: Any) -> int:
+    """
+    把 completion 的 usage 原地置零（缓存命中 / 合并的请求没有实际花费 token），返回原来的 total_tokens。
+    没有 usage 的 completion 不变，返回 0。
+    """
+    if isinstance(completion, dict):
+        usage = completion.get("usage")
+        if not isinstance(usage, dict):
+            return 0
+        completion["usage"] = dict(ZERO_USAGE)
+        return usage.get("total_tokens", 0) or 0
+    usage = getattr(completion, "usage", None)
+    if usage is None:
+        return 0
+    total = getattr(usage, "total_tokens", 0) or 0
+    completion.usage = type(usage)(**ZERO_USAGE)
+    return total
+
+
+def request_key(kwargs: Dict[str, Any], exclude: Iterable[str] = NON_SEMANTIC_PARAMS) -> str:
+    """请求参数的稳定 hash（dict 按 key 排序，exclude 中的参数不参与）"""
+    exclude = set(exclude)
+    payload = {k: v for k, v in kwargs.items() if k not in exclude}
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def dump_completion(completion: Any) -> str:
+    if hasattr(completion, "model_dump_json"):
+        return completion.model_dump_json()
+    if hasattr(completion, "model_dump"):
+        return json.dumps(completion.model_dump(), ensure_ascii=False)
+    return json.dumps(completion, ensure_ascii=False, default=lambda o: vars(o))
+
+
+def _to_namespace(value: Any) -> Any:
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(v) for v in value]
+    return value
+
+
+def load_completion(text: str) -> Any:
+    """还原成 ChatCompletion（没有安装 openai 时退回到属性访问兼容的 SimpleNamespace）；内容无法还原时抛 ValueError"""
+    try:
+        from openai.types.chat import ChatCompletion
+    except ImportError:
+        return _to_namespace(json.loads(text))
+    return ChatCompletion.model_validate_json(text)
+
+
+class LLMResponseCache:
+    """
+    SQLite 响应缓存，线程安全；多个进程可以共享同一个文件。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: Optional[float] = 30 * 24 * 3600,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, stage TEXT, response TEXT,"
+                " size INTEGER, created_at REAL, accessed_at REAL, hits INTEGER DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, response: str, model: str = "", stage: str = "") -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, stage, response, size, created_at, accessed_at, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, model, stage, response, len(response.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict_locked(now)
+
+    def invalidate(self, key: str) -> bool:
+        """删除 key 对应的条目，返回是否存在"""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+            self._conn.commit()
+        return removed > 0
+
+    def evict(self) -> int:
+        """删除过期条目，并在超过条数 / 字节上限时按最近访问时间淘汰，返回删除的条数"""
+        with self._lock:
+            return self._evict_locked(time.time())
+
+    def _evict_locked(self, now: float) -> int:
+        removed = 0
+        if self.ttl_seconds is not None:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY accessed_at ASC, rowid ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+        if self.max_bytes is not None:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if total > self.max_bytes:
+                stale = []
+                rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC, rowid ASC")
+                for key, size in rows.fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                removed += len(stale)
+        self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_shared_caches: Dict[str, LLMResponseCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache(path: str = DEFAULT_CACHE_PATH, **kwargs) -> LLMResponseCache:
+    """同一进程内同一路径只打开一个连接，所有阶段共享"""
+    with _shared_lock:
+        if path not in _shared_caches:
+            _shared_caches[path] = LLMResponseCache(path, **kwargs)
+        return _shared_caches[path]
+
+
+class _CachedCompletions:
+    def __init__(self, owner: "CachedAsyncClient"):
+        self._owner = owner
+
+    async def create(self, cache: Optional[bool] = None, **kwargs):
+        return await self._owner._create(kwargs, cache)
+
+
+class CachedAsyncClient:
+    """
+    AsyncOpenAI 的缓存包装：chat.completions.create 先查共享缓存，其余属性直接转发给原客户端。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        cache: Optional[LLMResponseCache],
+        stage: str = "",
+        max_temperature: float = DEFAULT_MAX_TEMPERATURE,
+    ):
+        self.client = client
+        self.cache = cache
+        self.stage = stage
+        self.max_temperature = max_temperature
+        self.chat = SimpleNamespace(completions=_CachedCompletions(self))
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidated = 0
+        self.saved_tokens = 0
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def is_cacheable(self, kwargs: Dict[str, Any], cache: Optional[bool] = None) -> bool:
+        if self.cache is None or cache is False:
+            return False
+        if kwargs.get("stream") or (kwargs.get("n") or 1) > 1:
+            return False
+        if cache:
+            return True
+        temperature = kwargs.get("temperature")
+        return temperature is not None and temperature <= self.max_temperature
+
+    async def _create(self, kwargs: Dict[str, Any], cache: Optional[bool]):
+        if not self.is_cacheable(kwargs, cache):
+            self.bypassed += 1
+            return await self.client.chat.completions.create(**kwargs)
+
+        key = request_key(kwargs)
+        try:
+            cached = self.cache.get(key)
+        except sqlite3.Error as e:
+            print(f"Warning: LLM cache lookup failed ({self.stage}): {e}")
+            cached = None
+        if cached is not None:
+            try:
+                completion = load_completion(cached)
+            except ValueError as e:
+                # 损坏的行 / 不是 ChatCompletion 的条目（pydantic 的 ValidationError 也是 ValueError）：删掉后按未命中处理
+                print(f"Warning: dropping unreadable LLM cache entry ({self.stage}): {e}")
+                self._drop(key)
+            else:
+                self.hits += 1
+                self.saved_tokens += zero_usage(completion)
+                return completion
+
+        self.misses += 1
+        completion = await self.client.chat.completions.create(**kwargs)
+        try:
+            self.cache.set(key, dump_completion(completion), model=kwargs.get("model", ""), stage=self.stage)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Warning: LLM cache write failed ({self.stage}): {e}")
+        return completion
+
+    def invalidate(self, cache: Optional[bool] = None, **kwargs) -> bool:
+        """
+        删除某个请求的缓存响应（调用方解析响应失败时使用），参数与 chat.completions.create 相同。
+
+        Returns:
+            缓存中是否有该请求的响应
+        """
+        if not self.is_cacheable(kwargs, cache):
+            return False
+        return self._drop(request_key(kwargs))
+
+    def _drop(self, key: str) -> bool:
+        try:
+            removed = self.cache.invalidate(key)
+        except sqlite3.Error as e:
+            print(f"Warning: LLM cache invalidation failed ({self.stage}): {e}")
+            return False
+        if removed:
+            self.invalidated += 1
+        return removed
+
+    def cache_summary(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        summary = {
+            "llm_cache_hits": self.hits,
+            "llm_cache_misses": self.misses,
+            "llm_cache_bypassed": self.bypassed,
+            "llm_cache_invalidated": self.invalidated,
+            "llm_cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            "llm_cache_saved_tokens": self.saved_tokens,
+        }
+        # 下层是 llm_coalesce.CoalescingAsyncClient 时一并报告合并数量
+        if hasattr(self.client, "coalesce_summary"):
+            summary.update(self.client.coalesce_summary())
+        return summary
+
+    def format_cache_summary(self) -> str:
+        summary = self.cache_summary()
+        text = (
+            f"LLM cache ({self.stage}): hits={summary['llm_cache_hits']}, misses={summary['llm_cache_misses']}, "
+            f"bypassed={summary['llm_cache_bypassed']}, hit rate={summary['llm_cache_hit_rate'] * 100:.2f}%, "
+            f"saved tokens={summary['llm_cache_saved_tokens']}"
+        )
+        if "llm_coalesced" in summary:
+            text += f", coalesced={summary['llm_coalesced']}/{summary['llm_requests']} requests"
+        return text
+
+
+def wrap_llm_client(client: Any, stage: str, config: Optional[Dict[str, Any]] = None) -> CachedAsyncClient:
+    """
+    用共享缓存包装 AsyncOpenAI 客户端（缓存层下面是 llm_coalesce 的 in-flight 合并层）。
+
+    config 中 llm_cache 段的 coalesce（默认 true）/ coalesce_exclude（额外不参与合并 key 的参数）控制合并层。
+
+    Args:
+        client: AsyncOpenAI 实例
+        stage: 阶段名，用于统计和缓存条目标记
+        config: 完整的 config.yaml 配置（读取其中的 llm_cache 段），没有配置文件的模块传 None 使用默认值
+    """
+    settings = dict((config or {}).get("llm_cache") or {})
+    enabled = settings.get("enabled", True) and os.getenv("GRAPH_TOUCAN_LLM_CACHE", "1") != "0"
+    cache = None
+    if enabled:
+        path = os.getenv("GRAPH_TOUCAN_LLM_CACHE_PATH") or settings.get("path", DEFAULT_CACHE_PATH)
+        ttl_days = settings.get("ttl_days", 30)
+        max_mb = settings.get("max_mb")
+        try:
+            cache = get_shared_cache(
+                path,
+                ttl_seconds=ttl_days * 24 * 3600 if ttl_days else None,
+                max_entries=settings.get("max_entries"),
+                max_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+            )
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: LLM cache disabled for {stage}, cannot open {path}: {e}")
+    from llm_coalesce import CoalescingAsyncClient
+
+    max_temperature = settings.get("max_temperature", DEFAULT_MAX_TEMPERATURE)
+    coalescing_client = CoalescingAsyncClient(
+        client,
+        enabled=settings.get("coalesce", True),
+        exclude_params=settings.get("coalesce_exclude", ()),
+        max_temperature=max_temperature,
+    )
+    return CachedAsyncClient(coalescing_client, cache, stage=stage, max_temperature=max_temperature)
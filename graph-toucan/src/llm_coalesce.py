@@ -0,0 +1,115 @@
+"""
+相同 LLM 请求的 in-flight 合并（request coalescing）。
+
+并发任务经常在同一时刻发出完全相同的请求（例如 build_graph_v1 同一个 batch 里对同一 node 的 filter、
+共享前缀的多条 FSP path 对同一个 tool 的模拟调用）。CoalescingAsyncClient 包装 AsyncOpenAI：
+- 第一个请求真正发出 HTTP 调用（作为独立 task 运行，发起者被取消不影响其他等待者）
+- 在它完成之前到达的相同请求直接等待同一个 future，拿到结果的深拷贝（usage 置零：只有一次实际请求，
+  token 统计和 TPM 预算只算发起者那一份；节省的 token 计入 coalesce_summary）
+- 完成后立即从 in-flight 表中移除，之后的请求重新调用（持久化复用交给 llm_cache）
+
+key 默认是 llm_cache.request_key（排除 timeout / extra_headers 等与输出无关的参数），
+可以通过 exclude_params 增加排除字段，或直接传入 key_fn 自定义归一化。
+默认只合并确定性请求（temperature <= max_temperature），采样请求合并会改变语义；
+单次调用可以用 coalesce=True / coalesce=False 强制开启 / 关闭（这个参数不会传给 API）。
+
+wrap_llm_client 默认把它放在缓存层下面：缓存未命中的并发相同请求只会发出一次 HTTP 调用。
+"""
+
+import asyncio
+import copy
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from llm_cache import DEFAULT_MAX_TEMPERATURE, NON_SEMANTIC_PARAMS, request_key, zero_usage
+
+
+class _CoalescingCompletions:
+    def __init__(self, owner: "CoalescingAsyncClient"):
+        self._owner = owner
+
+    async def create(self, coalesce: Optional[bool] = None, **kwargs):
+        return await self._owner._create(kwargs, coalesce)
+
+
+class CoalescingAsyncClient:
+    """
+    AsyncOpenAI 的 in-flight 合并包装：chat.completions.create 合并并发的相同请求，其余属性直接转发给原客户端。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        enabled: bool = True,
+        key_fn: Optional[Callable[[Dict[str, Any]], str]] = None,
+        exclude_params: Iterable[str] = (),
+        max_temperature: Optional[float] = DEFAULT_MAX_TEMPERATURE,
+    ):
+        """
+        Args:
+            client: AsyncOpenAI 实例
+            enabled: False 时直接透传（保留 coalesce 参数的兼容处理）
+            key_fn: 自定义 key 归一化函数，kwargs -> str；默认 request_key
+            exclude_params: 额外不参与 key 的参数名（在 NON_SEMANTIC_PARAMS 基础上追加）
+            max_temperature: 只合并 temperature 不超过该值的请求；None 表示不限制
+        """
+        self.client = client
+        self.enabled = enabled
+        exclude = frozenset(NON_SEMANTIC_PARAMS) | frozenset(exclude_params)
+        self.key_fn = key_fn or (lambda kwargs: request_key(kwargs, exclude=exclude))
+        self.max_temperature = max_temperature
+        self.chat = SimpleNamespace(completions=_CoalescingCompletions(self))
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.saved_tokens = 0
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def should_coalesce(self, kwargs: Dict[str, Any], coalesce: Optional[bool] = None) -> bool:
+        if not self.enabled or coalesce is False:
+            return False
+        if kwargs.get("stream") or (kwargs.get("n") or 1) > 1:
+            return False
+        if coalesce or self.max_temperature is None:
+            return True
+        temperature = kwargs.get("temperature")
+        return temperature is not None and temperature <= self.max_temperature
+
+    async def _create(self, kwargs: Dict[str, Any], coalesce: Optional[bool]):
+        self.requests += 1
+        if not self.should_coalesce(kwargs, coalesce):
+            self.upstream_calls += 1
+            return await self.client.chat.completions.create(**kwargs)
+
+        key = self.key_fn(kwargs)
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            completion = copy.deepcopy(await asyncio.shield(task))
+            self.saved_tokens += zero_usage(completion)
+            return completion
+
+        self.upstream_calls += 1
+        task = asyncio.ensure_future(self.client.chat.completions.create(**kwargs))
+        self.inflight[key] = task
+
+        def release(done: asyncio.Future) -> None:
+            if self.inflight.get(key) is done:
+                del self.inflight[key]
+            # 所有等待者都被取消时，避免 "exception was never retrieved" 警告
+            if not done.cancelled():
+                done.exception()
+
+        task.add_done_callback(release)
+        return await asyncio.shield(task)
+
+    def coalesce_summary(self) -> Dict[str, Any]:
+        return {
+            "llm_requests": self.requests,
+            "llm_coalesced": self.coalesced,
+            "llm_upstream_calls": self.upstream_calls,
+            "llm_coalesced_saved_tokens": self.saved_tokens,
+        }
@@ -11,6 +11,8 @@ import re
 from typing import Dict, List, Any, Optional, Tuple
 from openai import AsyncOpenAI
 
+from llm_cache import wrap_llm_client
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -56,10 +58,13 @@ except ImportError:
             if self.desc:
                 logger.info(f"{self.desc}: 完成 {self.current}/{self.total}")
 
-# 初始化异步 OpenAI 客户端
-async_client = AsyncOpenAI(
-    api_key="EMPTY",
-    base_url="http://10.1.144.30:8000/v1",
+# 初始化异步 OpenAI 客户端（带共享响应缓存）
+async_client = wrap_llm_client(
+    AsyncOpenAI(
+        api_key="EMPTY",
+        base_url="http://10.1.144.30:8000/v1",
+    ),
+    stage="llm_fix_code",
 )
 
 ROOT_DIR = "/data/lhy/datasets/graph-Toucan"
@@ -572,6 +577,7 @@ async def fix_files_from_regenerate_summary(
         "partially_fixed": partially_fixed_count,
         "error": error_count,
         "total_tokens": total_tokens,
+        **async_client.cache_summary(),
         "status_record": status_record,
         "results": results
     }
@@ -592,6 +598,7 @@ async def fix_files_from_regenerate_summary(
     logger.info(f"部分修复: {partially_fixed_count}")
     logger.info(f"处理出错: {error_count}")
     logger.info(f"总 token 使用: {total_tokens}")
+    logger.info(async_client.format_cache_summary())
     logger.info(f"结果摘要已保存到: {summary_path}")
     logger.info(f"状态记录已保存到: {FIX_CODE_STATUS_FILE}")
 
@@ -721,6 +728,7 @@ async def fix_files_from_json(
         "partially_fixed": partially_fixed_count,
         "error": error_count,
         "total_tokens": total_tokens,
+        **async_client.cache_summary(),
         "status_record": status_record,
         "results": results
     }
@@ -741,6 +749,7 @@ async def fix_files_from_json(
     logger.info(f"部分修复: {partially_fixed_count}")
     logger.info(f"处理出错: {error_count}")
     logger.info(f"总 token 使用: {total_tokens}")
+    logger.info(async_client.format_cache_summary())
     logger.info(f"结果摘要已保存到: {summary_path}")
     logger.info(f"状态记录已保存到: {FIX_CODE_STATUS_FILE}")
 
@@ -850,6 +859,7 @@ async def fix_all_files(
         "partially_fixed": partially_fixed_count,
         "error": error_count,
         "total_tokens": total_tokens,
+        **async_client.cache_summary(),
         "status_record": status_record,
         "results": results
     }
@@ -869,6 +879,7 @@ async def fix_all_files(
     logger.info(f"部分修复: {partially_fixed_count}")
     logger.info(f"处理出错: {error_count}")
     logger.info(f"总 token 使用: {total_tokens}")
+    logger.info(async_client.format_cache_summary())
     logger.info(f"结果摘要已保存到: {summary_path}")
     logger.info(f"状态记录已保存到: {FIX_CODE_STATUS_FILE}")
 
@@ -0,0 +1,235 @@
+"""
+LLM 请求的滑动窗口并发调度器。
+
+原来各个 pipeline 阶段（build_graph_v1 / generate_queries_for_all_turns / process_all_fsp_paths /
+run_distillation / run_distillation_v2）都是「切 batch -> asyncio.gather -> 下一个 batch」，
+每个 batch 都要等最慢的那个请求结束，endpoint 大部分时间是空闲的。
+
+SlidingWindowScheduler 维护一个工作队列，始终保持 max_concurrency 个请求在飞：
+任意一个请求完成就立即补上下一个，结果按完成顺序产出。
+
+- max_concurrency: 同时在飞的最大请求数
+- max_tokens_per_minute: 可选的 TPM 限制。派发请求时先按估计值预留 token，完成后换成实际消耗；
+  最近 60 秒内已完成请求的实际消耗 + 在飞请求的预留 + 新请求的估计超出预算时暂停派发
+  （等到有请求完成或最早的记录滑出窗口；没有任何占用时总是允许派发一个，避免单个估计值超过预算时卡死）。
+  估计值默认是已完成请求的平均消耗（还没有完成的请求时为 initial_token_estimate），也可以用 token_estimator 按条目给出
+- stop(): 早停。取消所有在飞请求，不再派发新请求（被取消的条目不会产出结果，resume 时会重试）
+
+用法：
+    scheduler = SlidingWindowScheduler(max_concurrency=20)
+    async for item, result in scheduler.run(items, worker):
+        if isinstance(result, Exception):
+            ...
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Optional, Set, Tuple
+
+DEFAULT_INITIAL_TOKEN_ESTIMATE = 1024
+_NO_ITEM = object()
+
+
+def default_token_counter(result: Any) -> int:
+    """从结果的 token_usage 字段中读取 total_tokens（与各阶段的返回格式一致）。"""
+    if isinstance(result, dict):
+        return (result.get("token_usage") or {}).get("total_tokens", 0) or 0
+    return 0
+
+
+def batch_token_counter(results: Any) -> int:
+    """worker 返回结果列表时（如一次请求判断一组 pair），累加每个结果的 total_tokens。"""
+    if isinstance(results, (list, tuple)):
+        return sum(default_token_counter(result) for result in results)
+    return default_token_counter(results)
+
+
+class SlidingWindowScheduler:
+    """
+    有界并发的工作队列调度器（滑动窗口，不存在 batch 屏障）。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_tokens_per_minute: Optional[int] = None,
+        token_counter: Callable[[Any], int] = default_token_counter,
+        token_estimator: Optional[Callable[[Any], int]] = None,
+        initial_token_estimate: int = DEFAULT_INITIAL_TOKEN_ESTIMATE,
+    ):
+        """
+        Args:
+            token_counter: 从 worker 的结果中读取实际消耗的 token
+            token_estimator: 可选，按条目估计一次请求的 token（派发时预留）；默认用已完成请求的平均消耗
+            initial_token_estimate: 还没有请求完成时的默认估计值
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be >= 1, got {max_concurrency}")
+        self.max_concurrency = max_concurrency
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.token_counter = token_counter
+        self.token_estimator = token_estimator
+        self.initial_token_estimate = initial_token_estimate
+
+        self._stopped = False
+        self._pending: Set[asyncio.Future] = set()
+        self._token_window: Deque[Tuple[float, int]] = deque()
+        self._window_tokens = 0
+        # 在飞请求预留的 token（派发时按估计值预留，完成时释放并记录实际消耗）
+        self._reservations: Dict[asyncio.Future, int] = {}
+        self._reserved_tokens = 0
+        self._counted_requests = 0
+        self._counted_tokens = 0
+
+        # 统计信息
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.peak_in_flight = 0
+        self.throttled_seconds = 0.0
+
+    def stop(self) -> None:
+        """早停：取消所有在飞的请求，不再派发新的请求。"""
+        self._stopped = True
+        for task in self._pending:
+            task.cancel()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def _record_tokens(self, result: Any) -> None:
+        if not self.max_tokens_per_minute:
+            return
+        try:
+            tokens = int(self.token_counter(result))
+        except Exception:
+            tokens = 0
+        self._counted_requests += 1
+        self._counted_tokens += max(tokens, 0)
+        if tokens > 0:
+            self._token_window.append((time.monotonic(), tokens))
+            self._window_tokens += tokens
+
+    def _estimate_tokens(self, item: Any) -> int:
+        if self.token_estimator is not None:
+            try:
+                return max(int(self.token_estimator(item)), 0)
+            except Exception:
+                pass
+        if self._counted_requests:
+            return self._counted_tokens // self._counted_requests
+        return self.initial_token_estimate
+
+    def _reserve(self, task: asyncio.Future, tokens: int) -> None:
+        if self.max_tokens_per_minute:
+            self._reservations[task] = tokens
+            self._reserved_tokens += tokens
+
+    def _release(self, task: asyncio.Future) -> None:
+        self._reserved_tokens -= self._reservations.pop(task, 0)
+
+    def _prune_token_window(self, now: float) -> None:
+        while self._token_window and now - self._token_window[0][0] >= 60.0:
+            _, tokens = self._token_window.popleft()
+            self._window_tokens -= tokens
+
+    def _token_budget_delay(self, estimate: int) -> Tuple[bool, Optional[float]]:
+        """
+        预留 estimate 个 token 后是否仍在 TPM 预算内。
+
+        Returns:
+            (是否可以派发, 不能派发时最早的窗口记录还要多久滑出窗口；窗口为空时为 None，只能等在飞请求完成)
+        """
+        if not self.max_tokens_per_minute:
+            return True, None
+        now = time.monotonic()
+        self._prune_token_window(now)
+        used = self._window_tokens + self._reserved_tokens
+        if used == 0 or used + estimate <= self.max_tokens_per_minute:
+            return True, None
+        if not self._token_window:
+            return False, None
+        return False, max(0.01, 60.0 - (now - self._token_window[0][0]))
+
+    async def run(
+        self,
+        items: Iterable[Any],
+        worker: Callable[[Any], Awaitable[Any]],
+    ) -> AsyncIterator[Tuple[Any, Any]]:
+        """
+        对 items 中的每个元素调用 worker，保持最多 max_concurrency 个在飞，按完成顺序产出 (item, result)。
+
+        worker 抛出的异常会作为 result 产出（等价于 asyncio.gather(..., return_exceptions=True)）。
+        """
+        iterator = iter(items)
+        exhausted = False
+        next_item = _NO_ITEM
+        task_to_item: Dict[asyncio.Future, Any] = {}
+
+        try:
+            while True:
+                # 补满窗口（TPM 预算不足时停止派发）
+                throttled = False
+                throttle_delay = None
+                while not self._stopped and not exhausted and len(self._pending) < self.max_concurrency:
+                    if next_item is _NO_ITEM:
+                        try:
+                            next_item = next(iterator)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                    estimate = self._estimate_tokens(next_item)
+                    admitted, throttle_delay = self._token_budget_delay(estimate)
+                    if not admitted:
+                        throttled = True
+                        break
+                    task = asyncio.ensure_future(worker(next_item))
+                    task_to_item[task] = next_item
+                    next_item = _NO_ITEM
+                    self._pending.add(task)
+                    self._reserve(task, estimate)
+                    self.submitted += 1
+                    self.peak_in_flight = max(self.peak_in_flight, len(self._pending))
+
+                wait_start = time.monotonic()
+                if not self._pending:
+                    if not throttled:
+                        break
+                    # 没有在飞的请求：等最早的窗口记录滑出 60 秒窗口
+                    await asyncio.sleep(throttle_delay)
+                    self.throttled_seconds += time.monotonic() - wait_start
+                    continue
+
+                # 预算不足时等到有请求完成（释放预留）或最早的窗口记录过期
+                done, _ = await asyncio.wait(self._pending, timeout=throttle_delay, return_when=asyncio.FIRST_COMPLETED)
+                if throttled:
+                    self.throttled_seconds += time.monotonic() - wait_start
+                for task in done:
+                    self._pending.discard(task)
+                    self._release(task)
+                    item = task_to_item.pop(task)
+                    if task.cancelled():
+                        self.cancelled += 1
+                        continue
+                    exc = task.exception()
+                    result = exc if exc is not None else task.result()
+                    self.completed += 1
+                    self._record_tokens(result)
+                    yield item, result
+        finally:
+            for task in self._pending:
+                task.cancel()
+            self._pending.clear()
+            self._reservations.clear()
+            self._reserved_tokens = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "peak_in_flight": self.peak_in_flight,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+        }
@@ -0,0 +1,273 @@
+"""
+DAG 上有界长度路径的精确计数与均匀采样。
+
+随机游走得到的链分布偏向出度大的 node，也无法知道长度为 k 的合法链一共有多少条。
+remove_cycles_minimally（validate.py）输出的图是 DAG，DAG 上的路径天然是简单路径，可以用 DP 精确计数：
+
+    C[0][v] = 1
+    C[l][v] = sum(C[l - 1][u] for u in successors(v))      # 从 v 出发、恰好 l 条边的路径数
+
+- 路径按 (起点, 长度, 字典序) 排成一个整体序列，第 rank 条路径可以直接“解码”（unrank）：
+  先用起点 / 长度的累计数二分定位 block，再逐步在后继的累计计数里二分选下一个 node
+  （每一层每条边预先存好组内累计数，每条路径 O(L log deg)）
+- 均匀采样 = 均匀抽 rank；不放回采样直接用 random.sample(range(total), n)，不需要“多生成再去重”
+  （total 超过 sys.maxsize 时 range 无法取长度，改为 randrange + 拒绝重复，此时 n 远小于 total）
+- 计数用 Python int，不会溢出
+
+用法：
+    counter = PathCounter(load_graph_store(acyclic_graph_path), max_length=5)
+    counter.total                      # 长度 1..5 的路径总数
+    paths = counter.sample(1000, rng)  # 1000 条互不相同的均匀随机路径
+
+    python path_counting.py graph_acyclic.json paths_uniform.jsonl --num-paths 10000 --max-length 5
+"""
+
+import argparse
+import bisect
+import random
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from graph_store import load_graph_store
+from path_stream import RecordWriter
+
+
+def find_cycle_nodes(offsets: Sequence[int], targets: Sequence[int], num_nodes: int) -> List[int]:
+    """Kahn 拓扑排序后仍有入度的 node（为空表示无环）"""
+    indegree = [0] * num_nodes
+    for t in targets:
+        indegree[t] += 1
+    queue = [v for v in range(num_nodes) if indegree[v] == 0]
+    removed = 0
+    while queue:
+        v = queue.pop()
+        removed += 1
+        for k in range(offsets[v], offsets[v + 1]):
+            t = targets[k]
+            indegree[t] -= 1
+            if indegree[t] == 0:
+                queue.append(t)
+    if removed == num_nodes:
+        return []
+    return [v for v in range(num_nodes) if indegree[v] > 0]
+
+
+def unique_successor_csr(offsets: Sequence[int], targets: Sequence[int], num_nodes: int) -> Tuple[array, array]:
+    """合并同一对 node 之间的多条边（不同依赖类型），计数的是不同的 node 序列"""
+    new_offsets = array("q", [0])
+    new_targets = array("i")
+    for v in range(num_nodes):
+        seen = set()
+        for k in range(offsets[v], offsets[v + 1]):
+            t = targets[k]
+            if t not in seen:
+                seen.add(t)
+                new_targets.append(t)
+        new_offsets.append(len(new_targets))
+    return new_offsets, new_targets
+
+
+class PathCounter:
+    """
+    DAG 上从各起点出发、长度（边数）在 [min_length, max_length] 内的路径计数 / 解码 / 均匀采样。
+    """
+
+    def __init__(
+        self,
+        store,
+        max_length: int,
+        min_length: int = 1,
+        exclude_types: Iterable[str] = ("prerequisite",),
+        start_nodes: Optional[Iterable[int]] = None,
+        check_acyclic: bool = True,
+    ):
+        """
+        Args:
+            store: graph_store.GraphStore（应为 remove_cycles_minimally 输出的无环图）
+            max_length / min_length: 路径边数范围（与 random_walker 的 max_steps 含义相同）
+            exclude_types: 忽略的边类型（与 load_graph_for_walk 一致）
+            start_nodes: 允许的起点（默认所有 node）
+            check_acyclic: 检查图是否无环；有环时 DP 计数的是 walk 而不是简单路径，直接报错
+        """
+        if min_length < 0 or max_length < min_length:
+            raise ValueError(f"Invalid length range [{min_length}, {max_length}]")
+        self.store = store
+        self.max_length = max_length
+        self.min_length = min_length
+        self.num_nodes = store.num_nodes
+        self.offsets, self.targets = unique_successor_csr(*store.filtered_csr(exclude_types), store.num_nodes)
+
+        if check_acyclic:
+            cycle_nodes = find_cycle_nodes(self.offsets, self.targets, self.num_nodes)
+            if cycle_nodes:
+                raise ValueError(
+                    f"Graph has cycles through {len(cycle_nodes)} nodes (e.g. {cycle_nodes[:5]}); "
+                    f"run validate.remove_cycles_minimally first"
+                )
+
+        # counts[l][v]：从 v 出发恰好 l 条边的路径数
+        offsets, targets = self.offsets, self.targets
+        self.counts: List[List[int]] = [[1] * self.num_nodes]
+        # cum[l][k]：边 k 所在行内、到 k 为止（含）的 counts[l - 1][target] 累计数（l >= 1）
+        self.cum: List[Optional[List[int]]] = [None]
+        for length in range(1, max_length + 1):
+            prev = self.counts[length - 1]
+            cur = [0] * self.num_nodes
+            cum = [0] * len(targets)
+            for v in range(self.num_nodes):
+                running = 0
+                for k in range(offsets[v], offsets[v + 1]):
+                    running += prev[targets[k]]
+                    cum[k] = running
+                cur[v] = running
+            self.counts.append(cur)
+            self.cum.append(cum)
+
+        # 起点 × 长度 的 block，按 (起点, 长度) 排列
+        self.start_nodes = list(start_nodes) if start_nodes is not None else list(range(self.num_nodes))
+        self.blocks: List[Tuple[int, int]] = []
+        self.block_ends: List[int] = []
+        total = 0
+        for v in self.start_nodes:
+            for length in range(min_length, max_length + 1):
+                count = self.counts[length][v]
+                if count:
+                    total += count
+                    self.blocks.append((v, length))
+                    self.block_ends.append(total)
+        self.total = total
+
+    def count(self, start: int, length: int) -> int:
+        """从 start 出发恰好 length 条边的路径数"""
+        return self.counts[length][start]
+
+    def totals_by_length(self) -> Dict[int, int]:
+        return {
+            length: sum(self.counts[length][v] for v in self.start_nodes)
+            for length in range(self.min_length, self.max_length + 1)
+        }
+
+    def unrank(self, rank: int) -> List[int]:
+        """第 rank 条路径（0 <= rank < total）"""
+        if not 0 <= rank < self.total:
+            raise IndexError(rank)
+        b = bisect.bisect_right(self.block_ends, rank)
+        start, length = self.blocks[b]
+        offset = rank - (self.block_ends[b - 1] if b > 0 else 0)
+
+        path = [start]
+        current = start
+        for remaining in range(length, 0, -1):
+            cum = self.cum[remaining]
+            lo, hi = self.offsets[current], self.offsets[current + 1]
+            k = bisect.bisect_right(cum, offset, lo, hi)
+            if k > lo:
+                offset -= cum[k - 1]
+            current = self.targets[k]
+            path.append(current)
+        return path
+
+    def sample(self, n: int, rng: random.Random, unique: bool = True) -> List[List[int]]:
+        """
+        均匀随机采样 n 条路径。unique=True 时不放回（n 超过总数时返回全部路径），结果按 rank 排序（同一起点相邻）。
+        """
+        if unique:
+            k = min(n, self.total)
+            if self.total <= sys.maxsize:
+                ranks = sorted(rng.sample(range(self.total), k))
+            else:
+                # len(range) 超过 sys.maxsize 时 rng.sample 会 OverflowError；此时 k 远小于总数，拒绝重复的 rank 即可
+                chosen = set()
+                while len(chosen) < k:
+                    chosen.add(rng.randrange(self.total))
+                ranks = sorted(chosen)
+        else:
+            ranks = [rng.randrange(self.total) for _ in range(n)] if self.total else []
+        return [self.unrank(rank) for rank in ranks]
+
+    def report(self, top_k: int = 20) -> Dict[str, Any]:
+        """计数摘要：总数、各长度的路径数、路径最多的起点"""
+        per_node = [
+            (v, sum(self.counts[length][v] for length in range(self.min_length, self.max_length + 1)))
+            for v in self.start_nodes
+        ]
+        per_node.sort(key=lambda item: -item[1])
+        return {
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+            "total_paths": self.total,
+            "paths_by_length": {str(k): v for k, v in self.totals_by_length().items()},
+            "num_start_nodes_with_paths": sum(1 for _, c in per_node if c),
+            "top_start_nodes": [
+                {"index": v, "name": self.store.name(v), "num_paths": c} for v, c in per_node[:top_k]
+            ],
+        }
+
+
+def sample_paths_to_file(
+    graph_path: str,
+    output_path: str,
+    num_paths: int,
+    max_length: int = 5,
+    min_length: int = 1,
+    seed: int = 42,
+    exclude_types: Iterable[str] = ("prerequisite",),
+) -> Dict[str, Any]:
+    """
+    从无环图中不放回地均匀采样 num_paths 条路径，写成 path_stream 的 walk_paths JSONL（generate_fsp_v2 可以直接读取）。
+
+    Returns:
+        PathCounter.report() + 实际采样条数
+    """
+    store = load_graph_store(graph_path)
+    counter = PathCounter(store, max_length=max_length, min_length=min_length, exclude_types=exclude_types)
+    report = counter.report()
+    print(f"Total paths with {min_length}..{max_length} edges: {counter.total:,}")
+
+    paths = counter.sample(num_paths, random.Random(seed))
+    report["num_sampled"] = len(paths)
+
+    meta = {
+        "graph_path": graph_path,
+        "walk_engine": "uniform_exact",
+        "min_length": min_length,
+        "max_length": max_length,
+        "seed": seed,
+    }
+    with RecordWriter(output_path, kind="walk_paths", meta=meta) as writer:
+        current_start = None
+        walk_id = 0
+        for path in paths:
+            if path[0] != current_start:
+                current_start = path[0]
+                walk_id = 0
+                writer.write({"type": "node", "node_idx": current_start, "name": store.name(current_start)})
+            walk_id += 1
+            writer.write({
+                "type": "path",
+                "node_idx": current_start,
+                "walk_id": walk_id,
+                "node_indices": path,
+                "node_names": [store.name(p) for p in path],
+                "path_length": len(path),
+            })
+        writer.set_statistics(report)
+
+    print(f"Sampled {len(paths)} distinct paths uniformly -> {output_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count bounded-length paths in the acyclic tool graph and sample them uniformly")
+    parser.add_argument("graph_path", help="acyclic graph (output of validate.remove_cycles_minimally)")
+    parser.add_argument("output_path", help="walk_paths JSONL output")
+    parser.add_argument("--num-paths", type=int, default=10000)
+    parser.add_argument("--max-length", type=int, default=5)
+    parser.add_argument("--min-length", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    sample_paths_to_file(
+        args.graph_path, args.output_path, args.num_paths,
+        max_length=args.max_length, min_length=args.min_length, seed=args.seed,
+    )
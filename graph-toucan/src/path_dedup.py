@@ -0,0 +1,247 @@
+"""
+跨起点的全局路径去重（canonical hash + trie 子路径包含）。
+
+random_walker 只在每个起点的 paths_before_dedup 内部去重，generate_fsp_v2 / backward_to_query 对所有幸存路径生成 query。
+不同起点走出的链经常互相包含（例如 node 1 的 [1, 2, 3] 是 node 0 的 [0, 1, 2, 3] 的后缀），同一条链的 query 会被生成多次。
+
+GlobalPathDeduper 在 iter_walk_paths 的输出上流式去重：
+- 精确去重：路径的 canonical hash（node index 序列的 64 位 blake2b）放进 hash set，只保留第一次出现
+- 子路径包含（subsumption，可选）：
+    "prefix"  路径是另一条更长路径的前缀时丢弃
+    "suffix"  路径是另一条更长路径的后缀时丢弃
+    "subpath" 路径是另一条更长路径中任意一段连续子链时丢弃
+  包含关系需要看到全部路径：第一遍流式读取把路径（suffix / subpath 模式下是反转路径 / 所有后缀）插入 trie，
+  第二遍流式读取输出幸存路径，内存只有 trie 和 hash set
+- 统计丢弃的路径数和按路径长度估算的 LLM token 节省量
+
+用法：
+    deduper = GlobalPathDeduper(subsumption="subpath")
+    for node_idx, node_name, path_idx, record in deduper.iter_unique(walk_path_file):
+        ...
+    print(format_dedup_stats(deduper.stats()))
+
+    python path_dedup.py path_v1.jsonl path_v1_global_dedup.jsonl --subsumption subpath
+"""
+
+import argparse
+import hashlib
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from path_stream import RecordWriter, iter_records, iter_walk_paths, is_jsonl_path
+
+SUBSUMPTION_MODES = ("none", "prefix", "suffix", "subpath")
+
+# 每条路径进入下游（backward_to_query + 蒸馏）的 token 估算：固定开销 + 每个 tool 的开销
+DEFAULT_BASE_TOKENS_PER_PATH = 1500
+DEFAULT_TOKENS_PER_TOOL = 800
+
+
+def canonical_hash(path: Sequence[int]) -> int:
+    """路径的 canonical 64 位哈希（与进程无关，可以跨运行比较）"""
+    return int.from_bytes(hashlib.blake2b(array("q", path).tobytes(), digest_size=8).digest(), "little")
+
+
+class PathTrie:
+    """
+    node index 序列的 trie。每个节点是 [children dict, 标记位]；
+    标记位 PROPER_SUFFIX 表示某条路径的一个真后缀恰好在这里结束（subpath 模式用）。
+    """
+
+    PROPER_SUFFIX = 1
+
+    def __init__(self):
+        self.root: List[Any] = [{}, 0]
+        self.num_nodes = 1
+
+    def insert(self, seq: Sequence[int], flag: int = 0) -> None:
+        node = self.root
+        for item in seq:
+            children = node[0]
+            child = children.get(item)
+            if child is None:
+                child = [{}, 0]
+                children[item] = child
+                self.num_nodes += 1
+            node = child
+        node[1] |= flag
+
+    def find(self, seq: Sequence[int]) -> Optional[List[Any]]:
+        node = self.root
+        for item in seq:
+            node = node[0].get(item)
+            if node is None:
+                return None
+        return node
+
+
+class GlobalPathDeduper:
+    """跨起点的全局路径去重（见模块说明）"""
+
+    def __init__(
+        self,
+        subsumption: str = "none",
+        key: str = "node_indices",
+        base_tokens_per_path: int = DEFAULT_BASE_TOKENS_PER_PATH,
+        tokens_per_tool: int = DEFAULT_TOKENS_PER_TOOL,
+    ):
+        """
+        Args:
+            subsumption: "none" / "prefix" / "suffix" / "subpath"
+            key: 用于比较的路径字段（"node_indices"，或 merge 后的 "merged_path"）
+            base_tokens_per_path / tokens_per_tool: token 节省量估算参数
+        """
+        if subsumption not in SUBSUMPTION_MODES:
+            raise ValueError(f"Unknown subsumption mode: {subsumption}")
+        self.subsumption = subsumption
+        self.key = key
+        self.base_tokens_per_path = base_tokens_per_path
+        self.tokens_per_tool = tokens_per_tool
+        self.trie: Optional[PathTrie] = None
+        self.seen: set = set()
+        self.num_input = 0
+        self.num_kept = 0
+        self.num_exact_duplicates = 0
+        self.num_subsumed = 0
+        self.tokens_saved = 0
+
+    def _path(self, record: Dict[str, Any]) -> List[int]:
+        return record.get(self.key) or record.get("node_indices") or []
+
+    def estimate_tokens(self, path: Sequence[int]) -> int:
+        return self.base_tokens_per_path + self.tokens_per_tool * len(path)
+
+    # ---------- trie ----------
+
+    def add_to_trie(self, path: Sequence[int]) -> None:
+        if self.trie is None:
+            self.trie = PathTrie()
+        if self.subsumption == "prefix":
+            self.trie.insert(path)
+        elif self.subsumption == "suffix":
+            self.trie.insert(path[::-1])
+        elif self.subsumption == "subpath":
+            for start in range(len(path)):
+                self.trie.insert(path[start:], PathTrie.PROPER_SUFFIX if start > 0 else 0)
+
+    def is_subsumed(self, path: Sequence[int]) -> bool:
+        """path 是否严格包含在 trie 中的另一条更长路径里"""
+        if self.subsumption == "none" or self.trie is None or not path:
+            return False
+        if self.subsumption == "suffix":
+            node = self.trie.find(path[::-1])
+        else:
+            node = self.trie.find(path)
+        if node is None:
+            return False
+        if node[0]:
+            # 在某条路径里后面还有节点（前缀 / 后缀 / 中间一段）
+            return True
+        return self.subsumption == "subpath" and bool(node[1] & PathTrie.PROPER_SUFFIX)
+
+    # ---------- 流式去重 ----------
+
+    def build_index(self, input_path: str) -> None:
+        """第一遍：把所有路径插入 trie（subsumption="none" 时什么都不做）"""
+        if self.subsumption == "none":
+            return
+        for _, _, _, record in iter_walk_paths(input_path):
+            self.add_to_trie(self._path(record))
+
+    def accept(self, path: Sequence[int]) -> bool:
+        """第二遍中逐条判断是否保留，并更新统计"""
+        self.num_input += 1
+        path_hash = canonical_hash(path)
+        if path_hash in self.seen:
+            self.num_exact_duplicates += 1
+            self.tokens_saved += self.estimate_tokens(path)
+            return False
+        self.seen.add(path_hash)
+        if self.is_subsumed(path):
+            self.num_subsumed += 1
+            self.tokens_saved += self.estimate_tokens(path)
+            return False
+        self.num_kept += 1
+        return True
+
+    def iter_unique(self, input_path: str, follow: bool = False) -> Iterator[Tuple[int, str, int, Dict[str, Any]]]:
+        """
+        与 path_stream.iter_walk_paths 相同的迭代接口，只输出去重后幸存的路径。
+        follow=True（边写边读）时拿不到全部路径，只支持 subsumption="none"。
+        """
+        if follow and self.subsumption != "none":
+            raise ValueError("subsumption dedup needs the complete walk output; use follow=False")
+        self.build_index(input_path)
+        for item in iter_walk_paths(input_path, follow=follow):
+            if self.accept(self._path(item[3])):
+                yield item
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subsumption": self.subsumption,
+            "key": self.key,
+            "input_paths": self.num_input,
+            "kept_paths": self.num_kept,
+            "exact_duplicates": self.num_exact_duplicates,
+            "subsumed_paths": self.num_subsumed,
+            "removed_ratio": (self.num_input - self.num_kept) / self.num_input if self.num_input else 0.0,
+            "estimated_tokens_saved": self.tokens_saved,
+            "trie_nodes": self.trie.num_nodes if self.trie is not None else 0,
+        }
+
+
+def format_dedup_stats(stats: Dict[str, Any]) -> str:
+    return (
+        f"全局去重（{stats['subsumption']}）: {stats['input_paths']} -> {stats['kept_paths']} 条路径 "
+        f"(精确重复 {stats['exact_duplicates']}, 子路径包含 {stats['subsumed_paths']}, "
+        f"去除率 {stats['removed_ratio']:.2%})，预计节省 LLM tokens: {stats['estimated_tokens_saved']:,}"
+    )
+
+
+def dedup_walk_file(
+    input_path: str,
+    output_path: str,
+    subsumption: str = "subpath",
+    key: str = "node_indices",
+) -> Dict[str, Any]:
+    """
+    对 random_walker 的输出（JSONL 或原来的 path_v1.json）做全局去重，写成 path_stream 的 walk_paths JSONL。
+    path 记录只保留幸存的路径；node 记录只写 node_idx / name（去重后原来的 per-node 统计不再准确）。
+
+    Returns:
+        去重统计（同时写入 summary 记录）
+    """
+    if not is_jsonl_path(output_path):
+        raise ValueError(f"Global dedup output must be a JSONL file: {output_path}")
+    deduper = GlobalPathDeduper(subsumption=subsumption, key=key)
+    deduper.build_index(input_path)
+
+    meta: Dict[str, Any] = {"input_path": input_path, "global_dedup": {"subsumption": subsumption, "key": key}}
+    if is_jsonl_path(input_path):
+        meta["walk_meta"] = next(iter_records(input_path)).get("meta", {})
+
+    with RecordWriter(output_path, kind="walk_paths", meta=meta) as writer:
+        written_nodes = set()
+        for node_idx, node_name, path_idx, record in iter_walk_paths(input_path):
+            if not deduper.accept(deduper._path(record)):
+                continue
+            if node_idx not in written_nodes:
+                writer.write({"type": "node", "node_idx": node_idx, "name": node_name})
+                written_nodes.add(node_idx)
+            writer.write({"type": "path", "node_idx": node_idx, "walk_id": path_idx + 1, **{
+                k: v for k, v in record.items() if k not in ("type", "node_idx", "walk_id")
+            }})
+        writer.set_statistics(deduper.stats())
+
+    print(format_dedup_stats(deduper.stats()))
+    return deduper.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Global cross-node deduplication of random-walk paths")
+    parser.add_argument("input_path")
+    parser.add_argument("output_path")
+    parser.add_argument("--subsumption", choices=SUBSUMPTION_MODES, default="subpath")
+    parser.add_argument("--key", default="node_indices")
+    args = parser.parse_args()
+    dedup_walk_file(args.input_path, args.output_path, subsumption=args.subsumption, key=args.key)
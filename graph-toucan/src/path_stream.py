@@ -0,0 +1,286 @@
+"""
+游走路径 / FSP 产物的流式 JSONL 格式。
+
+原来 run_walks_from_all_nodes_with_dedup 把所有 node_results 放在内存里，再展开一份带 node_names 的 to_save，
+最后整体 json.dump(indent=2)；generate_fsp_v2 又要整体 json.load。内存随游走条数线性增长，
+下游也必须等上游整个跑完。现在改为每行一条记录：
+
+    {"type": "header", "kind": "walk_paths", "version": 1, "meta": {...}}
+    {"type": "node", "node_idx": 0, "name": ..., "num_paths_before_dedup": ..., ...}
+    {"type": "path", "node_idx": 0, "walk_id": 1, "node_indices": [...], "node_names": [...], ...}
+    ...
+    {"type": "summary", "statistics": {...}}
+
+- 文件名以 .jsonl 结尾时使用该格式；.jsonl.gz / .jsonl.bz2 / .jsonl.xz 为压缩变体（标准库 gzip / bz2 / lzma）
+- summary 记录只在写完时出现：读到 summary 说明文件完整
+- iter_records(path, follow=True) 可以在上游还在写的时候边读边消费（仅限未压缩文件），读到 summary 后结束
+- RecordWriter(append=True) 续写中断的未压缩文件（没有 summary），用于按路径 ID 断点续跑
+- 其他文件名仍按原来的单个 JSON 文档处理，iter_walk_paths / iter_fsp_paths 对两种格式给出相同的迭代结果
+"""
+
+import bz2
+import gzip
+import json
+import lzma
+import os
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+FORMAT_VERSION = 1
+
+_COMPRESSORS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+
+def _split_compression(path: str) -> Tuple[str, Optional[str]]:
+    base, ext = os.path.splitext(path)
+    if ext in _COMPRESSORS:
+        return base, ext
+    return path, None
+
+
+def is_jsonl_path(path: str) -> bool:
+    """path 是否为 JSONL（可带压缩后缀）"""
+    base, _ = _split_compression(path)
+    return base.endswith(".jsonl")
+
+
+def is_compressed_path(path: str) -> bool:
+    return _split_compression(path)[1] is not None
+
+
+def open_text(path: str, mode: str = "r"):
+    """按后缀打开（可能压缩的）文本文件"""
+    _, ext = _split_compression(path)
+    if ext is None:
+        return open(path, mode, encoding="utf-8")
+    return _COMPRESSORS[ext](path, mode + "t", encoding="utf-8")
+
+
+class RecordWriter:
+    """
+    流式写 JSONL 记录：构造时写 header，close(statistics) 时写 summary。
+
+    用法：
+        with RecordWriter(path, kind="walk_paths", meta={...}) as writer:
+            writer.write({"type": "path", ...})
+            writer.flush()
+            writer.set_statistics({...})
+    """
+
+    def __init__(self, path: str, kind: str, meta: Optional[Dict[str, Any]] = None, append: bool = False):
+        """
+        append=True 时续写一个中断的（没有 summary 的）未压缩文件：丢掉末尾写了一半的行，不再写 header，
+        num_records 从已有记录数开始。已有 header 的 meta 必须与本次的 meta 相同（meta 为 None 时不检查），
+        否则抛 ValueError；文件为空（header 还没写完就中断）时按全新文件处理
+        """
+        self.path = path
+        self.kind = kind
+        self.compressed = is_compressed_path(path)
+        self.num_records = 0
+        self.statistics: Optional[Dict[str, Any]] = None
+        if append and self._open_for_append(meta):
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._f = open_text(path, "w")
+        self._write_line({"type": "header", "kind": self.kind, "version": FORMAT_VERSION, "meta": meta or {}})
+
+    def _open_for_append(self, meta: Optional[Dict[str, Any]]) -> bool:
+        """打开已有文件续写；文件为空时返回 False，由调用方按全新文件写 header"""
+        if self.compressed:
+            raise ValueError(f"Cannot resume a compressed JSONL file: {self.path}")
+        drop_partial_record(self.path)
+        if os.path.getsize(self.path) == 0:
+            return False
+        header = read_header(self.path)
+        if header.get("kind") != self.kind:
+            raise ValueError(f"{self.path} holds {header.get('kind')!r} records, expected {self.kind!r}")
+        if meta is not None:
+            # 按 JSON 往返后比较（tuple / list 等写入后不可区分）
+            expected = json.loads(json.dumps(meta, ensure_ascii=False))
+            existing = header.get("meta") or {}
+            mismatched = sorted(k for k in set(expected) | set(existing) if expected.get(k) != existing.get(k))
+            if mismatched:
+                details = ", ".join(f"{k}: {existing.get(k)!r} != {expected.get(k)!r}" for k in mismatched)
+                raise ValueError(f"Cannot resume {self.path}: header meta differs from this run ({details})")
+        for record in iter_records(self.path):
+            if record.get("type") == "summary":
+                raise ValueError(f"{self.path} is already complete")
+            if record.get("type") != "header":
+                self.num_records += 1
+        self._f = open_text(self.path, "a")
+        return True
+
+    def _write_line(self, record: Dict[str, Any]) -> None:
+        self._f.write(json.dumps(record, ensure_ascii=False))
+        self._f.write("\n")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._write_line(record)
+        self.num_records += 1
+
+    def flush(self) -> None:
+        """让 follow 模式的读者看到已写的记录（压缩文件不做同步 flush，避免破坏压缩率）"""
+        if not self.compressed:
+            self._f.flush()
+
+    def set_statistics(self, statistics: Dict[str, Any]) -> None:
+        self.statistics = statistics
+
+    def close(self, statistics: Optional[Dict[str, Any]] = None) -> None:
+        if self._f.closed:
+            return
+        if statistics is not None:
+            self.statistics = statistics
+        self._write_line({"type": "summary", "num_records": self.num_records, "statistics": self.statistics or {}})
+        self._f.close()
+
+    def abort(self) -> None:
+        """出错时关闭文件但不写 summary，读者据此判断文件不完整"""
+        if not self._f.closed:
+            self._f.close()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_records(
+    path: str,
+    follow: bool = False,
+    poll_interval: float = 1.0,
+    timeout: Optional[float] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    逐条读取 JSONL 记录（包括 header 和 summary）。
+
+    Args:
+        path: JSONL 文件路径（可压缩）
+        follow: True 时在文件末尾等待上游继续写入，直到读到 summary；只支持未压缩文件
+        poll_interval: follow 模式下的轮询间隔（秒）
+        timeout: follow 模式下连续多久没有新数据就放弃（None 表示一直等）
+    """
+    if follow and is_compressed_path(path):
+        raise ValueError(f"follow mode requires an uncompressed JSONL file: {path}")
+
+    if follow:
+        while not os.path.exists(path):
+            time.sleep(poll_interval)
+
+    with open_text(path, "r") as f:
+        pending = ""
+        idle_since = time.monotonic()
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if not pending.endswith("\n"):
+                    # 上游写到一半的行，等待剩余部分
+                    continue
+                line, pending = pending, ""
+                idle_since = time.monotonic()
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield record
+                if record.get("type") == "summary":
+                    return
+                continue
+            if not follow:
+                if pending.strip():
+                    raise ValueError(f"Truncated record at end of {path}")
+                return
+            if timeout is not None and time.monotonic() - idle_since > timeout:
+                raise TimeoutError(f"No new records in {path} for {timeout}s")
+            time.sleep(poll_interval)
+
+
+def drop_partial_record(path: str) -> None:
+    """截掉未压缩 JSONL 末尾没有换行的半行（进程被杀时写到一半的记录）"""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        chunk = 1 << 16
+        pos = size
+        while pos > 0:
+            start = max(0, pos - chunk)
+            f.seek(start)
+            data = f.read(pos - start)
+            newline = data.rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                if end != size:
+                    f.truncate(end)
+                return
+            pos = start
+        f.truncate(0)
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """只读 header 记录"""
+    for record in iter_records(path):
+        if record.get("type") != "header":
+            raise ValueError(f"{path} does not start with a header record")
+        return record
+    raise ValueError(f"{path} is empty")
+
+
+def iter_walk_paths(path: str, follow: bool = False) -> Iterator[Tuple[int, str, int, Dict[str, Any]]]:
+    """
+    遍历游走结果中去重后的路径，对 JSONL 和原来的 path_v1.json 给出相同的顺序。
+
+    Yields:
+        (node_idx, node_name, path_idx, path_record)，path_record 至少包含 node_indices
+    """
+    if not is_jsonl_path(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for node_idx_str, node_data in data.get("node_results", {}).items():
+            node_idx = int(node_idx_str)
+            node_name = node_data.get("name", f"node_{node_idx}")
+            for path_idx, path_data in enumerate(node_data.get("paths_after_dedup", [])):
+                if not isinstance(path_data, dict):
+                    path_data = {"node_indices": path_data}
+                yield node_idx, node_name, path_idx, path_data
+        return
+
+    node_names: Dict[int, str] = {}
+    for record in iter_records(path, follow=follow):
+        record_type = record.get("type")
+        if record_type == "node":
+            node_names[record["node_idx"]] = record.get("name", f"node_{record['node_idx']}")
+        elif record_type == "path":
+            node_idx = record["node_idx"]
+            yield node_idx, node_names.get(node_idx, f"node_{node_idx}"), record["walk_id"] - 1, record
+
+
+def iter_fsp_paths(path: str, follow: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    遍历 FSP v2 路径（fsp_v2.json 或 JSONL），每条路径带 node_idx / node_name。
+    """
+    if not is_jsonl_path(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for node_idx_str, node_data in data.get("node_results", {}).items():
+            for fsp_path in node_data.get("paths", []):
+                fsp_path["node_idx"] = int(node_idx_str)
+                fsp_path.setdefault("node_name", node_data.get("node_name"))
+                yield fsp_path
+        return
+
+    for record in iter_records(path, follow=follow):
+        if record.get("type") == "path":
+            del record["type"]
+            yield record
@@ -26,6 +26,8 @@ from openai import AsyncOpenAI
 # 导入 backward_to_query 中的函数
 sys.path.insert(0, os.path.dirname(__file__))
 from backward_to_query import execute_function_call
+from llm_scheduler import SlidingWindowScheduler
+from llm_cache import wrap_llm_client
 
 
 # 路径配置
@@ -69,9 +71,10 @@ else:
     api_key = config["api"].get("api_key", "EMPTY")
 base_url = config["api"]["base_url"]
 
-async_client = AsyncOpenAI(
-    api_key=api_key,
-    base_url=base_url,
+async_client = wrap_llm_client(
+    AsyncOpenAI(api_key=api_key, base_url=base_url),
+    stage="positive_distill",
+    config=config,
 )
 
 # 模型配置
@@ -1003,18 +1006,22 @@ async def run_distillation(
     use_atomic_queries: bool = False,
     resume: bool = False,
     early_stop_batches: int = 3,
+    max_concurrency: Optional[int] = None,
+    max_tokens_per_minute: Optional[int] = None,
 ) -> None:
     """
     运行正向蒸馏验证
 
     Args:
         max_records: 最多处理的记录数（None 表示全部）
-        batch_size: 批处理大小
+        batch_size: 进度汇报和早停的粒度（每完成 batch_size 条记录汇报一次）
         use_atomic_queries: 是否使用 atomic queries 进行多轮对话
                            False: 使用 final_query 的单轮多步对话（process_single_record）
                            True: 使用 atomic_queries 的多轮多步对话（process_single_record_v1）
         resume: 是否启用断点续传（跳过已成功处理的记录）
         early_stop_batches: 连续多少个 batch 全部失败后停止（0 表示不启用早停）
+        max_concurrency: 同时处理的记录数（默认等于 batch_size）
+        max_tokens_per_minute: 可选的 TPM 限制（None 表示不限制）
     """
     print(f"Loading backward queries from {BACKWARD_QUERIES_PATH}...")
 
@@ -1096,44 +1103,48 @@ async def run_distillation(
     total_exact_matches = 0
     total_processed = 0
     total_errors = 0
-    consecutive_failed_batches = 0  # 连续失败的 batch 计数
     total_steps = 0  # 累积总步数
     total_turns = 0  # 累积总轮次数
 
     # 选择使用哪个处理函数
     process_func = process_single_record_v1 if use_atomic_queries else process_single_record
 
-    with open(output_path, file_mode, encoding="utf-8") as f:
-        num_batches = (len(records) + batch_size - 1) // batch_size
-
-        for batch_idx, start in enumerate(tqdm(range(0, len(records), batch_size),
-                                               total=num_batches,
-                                               desc="Processing records",
-                                               unit="batch"), start=1):
-            batch = records[start: start + batch_size]
-            print(f"\n[Batch {batch_idx}/{num_batches}] Processing records {start + 1}-{start + len(batch)}...")
-
-            batch_errors = 0  # 当前 batch 的错误数
-            batch_tokens = 0
-            batch_steps_per_turn = []  # 当前 batch 的每个turn平均步数列表
-
-            tasks = [process_func(record) for record in batch]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            for result in results:
-                if isinstance(result, Exception):
-                    print(f"[ERROR] Exception: {result}")
-                    batch_errors += 1
-                    total_errors += 1
-                    # 失败的记录不写入文件，下次 resume 会重新处理
-                    continue
+    # batch_size 仍是进度汇报 / 早停的粒度：连续 early_stop_batches 个 batch 的记录全部失败时早停
+    early_stop_threshold = batch_size * early_stop_batches
+    consecutive_failures = 0  # 连续失败的记录计数
 
-                # 检查是否是处理失败（有 error 或 rollout_error）
-                if result.get("error") or result.get("rollout_error"):
-                    batch_errors += 1
-                    total_errors += 1
-                    # 失败的记录不写入文件
-                    continue
+    # 滑动窗口：始终保持 max_concurrency 条记录在处理中，完成一条补一条
+    scheduler = SlidingWindowScheduler(
+        max_concurrency=max_concurrency or batch_size,
+        max_tokens_per_minute=max_tokens_per_minute,
+    )
+
+    with open(output_path, file_mode, encoding="utf-8") as f:
+        window_idx = 0
+        window_done = 0
+        window_errors = 0  # 当前窗口的错误数
+        window_tokens = 0
+        window_steps_per_turn = []  # 当前窗口的每个turn平均步数列表
+        progress_bar = tqdm(total=len(records), desc="Processing records", unit="record")
+
+        async for _, result in scheduler.run(records, process_func):
+            progress_bar.update(1)
+            window_done += 1
+
+            if isinstance(result, Exception):
+                print(f"[ERROR] Exception: {result}")
+                window_errors += 1
+                total_errors += 1
+                consecutive_failures += 1
+                # 失败的记录不写入文件，下次 resume 会重新处理
+            # 检查是否是处理失败（有 error 或 rollout_error）
+            elif result.get("error") or result.get("rollout_error"):
+                window_errors += 1
+                total_errors += 1
+                consecutive_failures += 1
+                # 失败的记录不写入文件
+            else:
+                consecutive_failures = 0
 
                 # 只写入成功的记录
                 f.write(json.dumps(result, ensure_ascii=False) + "\n")
@@ -1153,42 +1164,41 @@ async def run_distillation(
 
                     # 计算当前记录的平均每个turn的步数
                     steps_per_turn = generated_steps / record_turns if record_turns > 0 else 0
-                    batch_steps_per_turn.append(steps_per_turn)
+                    window_steps_per_turn.append(steps_per_turn)
 
                 token_usage = result.get("token_usage", {})
-                batch_tokens += token_usage.get("total_tokens", 0)
-
-            total_tokens += batch_tokens
-
-            # 计算当前 batch 的平均每个turn的步数
-            avg_steps_per_turn = sum(batch_steps_per_turn) / len(batch_steps_per_turn) if batch_steps_per_turn else 0
-
-            # 早停检查：如果当前 batch 全部失败
-            if batch_errors == len(batch):
-                consecutive_failed_batches += 1
-                print(
-                    f"[Batch {batch_idx}] ❌ ALL {len(batch)} records FAILED! "
-                    f"(consecutive failed batches: {consecutive_failed_batches}/{early_stop_batches})"
-                )
+                window_tokens += token_usage.get("total_tokens", 0)
+                total_tokens += token_usage.get("total_tokens", 0)
+
+            # 早停检查：连续失败的记录数达到阈值
+            if early_stop_batches > 0 and consecutive_failures >= min(early_stop_threshold, len(records)):
+                scheduler.stop()
+                print("\n" + "=" * 80)
+                print("🛑 EARLY STOPPING TRIGGERED")
+                print("=" * 80)
+                print(f"Consecutive failed records: {consecutive_failures} "
+                      f"(= {early_stop_batches} batches of {batch_size})")
+                print(f"Stopping to prevent further failures...")
+                print("=" * 80)
+                break
 
-                # 如果连续失败的 batch 数量达到阈值，停止处理
-                if early_stop_batches > 0 and consecutive_failed_batches >= early_stop_batches:
-                    print("\n" + "=" * 80)
-                    print("🛑 EARLY STOPPING TRIGGERED")
-                    print("=" * 80)
-                    print(f"Consecutive failed batches: {consecutive_failed_batches}")
-                    print(f"Stopping to prevent further failures...")
-                    print("=" * 80)
-                    break
-            else:
-                # 如果当前 batch 有成功的，重置连续失败计数
-                consecutive_failed_batches = 0
+            if window_done >= batch_size or progress_bar.n == len(records):
+                window_idx += 1
+                # 计算当前窗口的平均每个turn的步数
+                avg_steps_per_turn = sum(window_steps_per_turn) / len(window_steps_per_turn) if window_steps_per_turn else 0
                 print(
-                    f"[Batch {batch_idx}] batch_tokens={batch_tokens}, "
+                    f"[Batch {window_idx}] batch_tokens={window_tokens}, "
                     f"overall_tokens={total_tokens}, "
-                    f"batch_errors={batch_errors}/{len(batch)}, "
+                    f"batch_errors={window_errors}/{window_done}, "
                     f"avg_steps_per_turn={avg_steps_per_turn:.2f}"
                 )
+                window_done = 0
+                window_errors = 0
+                window_tokens = 0
+                window_steps_per_turn = []
+
+        progress_bar.close()
+        print(f"Scheduler stats: {scheduler.summary()}")
 
     print("\n" + "=" * 80)
     print(f"DISTILLATION SUMMARY ({'Multi-turn' if use_atomic_queries else 'Single-turn'})")
@@ -1200,6 +1210,7 @@ async def run_distillation(
     if total_processed > 0:
         print(f"Exact match rate: {total_exact_matches / total_processed * 100:.2f}%")
     print(f"Total tokens used: {total_tokens}")
+    print(async_client.format_cache_summary())
     if total_turns > 0:
         print(f"Average steps per turn: {total_steps / total_turns:.2f}")
     print("=" * 80)
@@ -1223,6 +1234,10 @@ def main() -> None:
                         help='Resume from previous run (skip already processed records)')
     parser.add_argument('--early-stop', type=int, default=1,
                         help='Stop after N consecutive batches with all failures (0 to disable)')
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help='Number of records in flight at once (default: batch size)')
+    parser.add_argument('--max-tpm', type=int, default=None,
+                        help='Optional tokens-per-minute limit')
     parser.add_argument('--test', action='store_true',
                         help='Test mode: process only 5 records')
 
@@ -1245,6 +1260,8 @@ def main() -> None:
         use_atomic_queries=use_atomic_queries,
         resume=args.resume,
         early_stop_batches=args.early_stop,
+        max_concurrency=args.max_concurrency,
+        max_tokens_per_minute=args.max_tpm,
     ))
 
 
@@ -22,6 +22,8 @@ from openai import AsyncOpenAI
 # 导入 backward_to_query 中的函数执行逻辑
 sys.path.insert(0, os.path.dirname(__file__))
 from backward_to_query import execute_function_call
+from llm_scheduler import SlidingWindowScheduler
+from llm_cache import wrap_llm_client
 
 # 路径配置
 ROOT_DIR = "/data/lhy/datasets/graph-Toucan"
@@ -101,9 +103,10 @@ else:
     api_key = config["api"].get("api_key", "EMPTY")
 base_url = config["api"]["base_url"]
 
-async_client = AsyncOpenAI(
-    api_key=api_key,
-    base_url=base_url,
+async_client = wrap_llm_client(
+    AsyncOpenAI(api_key=api_key, base_url=base_url),
+    stage="positive_distill_v2",
+    config=config,
 )
 
 # 模型配置
@@ -767,16 +770,20 @@ async def run_distillation_v2(
     max_paths: Optional[int] = None,
     batch_size: int = 5,
     resume: bool = False,
-    early_stop_batches: int = 3
+    early_stop_batches: int = 3,
+    max_concurrency: Optional[int] = None,
+    max_tokens_per_minute: Optional[int] = None,
 ) -> None:
     """
     运行正向蒸馏 V2
 
     Args:
         max_paths: 最多处理的 path 数（None 表示全部）
-        batch_size: 批处理大小
+        batch_size: 进度汇报和早停的粒度（每完成 batch_size 条 path 汇报一次）
         resume: 是否启用断点续传（跳过已成功处理的 path）
         early_stop_batches: 连续多少个 batch 全部失败后停止（0 表示不启用早停）
+        max_concurrency: 同时处理的 path 数（默认等于 batch_size）
+        max_tokens_per_minute: 可选的 TPM 限制（None 表示不限制）
     """
     print(f"Loading FSP V2 data from {FSP_V2_PATH}...")
 
@@ -851,99 +858,95 @@ async def run_distillation_v2(
     total_errors = 0
     total_function_matches = 0
     total_functions = 0
-    consecutive_failed_batches = 0
+    consecutive_failures = 0  # 连续失败的 path 计数
+    # batch_size 仍是进度汇报 / 早停的粒度：连续 early_stop_batches 个 batch 的 path 全部失败时早停
+    early_stop_threshold = batch_size * early_stop_batches
 
-    with open(DISTILL_V2_OUTPUT, file_mode, encoding="utf-8") as f:
-        num_batches = (len(paths) + batch_size - 1) // batch_size
-
-        for batch_idx, start in enumerate(tqdm(range(0, len(paths), batch_size),
-                                               total=num_batches,
-                                               desc="Processing paths",
-                                               unit="batch"), start=1):
-            batch = paths[start: start + batch_size]
-            print(f"\n[Batch {batch_idx}/{num_batches}] Processing paths {start + 1}-{start + len(batch)}...")
-
-            batch_errors = 0
-            batch_tokens = 0
-
-            # 准备 batch tasks（并发执行）
-            tasks = []
-            task_path_info = []  # 记录每个 task 对应的 path_info，用于错误报告
-
-            for path_data in batch:
-                path_info = path_data.get('path_info', {})
-
-                # 提取 tool_schemas
-                tool_schemas = extract_tool_schemas_for_path(path_data, all_tool_schemas)
-
-                if not tool_schemas:
-                    print(f"  Path {path_info.get('node_idx', '?')}-{path_info.get('path_idx', '?')}: Warning: No tool schemas found")
-                    batch_errors += 1
-                    total_errors += 1
-                    continue
-
-                # 创建 task
-                tasks.append(distill_path(path_data, tool_schemas))
-                task_path_info.append(path_info)
-
-            # 并发执行所有 tasks
-            if tasks:
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # 处理结果
-                for result, path_info in zip(results, task_path_info):
-                    if isinstance(result, Exception):
-                        print(f"  Path {path_info.get('node_idx', '?')}-{path_info.get('path_idx', '?')}: [ERROR] {result}")
-                        import traceback
-                        traceback.print_exc()
-                        batch_errors += 1
-                        total_errors += 1
-                        continue
+    async def distill_one(path_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        path_info = path_data.get('path_info', {})
 
-                    # 写入成功结果
-                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
-                    f.flush()
-
-                    # 统计
-                    total_processed += 1
-                    token_usage = result.get('token_usage', {})
-                    batch_tokens += token_usage.get('total_tokens', 0)
-
-                    # 统计函数匹配率
-                    distilled_turns = result.get('distilled_turns', [])
-                    for turn in distilled_turns:
-                        gt_funcs = set(call['function'] for call in turn.get('ground_truth_tool_calls', []))
-                        gen_funcs = set(turn.get('generated_tool_calls', []))
-                        total_function_matches += len(gt_funcs & gen_funcs)
-                        total_functions += len(gt_funcs)
-
-            total_tokens += batch_tokens
-
-            # 计算当前 batch 的统计
-            batch_success = len(batch) - batch_errors
-            print(f"[Batch {batch_idx}] Success: {batch_success}/{len(batch)}, "
-                  f"batch_tokens={batch_tokens}, overall_tokens={total_tokens}")
-
-            # 早停检查：如果当前 batch 全部失败
-            if batch_errors == len(batch):
-                consecutive_failed_batches += 1
-                print(
-                    f"[Batch {batch_idx}] ❌ ALL {len(batch)} paths FAILED! "
-                    f"(consecutive failed batches: {consecutive_failed_batches}/{early_stop_batches})"
-                )
+        # 提取 tool_schemas
+        tool_schemas = extract_tool_schemas_for_path(path_data, all_tool_schemas)
+        if not tool_schemas:
+            print(f"  Path {path_info.get('node_idx', '?')}-{path_info.get('path_idx', '?')}: Warning: No tool schemas found")
+            return None
 
-                # 如果连续失败的 batch 数量达到阈值，停止处理
-                if early_stop_batches > 0 and consecutive_failed_batches >= early_stop_batches:
-                    print("\n" + "=" * 80)
-                    print("🛑 EARLY STOPPING TRIGGERED")
-                    print("=" * 80)
-                    print(f"Consecutive failed batches: {consecutive_failed_batches}")
-                    print(f"Stopping to prevent further failures...")
-                    print("=" * 80)
-                    break
+        return await distill_path(path_data, tool_schemas)
+
+    # 滑动窗口：始终保持 max_concurrency 条 path 在处理中，完成一条补一条
+    scheduler = SlidingWindowScheduler(
+        max_concurrency=max_concurrency or batch_size,
+        max_tokens_per_minute=max_tokens_per_minute,
+    )
+
+    with open(DISTILL_V2_OUTPUT, file_mode, encoding="utf-8") as f:
+        window_idx = 0
+        window_done = 0
+        window_errors = 0
+        window_tokens = 0
+        progress_bar = tqdm(total=len(paths), desc="Processing paths", unit="path")
+
+        async for path_data, result in scheduler.run(paths, distill_one):
+            progress_bar.update(1)
+            window_done += 1
+            path_info = path_data.get('path_info', {})
+
+            if result is None:
+                # 没有 tool schemas，视为失败
+                window_errors += 1
+                total_errors += 1
+                consecutive_failures += 1
+            elif isinstance(result, Exception):
+                print(f"  Path {path_info.get('node_idx', '?')}-{path_info.get('path_idx', '?')}: [ERROR] {result}")
+                import traceback
+                traceback.print_exception(type(result), result, result.__traceback__)
+                window_errors += 1
+                total_errors += 1
+                consecutive_failures += 1
             else:
-                # 只要有一个成功，就重置连续失败计数
-                consecutive_failed_batches = 0
+                consecutive_failures = 0
+
+                # 写入成功结果
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+
+                # 统计
+                total_processed += 1
+                token_usage = result.get('token_usage', {})
+                window_tokens += token_usage.get('total_tokens', 0)
+                total_tokens += token_usage.get('total_tokens', 0)
+
+                # 统计函数匹配率
+                distilled_turns = result.get('distilled_turns', [])
+                for turn in distilled_turns:
+                    gt_funcs = set(call['function'] for call in turn.get('ground_truth_tool_calls', []))
+                    gen_funcs = set(turn.get('generated_tool_calls', []))
+                    total_function_matches += len(gt_funcs & gen_funcs)
+                    total_functions += len(gt_funcs)
+
+            # 早停检查：连续失败的 path 数达到阈值
+            if early_stop_batches > 0 and consecutive_failures >= min(early_stop_threshold, len(paths)):
+                scheduler.stop()
+                print("\n" + "=" * 80)
+                print("🛑 EARLY STOPPING TRIGGERED")
+                print("=" * 80)
+                print(f"Consecutive failed paths: {consecutive_failures} "
+                      f"(= {early_stop_batches} batches of {batch_size})")
+                print(f"Stopping to prevent further failures...")
+                print("=" * 80)
+                break
+
+            if window_done >= batch_size or progress_bar.n == len(paths):
+                window_idx += 1
+                # 计算当前窗口的统计
+                print(f"[Batch {window_idx}] Success: {window_done - window_errors}/{window_done}, "
+                      f"batch_tokens={window_tokens}, overall_tokens={total_tokens}")
+                window_done = 0
+                window_errors = 0
+                window_tokens = 0
+
+        progress_bar.close()
+        print(f"Scheduler stats: {scheduler.summary()}")
 
     # 计算整体函数匹配率
     overall_match_rate = total_function_matches / total_functions if total_functions > 0 else 0.0
@@ -956,6 +959,7 @@ async def run_distillation_v2(
     print(f"Failed: {total_errors}")
     print(f"Success rate: {total_processed / len(paths) * 100:.1f}%" if len(paths) > 0 else "N/A")
     print(f"Total tokens used: {total_tokens}")
+    print(async_client.format_cache_summary())
     print(f"Function match rate: {overall_match_rate:.2%} ({total_function_matches}/{total_functions})")
     print("=" * 80)
     print(f"\nResults saved to: {DISTILL_V2_OUTPUT}")
@@ -974,6 +978,10 @@ def main() -> None:
                         help='Resume from previous run (skip already processed paths)')
     parser.add_argument('--early-stop', type=int, default=3,
                         help='Stop after N consecutive batches with all failures (0 to disable, default: 3)')
+    parser.add_argument('--max-concurrency', type=int, default=None,
+                        help='Number of paths in flight at once (default: batch size)')
+    parser.add_argument('--max-tpm', type=int, default=None,
+                        help='Optional tokens-per-minute limit')
     parser.add_argument('--test', action='store_true',
                         help='Test mode: process only 2 paths')
 
@@ -987,7 +995,9 @@ def main() -> None:
         max_paths=args.max_paths,
         batch_size=args.batch_size,
         resume=args.resume,
-        early_stop_batches=args.early_stop
+        early_stop_batches=args.early_stop,
+        max_concurrency=args.max_concurrency,
+        max_tokens_per_minute=args.max_tpm,
     ))
 
 
@@ -0,0 +1,141 @@
+"""
+FSP 路径的前缀树（trie）：相同的前缀只执行一次。
+
+同一个起点游走出来的 FSP 路径往往有完全相同的前几个 turn，process_single_fsp_path 却对每条路径
+独立地重新生成 query、参数、执行函数、模拟 API 输出。这里把每条路径看成一串 step（每个 turn 一个 step，
+key 包含影响该 turn 处理结果的全部信息），插入前缀树：
+
+- 每个 trie node 对应一个唯一前缀，step 只执行一次，结果分发给经过它的所有路径
+- 分叉处把执行状态（对话 / 历史输出）fork 一份给每个子树（最后一个子树直接沿用原状态），子树之间并发执行
+- 某个 node 执行失败时，经过它的所有路径都记为失败
+- 每个 node 的开销记到经过它的第一条路径（owner，路径 id 最小的那条）上：
+  TrieResult.owned 标出路径上哪些 step 由本路径付费，共享前缀的 token 只计一次
+
+用法：
+    trie = PrefixTrie()
+    for steps in paths_as_steps:          # steps: [(key, payload), ...]
+        trie.add(steps)
+    results = await run_subtree(trie.root, initial_state, step)   # step(state, node) -> record
+"""
+
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+
+class TrieNode:
+    """一个唯一前缀（根节点 depth = -1，不对应任何 step）"""
+
+    __slots__ = ("key", "payload", "depth", "children", "terminal", "path_ids")
+
+    def __init__(self, key: Hashable = None, payload: Any = None, depth: int = -1):
+        self.key = key
+        # 第一条经过该 node 的路径提供的 step 数据（key 相同的 step 处理结果相同，用哪条路径的都一样）
+        self.payload = payload
+        self.depth = depth
+        self.children: Dict[Hashable, "TrieNode"] = {}
+        # 在该 node 结束的路径 id
+        self.terminal: List[int] = []
+        # 经过该 node 的路径 id（递增）
+        self.path_ids: List[int] = []
+
+    @property
+    def owner(self) -> Optional[int]:
+        """为该 node 付费的路径（经过它的第一条路径）"""
+        return self.path_ids[0] if self.path_ids else None
+
+
+class TrieResult(NamedTuple):
+    records: List[Any]  # 路径上每个 step 的结果
+    owned: List[bool]   # 该 step 是否由本路径付费（False 表示与更早的路径共享）
+
+    @property
+    def shared_steps(self) -> int:
+        return sum(1 for owned in self.owned if not owned)
+
+
+class PrefixTrie:
+    """见模块说明"""
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.num_paths = 0
+        self.num_steps = 0
+        self.num_nodes = 0
+
+    def add(self, steps: Sequence[Tuple[Hashable, Any]]) -> int:
+        """插入一条路径（[(key, payload), ...]），返回路径 id（按插入顺序从 0 开始）"""
+        path_id = self.num_paths
+        self.num_paths += 1
+        node = self.root
+        node.path_ids.append(path_id)
+        for key, payload in steps:
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = TrieNode(key, payload, node.depth + 1)
+                self.num_nodes += 1
+            child.path_ids.append(path_id)
+            node = child
+        node.terminal.append(path_id)
+        self.num_steps += len(steps)
+        return path_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "num_paths": self.num_paths,
+            "num_groups": len(self.root.children),
+            "total_steps": self.num_steps,
+            "unique_steps": self.num_nodes,
+            "shared_steps": self.num_steps - self.num_nodes,
+            "sharing_ratio": 1 - self.num_nodes / self.num_steps if self.num_steps else 0.0,
+        }
+
+
+async def run_subtree(
+    node: TrieNode,
+    state: Any,
+    step: Callable[[Any, TrieNode], Awaitable[Any]],
+    fork: Callable[[Any], Any] = copy.deepcopy,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    _chain: Tuple[Any, ...] = (),
+    _owners: Tuple[Optional[int], ...] = (),
+    _results: Optional[Dict[int, Union[TrieResult, Exception]]] = None,
+) -> Dict[int, Union[TrieResult, Exception]]:
+    """
+    从 node 开始执行子树（node 为根节点时不执行 step），每个 node 执行一次。
+
+    Args:
+        state: node 之前的前缀执行后的状态；step 原地更新它
+        step: step(state, node) -> record（node.payload / node.depth 描述要执行的 step）
+        fork: 分叉时复制状态
+        semaphore: 可选，限制同时执行的 step 数
+
+    Returns:
+        路径 id -> TrieResult 或异常（经过失败 node 的路径）
+    """
+    results: Dict[int, Union[TrieResult, Exception]] = {} if _results is None else _results
+    if node.depth >= 0:
+        try:
+            if semaphore is not None:
+                async with semaphore:
+                    record = await step(state, node)
+            else:
+                record = await step(state, node)
+        except Exception as e:
+            for path_id in node.path_ids:
+                results[path_id] = e
+            return results
+        _chain = _chain + (record,)
+        _owners = _owners + (node.owner,)
+
+    for path_id in node.terminal:
+        results[path_id] = TrieResult(list(_chain), [owner == path_id for owner in _owners])
+
+    children = list(node.children.values())
+    if children:
+        states = [fork(state) for _ in children[:-1]] + [state]
+        await asyncio.gather(*[
+            run_subtree(child, child_state, step, fork, semaphore, _chain, _owners, results)
+            for child, child_state in zip(children, states)
+        ])
+    return results
@@ -10,11 +10,15 @@ from openai import AsyncOpenAI
 import sys
 sys.path.append('/data/lhy/datasets')
 from louvain_community_detection import LouvainCommunityDetection
+from llm_cache import wrap_llm_client
 
-# 初始化异步 OpenAI 客户端
-async_client = AsyncOpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+# 初始化异步 OpenAI 客户端（带共享响应缓存）
+async_client = wrap_llm_client(
+    AsyncOpenAI(
+        api_key=os.getenv("DASHSCOPE_API_KEY"),
+        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+    ),
+    stage="process_mcp",
 )
 
 # 配置日志
@@ -435,7 +439,8 @@ async def classify_functions_batch(function_schemas, batch_size=10):
             'avg_total_tokens': total_tokens / num_successful,
             'total_prompt_tokens': total_prompt_tokens,
             'total_completion_tokens': total_completion_tokens,
-            'total_tokens': total_tokens
+            'total_tokens': total_tokens,
+            **async_client.cache_summary(),
         }
     else:
         token_stats = {
@@ -446,7 +451,8 @@ async def classify_functions_batch(function_schemas, batch_size=10):
             'avg_total_tokens': 0,
             'total_prompt_tokens': 0,
             'total_completion_tokens': 0,
-            'total_tokens': 0
+            'total_tokens': 0,
+            **async_client.cache_summary(),
         }
     
     return results, token_stats, failed_samples
@@ -486,6 +492,7 @@ async def classify_tool_set_from_json(json_file, output_file=None, batch_size=10
     print(f"  总 prompt tokens: {token_stats['total_prompt_tokens']}")
     print(f"  总 completion tokens: {token_stats['total_completion_tokens']}")
     print(f"  总 tokens: {token_stats['total_tokens']}")
+    print(f"  {async_client.format_cache_summary()}")
     
     # 保存结果
     if output_file:
@@ -0,0 +1,222 @@
+"""
+build_graph_v1 的追加式进度日志（append-only journal）。
+
+原来每个 batch 结束后都把完整的 processed_pairs / edges / edge_details 重写到一个缩进 JSON 文件，
+单次 checkpoint 的代价随进度线性增长，整次运行的 I/O 是二次的。现在改为：
+
+- 每个 batch 只把本 batch 的 per-pair 结果追加到 JSONL journal（O(batch)），写完 flush + fsync
+- 每隔 compact_every 个 batch（以及运行结束时）做一次 compaction：
+  把完整状态写成原来格式的 progress JSON（snapshot，先写临时文件再 os.replace，保证原子性），然后清空 journal
+- 恢复时先读 snapshot，再按顺序重放 journal，得到与原来完全相同的 progress_data 结构
+
+崩溃安全：
+- journal 最后一行写到一半时，加载时会截断到最后一个完整行
+- journal 每行带递增的序号 seq，snapshot 记录它包含的最后一个序号（progress.journal_seq）；
+  snapshot 替换成功但 journal 还没清空时，重放跳过 seq <= journal_seq 的记录（pair 和 batch 标记都跳过，
+  processed_batches 不会重复累计）。没有 seq 的旧 journal 按函数名跳过 snapshot 中已经存在的 pair
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+
+def keyed_progress_file(progress_file: str, key_payload: Any) -> str:
+    """
+    在 progress_file 文件名中加入 key_payload 的 hash（graph_progress.json -> graph_progress.<hash>.json）。
+
+    输入不同的运行（如增量更新时旧 graph / 变化的 node 不同）各自使用新的进度文件，不会复用别的运行的 pair；
+    输入相同的运行得到同一个文件，中断后可以断点续传。
+    """
+    payload = json.dumps(key_payload, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+    root, ext = os.path.splitext(progress_file)
+    return f"{root}.{digest}{ext or '.json'}"
+
+
+class ProgressJournal:
+    """
+    snapshot（progress JSON）+ JSONL journal 组成的进度存储。
+
+    journal 中每行一条记录（都带递增的 "seq"）：
+    - {"type": "pair", "pair": [src, tgt], "pair_names": [src_name, tgt_name],
+       "token_usage": {...}, "judge_requests": n, "edge": {...} | null, "edge_detail": {...} | null}
+      judge_requests 为计到该 pair 上的 LLM 请求数（批量 judge 时只有组内第一个 pair 计入批量请求；
+      没有该字段的旧记录按 1 计），累加到 successful_calls；每条记录给 judged_pairs 加 1。
+      静态 schema 匹配直接建边的记录带 "source": "static"，两者都不计入（没有 LLM 调用）
+    - {"type": "batch"}：一个 batch 写完的标记，用于累计 processed_batches
+    """
+
+    def __init__(self, progress_file: str, journal_file: Optional[str] = None, compact_every: int = 50):
+        self.progress_file = progress_file
+        if journal_file is None:
+            journal_file = os.path.splitext(progress_file)[0] + "_journal.jsonl"
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        # 最后一条已写入 journal 的记录序号（None 表示还没从 snapshot / journal 中读出）
+        self.last_seq: Optional[int] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.progress_file) or os.path.exists(self.journal_file)
+
+    def clear(self) -> None:
+        """删除 snapshot 和 journal（结果已经合并到最终输出之后调用）。"""
+        for path in (self.progress_file, self.progress_file + ".tmp", self.journal_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.last_seq = None
+
+    def _repair_journal(self) -> None:
+        """截断 journal 末尾不完整的行（崩溃时写到一半）。"""
+        if not os.path.exists(self.journal_file):
+            return
+        with open(self.journal_file, "rb+") as f:
+            data = f.read()
+            if not data or data.endswith(b"\n"):
+                return
+            last_newline = data.rfind(b"\n")
+            f.truncate(last_newline + 1)
+        print(f"==> Truncated incomplete trailing record in {self.journal_file}")
+
+    def load(self) -> Dict[str, Any]:
+        """
+        读取 snapshot 并重放 journal。
+
+        Returns:
+            与 progress JSON 相同结构的 dict：
+            progress / processed_pairs / processed_pairs_by_name / edges / edge_details / token_usage_summary
+        """
+        progress_data: Dict[str, Any] = {}
+        if os.path.exists(self.progress_file):
+            with open(self.progress_file, "r", encoding="utf-8") as f:
+                progress_data = json.load(f)
+
+        processed_pairs = [list(p) for p in progress_data.get("processed_pairs", [])]
+        processed_pairs_by_name = [list(p) for p in progress_data.get("processed_pairs_by_name", [])]
+        edges = progress_data.get("edges", [])
+        edge_details = progress_data.get("edge_details", [])
+        stats = dict(progress_data.get("token_usage_summary", {}))
+        for key in ("successful_calls", "total_prompt_tokens", "total_completion_tokens", "total_tokens"):
+            stats.setdefault(key, 0)
+        # 旧 snapshot 没有 judged_pairs，当时 successful_calls 按 pair 计
+        stats.setdefault("judged_pairs", stats["successful_calls"])
+        progress_info = dict(progress_data.get("progress", {}))
+        processed_batches = progress_info.get("processed_batches", 0)
+        snapshot_seq = progress_info.get("journal_seq", 0)
+        last_seq = snapshot_seq
+
+        seen_names = {tuple(p) for p in processed_pairs_by_name}
+        seen_indices = {tuple(p) for p in processed_pairs}
+
+        self._repair_journal()
+        replayed = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    seq = record.get("seq")
+                    if seq is not None:
+                        last_seq = max(last_seq, seq)
+                        # snapshot 已经包含该记录（compaction 后 journal 未清空就崩溃的情况）
+                        if seq <= snapshot_seq:
+                            continue
+
+                    if record.get("type") == "batch":
+                        processed_batches += 1
+                        continue
+
+                    pair_names = tuple(record.get("pair_names") or ())
+                    pair = tuple(record.get("pair") or ())
+                    # 没有 seq 的旧记录：snapshot 已经包含的 pair 按函数名 / 下标跳过
+                    if (pair_names and pair_names in seen_names) or (not pair_names and pair in seen_indices):
+                        continue
+
+                    if pair:
+                        processed_pairs.append(list(pair))
+                        seen_indices.add(pair)
+                    if pair_names:
+                        processed_pairs_by_name.append(list(pair_names))
+                        seen_names.add(pair_names)
+
+                    tu = record.get("token_usage", {}) or {}
+                    stats["total_prompt_tokens"] += tu.get("prompt_tokens", 0)
+                    stats["total_completion_tokens"] += tu.get("completion_tokens", 0)
+                    stats["total_tokens"] += tu.get("total_tokens", 0)
+                    if record.get("source") != "static":
+                        stats["successful_calls"] += record.get("judge_requests", 1)
+                        stats["judged_pairs"] += 1
+
+                    if record.get("edge") is not None:
+                        edges.append(record["edge"])
+                    if record.get("edge_detail") is not None:
+                        edge_details.append(record["edge_detail"])
+                    replayed += 1
+
+        if replayed:
+            print(f"==> Replayed {replayed} pairs from journal {self.journal_file}")
+
+        self.last_seq = last_seq
+        progress_info["processed_batches"] = processed_batches
+        progress_info["journal_seq"] = last_seq
+        progress_info["processed_pairs"] = len(processed_pairs)
+        return {
+            "version": progress_data.get("version", "1.0.0"),
+            "progress": progress_info,
+            "processed_pairs": processed_pairs,
+            "processed_pairs_by_name": processed_pairs_by_name,
+            "edges": edges,
+            "edge_details": edge_details,
+            "token_usage_summary": stats,
+        }
+
+    def append_batch(self, records: List[Dict[str, Any]]) -> None:
+        """把一个 batch 的 pair 记录和 batch 标记追加到 journal，并 fsync。"""
+        if self.last_seq is None:
+            # 没有先调用 load()：从已有的 snapshot / journal 中接着编号
+            self.load()
+        os.makedirs(os.path.dirname(self.journal_file) or ".", exist_ok=True)
+        seq = self.last_seq
+        lines = []
+        for record in records:
+            seq += 1
+            lines.append(json.dumps({"type": "pair", **record, "seq": seq}, ensure_ascii=False))
+        seq += 1
+        lines.append(json.dumps({"type": "batch", "seq": seq}))
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.last_seq = seq
+
+    def should_compact(self, batch_num: int) -> bool:
+        return self.compact_every > 0 and batch_num % self.compact_every == 0
+
+    def compact(self, progress_data: Dict[str, Any]) -> None:
+        """
+        原子地写入完整 snapshot，然后清空 journal。
+
+        progress_data 必须包含到目前为止 append_batch 写入的全部记录；
+        snapshot 的 progress.journal_seq 记为最后一条已写入记录的序号。
+        """
+        if self.last_seq is None:
+            self.load()
+        progress_data = dict(progress_data)
+        progress_data["progress"] = dict(progress_data.get("progress", {}), journal_seq=self.last_seq)
+        os.makedirs(os.path.dirname(self.progress_file) or ".", exist_ok=True)
+        tmp_file = self.progress_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(progress_data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.progress_file)
+        # snapshot 已落盘，journal 中的记录都已包含在内
+        with open(self.journal_file, "w", encoding="utf-8"):
+            pass
@@ -21,7 +21,14 @@ Random walker on the constructed tool graph.
 import json
 import os
 import random
-from typing import Dict, List, Tuple, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from graph_store import load_graph_store
+from path_stream import RecordWriter, is_jsonl_path
+from walk_bias import WalkBias, biased_random_walk_from_node, load_alias_tables
+from walk_coverage import CoverageScheduler, CoverageTargets, format_coverage_report
+from walk_engine import batch_random_walks, derive_seed, walk_csr
 
 
 GRAPH_DIR = "/data/lhy/datasets/graph-Toucan/graph"
@@ -36,39 +43,22 @@ def load_graph_for_walk(
     graph_path: str,
 ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[int, str], Dict[int, List[int]]]:
     """
-    从图 JSON 文件中加载节点和边，并构建：
+    通过 graph_store.load_graph_store 加载图（优先 mmap 打开 .csr），返回：
+    - nodes / edges: 只读视图（edges 不含 prerequisite 边）
     - index_to_name: 节点索引 -> 函数名
-    - adj: 邻接表 index -> List[index]（有向边 source -> target）
+    - adj: 邻接表视图 index -> List[index]（有向边 source -> target）
     """
     print(f"Loading graph for random walk from {graph_path}...")
-    with open(graph_path, "r", encoding="utf-8") as f:
-        graph = json.load(f)
+    store = load_graph_store(graph_path)
 
-    nodes = graph.get("nodes", [])
-    edges = graph.get("edges", [])
-    
-    need_edges = []
-    for edge in edges:
-        if edge['dependency_type'] == "prerequisite":
-            continue
-        need_edges.append(edge)
-    
-    edges = need_edges
-    index_to_name: Dict[int, str] = {}
-    for node in nodes:
-        idx = node.get("index")
-        func_schema = node.get("function_schema", {}).get("function", {})
-        name = func_schema.get("name", f"node_{idx}")
-        if idx is not None:
-            index_to_name[idx] = name
-
-    adj: Dict[int, List[int]] = {}
-    for edge in edges:
-        src = edge.get("source")
-        tgt = edge.get("target")
-        if src is None or tgt is None:
-            continue
-        adj.setdefault(src, []).append(tgt)
+    nodes = store.nodes()
+    edges = store.edges(exclude_types=("prerequisite",))
+
+    index_to_name: Dict[int, str] = {
+        idx: name or f"node_{idx}" for idx, name in enumerate(store.names)
+    }
+
+    adj = store.adjacency(exclude_types=("prerequisite",))
 
     print(
         f"Loaded graph: {len(nodes)} nodes, {len(edges)} edges, "
@@ -268,6 +258,140 @@ def run_walks_from_single_node_with_dedup(
     return result
 
 
+def dedup_paths(paths: List[List[int]]) -> List[List[int]]:
+    """按出现顺序去重"""
+    seen_paths = set()
+    paths_after_dedup: List[List[int]] = []
+    for path in paths:
+        path_tuple = tuple(path)
+        if path_tuple not in seen_paths:
+            seen_paths.add(path_tuple)
+            paths_after_dedup.append(path)
+    return paths_after_dedup
+
+
+def node_result(
+    idx: int,
+    paths_before_dedup: List[List[int]],
+    paths_after_dedup: List[List[int]],
+    merged_paths: List[Dict[str, Any]],
+    index_to_name: Dict[int, str],
+) -> Dict[str, Any]:
+    num_before = len(paths_before_dedup)
+    num_after = len(paths_after_dedup)
+    return {
+        "name": index_to_name.get(idx, f"node_{idx}"),
+        "num_paths_before_dedup": num_before,
+        "num_paths_after_dedup": num_after,
+        "dedup_ratio": (num_before - num_after) / num_before if num_before > 0 else 0.0,
+        "paths_before_dedup": paths_before_dedup,
+        "paths_after_dedup": paths_after_dedup,
+        "merged_paths": merged_paths,
+        "total_merges": sum(mp["num_merges"] for mp in merged_paths),
+    }
+
+
+def build_node_result(
+    idx: int,
+    paths_before_dedup: List[List[int]],
+    index_to_name: Dict[int, str],
+    candidate_index: "MergeCandidateIndex",
+    merge_probability: float,
+    rng: random.Random,
+) -> Dict[str, Any]:
+    """单个起点的结果：去重 + merge"""
+    paths_after_dedup = dedup_paths(paths_before_dedup)
+    merged_paths = candidate_index.merge_paths(paths_after_dedup, rng, merge_probability)
+    return node_result(idx, paths_before_dedup, paths_after_dedup, merged_paths, index_to_name)
+
+
+def write_node_records(
+    writer: RecordWriter,
+    idx: int,
+    node_data: Dict[str, Any],
+    index_to_name: Dict[int, str],
+) -> None:
+    """把一个起点的结果写成 path_stream 记录：一条 node 记录 + 每条去重后路径一条 path 记录"""
+    writer.write({
+        "type": "node",
+        "node_idx": idx,
+        "name": node_data["name"],
+        "num_paths_before_dedup": node_data["num_paths_before_dedup"],
+        "num_paths_after_dedup": node_data["num_paths_after_dedup"],
+        "dedup_ratio": node_data["dedup_ratio"],
+        "total_merges": node_data["total_merges"],
+        "paths_before_dedup": node_data["paths_before_dedup"],
+    })
+    # merged_paths 与 paths_after_dedup 一一对应
+    for walk_id, (path, merged) in enumerate(zip(node_data["paths_after_dedup"], node_data["merged_paths"]), 1):
+        writer.write({
+            "type": "path",
+            "node_idx": idx,
+            "walk_id": walk_id,
+            "node_indices": path,
+            "node_names": [index_to_name.get(p, f"node_{p}") for p in path],
+            "path_length": len(path),
+            "merged_path": merged["merged_path"],
+            "merged_path_names": merged["merged_path_names"],
+            "merge_info": merged["merge_info"],
+            "num_merges": merged["num_merges"],
+        })
+    writer.flush()
+
+
+def _make_walk_state(
+    adj,
+    index_to_name: Dict[int, str],
+    candidate_index: "MergeCandidateIndex",
+    walk_params: Dict[str, Any],
+) -> Dict[str, Any]:
+    return {
+        "store": adj.store,
+        "csr": walk_csr(adj.store, adj.exclude_types),
+        "index_to_name": index_to_name,
+        "candidate_index": candidate_index,
+        **walk_params,
+    }
+
+
+def _walk_shard_with_state(state: Dict[str, Any], shard: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+    """一个分片内的起点：批量游走 + 去重 + merge（merge 的 rng 由 (seed, 起点) 派生）"""
+    shard_paths = batch_random_walks(
+        state["store"],
+        shard,
+        num_walks=state["num_walks_per_node"],
+        max_steps=state["max_steps"],
+        seed=state["seed"],
+        csr=state["csr"],
+    )
+    deduped = {idx: dedup_paths(shard_paths[idx]) for idx in shard}
+    merged = state["candidate_index"].merge_batch(
+        ((deduped[idx], random.Random(derive_seed(state["seed"], idx))) for idx in shard),
+        merge_probability=state["merge_probability"],
+    )
+    return [
+        (idx, node_result(idx, shard_paths[idx], deduped[idx], merged_paths, state["index_to_name"]))
+        for idx, merged_paths in zip(shard, merged)
+    ]
+
+
+# 进程池 worker 的状态（每个 worker 在 initializer 中加载一次，图通过 mmap 共享）
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_walk_worker(graph_path: str, candidates_mapping_path: str, walk_params: Dict[str, Any]) -> None:
+    _, _, index_to_name, adj = load_graph_for_walk(graph_path)
+    name_to_index = {name: idx for idx, name in index_to_name.items()}
+    candidate_index = MergeCandidateIndex(
+        load_node_candidates_mapping(candidates_mapping_path), name_to_index, index_to_name,
+    )
+    _WORKER_STATE.update(_make_walk_state(adj, index_to_name, candidate_index, walk_params))
+
+
+def _walk_shard(shard: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+    return _walk_shard_with_state(_WORKER_STATE, shard)
+
+
 def run_walks_from_all_nodes_with_dedup(
     graph_path: str = DEFAULT_GRAPH_PATH,
     max_steps: int = 10,
@@ -277,6 +401,12 @@ def run_walks_from_all_nodes_with_dedup(
     save_json_path: Optional[str] = None,
     merge_probability: float = 0.15,
     candidates_mapping_path: str = NODE_CANDIDATES_MAPPING_PATH,
+    walk_engine: str = "sequential",
+    num_workers: int = 1,
+    shard_size: int = 256,
+    walk_bias: Optional[WalkBias] = None,
+    coverage_targets: Optional[CoverageTargets] = None,
+    coverage_report_path: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     从每个节点出发，生成多条路径并去重，遍历整个图。
@@ -285,12 +415,25 @@ def run_walks_from_all_nodes_with_dedup(
     Args:
         graph_path: 图 JSON 文件路径
         max_steps: 每条游走路径允许的最大步数
-        num_walks_per_node: 每个节点要生成的路径数量（默认3条）
+        num_walks_per_node: 每个节点要生成的路径数量（默认3条）；walk_engine="coverage" 时为每个起点的上限
         seed: 随机种子
         log_path: 日志文件路径（可选）
-        save_json_path: 保存结果的 JSON 文件路径（可选）
+        save_json_path: 保存结果的文件路径（可选）。以 .jsonl / .jsonl.gz 等结尾时边生成边写
+            path_stream 的流式格式（header + 每个节点一条 node 记录 + 每条去重后路径一条 path 记录 + summary），
+            此时返回值中不保留 node_results，内存不随游走条数增长；否则按原来的单个 JSON 文档保存
         merge_probability: 每个节点进行 merge 的概率（默认0.3）
         candidates_mapping_path: 节点候选映射文件路径
+        walk_engine: "sequential"（逐条 random_walk_from_node，共享 rng）或
+            "batch"（walk_engine.batch_random_walks，按 (seed, 起点, walk_id) 生成随机数，
+            merge 使用由 (seed, 起点) 派生的 rng，可复现且与遍历顺序 / 进程数无关）或
+            "coverage"（walk_coverage.CoverageScheduler 按覆盖率分配各起点的游走数，覆盖目标达到后停止，共享 rng）
+        num_workers: >1 时按起点分片到进程池并行（需要 walk_engine="batch"），结果与 worker 数无关
+        shard_size: 每个分片的起点数
+        walk_bias: 转移权重（walk_bias.WalkBias：confidence / dependency_type 权重、逆访问频率、node2vec），
+            None 或均匀配置时保持原来的均匀选择；目前只支持 walk_engine="sequential"
+            （逆访问频率依赖之前生成的路径，与按起点独立的 batch 随机流不兼容）和 "coverage"
+        coverage_targets: walk_engine="coverage" 的覆盖目标与预算（默认 CoverageTargets()）
+        coverage_report_path: 覆盖率报告的保存路径（可选，walk_engine="coverage" 时有效）
     
     Returns:
         {
@@ -311,17 +454,28 @@ def run_walks_from_all_nodes_with_dedup(
                     "paths_after_dedup": List[List[int]],
                 },
                 ...
-            },
+            },  # 流式保存时为空
+            "coverage": Dict,  # walk_engine="coverage" 时的覆盖率报告
         }
     """
+    if walk_engine not in ("sequential", "batch", "coverage"):
+        raise ValueError(f"Unknown walk_engine: {walk_engine}")
+    if num_workers > 1 and walk_engine != "batch":
+        raise ValueError("num_workers > 1 requires walk_engine='batch' (per-node deterministic seeds)")
+    if walk_bias is not None and walk_bias.is_uniform:
+        walk_bias = None
+    if walk_bias is not None and walk_engine == "batch":
+        raise ValueError("walk_bias requires walk_engine='sequential' or 'coverage'")
+
     rng = random.Random(seed)
     nodes, edges, index_to_name, adj = load_graph_for_walk(graph_path)
     
     # 构建 name_to_index 映射（用于 merge 时查找候选节点的索引）
     name_to_index: Dict[str, int] = {name: idx for idx, name in index_to_name.items()}
     
-    # 加载节点候选映射
+    # 加载节点候选映射，构建所有路径共用的整数候选索引
     node_to_candidates = load_node_candidates_mapping(candidates_mapping_path)
+    candidate_index = MergeCandidateIndex(node_to_candidates, name_to_index, index_to_name)
     
     node_indices = sorted(index_to_name.keys())
     
@@ -336,75 +490,135 @@ def run_walks_from_all_nodes_with_dedup(
     node_results: Dict[str, Dict[str, Any]] = {}
     total_walks_before = 0
     total_walks_after = 0
+    total_merges = 0
+
+    stream_writer: Optional[RecordWriter] = None
+    if save_json_path is not None and is_jsonl_path(save_json_path):
+        print(f"\n流式保存结果到 {save_json_path}...")
+        stream_writer = RecordWriter(save_json_path, kind="walk_paths", meta={
+            "graph_path": graph_path,
+            "max_steps": max_steps,
+            "num_walks_per_node": num_walks_per_node,
+            "num_nodes": len(node_indices),
+            "seed": seed,
+            "walk_engine": walk_engine,
+            "walk_bias": walk_bias.__dict__ if walk_bias is not None else None,
+            "merge_probability": merge_probability,
+        })
     
     print(f"\n开始遍历所有节点，共 {len(node_indices)} 个节点...")
     
-    for idx in node_indices:
-        name = index_to_name.get(idx, f"node_{idx}")
-        
-        # 生成多条路径
-        paths_before_dedup: List[List[int]] = []
-        for walk_id in range(num_walks_per_node):
-            path = random_walk_from_node(idx, adj, max_steps=max_steps, rng=rng)
-            paths_before_dedup.append(path)
-            
-            if log_path is not None:
-                msg = (
-                    f"[WALK] node={idx}({name}), walk_id={walk_id+1}/{num_walks_per_node}, "
-                    f"path_len={len(path)}, path={path}"
+    walk_params = {
+        "max_steps": max_steps,
+        "num_walks_per_node": num_walks_per_node,
+        "seed": seed,
+        "merge_probability": merge_probability,
+    }
+    shards = [node_indices[i:i + shard_size] for i in range(0, len(node_indices), shard_size)]
+
+    if walk_bias is not None:
+        alias_tables = load_alias_tables(adj.store, walk_bias, adj.exclude_types)
+        visit_counts: Dict[int, int] = {}
+
+    def walk_one(idx: int) -> List[int]:
+        """共享 rng 的单条游走（sequential / coverage）"""
+        if walk_bias is None:
+            return random_walk_from_node(idx, adj, max_steps=max_steps, rng=rng)
+        path = biased_random_walk_from_node(
+            idx, alias_tables, walk_bias, max_steps=max_steps, rng=rng, visit_counts=visit_counts,
+        )
+        for node in path:
+            visit_counts[node] = visit_counts.get(node, 0) + 1
+        return path
+
+    def sequential_stream():
+        for idx in node_indices:
+            paths_before_dedup = [walk_one(idx) for _ in range(num_walks_per_node)]
+            yield idx, build_node_result(
+                idx, paths_before_dedup, index_to_name, candidate_index,
+                merge_probability=merge_probability, rng=rng,
+            )
+
+    coverage_report: Optional[Dict[str, Any]] = None
+
+    def coverage_stream():
+        nonlocal coverage_report
+        scheduler = CoverageScheduler(
+            adj.store, coverage_targets, max_walks_per_node=num_walks_per_node, exclude_types=adj.exclude_types,
+        )
+        node_paths = scheduler.run(node_indices, walk_one)
+        coverage_report = scheduler.report(index_to_name)
+        print(format_coverage_report(coverage_report))
+        for idx in node_indices:
+            if node_paths[idx]:
+                yield idx, build_node_result(
+                    idx, node_paths[idx], index_to_name, candidate_index,
+                    merge_probability=merge_probability, rng=rng,
                 )
-                append_log(msg, log_path)
-        
-        # 去重
-        seen_paths = set()
-        paths_after_dedup: List[List[int]] = []
-        
-        for path in paths_before_dedup:
-            path_tuple = tuple(path)
-            if path_tuple not in seen_paths:
-                seen_paths.add(path_tuple)
-                paths_after_dedup.append(path)
-        
-        num_before = len(paths_before_dedup)
-        num_after = len(paths_after_dedup)
-        dedup_ratio = (num_before - num_after) / num_before if num_before > 0 else 0.0
-        
-        total_walks_before += num_before
-        total_walks_after += num_after
-        
-        # 对去重后的路径进行 merge 操作
-        merged_paths = merge_paths_with_candidates(
-            paths_after_dedup=paths_after_dedup,
-            index_to_name=index_to_name,
-            node_to_candidates=node_to_candidates,
-            name_to_index=name_to_index,
-            merge_probability=merge_probability,
-            rng=rng,
+
+    if walk_engine == "sequential":
+        node_stream = sequential_stream()
+        executor = None
+    elif walk_engine == "coverage":
+        node_stream = coverage_stream()
+        executor = None
+    elif num_workers > 1:
+        # 按起点分片到进程池；executor.map 按提交顺序流式返回，合并结果与 worker 数无关
+        executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_walk_worker,
+            initargs=(graph_path, candidates_mapping_path, walk_params),
         )
-        
-        node_results[str(idx)] = {
-            "name": name,
-            "num_paths_before_dedup": num_before,
-            "num_paths_after_dedup": num_after,
-            "dedup_ratio": dedup_ratio,
-            "paths_before_dedup": paths_before_dedup,
-            "paths_after_dedup": paths_after_dedup,
-            "merged_paths": merged_paths,
-            "total_merges": sum(mp["num_merges"] for mp in merged_paths),
-        }
-        
-        # 打印每个节点的结果
-        if num_after < num_before:
-            total_merges = sum(mp["num_merges"] for mp in merged_paths)
-            print(f"节点 {idx} ({name}): {num_before} -> {num_after} 条路径 (去重率: {dedup_ratio:.2%}), merge: {total_merges} 次")
+        node_stream = (item for shard_result in executor.map(_walk_shard, shards) for item in shard_result)
+    else:
+        state = _make_walk_state(adj, index_to_name, candidate_index, walk_params)
+        node_stream = (item for shard in shards for item in _walk_shard_with_state(state, shard))
+        executor = None
+
+    try:
+        for idx, node_data in node_stream:
+            name = node_data["name"]
+            num_before = node_data["num_paths_before_dedup"]
+            if log_path is not None:
+                for walk_id, path in enumerate(node_data["paths_before_dedup"]):
+                    msg = (
+                        f"[WALK] node={idx}({name}), walk_id={walk_id+1}/{num_before}, "
+                        f"path_len={len(path)}, path={path}"
+                    )
+                    append_log(msg, log_path)
+
+            num_after = node_data["num_paths_after_dedup"]
+            total_walks_before += num_before
+            total_walks_after += num_after
+            total_merges += node_data["total_merges"]
+            if stream_writer is not None:
+                write_node_records(stream_writer, idx, node_data, index_to_name)
+            else:
+                node_results[str(idx)] = node_data
+
+            # 打印每个节点的结果
+            if num_after < num_before:
+                print(f"节点 {idx} ({name}): {num_before} -> {num_after} 条路径 "
+                      f"(去重率: {node_data['dedup_ratio']:.2%}), merge: {node_data['total_merges']} 次")
+    except BaseException:
+        if stream_writer is not None:
+            stream_writer.abort()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
     overall_dedup_ratio = (total_walks_before - total_walks_after) / total_walks_before if total_walks_before > 0 else 0.0
     
-    # 统计总的 merge 次数
-    total_merges = sum(
-        node_data.get("total_merges", 0)
-        for node_data in node_results.values()
-    )
+    if stream_writer is not None:
+        stream_writer.close(statistics={
+            "total_walks_before_dedup": total_walks_before,
+            "total_walks_after_dedup": total_walks_after,
+            "overall_dedup_ratio": overall_dedup_ratio,
+            "total_merges": total_merges,
+            "coverage": coverage_report,
+        })
+        print(f"结果已保存到 {save_json_path}（{stream_writer.num_records} 条记录）")
     
     result = {
         "graph_path": graph_path,
@@ -417,7 +631,16 @@ def run_walks_from_all_nodes_with_dedup(
         "merge_probability": merge_probability,
         "total_merges": total_merges,
         "node_results": node_results,
+        "coverage": coverage_report,
     }
+
+    if coverage_report is not None and coverage_report_path is not None:
+        report_dir = os.path.dirname(coverage_report_path)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(coverage_report_path, "w", encoding="utf-8") as f:
+            json.dump(coverage_report, f, ensure_ascii=False, indent=2)
+        print(f"覆盖率报告已保存到 {coverage_report_path}")
     
     # 打印总体统计
     print(f"\n" + "=" * 80)
@@ -431,7 +654,7 @@ def run_walks_from_all_nodes_with_dedup(
     print(f"=" * 80)
     
     # 如果需要，保存结果到 JSON 文件
-    if save_json_path is not None:
+    if save_json_path is not None and stream_writer is None:
         print(f"\n保存结果到 {save_json_path}...")
         os.makedirs(os.path.dirname(save_json_path), exist_ok=True)
         
@@ -443,12 +666,15 @@ def run_walks_from_all_nodes_with_dedup(
                 "num_walks_per_node": num_walks_per_node,
                 "num_nodes": len(node_indices),
                 "seed": seed,
+                "walk_engine": walk_engine,
+                "walk_bias": walk_bias.__dict__ if walk_bias is not None else None,
             },
             "statistics": {
                 "total_walks_before_dedup": total_walks_before,
                 "total_walks_after_dedup": total_walks_after,
                 "overall_dedup_ratio": overall_dedup_ratio,
             },
+            "coverage": coverage_report,
             "node_results": {
                 node_idx: {
                     "name": node_data["name"],
@@ -508,6 +734,100 @@ def load_node_candidates_mapping(
     return node_to_candidates
 
 
+class MergeCandidateIndex:
+    """
+    node_candidates_mapping 的整数索引，供 merge_paths_with_candidates 在所有路径间复用。
+
+    - 每个 node index 对应一个候选 index 元组（预先过滤掉不在 name_to_index 里的候选名，保留原顺序和重复项）
+    - 路径中的 node 放进 set，按 index 排除已在路径中的候选
+    - 同名 node（多个 index 对应同一个名字）按 name_to_index 归一化后比较，与按名字排除的结果一致
+
+    merge 对 rng 的调用顺序与原来按名字扫描的实现完全相同，相同 seed 下输出不变。
+    """
+
+    def __init__(
+        self,
+        node_to_candidates: Dict[str, List[str]],
+        name_to_index: Dict[str, int],
+        index_to_name: Dict[int, str],
+    ):
+        self.index_to_name = index_to_name
+        # node index -> 候选 index 元组；原始候选列表为空的 node 不在这里（不会进入候选选择）
+        self.candidates: Dict[int, Tuple[int, ...]] = {}
+        for idx, name in index_to_name.items():
+            names = node_to_candidates.get(name)
+            if names:
+                self.candidates[idx] = tuple(name_to_index[c] for c in names if c in name_to_index)
+        # 名字对应的 index 不是自身的 node（同名），排除时换成 name_to_index 里的 index
+        self.aliases: Dict[int, int] = {
+            idx: name_to_index[name]
+            for idx, name in index_to_name.items()
+            if name in name_to_index and name_to_index[name] != idx
+        }
+
+    def name(self, idx: int) -> str:
+        return self.index_to_name.get(idx, f"node_{idx}")
+
+    def merge_path(self, path: List[int], rng: random.Random, merge_probability: float) -> Dict[str, Any]:
+        """对一条路径做 merge，返回 merged_paths 中的一项"""
+        candidates = self.candidates
+        aliases = self.aliases
+        path_keys = None
+        merge_info = []
+        merges_to_apply = []  # [(insert_position, candidate_idx), ...]
+
+        for step_idx, node_idx in enumerate(path):
+            step_merge_info = {
+                "step_idx": step_idx,
+                "node_idx": node_idx,
+                "node_name": self.name(node_idx),
+                "merged": False,
+                "merged_candidate": None,
+                "merged_candidate_idx": None,
+            }
+            # 以概率 p 决定是否 merge
+            if rng.random() < merge_probability:
+                node_candidates = candidates.get(node_idx)
+                if node_candidates:
+                    if path_keys is None:
+                        path_keys = {aliases.get(p, p) for p in path}
+                    available_candidates = [c for c in node_candidates if c not in path_keys]
+                    if available_candidates:
+                        candidate_idx = rng.choice(available_candidates)
+                        step_merge_info["merged"] = True
+                        step_merge_info["merged_candidate"] = self.name(candidate_idx)
+                        step_merge_info["merged_candidate_idx"] = candidate_idx
+                        merges_to_apply.append((step_idx + 1, candidate_idx))
+            merge_info.append(step_merge_info)
+
+        # 从后往前插入 candidates（避免索引变化）
+        merged_path = list(path)
+        for insert_position, candidate_idx in reversed(merges_to_apply):
+            merged_path.insert(insert_position, candidate_idx)
+
+        return {
+            "path": path,
+            "path_names": [self.name(node_idx) for node_idx in path],
+            "merged_path": merged_path,
+            "merged_path_names": [self.name(node_idx) for node_idx in merged_path],
+            "merge_info": merge_info,
+            "num_merges": len(merges_to_apply),
+        }
+
+    def merge_paths(
+        self, paths: List[List[int]], rng: random.Random, merge_probability: float,
+    ) -> List[Dict[str, Any]]:
+        return [self.merge_path(path, rng, merge_probability) for path in paths]
+
+    def merge_batch(
+        self,
+        batch: Iterable[Tuple[List[List[int]], random.Random]],
+        merge_probability: float,
+    ) -> List[List[Dict[str, Any]]]:
+        """一次 merge 一个分片：batch 中每项是 (一个起点去重后的路径, 该起点的 rng)"""
+        return [self.merge_paths(paths, rng, merge_probability) for paths, rng in batch]
+
+
 def merge_paths_with_candidates(
     paths_after_dedup: List[List[int]],
     index_to_name: Dict[int, str],
@@ -515,6 +835,7 @@ def merge_paths_with_candidates(
     name_to_index: Dict[str, int],
     merge_probability: float = 0.15,
     rng: random.Random = None,
+    candidate_index: Optional[MergeCandidateIndex] = None,
 ) -> List[Dict[str, Any]]:
     """
     对去重后的路径进行 merge 操作。
@@ -531,6 +852,7 @@ def merge_paths_with_candidates(
         name_to_index: 节点名称 -> 节点索引的映射
         merge_probability: 每个节点进行 merge 的概率
         rng: 随机数生成器
+        candidate_index: 预先构建的 MergeCandidateIndex（多次调用时复用；None 时按前三个映射临时构建）
     
     Returns:
         List[Dict]: merge 后的路径列表，每个路径包含：
@@ -540,72 +862,9 @@ def merge_paths_with_candidates(
     """
     if rng is None:
         rng = random.Random()
-    
-    merged_paths = []
-    total_merges = 0
-    
-    for path_idx, path in enumerate(paths_after_dedup):
-        path_names = [index_to_name.get(node_idx, f"node_{node_idx}") for node_idx in path]
-        merge_info = []
-        
-        # 第一步：收集所有需要 merge 的信息（不修改路径）
-        merges_to_apply = []  # [(step_idx, candidate_name, candidate_idx), ...]
-        
-        for step_idx, (node_idx, node_name) in enumerate(zip(path, path_names)):
-            step_merge_info = {
-                "step_idx": step_idx,
-                "node_idx": node_idx,
-                "node_name": node_name,
-                "merged": False,
-                "merged_candidate": None,
-                "merged_candidate_idx": None,
-            }
-            
-            # 以概率 p 决定是否 merge
-            if rng.random() < merge_probability:
-                # 获取该节点的 candidates
-                candidates = node_to_candidates.get(node_name, [])
-                
-                if candidates:
-                    # 过滤掉已经在路径中的 candidates
-                    available_candidates = [
-                        cand for cand in candidates
-                        if cand not in path_names and cand in name_to_index
-                    ]
-                    
-                    if available_candidates:
-                        # 随机选择一个 candidate
-                        selected_candidate = rng.choice(available_candidates)
-                        candidate_idx = name_to_index[selected_candidate]
-                        
-                        step_merge_info["merged"] = True
-                        step_merge_info["merged_candidate"] = selected_candidate
-                        step_merge_info["merged_candidate_idx"] = candidate_idx
-                        total_merges += 1
-                        
-                        # 记录需要应用的 merge（从后往前插入，避免索引变化）
-                        merges_to_apply.append((step_idx + 1, selected_candidate, candidate_idx))
-            
-            merge_info.append(step_merge_info)
-        
-        # 第二步：从后往前插入 candidates（避免索引变化）
-        merged_path = path.copy()
-        merged_path_names = path_names.copy()
-        for insert_position, candidate_name, candidate_idx in reversed(merges_to_apply):
-            merged_path.insert(insert_position, candidate_idx)
-            merged_path_names.insert(insert_position, candidate_name)
-        
-        merged_paths.append({
-            "path": path,
-            "path_names": [index_to_name.get(node_idx, f"node_{node_idx}") for node_idx in path],
-            "merged_path": merged_path,
-            "merged_path_names": [index_to_name.get(node_idx, f"node_{node_idx}") for node_idx in merged_path],
-            "merge_info": merge_info,
-            "num_merges": sum(1 for info in merge_info if info["merged"]),
-        })
-    
-    print(f"Merge 完成: {len(paths_after_dedup)} 条路径，共 {total_merges} 次 merge 操作")
-    return merged_paths
+    if candidate_index is None:
+        candidate_index = MergeCandidateIndex(node_to_candidates, name_to_index, index_to_name)
+    return candidate_index.merge_paths(paths_after_dedup, rng, merge_probability)
 
 
 def apply_merge_operation(
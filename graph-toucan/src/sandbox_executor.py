@@ -0,0 +1,829 @@
+"""
+生成函数（tool）的进程池沙箱执行。
+
+backward_to_query.execute_function_call 原来在事件循环线程里直接执行 tool，并用 SafeExecutionContext
+在整个进程范围内替换 builtins.open / eval、os.remove、shutil.*、subprocess.*：
+- asyncio.gather 并发处理多条路径时，一个 task 的 __exit__ 可能在另一个 task 仍在执行时恢复原函数，限制失效
+- tool 是同步代码，执行期间阻塞整个事件循环，不同路径的 tool 无法真正并行
+
+SandboxPool 预先 fork 一组 worker 进程，tool 只在 worker 里加载和执行：
+- 每个 worker 同一时刻只执行一个调用，SafeExecutionContext 的替换只影响这个 worker 进程，不会被别的调用提前恢复
+- worker 的工作目录切换到 SAFE_WORK_DIR（相对路径都落在安全目录内），并用 RLIMIT_AS 限制可用内存
+- 每次调用有超时：worker 内用 ITIMER_REAL 中断超时的 Python 代码；卡在 C 代码里不响应时，父进程超时后重建该 worker
+- call_external_api 的 LLM 模拟仍在父进程（事件循环）中完成，模拟结果随调用一起发给 worker，
+  worker 用 mock 替换 module.call_external_api（stateful tool 为 _original_call_external_api）；
+  父进程只解析 tool 源码，不执行生成的 module
+
+worker 常驻并缓存已加载的 module（见 SandboxPool 的 tool affinity 路由和 preload）：
+生成的 tool 有 ~1250 个，每个 worker 只加载 / 缓存分给它的那部分 tool，module 缓存保持命中。
+
+stateful tool 的 VirtualSystem（new_feature/state_manager.py）状态不保存在 worker 进程里：
+同一条路径的 tool 会被路由到不同的 worker，状态由调用方的 ToolSession（tool_session.py）随调用传给 worker，
+执行完把更新后的状态带回来（run 的 session 参数）。
+
+用法：
+    pool = SandboxPool([GENERATED_FUNCTIONS_STATEFUL_DIR, GENERATED_FUNCTIONS_DIR], SAFE_WORK_DIR, num_workers=8,
+                       import_paths=[STATE_MANAGER_DIR])
+    pool.start()                        # 在 asyncio.run 之前启动 worker
+    await pool.preload(tool_names_in_shard)   # 可选：按调用次数分配 home worker 并预加载 module
+    result = await pool.run(func_name, parameters, api_output=simulated_output, replace_api=True,
+                            session=current_session())
+"""
+
+import asyncio
+import copy
+import heapq
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # 非 Unix 平台没有 resource，不限制内存
+    resource = None
+
+from function_registry import DEFAULT_CACHE_SIZE, FunctionRegistry, api_function_name
+from tool_session import ToolSession, bind_session_state
+
+DEFAULT_SAFE_WORK_DIR = "/data/lhy/datasets/graph-Toucan/safe_work_dir"
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MEMORY_LIMIT_MB = 2048
+DEFAULT_PRELOAD_PER_WORKER = 64
+DEFAULT_SPILL_THRESHOLD = 4
+# 父进程在 worker 超时之后再等多久才认为 worker 卡死
+HARD_TIMEOUT_GRACE = 5.0
+
+
+class SandboxError(RuntimeError):
+    """tool 在沙箱 worker 中执行失败（原始异常类型和信息保留在消息里）"""
+
+
+class SandboxTimeout(SandboxError):
+    """tool 执行超时"""
+
+
+class _CallTimeout(BaseException):
+    """worker 内的超时信号；继承 BaseException，避免被 tool 里的 except Exception 吞掉"""
+
+
+class SafeExecutionContext:
+    """
+    安全执行上下文，限制文件操作和危险操作
+
+    替换是进程级的：同一进程里同时只能有一个调用处于该上下文中（SandboxPool 的 worker 满足这一点）。
+    """
+    def __init__(self, safe_dir: str = DEFAULT_SAFE_WORK_DIR):
+        self.safe_dir = os.path.abspath(safe_dir)
+        self.original_builtins = {}
+        self.original_modules = {}
+        self.original_os = None
+        self.original_shutil = None
+        self.original_subprocess = None
+
+    def _check_path_safe(self, path: str) -> str:
+        """
+        检查路径是否在安全目录内，如果是则返回绝对路径，否则抛出异常
+
+        如果路径是相对路径，会先解析为相对于安全目录的路径
+        """
+        safe_dir_abs = os.path.abspath(self.safe_dir)
+
+        # 如果是相对路径，先解析为相对于安全目录的路径
+        if not os.path.isabs(path):
+            abs_path = os.path.abspath(os.path.join(safe_dir_abs, path))
+        else:
+            abs_path = os.path.abspath(path)
+
+        # 检查路径是否在安全目录内
+        try:
+            # 使用 commonpath 检查路径是否在安全目录内
+            common_path = os.path.commonpath([abs_path, safe_dir_abs])
+            if common_path != safe_dir_abs:
+                raise PermissionError(
+                    f"File operation not allowed outside safe directory. "
+                    f"Attempted path: {abs_path}, Safe directory: {safe_dir_abs}"
+                )
+        except ValueError:
+            # 路径不在同一驱动器上（Windows）或完全不同
+            raise PermissionError(
+                f"File operation not allowed outside safe directory. "
+                f"Attempted path: {abs_path}, Safe directory: {safe_dir_abs}"
+            )
+
+        return abs_path
+
+    def _safe_open(self, file, mode='r', buffering=-1, encoding=None, errors=None, newline=None, closefd=True, opener=None):
+        """安全的 open 函数，限制文件操作在安全目录内"""
+        if isinstance(file, str):
+            file = self._check_path_safe(file)
+        return self.original_builtins['open'](file, mode, buffering, encoding, errors, newline, closefd, opener)
+
+    def _safe_os_remove(self, path):
+        """安全的 os.remove，限制在安全目录内"""
+        self._check_path_safe(path)
+        return self.original_os.remove(path)
+
+    def _safe_os_unlink(self, path):
+        """安全的 os.unlink，限制在安全目录内"""
+        self._check_path_safe(path)
+        return self.original_os.unlink(path)
+
+    def _safe_os_rmdir(self, path):
+        """安全的 os.rmdir，限制在安全目录内"""
+        self._check_path_safe(path)
+        return self.original_os.rmdir(path)
+
+    def _safe_os_makedirs(self, name, mode=0o777, exist_ok=False):
+        """安全的 os.makedirs，限制在安全目录内"""
+        self._check_path_safe(name)
+        return self.original_os.makedirs(name, mode, exist_ok)
+
+    def _safe_os_mkdir(self, name, mode=0o777):
+        """安全的 os.mkdir，限制在安全目录内"""
+        self._check_path_safe(name)
+        return self.original_os.mkdir(name, mode)
+
+    def _safe_shutil_rmtree(self, path, ignore_errors=False, onerror=None):
+        """安全的 shutil.rmtree，限制在安全目录内"""
+        self._check_path_safe(path)
+        return self.original_shutil.rmtree(path, ignore_errors, onerror)
+
+    def _safe_shutil_move(self, src, dst):
+        """安全的 shutil.move，限制在安全目录内"""
+        self._check_path_safe(src)
+        self._check_path_safe(dst)
+        return self.original_shutil.move(src, dst)
+
+    def _safe_shutil_copy(self, src, dst):
+        """安全的 shutil.copy，限制在安全目录内"""
+        self._check_path_safe(src)
+        self._check_path_safe(dst)
+        return self.original_shutil.copy(src, dst)
+
+    def _safe_shutil_copy2(self, src, dst):
+        """安全的 shutil.copy2，限制在安全目录内"""
+        self._check_path_safe(src)
+        self._check_path_safe(dst)
+        return self.original_shutil.copy2(src, dst)
+
+    def _safe_subprocess_run(self, *args, **kwargs):
+        """禁止 subprocess 操作"""
+        raise PermissionError("subprocess operations are not allowed in safe execution context")
+
+    def _safe_subprocess_call(self, *args, **kwargs):
+        """禁止 subprocess 操作"""
+        raise PermissionError("subprocess operations are not allowed in safe execution context")
+
+    def _safe_subprocess_popen(self, *args, **kwargs):
+        """禁止 subprocess 操作"""
+        raise PermissionError("subprocess operations are not allowed in safe execution context")
+
+    def _safe_eval(self, *args, **kwargs):
+        """禁止 eval 操作"""
+        raise PermissionError("eval operations are not allowed in safe execution context")
+
+    def _safe_exec(self, *args, **kwargs):
+        """禁止 exec 操作"""
+        raise PermissionError("exec operations are not allowed in safe execution context")
+
+    def _safe_compile(self, *args, **kwargs):
+        """禁止 compile 操作"""
+        raise PermissionError("compile operations are not allowed in safe execution context")
+
+    def __enter__(self):
+        """进入安全执行上下文"""
+        import builtins
+        import os as os_module
+        import shutil
+        import subprocess
+
+        # 保存原始函数
+        self.original_builtins['open'] = builtins.open
+        self.original_builtins['eval'] = builtins.eval
+        # 不再拦截 exec 和 compile，因为模块加载需要它们
+        # self.original_builtins['exec'] = builtins.exec
+        # self.original_builtins['compile'] = builtins.compile
+        self.original_os = os_module
+        self.original_shutil = shutil
+        self.original_subprocess = subprocess
+
+        # 替换为安全版本
+        builtins.open = self._safe_open
+        builtins.eval = self._safe_eval
+        # 不再替换 exec 和 compile
+        # builtins.exec = self._safe_exec
+        # builtins.compile = self._safe_compile
+
+        # 替换 os 模块的危险函数
+        os_module.remove = self._safe_os_remove
+        os_module.unlink = self._safe_os_unlink
+        os_module.rmdir = self._safe_os_rmdir
+        os_module.makedirs = self._safe_os_makedirs
+        os_module.mkdir = self._safe_os_mkdir
+
+        # 替换 shutil 模块的危险函数
+        shutil.rmtree = self._safe_shutil_rmtree
+        shutil.move = self._safe_shutil_move
+        shutil.copy = self._safe_shutil_copy
+        shutil.copy2 = self._safe_shutil_copy2
+
+        # 替换 subprocess 模块的所有函数
+        subprocess.run = self._safe_subprocess_run
+        subprocess.call = self._safe_subprocess_call
+        subprocess.Popen = self._safe_subprocess_popen
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """退出安全执行上下文，恢复原始函数"""
+        import builtins
+        import os as os_module
+        import shutil
+        import subprocess
+
+        # 恢复原始函数
+        builtins.open = self.original_builtins.get('open', builtins.open)
+        builtins.eval = self.original_builtins.get('eval', builtins.eval)
+        # exec 和 compile 未被修改，无需恢复
+        # builtins.exec = self.original_builtins.get('exec', builtins.exec)
+        # builtins.compile = self.original_builtins.get('compile', builtins.compile)
+
+        if self.original_os:
+            os_module.remove = self.original_os.remove
+            os_module.unlink = self.original_os.unlink
+            os_module.rmdir = self.original_os.rmdir
+            os_module.makedirs = self.original_os.makedirs
+            os_module.mkdir = self.original_os.mkdir
+
+        if self.original_shutil:
+            shutil.rmtree = self.original_shutil.rmtree
+            shutil.move = self.original_shutil.move
+            shutil.copy = self.original_shutil.copy
+            shutil.copy2 = self.original_shutil.copy2
+
+        if self.original_subprocess:
+            subprocess.run = self.original_subprocess.run
+            subprocess.call = self.original_subprocess.call
+            subprocess.Popen = self.original_subprocess.Popen
+
+        return False  # 不抑制异常
+
+
+# ==================== 单次调用 ====================
+
+def call_tool_function(func: Any, func_name: str, parameters: Optional[Dict[str, Any]]) -> Any:
+    """执行函数调用；没有参数时使用参数默认值（名为 tool_name 的参数填函数名）"""
+    if parameters:
+        return func(**parameters)
+    # 尝试无参数调用或使用默认值
+    sig = inspect.signature(func)
+    call_params = {}
+    for param_name, param in sig.parameters.items():
+        if param.default != inspect.Parameter.empty:
+            call_params[param_name] = param.default
+        elif param_name == "tool_name":
+            call_params[param_name] = func_name
+    return func(**call_params) if call_params else func()
+
+
+def execute_loaded_function(
+    func: Any,
+    module: Any,
+    func_name: str,
+    parameters: Optional[Dict[str, Any]],
+    api_output: Any = None,
+    replace_api: bool = False,
+    safe_dir: str = DEFAULT_SAFE_WORK_DIR,
+    session: Optional[ToolSession] = None,
+) -> Any:
+    """
+    在 SafeExecutionContext 中执行已加载的函数。
+
+    Args:
+        replace_api: 是否把 module.call_external_api（stateful tool 为 _original_call_external_api）
+            替换成返回 api_output 的 mock（执行完恢复）
+        session: 会话状态（见 tool_session.py）；module 用到 sys_state 时在 session.state 上执行，
+            成功后把更新后的状态写回 session.state。None 表示使用本进程的全局状态
+    """
+    binding = bind_session_state(module, session.state) if session is not None else None
+    # stateful tool 替换被包装的 _original_call_external_api，包装中的 sys_state 副作用照常执行
+    api_name = api_function_name(module)
+    original_call_external_api = getattr(module, api_name, None)
+    if replace_api:
+        def mock_call_external_api(tool_name: str, *args, **kwargs) -> Dict[str, Any]:
+            """Mock implementation of call_external_api"""
+            # stateful 包装会修改返回的 dict，不能改到调用方（模拟缓存）持有的 api_output
+            return copy.deepcopy(api_output)
+
+        setattr(module, api_name, mock_call_external_api)
+    try:
+        with SafeExecutionContext(safe_dir):
+            result = call_tool_function(func, func_name, parameters)
+        if binding is not None:
+            session.state = binding.dumps()
+        return result
+    finally:
+        if binding is not None:
+            binding.release()
+        if replace_api:
+            # 恢复原始的 call_external_api（如果有），否则删除 mock
+            if original_call_external_api:
+                setattr(module, api_name, original_call_external_api)
+            elif hasattr(module, api_name):
+                delattr(module, api_name)
+
+
+# ==================== worker 进程 ====================
+
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _raise_call_timeout(signum, frame):
+    raise _CallTimeout()
+
+
+def _limit_memory(memory_limit_mb: int) -> None:
+    """限制 worker 的地址空间：fork 时继承的当前大小 + memory_limit_mb"""
+    baseline = 0
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    limit = baseline + memory_limit_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _init_sandbox_worker(
+    directories, safe_dir: str, memory_limit_mb: Optional[int], cache_size: int, import_paths=(),
+) -> None:
+    start = time.perf_counter()
+    # Ctrl-C 由父进程处理，worker 跟随进程池关闭
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, _raise_call_timeout)
+    os.makedirs(safe_dir, exist_ok=True)
+    os.chdir(safe_dir)
+    if memory_limit_mb and resource is not None:
+        try:
+            _limit_memory(memory_limit_mb)
+        except (OSError, ValueError) as e:
+            print(f"Warning: sandbox worker {os.getpid()} cannot limit memory: {e}")
+    registry = FunctionRegistry(directories, cache_size=cache_size, import_paths=import_paths)
+    registry.build()
+    _WORKER_STATE["registry"] = registry
+    _WORKER_STATE["safe_dir"] = safe_dir
+    _WORKER_STATE["init_seconds"] = time.perf_counter() - start
+
+
+def _worker_info() -> Dict[str, Any]:
+    return {"pid": os.getpid(), "init_seconds": _WORKER_STATE.get("init_seconds", 0.0)}
+
+
+def _preload_tools(func_names: List[str], timeout: Optional[float]) -> Dict[str, Any]:
+    """worker 中预先加载一组 tool 的 module（放进 FunctionRegistry 的 LRU 缓存），并返回实际加载的文件"""
+    registry = _WORKER_STATE["registry"]
+    start = time.perf_counter()
+    loaded, failed, resolved = 0, [], {}
+    for func_name in func_names:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            resolved[func_name] = registry.load(func_name).file_path
+            loaded += 1
+        except (_CallTimeout, Exception) as e:
+            failed.append(f"{func_name}: {type(e).__name__}: {e}")
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return {"loaded": loaded, "failed": failed, "resolved": resolved, "seconds": time.perf_counter() - start}
+
+
+def _resolve_tool(func_name: str, timeout: Optional[float]) -> str:
+    """
+    worker 中加载 tool（与执行时相同的文件名解析和回退规则），返回实际加载的文件。
+
+    Raises:
+        RuntimeError: 函数文件不存在或加载失败
+    """
+    registry = _WORKER_STATE["registry"]
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return registry.load(func_name).file_path
+    except _CallTimeout:
+        raise SandboxTimeout(f"loading {func_name} timed out after {timeout}s") from None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _portable(result: Any) -> Any:
+    """结果需要 pickle 回父进程；不能 pickle 的对象按 JSON（default=str）转换"""
+    try:
+        pickle.dumps(result)
+        return result
+    except Exception:
+        return json.loads(json.dumps(result, ensure_ascii=False, default=str))
+
+
+def _run_tool(
+    func_name: str,
+    parameters: Optional[Dict[str, Any]],
+    api_output: Any,
+    replace_api: bool,
+    timeout: Optional[float],
+    with_session: bool = False,
+    session_state: Optional[bytes] = None,
+) -> Tuple[Any, bool, Optional[bytes]]:
+    """
+    worker 中执行一次 tool 调用；异常统一转换为可 pickle 的 SandboxError。
+
+    Args:
+        with_session: 调用方是否有会话（没有时 stateful tool 使用 worker 进程的全局状态）
+        session_state: 会话状态（ToolSession.state）
+
+    Returns:
+        (函数返回值, module 是否命中 worker 的缓存, 更新后的会话状态；tool 没有用到会话状态时为 None)
+    """
+    registry = _WORKER_STATE["registry"]
+    hits = registry.hits
+    loaded = registry.load(func_name)
+    cache_hit = registry.hits > hits
+    session = ToolSession(session_state) if with_session else None
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = execute_loaded_function(
+            loaded.func, loaded.module, func_name, parameters,
+            api_output=api_output, replace_api=replace_api, safe_dir=_WORKER_STATE["safe_dir"],
+            session=session,
+        )
+    except _CallTimeout:
+        raise SandboxTimeout(f"{func_name} timed out after {timeout}s") from None
+    except Exception as e:
+        raise SandboxError(f"{type(e).__name__}: {e}") from None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    # execute_loaded_function 只在 tool 用到会话状态时替换 session.state
+    new_state = session.state if session is not None and session.state is not session_state else None
+    return _portable(result), cache_hit, new_state
+
+
+# ==================== 进程池 ====================
+
+def assign_tools(tool_counts: Mapping[str, int], num_workers: int) -> List[List[str]]:
+    """
+    按调用次数把 tool 分给 worker（最长处理时间优先：调用最多的 tool 先分，每次分给当前负载最小的 worker）。
+
+    Returns:
+        每个 worker 负责的 tool，按调用次数从多到少排列
+    """
+    loads = [(0, w) for w in range(num_workers)]
+    heapq.heapify(loads)
+    assigned: List[List[str]] = [[] for _ in range(num_workers)]
+    for name, count in sorted(tool_counts.items(), key=lambda item: (-item[1], item[0])):
+        load, w = heapq.heappop(loads)
+        assigned[w].append(name)
+        heapq.heappush(loads, (load + count, w))
+    return assigned
+
+
+class SandboxPool:
+    """
+    见模块说明；run 可以在多个 asyncio task 中并发调用。
+
+    每个 worker 是一个单进程的 ProcessPoolExecutor，调用按 tool 名路由（tool affinity）：
+    - 每个 tool 有一个固定的 home worker（preload 按调用次数均衡分配，未分配的 tool 按名字哈希），
+      同一个 tool 总在同一个 worker 执行，worker 内 FunctionRegistry 的 module 缓存保持命中
+    - home worker 排队的调用达到 spill_threshold 且有更空闲的 worker 时，临时分给最空闲的 worker
+    - 某个 worker 卡死 / 崩溃只重建这一个 worker
+    """
+
+    def __init__(
+        self,
+        directories: Iterable[str],
+        safe_dir: str = DEFAULT_SAFE_WORK_DIR,
+        num_workers: Optional[int] = None,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+        memory_limit_mb: Optional[int] = DEFAULT_MEMORY_LIMIT_MB,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        start_method: Optional[str] = None,
+        preload_per_worker: int = DEFAULT_PRELOAD_PER_WORKER,
+        spill_threshold: int = DEFAULT_SPILL_THRESHOLD,
+        import_paths: Iterable[str] = (),
+    ):
+        """
+        Args:
+            directories: 函数目录（与 FunctionRegistry 相同，靠前的优先）
+            safe_dir: worker 的工作目录，文件操作只允许在其中进行
+            num_workers: worker 进程数（默认 min(8, CPU 数)）
+            timeout: 单次调用超时秒数（None 表示不限制）
+            memory_limit_mb: 每个 worker 在启动时内存之外可以再使用的内存（None 表示不限制）
+            cache_size: 每个 worker 缓存的已加载函数个数（至少为 preload_per_worker）
+            start_method: multiprocessing 启动方式（默认有 fork 时用 fork，worker 直接继承已导入的模块）
+            preload_per_worker: preload 时每个 worker 最多预先加载的 module 数（0 表示只分配 home worker、不预加载）
+            spill_threshold: home worker 上排队的调用数达到该值时允许分给其他 worker（0 表示严格按 affinity）
+            import_paths: worker 中 tool import 的模块所在目录（与 FunctionRegistry 相同，如 state_manager 所在目录）
+        """
+        self.directories = [d for d in directories if d]
+        self.import_paths = [p for p in import_paths if p]
+        self.safe_dir = os.path.abspath(safe_dir)
+        self.num_workers = num_workers or min(8, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.preload_per_worker = preload_per_worker
+        self.cache_size = max(cache_size, preload_per_worker)
+        self.spill_threshold = spill_threshold
+        if start_method is None and "fork" in multiprocessing.get_all_start_methods():
+            start_method = "fork"
+        self.start_method = start_method
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.spills = 0
+        self.module_cache_hits = 0
+        self.module_cache_misses = 0
+        # 启动 / 预加载开销：每个 worker 最近一次启动的耗时（父进程看到的墙钟时间和 worker 初始化时间）
+        self.startup_seconds: List[float] = [0.0] * self.num_workers
+        self.init_seconds: List[float] = [0.0] * self.num_workers
+        self.preload_seconds: List[float] = [0.0] * self.num_workers
+        self.preloaded: List[List[str]] = [[] for _ in range(self.num_workers)]
+        self._affinity: Dict[str, int] = {}
+        # tool 名 -> worker 中实际加载的文件（父进程按这个文件解析 call_external_api，与执行的代码一致）
+        self._resolved: Dict[str, str] = {}
+        self._pending = [0] * self.num_workers
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * self.num_workers
+        self._lock = threading.Lock()
+
+    # ---------- worker 生命周期 ----------
+
+    def _create_worker(self, w: int) -> ProcessPoolExecutor:
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_sandbox_worker,
+            initargs=(self.directories, self.safe_dir, self.memory_limit_mb, self.cache_size, self.import_paths),
+        )
+        info = executor.submit(_worker_info).result()
+        self.startup_seconds[w] = time.perf_counter() - start
+        self.init_seconds[w] = info["init_seconds"]
+        # 重建的 worker 重新预加载它负责的 tool（不等待：单进程 worker 按提交顺序执行，之后的调用排在预加载后面）
+        if self.preloaded[w]:
+            future = executor.submit(_preload_tools, self.preloaded[w], self.timeout)
+            future.add_done_callback(lambda f, w=w: self._record_preload(w, f))
+        return executor
+
+    def _record_preload(self, w: int, future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.preload_seconds[w] = future.result()["seconds"]
+
+    def _worker(self, w: int) -> ProcessPoolExecutor:
+        """返回 worker w，不存在时创建并等待就绪（阻塞；事件循环中用 _aworker）"""
+        with self._lock:
+            executor = self._executors[w]
+            if executor is None:
+                os.makedirs(self.safe_dir, exist_ok=True)
+                executor = self._executors[w] = self._create_worker(w)
+            return executor
+
+    async def _aworker(self, w: int) -> ProcessPoolExecutor:
+        """事件循环中获取 worker w：需要（重新）创建时放到线程里等待，不阻塞事件循环"""
+        executor = self._executors[w]
+        if executor is not None:
+            return executor
+        return await asyncio.get_running_loop().run_in_executor(None, self._worker, w)
+
+    def start(self) -> None:
+        """
+        启动所有 worker 并等待就绪（已启动的跳过）。
+
+        应在 asyncio.run 之前调用：此时进程里还没有事件循环和其他线程，fork 出的 worker 状态干净。
+        之后在事件循环中重建 worker 时通过 _aworker 放到线程里完成。
+        """
+        for w in range(self.num_workers):
+            self._worker(w)
+
+    def _restart(self, w: int, executor: ProcessPoolExecutor) -> None:
+        """杀掉（可能卡死的）worker，下一次路由到它时重新创建；其他 task 已经重建过时不重复"""
+        with self._lock:
+            if self._executors[w] is not executor:
+                return
+            self._executors[w] = None
+            self.restarts += 1
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- 预加载与路由 ----------
+
+    async def preload(self, tool_names: Iterable[str]) -> Dict[str, Any]:
+        """
+        按 shard 中 tool 的出现次数给每个 tool 分配 home worker，并在各 worker 中并行预加载
+        （每个 worker 最多 preload_per_worker 个，调用最多的优先）。
+
+        Args:
+            tool_names: shard 中所有的 tool 调用（可以重复，重复次数即权重）
+
+        Returns:
+            预加载报告（tool 数、各 worker 的启动 / 预加载耗时、加载失败的 tool）
+        """
+        counts = Counter(name for name in tool_names if name)
+        assigned = assign_tools(counts, self.num_workers)
+        for w, names in enumerate(assigned):
+            for name in names:
+                self._affinity[name] = w
+            self.preloaded[w] = names[:self.preload_per_worker]
+
+        futures = []
+        for w in range(self.num_workers):
+            executor = await self._aworker(w)
+            futures.append(
+                asyncio.wrap_future(executor.submit(_preload_tools, self.preloaded[w], self.timeout))
+                if self.preloaded[w] else None
+            )
+        failed: List[str] = []
+        loaded = 0
+        for w, future in enumerate(futures):
+            if future is None:
+                self.preload_seconds[w] = 0.0
+                continue
+            report = await future
+            self.preload_seconds[w] = report["seconds"]
+            self._resolved.update(report["resolved"])
+            loaded += report["loaded"]
+            failed.extend(report["failed"])
+        return {
+            "num_tools": len(counts),
+            "num_preloaded": loaded,
+            "failed": failed,
+            "startup_seconds": list(self.startup_seconds),
+            "preload_seconds": list(self.preload_seconds),
+        }
+
+    def route(self, func_name: str) -> int:
+        """选择执行 func_name 的 worker（见类说明）"""
+        home = self._affinity.get(func_name)
+        if home is None:
+            home = self._affinity[func_name] = zlib.crc32(func_name.encode("utf-8")) % self.num_workers
+        if self.spill_threshold and self._pending[home] >= self.spill_threshold:
+            idlest = min(range(self.num_workers), key=self._pending.__getitem__)
+            if self._pending[idlest] < self._pending[home]:
+                self.spills += 1
+                return idlest
+        return home
+
+    # ---------- 执行 ----------
+
+    async def resolve(self, func_name: str) -> str:
+        """
+        返回 func_name 在 worker 中实际加载的文件（名字变体解析和加载失败时的回退规则都与执行时相同）。
+        父进程用这个文件解析 call_external_api（FunctionRegistry.api_parts），结果按 tool 名缓存。
+
+        Raises:
+            RuntimeError: 函数文件不存在或加载失败
+        """
+        file_path = self._resolved.get(func_name)
+        if file_path is None:
+            file_path = await self._call(func_name, _resolve_tool, func_name, self.timeout)
+            self._resolved[func_name] = file_path
+        return file_path
+
+    async def run(
+        self,
+        func_name: str,
+        parameters: Optional[Dict[str, Any]],
+        api_output: Any = None,
+        replace_api: bool = False,
+        session: Optional[ToolSession] = None,
+    ) -> Any:
+        """
+        在 worker 中执行一次 tool 调用，返回函数的原始返回值。
+
+        Args:
+            session: 调用方的会话状态（见 tool_session.py）：随调用发给 worker，tool 用到 sys_state 时
+                执行成功后写回更新后的状态。同一会话中 stateful 调用的先后由调用方保证（ToolSession.lock）
+
+        Raises:
+            SandboxTimeout: 超时（worker 卡死时会重建该 worker）
+            SandboxError: 函数执行出错（消息为原始异常类型和信息）或 worker 崩溃
+            RuntimeError: 函数文件不存在或加载失败
+        """
+        self.calls += 1
+        result, cache_hit, new_state = await self._call(
+            func_name, _run_tool, func_name, parameters, api_output, replace_api, self.timeout,
+            session is not None, session.state if session is not None else None,
+        )
+        if new_state is not None:
+            session.state = new_state
+        if cache_hit:
+            self.module_cache_hits += 1
+        else:
+            self.module_cache_misses += 1
+        return result
+
+    async def _call(self, func_name: str, fn, *args) -> Any:
+        """把 fn(*args) 发给 func_name 路由到的 worker 执行（超时 / worker 崩溃的处理见 run）"""
+        loop = asyncio.get_running_loop()
+        hard_timeout = self.timeout + HARD_TIMEOUT_GRACE if self.timeout else None
+        w = self.route(func_name)
+        self._pending[w] += 1
+        try:
+            for attempt in range(2):
+                executor = await self._aworker(w)
+                try:
+                    return await asyncio.wait_for(loop.run_in_executor(executor, fn, *args), hard_timeout)
+                except SandboxTimeout:
+                    self.timeouts += 1
+                    raise
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._restart(w, executor)
+                    raise SandboxTimeout(
+                        f"{func_name} did not respond within {hard_timeout}s; sandbox worker {w} restarted"
+                    ) from None
+                except BrokenProcessPool:
+                    # worker 被杀（内存超限 / 崩溃 / 同一 worker 上的其他调用超时触发重建）：重建后重试一次
+                    self._restart(w, executor)
+                    if attempt == 1:
+                        self.failures += 1
+                        raise SandboxError(f"Sandbox worker crashed while executing {func_name}") from None
+                    continue
+                except Exception:
+                    self.failures += 1
+                    raise
+        finally:
+            self._pending[w] -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors, self._executors = self._executors, [None] * self.num_workers
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.module_cache_hits + self.module_cache_misses
+        return {
+            "num_workers": self.num_workers,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "spills": self.spills,
+            "module_cache_hits": self.module_cache_hits,
+            "module_cache_misses": self.module_cache_misses,
+            "module_cache_hit_rate": self.module_cache_hits / lookups if lookups else 0.0,
+            "preloaded_modules": sum(len(names) for names in self.preloaded),
+            "max_startup_seconds": max(self.startup_seconds, default=0.0),
+            "total_preload_seconds": sum(self.preload_seconds),
+        }
+
+    def format_summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"Sandbox executor: {stats['num_workers']} workers, calls={stats['calls']}, "
+            f"failures={stats['failures']}, timeouts={stats['timeouts']}, restarts={stats['restarts']}, "
+            f"spills={stats['spills']}, module cache hit rate={stats['module_cache_hit_rate'] * 100:.2f}%, "
+            f"startup={stats['max_startup_seconds']:.2f}s, "
+            f"preloaded {stats['preloaded_modules']} modules in {stats['total_preload_seconds']:.2f}s"
+        )
+
+
+def build_sandbox_pool(
+    config: Optional[Dict[str, Any]],
+    directories: Iterable[str],
+    safe_dir: str = DEFAULT_SAFE_WORK_DIR,
+    import_paths: Iterable[str] = (),
+) -> Optional[SandboxPool]:
+    """按 config.yaml 的 sandbox_execution 段（和环境变量）创建进程池；关闭时返回 None（回退到进程内执行）"""
+    settings = dict((config or {}).get("sandbox_execution") or {})
+    enabled = settings.get("enabled", True)
+    env = os.getenv("GRAPH_TOUCAN_SANDBOX")
+    if env is not None:
+        enabled = env != "0"
+    if not enabled:
+        return None
+    return SandboxPool(
+        directories,
+        safe_dir=safe_dir,
+        num_workers=settings.get("num_workers"),
+        timeout=settings.get("timeout", DEFAULT_TIMEOUT),
+        memory_limit_mb=settings.get("memory_limit_mb", DEFAULT_MEMORY_LIMIT_MB),
+        start_method=settings.get("start_method"),
+        preload_per_worker=settings.get("preload_per_worker", DEFAULT_PRELOAD_PER_WORKER),
+        spill_threshold=settings.get("spill_threshold", DEFAULT_SPILL_THRESHOLD),
+        import_paths=import_paths,
+    )
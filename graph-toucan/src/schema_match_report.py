@@ -0,0 +1,150 @@
+"""
+离线评估静态 schema 预筛（schema_matcher.StaticSchemaMatcher）相对于已有 graph_v1 的召回率。
+
+对已经被 LLM 判断过的所有 pair（graph_v1_progress.json 中的 processed_pairs_by_name，
+没有进度文件时退回 node_candidates_mapping.json）重新做一次静态匹配，报告：
+- skip / accept / llm 三种决策的数量，以及 LLM 调用减少的倍数
+- 召回率：graph_v1 中的边有多少没有被 skip（整体 + 按 dependency_type）
+- accept 的精确率：直接接受的 pair 中有多少在 graph_v1 中确实有边
+
+用法：
+    python schema_match_report.py --skip-threshold 0.35 --accept-threshold 0.95
+"""
+
+import argparse
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from graph import load_graph_nodes, load_node_candidates_mapping
+from schema_matcher import StaticSchemaMatcher
+
+GRAPH_DIR = '/data/lhy/datasets/graph-Toucan/graph'
+CLASSIFICATION_FILE = '/data/lhy/datasets/graph-Toucan/tool_info/tool_classification_results_v1.json'
+SCHEMA_FILE = '/data/lhy/datasets/graph-Toucan/tool_info/tool_schema_with_outputformat.json'
+
+
+def load_judged_pairs(nodes: List[Dict], progress_file: str, candidates_mapping_file: str) -> List[Tuple[int, int]]:
+    """已经被 LLM 判断过的 (node_idx, candidate_idx)，按 function name 对齐到当前 nodes"""
+    name_to_index = {
+        node.get('function_schema', {}).get('function', {}).get('name', ''): idx
+        for idx, node in enumerate(nodes)
+    }
+    if os.path.exists(progress_file):
+        with open(progress_file, 'r', encoding='utf-8') as f:
+            progress_data = json.load(f)
+        pairs = []
+        for pair_names in progress_data.get('processed_pairs_by_name', []):
+            if len(pair_names) != 2:
+                continue
+            src, tgt = name_to_index.get(pair_names[0]), name_to_index.get(pair_names[1])
+            if src is not None and tgt is not None:
+                pairs.append((src, tgt))
+        return pairs
+
+    node_candidates = load_node_candidates_mapping(nodes, candidates_mapping_file)
+    return [(src, tgt) for src, candidates in node_candidates.items() for tgt in candidates]
+
+
+def load_edge_types(nodes: List[Dict], graph_file: str) -> Dict[Tuple[int, int], str]:
+    """graph_v1 中的边：(source_idx, target_idx) -> dependency_type（按 function name 对齐到当前 nodes）"""
+    with open(graph_file, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    name_to_index = {
+        node.get('function_schema', {}).get('function', {}).get('name', ''): idx
+        for idx, node in enumerate(nodes)
+    }
+    graph_names = [
+        node.get('function_schema', {}).get('function', {}).get('name', '')
+        for node in graph.get('nodes', [])
+    ]
+    edge_types = {}
+    for edge in graph.get('edges', []):
+        src = name_to_index.get(graph_names[edge['source']])
+        tgt = name_to_index.get(graph_names[edge['target']])
+        if src is not None and tgt is not None:
+            edge_types[(src, tgt)] = edge.get('dependency_type', 'none')
+    return edge_types
+
+
+def evaluate(
+    nodes: List[Dict],
+    judged_pairs: List[Tuple[int, int]],
+    edge_types: Dict[Tuple[int, int], str],
+    matcher: StaticSchemaMatcher,
+) -> Dict:
+    decisions = Counter()
+    edges_total = Counter()
+    edges_kept = Counter()
+    accepted_correct = 0
+    accepted_type_match = 0
+
+    for src, tgt in judged_pairs:
+        match = matcher.score_pair(nodes[src], nodes[tgt])
+        decision = match['decision']
+        decisions[decision] += 1
+        dep_type = edge_types.get((src, tgt))
+        if dep_type is not None:
+            edges_total[dep_type] += 1
+            if decision != 'skip':
+                edges_kept[dep_type] += 1
+        if decision == 'accept' and dep_type is not None:
+            accepted_correct += 1
+            if dep_type == 'full':
+                accepted_type_match += 1
+
+    num_pairs = len(judged_pairs)
+    llm_calls = decisions['llm']
+    total_edges = sum(edges_total.values())
+    return {
+        'num_pairs': num_pairs,
+        'decisions': dict(decisions),
+        'llm_reduction_factor': num_pairs / llm_calls if llm_calls else float('inf'),
+        'recall': sum(edges_kept.values()) / total_edges if total_edges else 1.0,
+        'recall_by_type': {
+            dep_type: edges_kept[dep_type] / count for dep_type, count in edges_total.items()
+        },
+        'edges_by_type': dict(edges_total),
+        'accept_precision': accepted_correct / decisions['accept'] if decisions['accept'] else None,
+        'accept_full_type_rate': accepted_type_match / decisions['accept'] if decisions['accept'] else None,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print("\n" + "=" * 80)
+    print("Static schema prefilter report")
+    print("=" * 80)
+    print(f"Judged pairs: {report['num_pairs']}")
+    for decision in ('skip', 'accept', 'llm'):
+        print(f"  {decision}: {report['decisions'].get(decision, 0)}")
+    print(f"LLM judgment reduction: {report['llm_reduction_factor']:.2f}x")
+    print(f"Edge recall (not skipped): {report['recall'] * 100:.2f}%")
+    for dep_type, recall in sorted(report['recall_by_type'].items()):
+        print(f"  {dep_type}: {recall * 100:.2f}% of {report['edges_by_type'][dep_type]} edges")
+    if report['accept_precision'] is not None:
+        print(f"Accept precision: {report['accept_precision'] * 100:.2f}% "
+              f"(dependency_type == full: {report['accept_full_type_rate'] * 100:.2f}%)")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the static schema prefilter against graph_v1")
+    parser.add_argument("--graph-file", default=os.path.join(GRAPH_DIR, 'graph_v1.json'))
+    parser.add_argument("--progress-file", default=os.path.join(GRAPH_DIR, 'graph_v1_progress.json'))
+    parser.add_argument("--candidates-mapping-file", default=os.path.join(GRAPH_DIR, 'node_candidates_mapping.json'))
+    parser.add_argument("--skip-threshold", type=float, default=0.35)
+    parser.add_argument("--accept-threshold", type=float, default=0.95)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    nodes = load_graph_nodes(CLASSIFICATION_FILE, SCHEMA_FILE)
+    judged_pairs = load_judged_pairs(nodes, args.progress_file, args.candidates_mapping_file)
+    edge_types = load_edge_types(nodes, args.graph_file)
+    matcher = StaticSchemaMatcher(skip_threshold=args.skip_threshold, accept_threshold=args.accept_threshold)
+
+    report = evaluate(nodes, judged_pairs, edge_types, matcher)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,330 @@
+"""
+不调用 LLM 的静态 schema 匹配，用于在 build_graph_v1 之前预筛 candidate pair。
+
+node_candidates_mapping.json 中绝大多数 pair 最终都没有边，但每个 pair 都要花一次 judge_edge_async。
+这里对每个 (node, candidate) 只比较：
+    node 的输出字段（去掉与 node 输入参数同名的 pass-through 字段，对应 filter_output_params_async 的规则 1）
+    vs candidate 的输入参数
+
+- 字段名归一化：camelCase / snake_case / 连字符统一拆成小写 token，并做简单的复数归一（items -> item）
+- 点路径展开：输出字段的嵌套结构（"result.items"、嵌套 fields / properties）和输入参数的嵌套 object 都展开成点路径
+- 类型兼容：把 Python 风格（str / List[Dict]）和 JSON Schema 风格（string / array）统一成同一套类型后打分
+
+每个 pair 得到一个 score（最佳字段匹配分）和三种决策之一：
+- "skip"：score < skip_threshold，不调用 LLM
+- "accept"：candidate 的所有 required 参数都能被 node 输出精确匹配（名字归一后相同且类型兼容），
+  直接建 full 依赖边并给出 param_mapping
+- "llm"：交给 judge_edge_async
+
+注意：prerequisite 依赖无法从 schema 上看出来，被 skip 的 pair 里可能含有 prerequisite 边
+（random_walker.load_graph_for_walk 本身也不使用 prerequisite 边）。召回率可以用 schema_match_report.py 离线评估。
+"""
+
+import re
+from typing import Any, Dict, List, Tuple
+
+# 归一化后的类型
+STRING = "string"
+INTEGER = "integer"
+NUMBER = "number"
+BOOLEAN = "boolean"
+ARRAY = "array"
+OBJECT = "object"
+ANY = "any"
+
+_TYPE_ALIASES = {
+    "str": STRING, "string": STRING, "text": STRING, "date": STRING, "datetime": STRING, "url": STRING,
+    "int": INTEGER, "integer": INTEGER, "long": INTEGER,
+    "float": NUMBER, "number": NUMBER, "double": NUMBER, "decimal": NUMBER,
+    "bool": BOOLEAN, "boolean": BOOLEAN,
+    "list": ARRAY, "array": ARRAY, "tuple": ARRAY, "set": ARRAY, "sequence": ARRAY,
+    "dict": OBJECT, "object": OBJECT, "mapping": OBJECT, "json": OBJECT,
+    "any": ANY, "": ANY,
+}
+
+
+def split_name_tokens(name: str) -> Tuple[str, ...]:
+    """把字段名拆成归一化的 token：fileId / file_id / file-id / FileIDs -> ("file", "id")"""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name or "")
+    name = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1_\2", name)
+    tokens = []
+    for token in re.split(r"[^A-Za-z0-9]+", name.lower()):
+        if not token:
+            continue
+        if len(token) > 3 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 2 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+            token = token[:-1]
+        tokens.append(token)
+    return tuple(tokens)
+
+
+def normalize_type(type_str: Any) -> Tuple[str, str]:
+    """
+    把类型描述归一化成 (type, item_type)。
+
+    支持 Python 风格（"List[str]"、"Optional[int]"、"Dict[str, Any]"）和 JSON Schema 风格（"string"、["string", "null"]）。
+    item_type 只对 array 有意义，其余为 ANY。
+    """
+    if isinstance(type_str, list):
+        non_null = [t for t in type_str if t != "null"]
+        type_str = non_null[0] if non_null else ""
+    text = str(type_str or "").strip()
+    match = re.match(r"^\s*([A-Za-z_.]+)\s*(?:\[(.*)\])?\s*$", text)
+    if not match:
+        return ANY, ANY
+    head = match.group(1).split(".")[-1].lower()
+    inner = (match.group(2) or "").strip()
+
+    if head in ("optional", "union"):
+        # Optional[int] / Union[int, None] -> 第一个非 None 分支
+        first = [part for part in _split_top_level(inner) if part.lower() not in ("none", "nonetype")]
+        return normalize_type(first[0]) if first else (ANY, ANY)
+
+    base = _TYPE_ALIASES.get(head, ANY)
+    if base == ARRAY and inner:
+        item_type, _ = normalize_type(_split_top_level(inner)[0])
+        return ARRAY, item_type
+    return base, ANY
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def flatten_output_fields(fields: List[Dict[str, Any]], prefix: str = "") -> List[Dict[str, Any]]:
+    """
+    把输出 schema 的 fields 展开成点路径列表。
+
+    每个元素：{"path": "result.items", "tokens": (...), "leaf_tokens": (...), "type": ..., "item_type": ...}
+    嵌套结构既支持字段名本身带点（"result.items"），也支持字段内的 "fields" 列表 / "properties" dict。
+    """
+    flat: List[Dict[str, Any]] = []
+    for field in fields or []:
+        if not isinstance(field, dict):
+            continue
+        name = str(field.get("name", "") or "").strip()
+        if not name:
+            continue
+        path = f"{prefix}.{name}" if prefix else name
+        field_type, item_type = normalize_type(field.get("type", ""))
+        flat.append({
+            "path": path,
+            "tokens": split_name_tokens(path),
+            "leaf_tokens": split_name_tokens(path.rsplit(".", 1)[-1]),
+            "type": field_type,
+            "item_type": item_type,
+        })
+        if isinstance(field.get("fields"), list):
+            flat.extend(flatten_output_fields(field["fields"], prefix=path))
+        if isinstance(field.get("properties"), dict):
+            nested = [dict(v, name=k) for k, v in field["properties"].items() if isinstance(v, dict)]
+            flat.extend(flatten_output_fields(nested, prefix=path))
+    return flat
+
+
+def flatten_input_params(parameters: Dict[str, Any], prefix: str = "", parent_required: bool = True) -> List[Dict[str, Any]]:
+    """
+    把 JSON Schema 风格的输入参数展开成点路径列表（嵌套 object 的 properties 也会展开）。
+
+    每个元素：{"path": ..., "tokens": ..., "leaf_tokens": ..., "type": ..., "item_type": ..., "required": bool}
+    """
+    flat: List[Dict[str, Any]] = []
+    properties = (parameters or {}).get("properties", {}) or {}
+    required = set((parameters or {}).get("required", []) or [])
+    for name, info in properties.items():
+        if not isinstance(info, dict):
+            info = {}
+        path = f"{prefix}.{name}" if prefix else name
+        param_type, item_type = normalize_type(info.get("type", ""))
+        if param_type == ARRAY and isinstance(info.get("items"), dict):
+            item_type, _ = normalize_type(info["items"].get("type", ""))
+        is_required = parent_required and name in required
+        flat.append({
+            "path": path,
+            "tokens": split_name_tokens(path),
+            "leaf_tokens": split_name_tokens(name),
+            "type": param_type,
+            "item_type": item_type,
+            "required": is_required,
+        })
+        if param_type == OBJECT and isinstance(info.get("properties"), dict):
+            flat.extend(flatten_input_params(info, prefix=path, parent_required=is_required))
+    return flat
+
+
+def type_compatibility(out_type: str, out_item: str, in_type: str, in_item: str) -> float:
+    """输出类型能否直接作为输入类型使用（1.0 完全兼容，0 不兼容）"""
+    if ANY in (out_type, in_type):
+        return 0.7
+    if out_type == in_type:
+        if out_type == ARRAY and ANY not in (out_item, in_item) and out_item != in_item:
+            return 0.5
+        return 1.0
+    if out_type == INTEGER and in_type == NUMBER:
+        return 1.0
+    if out_type == NUMBER and in_type == INTEGER:
+        return 0.6
+    if out_type == ARRAY and out_item in (in_type, ANY):
+        # 从列表中取一个元素作为输入
+        return 0.5
+    if in_type == ARRAY and in_item in (out_type, ANY):
+        # 单个值包装成列表
+        return 0.6
+    if in_type == STRING:
+        return 0.6 if out_type in (INTEGER, NUMBER) else 0.3
+    return 0.0
+
+
+def name_similarity(a: Tuple[str, ...], b: Tuple[str, ...]) -> float:
+    """归一化 token 序列的相似度：完全相同 1.0，一方是另一方的后缀 0.8（id vs file_id），否则为 token Jaccard"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    if longer[-len(shorter):] == shorter:
+        return 0.8
+    set_a, set_b = set(a), set(b)
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+class StaticSchemaMatcher:
+    """
+    node 输出字段 vs candidate 输入参数 的静态匹配打分器。
+
+    Args:
+        skip_threshold: pair score 低于该值时跳过 LLM 判断
+        accept_threshold: 字段匹配分不低于该值视为精确匹配；所有 required 参数都精确匹配时直接接受
+        min_field_score: 字段匹配分不低于该值才写入 param_mapping
+    """
+
+    def __init__(self, skip_threshold: float = 0.35, accept_threshold: float = 0.95, min_field_score: float = 0.5):
+        self.skip_threshold = skip_threshold
+        self.accept_threshold = accept_threshold
+        self.min_field_score = min_field_score
+        self._output_cache: Dict[int, List[Dict[str, Any]]] = {}
+        self._input_cache: Dict[int, List[Dict[str, Any]]] = {}
+        self.decisions = {"skip": 0, "llm": 0, "accept": 0}
+
+    def _node_outputs(self, node_func: Dict[str, Any]) -> List[Dict[str, Any]]:
+        key = id(node_func)
+        if key not in self._output_cache:
+            schema = node_func.get("function_schema", {}).get("function", {})
+            input_names = {
+                split_name_tokens(name)
+                for name in (schema.get("parameters", {}) or {}).get("properties", {}) or {}
+            }
+            output_schema = node_func.get("output_schema") or {}
+            # 规则 1：与输入参数同名的输出字段是 pass-through，不参与匹配
+            self._output_cache[key] = [
+                field for field in flatten_output_fields(output_schema.get("fields", []))
+                if field["tokens"] not in input_names
+            ]
+        return self._output_cache[key]
+
+    def _candidate_inputs(self, candidate_func: Dict[str, Any]) -> List[Dict[str, Any]]:
+        key = id(candidate_func)
+        if key not in self._input_cache:
+            schema = candidate_func.get("function_schema", {}).get("function", {})
+            self._input_cache[key] = flatten_input_params(schema.get("parameters", {}) or {})
+        return self._input_cache[key]
+
+    @staticmethod
+    def field_score(out_field: Dict[str, Any], in_param: Dict[str, Any]) -> float:
+        name_score = max(
+            name_similarity(out_field["tokens"], in_param["tokens"]),
+            name_similarity(out_field["leaf_tokens"], in_param["leaf_tokens"]),
+        )
+        if name_score == 0.0:
+            return 0.0
+        return name_score * type_compatibility(
+            out_field["type"], out_field["item_type"], in_param["type"], in_param["item_type"]
+        )
+
+    def score_pair(self, node_func: Dict[str, Any], candidate_func: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns:
+            dict:
+                - score: float, 最佳字段匹配分
+                - decision: "skip" / "llm" / "accept"
+                - param_mapping: {node_output_path: candidate_input_path}
+                - dependency_type: "full"（accept 时）或 "none"
+        """
+        outputs = self._node_outputs(node_func)
+        inputs = self._candidate_inputs(candidate_func)
+
+        best_score = 0.0
+        param_mapping: Dict[str, str] = {}
+        exact_inputs = set()
+        for in_param in inputs:
+            best_field, best_field_score = None, 0.0
+            for out_field in outputs:
+                s = self.field_score(out_field, in_param)
+                if s > best_field_score:
+                    best_field, best_field_score = out_field, s
+            best_score = max(best_score, best_field_score)
+            if best_field is not None and best_field_score >= self.min_field_score:
+                param_mapping.setdefault(best_field["path"], in_param["path"])
+            if best_field_score >= self.accept_threshold:
+                exact_inputs.add(in_param["path"])
+
+        required = [p["path"] for p in inputs if p["required"]]
+        # 没有 required 参数时，要求所有顶层参数都精确匹配
+        must_cover = required or [p["path"] for p in inputs if "." not in p["path"]]
+
+        if best_score < self.skip_threshold:
+            decision = "skip"
+        elif must_cover and all(path in exact_inputs for path in must_cover):
+            decision = "accept"
+        else:
+            decision = "llm"
+        self.decisions[decision] += 1
+
+        return {
+            "score": round(best_score, 4),
+            "decision": decision,
+            "param_mapping": param_mapping if decision != "skip" else {},
+            "dependency_type": "full" if decision == "accept" else "none",
+        }
+
+    def partition(self, edge_tasks: List[Tuple]) -> Tuple[List[Tuple], List[Tuple[Tuple, Dict]], List[Tuple[Tuple, Dict]]]:
+        """
+        把 build_graph_v1 的 edge_tasks 分成三组。
+
+        Args:
+            edge_tasks: [(node_idx, candidate_idx, node_func, candidate_func), ...]
+
+        Returns:
+            (需要 LLM 判断的 tasks, [(task, match)] 直接接受, [(task, match)] 跳过)
+        """
+        to_judge, accepted, skipped = [], [], []
+        for task in edge_tasks:
+            match = self.score_pair(task[2], task[3])
+            if match["decision"] == "skip":
+                skipped.append((task, match))
+            elif match["decision"] == "accept":
+                accepted.append((task, match))
+            else:
+                to_judge.append(task)
+        return to_judge, accepted, skipped
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "static_skipped": self.decisions["skip"],
+            "static_accepted": self.decisions["accept"],
+            "static_to_llm": self.decisions["llm"],
+        }
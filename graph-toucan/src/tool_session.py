@@ -0,0 +1,109 @@
+"""
+stateful tool 的会话状态（new_feature/state_manager.py 的 VirtualSystem）。
+
+stateful tool 通过 `from state_manager import sys_state` 读写虚拟文件系统 / 社交网络等状态，
+状态放在 state_manager._context_state（ContextVar[StateData]）里。tool 在沙箱 worker 进程中执行时，
+同一条路径的 tool 会被路由到不同的 worker，状态如果留在 worker 进程里，写和读就分散在不同进程中。
+
+这里把状态显式地随调用传递：
+- 每条路径（会话）有一个 ToolSession，state 是 StateData 的 pickle（None 表示还没有 stateful 调用，从全新状态开始）
+- 执行 tool 时把 session.state 发给 worker，bind_session_state 把它装进 state_manager 的 ContextVar，
+  执行完把更新后的状态 pickle 回来写回 session；执行失败时 session 不变
+- 没有用到 sys_state 的 tool 不受影响（不装载、不返回状态）
+
+    session = start_session()            # 路径开始时（当前 asyncio task 中）创建新会话
+    ...
+    await SANDBOX_POOL.run(func_name, parameters, session=current_session())
+
+state 是不可变的 bytes，分叉会话（ToolSession.fork）只需要共享同一个 bytes。
+"""
+
+import asyncio
+import pickle
+import re
+import sys
+from contextvars import ContextVar
+from typing import Any, Optional
+
+# tool 源码中引用会话状态的名字（state_manager 导出的 VirtualSystem 单例）
+SESSION_STATE_NAME = "sys_state"
+_SESSION_STATE_PATTERN = re.compile(rf"\b{SESSION_STATE_NAME}\b")
+
+
+class ToolSession:
+    """一条路径（会话）中 stateful tool 的状态"""
+
+    def __init__(self, state: Optional[bytes] = None):
+        self.state = state
+        # 同一会话中的 stateful 调用依次执行（读状态 -> 执行 -> 写回），避免并发调用互相覆盖
+        self.lock = asyncio.Lock()
+
+    def fork(self) -> "ToolSession":
+        """从当前状态分叉出一个独立的会话（之后两边的调用互不影响）"""
+        return ToolSession(self.state)
+
+    def __deepcopy__(self, memo) -> "ToolSession":
+        # 含会话的执行状态（如 prefix_trie 的分叉）用 copy.deepcopy 复制时得到独立的会话，锁不共享
+        return self.fork()
+
+
+_current_session: ContextVar[Optional[ToolSession]] = ContextVar("tool_session", default=None)
+
+
+def start_session(state: Optional[bytes] = None) -> ToolSession:
+    """在当前上下文（asyncio task）中开始一个新会话"""
+    session = ToolSession(state)
+    _current_session.set(session)
+    return session
+
+
+def use_session(session: Optional[ToolSession]) -> None:
+    """让当前上下文（asyncio task）使用已有的会话"""
+    _current_session.set(session)
+
+
+def current_session() -> Optional[ToolSession]:
+    """当前上下文的会话（没有开始会话时为 None，stateful tool 使用所在进程的全局状态）"""
+    return _current_session.get()
+
+
+def uses_session_state(source: Optional[str]) -> bool:
+    """tool 源码是否引用了会话状态（用来决定是否需要在会话锁内执行）"""
+    return bool(source) and _SESSION_STATE_PATTERN.search(source) is not None
+
+
+class SessionStateBinding:
+    """bind_session_state 的结果：执行期间装在 state_manager 的 ContextVar 中的状态"""
+
+    def __init__(self, context_var: ContextVar, state: Any):
+        self.context_var = context_var
+        self.state = state
+        self._token = context_var.set(state)
+
+    def dumps(self) -> bytes:
+        return pickle.dumps(self.state)
+
+    def release(self) -> None:
+        self.context_var.reset(self._token)
+
+
+def bind_session_state(module: Any, state: Optional[bytes]) -> Optional[SessionStateBinding]:
+    """
+    在执行 module 中的 tool 之前装载会话状态。
+
+    Args:
+        module: tool 所在的 module
+        state: ToolSession.state（None 表示使用全新的 StateData）
+
+    Returns:
+        SessionStateBinding；module 没有用到 sys_state（或 state_manager 不支持按上下文装载状态）时为 None
+    """
+    sys_state = getattr(module, SESSION_STATE_NAME, None)
+    if sys_state is None:
+        return None
+    manager = sys.modules.get(type(sys_state).__module__)
+    context_var = getattr(manager, "_context_state", None)
+    state_class = getattr(manager, "StateData", None)
+    if not isinstance(context_var, ContextVar) or state_class is None:
+        return None
+    return SessionStateBinding(context_var, pickle.loads(state) if state is not None else state_class())
@@ -42,39 +42,24 @@ import json
 import os
 import random
 from collections import deque
-from typing import Dict, List, Set, Tuple, Any
+from typing import Dict, List, Mapping, Set, Tuple, Any
 
+from graph_store import load_graph_store
 
-def load_graph(graph_path: str) -> Tuple[Dict[str, int], Dict[int, List[int]]]:
+
+def load_graph(graph_path: str) -> Tuple[Dict[str, int], Mapping[int, List[int]]]:
     """
-    从 test_graph_v1.1.0.json 加载图，构建：
+    通过 graph_store.load_graph_store 加载图（优先 mmap 打开 .csr），返回：
     - name_to_index: tool 名 -> 节点索引
-    - adj: 邻接表，index -> List[index]（有向边 source -> target）
+    - adj: 邻接表视图，index -> List[index]（有向边 source -> target）
     """
     print(f"Loading graph from {graph_path}...")
-    with open(graph_path, "r", encoding="utf-8") as f:
-        graph = json.load(f)
+    store = load_graph_store(graph_path)
 
-    nodes = graph.get("nodes", [])
-    edges = graph.get("edges", [])
-
-    name_to_index: Dict[str, int] = {}
-    for node in nodes:
-        idx = node.get("index")
-        func_schema = node.get("function_schema", {}).get("function", {})
-        name = func_schema.get("name")
-        if name is not None and idx is not None:
-            name_to_index[name] = idx
-
-    adj: Dict[int, List[int]] = {}
-    for edge in edges:
-        src = edge.get("source")
-        tgt = edge.get("target")
-        if src is None or tgt is None:
-            continue
-        adj.setdefault(src, []).append(tgt)
+    name_to_index = store.name_to_index()
+    adj = store.adjacency()
 
-    print(f"Loaded graph: {len(nodes)} nodes, {len(edges)} edges, {len(name_to_index)} named tools")
+    print(f"Loaded graph: {store.num_nodes} nodes, {store.num_edges} edges, {len(name_to_index)} named tools")
     return name_to_index, adj
 
 
@@ -8,39 +8,27 @@
 
 import json
 from collections import defaultdict
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Dict, List, Set, Tuple, Union
+
+from graph_store import GraphStore, load_graph_store, serialize_graph
 
 
 class GraphConnectivityVerifier:
     """图连通性验证器"""
 
-    def __init__(self, graph_data: Dict[str, Any]):
+    def __init__(self, graph_data: Union[GraphStore, Dict[str, Any]]):
         """
         初始化验证器
 
         Args:
-            graph_data: 图数据，包含 nodes 和 edges
+            graph_data: GraphStore（load_graph_store 的返回值），或包含 nodes 和 edges 的图 dict
         """
-        self.graph = graph_data
-        self.nodes = graph_data.get('nodes', [])
-        self.edges = graph_data.get('edges', [])
-
-        # 构建 function_name -> node_index 的映射
-        self.name_to_index = {}
-        for node in self.nodes:
-            func_name = node.get('function_schema', {}).get('function', {}).get('name', '')
-            if func_name:
-                self.name_to_index[func_name] = node.get('index')
-
-        # 构建邻接矩阵/集合: (source, target) -> edge_info
-        self.edge_set = set()
-        self.edge_info_map = {}
-        for edge in self.edges:
-            source = edge.get('source')
-            target = edge.get('target')
-            if source is not None and target is not None:
-                self.edge_set.add((source, target))
-                self.edge_info_map[(source, target)] = edge
+        if not isinstance(graph_data, GraphStore):
+            graph_data = GraphStore(serialize_graph(graph_data))
+        self.store = graph_data
+
+        # function_name -> node_index 的映射
+        self.name_to_index = self.store.name_to_index()
 
     def verify_call_sequence(self, tool_calls: List[Dict[str, Any]]) -> Tuple[bool, List[Dict]]:
         """
@@ -80,9 +68,10 @@ class GraphConnectivityVerifier:
 
             # 检查是否存在从 current 到 next 的边
             if current_idx is not None and next_idx is not None:
-                if (current_idx, next_idx) in self.edge_set:
+                edge_id = self.store.find_edge(current_idx, next_idx)
+                if edge_id is not None:
                     transition['has_edge'] = True
-                    transition['edge_info'] = self.edge_info_map[(current_idx, next_idx)]
+                    transition['edge_info'] = self.store.edge(edge_id)
                 else:
                     all_connected = False
                     transition['reason'] = f"No edge from '{current_tool}' to '{next_tool}' in graph"
@@ -100,10 +89,9 @@ class GraphConnectivityVerifier:
         return all_connected, transition_details
 
 
-def load_graph(graph_path: str) -> Dict[str, Any]:
-    """加载图数据"""
-    with open(graph_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+def load_graph(graph_path: str) -> GraphStore:
+    """加载图数据（graph_store.load_graph_store，优先 mmap 打开 .csr）"""
+    return load_graph_store(graph_path)
 
 
 def load_distill_data(jsonl_path: str, max_samples: int = None) -> List[Dict[str, Any]]:
@@ -182,8 +170,8 @@ def main():
     # 加载图数据
     print(f"Loading graph from {graph_path}...")
     graph_data = load_graph(graph_path)
-    print(f"  Loaded {len(graph_data.get('nodes', []))} nodes")
-    print(f"  Loaded {len(graph_data.get('edges', []))} edges")
+    print(f"  Loaded {graph_data.num_nodes} nodes")
+    print(f"  Loaded {graph_data.num_edges} edges")
 
     # 初始化验证器
     verifier = GraphConnectivityVerifier(graph_data)
@@ -0,0 +1,324 @@
+"""
+带权 / 有偏随机游走：alias 表 + 拒绝采样。
+
+random_walk_from_node 在未访问的后继中均匀选择，出度大的 hub tool 占满了生成的路径，入度低的 tool 很少出现在 FSP 里。
+WalkBias 描述转移权重：
+
+    w(u -> v) = confidence(u, v) ** confidence_power * dependency_type_weights[type(u, v)]     （静态，按边）
+              * node2vec 偏置 alpha(prev, v)：v 与 prev 相邻时为 1，否则为 1 / inout_q
+              * (1 + visits[v]) ** (-visit_power)                                              （动态，逆访问频率）
+
+- 静态部分预先为每个 node 构建 alias 表（Vose），每一步 O(1) 采样一条出边
+- visited 检查、node2vec 偏置和逆访问频率在采样后用拒绝采样修正（接受概率 = 偏置 / 偏置上界），
+  连续 max_tries 次被拒绝时退回到对未访问后继的精确加权采样，所以分布始终是精确的
+- 路径是无环的，node2vec 的“返回上一个节点”（1 / return_p）不会出现；return_p 保留用于与 node2vec 的参数对应
+- alias 表与 .csr 放在一起缓存（graph_v1.json.csr.alias-<配置哈希>），文件里记录图的 fingerprint，
+  图内容或权重配置变化时自动重建
+
+用法：
+    bias = WalkBias(confidence_power=1.0, dependency_type_weights={"partial": 0.5}, visit_power=1.0)
+    tables = load_alias_tables(store, bias, exclude_types=("prerequisite",))
+    path = biased_random_walk_from_node(start, tables, bias, max_steps=5, rng=rng, visit_counts=visit_counts)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import random
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from graph_store import _write_atomic, pack_sections, unpack_sections
+
+ALIAS_MAGIC = b"GTALIAS1"
+
+
+class WalkBias:
+    """转移权重配置（默认值等价于原来的均匀游走）"""
+
+    def __init__(
+        self,
+        confidence_power: float = 0.0,
+        dependency_type_weights: Optional[Dict[str, float]] = None,
+        visit_power: float = 0.0,
+        return_p: float = 1.0,
+        inout_q: float = 1.0,
+        max_tries: int = 32,
+    ):
+        """
+        Args:
+            confidence_power: 边权乘以 confidence ** confidence_power（0 表示不看 confidence）
+            dependency_type_weights: dependency_type -> 权重，未列出的类型为 1.0，0 表示不走这类边
+            visit_power: 逆访问频率的指数，目标 node 的权重乘以 (1 + 已访问次数) ** (-visit_power)
+            return_p: node2vec 的 return 参数（无环游走中不会生效）
+            inout_q: node2vec 的 in-out 参数：q > 1 倾向留在上一个节点的邻域（BFS），q < 1 倾向走远（DFS）
+            max_tries: 拒绝采样的最大尝试次数，超过后退回精确采样
+        """
+        if return_p <= 0 or inout_q <= 0:
+            raise ValueError("return_p and inout_q must be positive")
+        self.confidence_power = confidence_power
+        self.dependency_type_weights = dict(dependency_type_weights or {})
+        self.visit_power = visit_power
+        self.return_p = return_p
+        self.inout_q = inout_q
+        self.max_tries = max_tries
+
+    def static_config(self) -> Dict[str, Any]:
+        """决定 alias 表内容的参数（缓存 key）"""
+        return {
+            "confidence_power": self.confidence_power,
+            "dependency_type_weights": dict(sorted(self.dependency_type_weights.items())),
+        }
+
+    @property
+    def uses_node2vec(self) -> bool:
+        return self.inout_q != 1.0
+
+    @property
+    def is_uniform(self) -> bool:
+        return (
+            self.confidence_power == 0
+            and all(w == 1.0 for w in self.dependency_type_weights.values())
+            and self.visit_power == 0
+            and not self.uses_node2vec
+        )
+
+
+def build_alias(weights: Sequence[float]):
+    """
+    Vose alias 方法：返回 (prob, alias)，alias 是组内下标。
+    采样：k = int(u1 * n)；u2 < prob[k] 取 k，否则取 alias[k]。
+    """
+    n = len(weights)
+    total = sum(weights)
+    prob = [0.0] * n
+    alias = list(range(n))
+    if n == 0 or total <= 0:
+        return prob, alias
+    scaled = [w * n / total for w in weights]
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s = small.pop()
+        g = large.pop()
+        prob[s] = scaled[s]
+        alias[s] = g
+        scaled[g] = scaled[g] + scaled[s] - 1.0
+        if scaled[g] < 1.0:
+            small.append(g)
+        else:
+            large.append(g)
+    for i in large + small:
+        # 剩下的都是（数值误差下）恰好为 1 的桶
+        prob[i] = 1.0
+    return prob, alias
+
+
+class AliasTables:
+    """
+    按 node 分组的 alias 表（CSR 布局）：offsets / targets / weights / prob / alias 五列。
+    只包含权重 > 0 的边；底层是 mmap 的缓存文件或内存中的 array。
+    """
+
+    def __init__(self, columns: Dict[str, Sequence], header: Dict[str, Any], path: Optional[str] = None, views=None):
+        self.header = header
+        self.path = path
+        self.offsets = columns["offsets"]
+        self.targets = columns["targets"]
+        self.weights = columns["weights"]
+        self.prob = columns["prob"]
+        self.alias = columns["alias"]
+        self.num_nodes = len(self.offsets) - 1
+        self._views = views or []
+
+    @classmethod
+    def open(cls, path: str) -> "AliasTables":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, columns, views = unpack_sections(mm, ALIAS_MAGIC, path)
+        return cls(columns, header, path=path, views=views)
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+
+    def successors(self, idx: int) -> Sequence[int]:
+        if not 0 <= idx < self.num_nodes:
+            return []
+        return self.targets[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def sample_edge(self, idx: int, rng: random.Random) -> Optional[int]:
+        """O(1) 按静态权重采样 idx 的一条出边，返回边在 targets 中的下标（没有出边时返回 None）"""
+        lo = self.offsets[idx]
+        deg = self.offsets[idx + 1] - lo
+        if deg <= 0:
+            return None
+        k = lo + int(rng.random() * deg)
+        if rng.random() < self.prob[k]:
+            return k
+        return lo + self.alias[k]
+
+
+def build_alias_tables(store, bias: WalkBias, exclude_types: Iterable[str] = ("prerequisite",)) -> AliasTables:
+    """从 GraphStore 构建 alias 表（不读写缓存）"""
+    exclude_ids = store._type_ids(exclude_types)
+    offsets = array("q", [0])
+    targets = array("i")
+    weights = array("d")
+    prob = array("d")
+    alias = array("i")
+    dep_types = store._dep_types
+    confidence = store._confidence
+    store_targets = store._targets
+    type_weights = [bias.dependency_type_weights.get(t, 1.0) for t in store.dependency_types]
+
+    for idx in range(store.num_nodes):
+        row_targets: List[int] = []
+        row_weights: List[float] = []
+        for k in store.edge_range(idx):
+            type_id = dep_types[k]
+            if type_id in exclude_ids:
+                continue
+            weight = type_weights[type_id]
+            if bias.confidence_power and weight > 0:
+                weight *= max(confidence[k], 0.0) ** bias.confidence_power
+            if weight > 0:
+                row_targets.append(store_targets[k])
+                row_weights.append(weight)
+        row_prob, row_alias = build_alias(row_weights)
+        targets.extend(row_targets)
+        weights.extend(row_weights)
+        prob.extend(row_prob)
+        alias.extend(row_alias)
+        offsets.append(len(targets))
+
+    header = {
+        "fingerprint": store.fingerprint(),
+        "exclude_types": sorted(exclude_types),
+        "config": bias.static_config(),
+    }
+    columns = {"offsets": offsets, "targets": targets, "weights": weights, "prob": prob, "alias": alias}
+    return AliasTables(columns, header)
+
+
+def alias_cache_path(store, bias: WalkBias, exclude_types: Iterable[str] = ("prerequisite",)) -> Optional[str]:
+    """缓存文件路径：与 .csr 放在一起，文件名带静态配置的哈希；内存中的 store 返回 None"""
+    if not store.path:
+        return None
+    key = json.dumps({"exclude_types": sorted(exclude_types), **bias.static_config()}, sort_keys=True)
+    return f"{store.path}.alias-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}"
+
+
+def serialize_alias_tables(tables: AliasTables) -> bytes:
+    columns = []
+    for name, code in (("offsets", "q"), ("targets", "i"), ("weights", "d"), ("prob", "d"), ("alias", "i")):
+        column = getattr(tables, name)
+        data = column.tobytes() if isinstance(column, array) else bytes(column.cast("B"))
+        columns.append((name, data, code, len(column)))
+    return pack_sections(ALIAS_MAGIC, dict(tables.header), columns)
+
+
+def load_alias_tables(
+    store,
+    bias: WalkBias,
+    exclude_types: Iterable[str] = ("prerequisite",),
+    use_cache: bool = True,
+) -> AliasTables:
+    """
+    读取（或构建并缓存）alias 表。缓存文件中的 fingerprint 与当前图不一致时重建。
+    """
+    exclude_types = tuple(exclude_types)
+    cache_path = alias_cache_path(store, bias, exclude_types) if use_cache else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            tables = AliasTables.open(cache_path)
+            if tables.header.get("fingerprint") == store.fingerprint():
+                return tables
+            print(f"Alias table cache {cache_path} is stale, rebuilding...")
+        except ValueError as e:
+            print(f"Warning: ignoring unreadable alias table cache {cache_path}: {e}")
+
+    tables = build_alias_tables(store, bias, exclude_types)
+    if cache_path:
+        try:
+            _write_atomic(cache_path, serialize_alias_tables(tables))
+            return AliasTables.open(cache_path)
+        except OSError as e:
+            print(f"Warning: failed to write alias table cache {cache_path}: {e}")
+    return tables
+
+
+def _dynamic_factor(bias: WalkBias, nxt: int, prev_neighbors, visit_counts) -> float:
+    factor = 1.0
+    if prev_neighbors is not None and nxt not in prev_neighbors:
+        factor /= bias.inout_q
+    if bias.visit_power and visit_counts is not None:
+        factor *= (1 + visit_counts.get(nxt, 0)) ** (-bias.visit_power)
+    return factor
+
+
+def biased_random_walk_from_node(
+    start_idx: int,
+    tables: AliasTables,
+    bias: WalkBias,
+    max_steps: int,
+    rng: random.Random,
+    visit_counts: Optional[Dict[int, int]] = None,
+) -> List[int]:
+    """
+    与 random_walk_from_node 相同的无环游走，但按 WalkBias 的权重选择下一个节点。
+
+    visit_counts 为 node -> 已出现在生成路径中的次数（visit_power > 0 时使用），由调用方在每条路径生成后更新。
+    """
+    path: List[int] = [start_idx]
+    visited = {start_idx}
+    current = start_idx
+    prev: Optional[int] = None
+    # node2vec 偏置的上界：相邻为 1，不相邻为 1 / q
+    n2v_bound = max(1.0, 1.0 / bias.inout_q) if bias.uses_node2vec else 1.0
+
+    for _ in range(max_steps):
+        prev_neighbors = set(tables.successors(prev)) if bias.uses_node2vec and prev is not None else None
+
+        nxt: Optional[int] = None
+        for _ in range(bias.max_tries):
+            k = tables.sample_edge(current, rng)
+            if k is None:
+                break
+            candidate = tables.targets[k]
+            if candidate in visited:
+                continue
+            accept = _dynamic_factor(bias, candidate, prev_neighbors, visit_counts) / n2v_bound
+            if accept >= 1.0 or rng.random() < accept:
+                nxt = candidate
+                break
+        else:
+            # 拒绝太多次（大部分后继已访问或权重很低）：对未访问后继做精确加权采样
+            lo, hi = tables.offsets[current], tables.offsets[current + 1]
+            candidates = []
+            total = 0.0
+            for k in range(lo, hi):
+                candidate = tables.targets[k]
+                if candidate in visited:
+                    continue
+                weight = tables.weights[k] * _dynamic_factor(bias, candidate, prev_neighbors, visit_counts)
+                if weight > 0:
+                    candidates.append((candidate, weight))
+                    total += weight
+            if candidates:
+                r = rng.random() * total
+                for candidate, weight in candidates:
+                    r -= weight
+                    if r < 0:
+                        break
+                nxt = candidate
+
+        if nxt is None:
+            break
+        path.append(nxt)
+        visited.add(nxt)
+        prev, current = current, nxt
+
+    return path
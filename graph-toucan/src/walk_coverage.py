@@ -0,0 +1,304 @@
+"""
+按覆盖率调度随机游走：覆盖目标达到后停止，并输出覆盖率报告。
+
+原来每个 node 固定走 num_walks_per_node 条，再去重。hub 附近大量重复路径，冷门区域仍然没走到，
+重复路径还会进入下游 backward_to_query / 蒸馏，浪费 LLM 调用。CoverageScheduler 按轮次分配游走：
+
+- 第 0 轮：每个起点 initial_walks_per_node 条
+- 之后每轮按“欠覆盖程度”给起点打分：自身未覆盖的出边数 + 后继未覆盖出边数的平均值，
+  分数高的起点多分配游走（每轮总数不超过 walks_per_round，每个起点总数不超过 max_walks_per_node）
+- 在线统计 node 覆盖率（出现在长度 >= 2 的路径中的 node / 有边的 node）、边覆盖率、路径形状（依赖类型序列）数；
+  游走只决定下一个 node，同一 (source, target) 的多条平行边按一条边计算覆盖
+- 停止条件：node / 边覆盖率都达到目标；总游走数达到 max_total_walks；
+  连续 patience 轮既没有新边也没有新形状、且新路径比例低于 min_new_path_rate；没有欠覆盖的起点
+
+用法：
+    scheduler = CoverageScheduler(store, CoverageTargets(edge_coverage=0.9), max_walks_per_node=5)
+    node_paths = scheduler.run(node_indices, walk_fn)   # walk_fn(start) -> List[int]
+    report = scheduler.report(index_to_name)
+"""
+
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class CoverageTargets:
+    """覆盖目标与预算"""
+
+    def __init__(
+        self,
+        node_coverage: float = 1.0,
+        edge_coverage: float = 0.95,
+        max_total_walks: Optional[int] = None,
+        initial_walks_per_node: int = 1,
+        walks_per_round: Optional[int] = None,
+        patience: int = 2,
+        min_new_path_rate: float = 0.05,
+    ):
+        """
+        Args:
+            node_coverage: 目标 node 覆盖率
+            edge_coverage: 目标边覆盖率
+            max_total_walks: 总游走数上限（None 表示只受 max_walks_per_node 限制）
+            initial_walks_per_node: 第 0 轮每个起点的游走数
+            walks_per_round: 之后每轮最多分配的游走数（None 表示起点数的 1/4，至少 1）
+            patience: 连续多少轮没有进展就停止
+            min_new_path_rate: 一轮中新路径（去重意义上）占比低于该值视为没有进展
+        """
+        self.node_coverage = node_coverage
+        self.edge_coverage = edge_coverage
+        self.max_total_walks = max_total_walks
+        self.initial_walks_per_node = initial_walks_per_node
+        self.walks_per_round = walks_per_round
+        self.patience = patience
+        self.min_new_path_rate = min_new_path_rate
+
+
+class CoverageScheduler:
+    """在 GraphStore（过滤 exclude_types 后的边）上按覆盖率调度游走"""
+
+    def __init__(
+        self,
+        store,
+        targets: Optional[CoverageTargets] = None,
+        max_walks_per_node: int = 5,
+        exclude_types: Iterable[str] = ("prerequisite",),
+    ):
+        self.store = store
+        self.targets = targets or CoverageTargets()
+        self.max_walks_per_node = max_walks_per_node
+        self.exclude_ids = store._type_ids(exclude_types)
+
+        # 每个 (source, target) 只保留第一条未排除的边作为覆盖单元
+        dep_types = store._dep_types
+        self.walk_edges = []
+        self.is_walk_edge = bytearray(store.num_edges)
+        for idx in range(store.num_nodes):
+            seen_targets: Set[int] = set()
+            for k in store.edge_range(idx):
+                target = store._targets[k]
+                if dep_types[k] in self.exclude_ids or target in seen_targets:
+                    continue
+                seen_targets.add(target)
+                self.walk_edges.append(k)
+                self.is_walk_edge[k] = 1
+        self.num_walk_edges = len(self.walk_edges)
+        touched: Set[int] = set()
+        for k in self.walk_edges:
+            touched.add(store._sources[k])
+            touched.add(store._targets[k])
+        self.num_walk_nodes = len(touched)
+
+        self.edge_covered = bytearray(store.num_edges)
+        self.num_edges_covered = 0
+        self.node_visits: Dict[int, int] = {}
+        self.shapes: Dict[Tuple[str, ...], int] = {}
+        self.unique_paths: Set[Tuple[int, ...]] = set()
+        self.walks_per_node: Dict[int, int] = {}
+        self.total_walks = 0
+        self.history: List[Dict[str, Any]] = []
+        self.stop_reason: Optional[str] = None
+
+    # ---------- 在线统计 ----------
+
+    def _edge_id(self, source: int, target: int) -> Optional[int]:
+        """source -> target 的覆盖单元（第一条未排除的边）"""
+        store = self.store
+        for k in store.edge_range(source):
+            if store._targets[k] == target and store._dep_types[k] not in self.exclude_ids:
+                return k
+        return None
+
+    def observe(self, path: List[int]) -> Dict[str, int]:
+        """记录一条路径，返回它带来的新边 / 新形状 / 新路径数"""
+        new = {"edges": 0, "shapes": 0, "paths": 0}
+        key = tuple(path)
+        if key not in self.unique_paths:
+            self.unique_paths.add(key)
+            new["paths"] = 1
+
+        shape = []
+        for source, target in zip(path, path[1:]):
+            k = self._edge_id(source, target)
+            if k is None:
+                shape.append("?")
+                continue
+            shape.append(self.store.dependency_types[self.store._dep_types[k]])
+            if not self.edge_covered[k]:
+                self.edge_covered[k] = 1
+                self.num_edges_covered += 1
+                new["edges"] += 1
+        shape_key = tuple(shape)
+        if shape_key not in self.shapes:
+            new["shapes"] = 1
+        self.shapes[shape_key] = self.shapes.get(shape_key, 0) + 1
+
+        if len(path) >= 2:
+            for node in path:
+                self.node_visits[node] = self.node_visits.get(node, 0) + 1
+        return new
+
+    @property
+    def node_coverage(self) -> float:
+        return len(self.node_visits) / self.num_walk_nodes if self.num_walk_nodes else 1.0
+
+    @property
+    def edge_coverage(self) -> float:
+        return self.num_edges_covered / self.num_walk_edges if self.num_walk_edges else 1.0
+
+    def targets_met(self) -> bool:
+        return self.node_coverage >= self.targets.node_coverage and self.edge_coverage >= self.targets.edge_coverage
+
+    # ---------- 调度 ----------
+
+    def _uncovered_out(self, idx: int) -> int:
+        covered = self.edge_covered
+        is_walk_edge = self.is_walk_edge
+        return sum(1 for k in self.store.edge_range(idx) if is_walk_edge[k] and not covered[k])
+
+    def scores(self, start_nodes: Iterable[int]) -> Dict[int, float]:
+        """起点的欠覆盖分数：自身未覆盖出边数 + 后继未覆盖出边数的平均值"""
+        uncovered = {idx: self._uncovered_out(idx) for idx in range(self.store.num_nodes)}
+        scores = {}
+        for idx in start_nodes:
+            successors = self.store.successors(idx, exclude_ids=self.exclude_ids)
+            score = uncovered.get(idx, 0)
+            if successors:
+                score += sum(uncovered.get(s, 0) for s in successors) / len(successors)
+            if score > 0 and self.walks_per_node.get(idx, 0) < self.max_walks_per_node:
+                scores[idx] = score
+        return scores
+
+    def _budget_left(self) -> Optional[int]:
+        if self.targets.max_total_walks is None:
+            return None
+        return self.targets.max_total_walks - self.total_walks
+
+    def run(self, start_nodes: Iterable[int], walk_fn: Callable[[int], List[int]]) -> Dict[int, List[List[int]]]:
+        """
+        按轮次生成游走直到满足停止条件。
+
+        Returns:
+            {start_node: [path, ...]}（按生成顺序，未去重；包含所有起点，没有分到游走的起点为空列表）
+        """
+        start_nodes = list(start_nodes)
+        node_paths: Dict[int, List[List[int]]] = {idx: [] for idx in start_nodes}
+        walks_per_round = self.targets.walks_per_round or max(1, len(start_nodes) // 4)
+        stalled = 0
+
+        def do_walk(idx: int, new_totals: Dict[str, int]) -> None:
+            path = walk_fn(idx)
+            node_paths[idx].append(path)
+            self.walks_per_node[idx] = self.walks_per_node.get(idx, 0) + 1
+            self.total_walks += 1
+            for k, v in self.observe(path).items():
+                new_totals[k] += v
+
+        round_idx = 0
+        while True:
+            new_totals = {"edges": 0, "shapes": 0, "paths": 0}
+            round_walks = 0
+            if round_idx == 0:
+                allocation = [(idx, min(self.targets.initial_walks_per_node, self.max_walks_per_node))
+                              for idx in start_nodes]
+            else:
+                scores = self.scores(start_nodes)
+                if not scores:
+                    self.stop_reason = "exhausted"
+                    break
+                ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+                allocation = []
+                remaining = walks_per_round
+                for idx, score in ranked:
+                    if remaining <= 0:
+                        break
+                    count = min(math.ceil(score), self.max_walks_per_node - self.walks_per_node.get(idx, 0), remaining)
+                    allocation.append((idx, count))
+                    remaining -= count
+
+            budget_hit = False
+            for idx, count in allocation:
+                for _ in range(count):
+                    budget_left = self._budget_left()
+                    if budget_left is not None and budget_left <= 0:
+                        budget_hit = True
+                        break
+                    do_walk(idx, new_totals)
+                    round_walks += 1
+                if budget_hit:
+                    break
+
+            self.history.append({
+                "round": round_idx,
+                "walks": round_walks,
+                "new_edges": new_totals["edges"],
+                "new_shapes": new_totals["shapes"],
+                "new_paths": new_totals["paths"],
+                "node_coverage": self.node_coverage,
+                "edge_coverage": self.edge_coverage,
+            })
+            round_idx += 1
+
+            if budget_hit:
+                self.stop_reason = "budget"
+                break
+            if self.targets_met():
+                self.stop_reason = "targets_met"
+                break
+            progress = (
+                new_totals["edges"] > 0
+                or new_totals["shapes"] > 0
+                or (round_walks > 0 and new_totals["paths"] / round_walks >= self.targets.min_new_path_rate)
+            )
+            stalled = 0 if progress else stalled + 1
+            if stalled >= self.targets.patience:
+                self.stop_reason = "stalled"
+                break
+
+        return node_paths
+
+    # ---------- 报告 ----------
+
+    def report(self, index_to_name: Optional[Dict[int, str]] = None, max_listed: int = 50) -> Dict[str, Any]:
+        """覆盖率报告（可直接 json.dump）"""
+        index_to_name = index_to_name or {}
+        uncovered_nodes = sorted(
+            idx for idx in range(self.store.num_nodes)
+            if idx not in self.node_visits and self.store.successors(idx, exclude_ids=self.exclude_ids)
+        )
+        uncovered_edges = [k for k in self.walk_edges if not self.edge_covered[k]]
+        return {
+            "stop_reason": self.stop_reason,
+            "targets": dict(self.targets.__dict__),
+            "total_walks": self.total_walks,
+            "unique_paths": len(self.unique_paths),
+            "rounds": len(self.history),
+            "node_coverage": self.node_coverage,
+            "edge_coverage": self.edge_coverage,
+            "num_walk_nodes": self.num_walk_nodes,
+            "num_walk_edges": self.num_walk_edges,
+            "num_edges_covered": self.num_edges_covered,
+            "num_shapes": len(self.shapes),
+            "top_shapes": [
+                {"shape": list(shape), "count": count}
+                for shape, count in sorted(self.shapes.items(), key=lambda item: -item[1])[:10]
+            ],
+            "uncovered_nodes": [
+                {"index": idx, "name": index_to_name.get(idx, f"node_{idx}")} for idx in uncovered_nodes[:max_listed]
+            ],
+            "num_uncovered_nodes": len(uncovered_nodes),
+            "uncovered_edges": [
+                {"source": self.store._sources[k], "target": self.store._targets[k]} for k in uncovered_edges[:max_listed]
+            ],
+            "history": self.history,
+        }
+
+
+def format_coverage_report(report: Dict[str, Any]) -> str:
+    """覆盖率报告的简短文本摘要"""
+    return (
+        f"覆盖率调度: {report['total_walks']} 条游走（{report['rounds']} 轮，停止原因: {report['stop_reason']}），"
+        f"去重后 {report['unique_paths']} 条；node 覆盖率 {report['node_coverage']:.2%}，"
+        f"边覆盖率 {report['edge_coverage']:.2%}（{report['num_edges_covered']}/{report['num_walk_edges']}），"
+        f"路径形状 {report['num_shapes']} 种"
+    )
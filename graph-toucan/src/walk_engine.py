@@ -0,0 +1,206 @@
+"""
+批量随机游走引擎（CSR 图 + counter-based 随机数）。
+
+random_walker.random_walk_from_node 每次只走一条路径，每一步重新构建 unvisited_neighbors 列表，
+所有游走共享一个 random.Random，结果依赖遍历顺序。这里：
+
+- 在 graph_store 的 CSR（offsets / targets）上游走，prerequisite 等边类型在构建 CSR 时过滤
+- 安装了 numpy 时，一批游走（chunk_size 条）按步同步推进：每一步把所有活跃游走的候选边展开成一个数组，
+  用路径矩阵做 visited 检查（路径长度 <= max_steps + 1，比按 node 数开 bitmask 省内存），
+  在每条游走的未访问邻居中按秩选出下一个节点
+- 没有 numpy 时退回逐条游走的纯 Python 实现，两种实现的输出完全一致
+- 随机数是 counter-based 的：第 step 步的均匀数 = splitmix64(seed, start, walk_id, step)，
+  与游走顺序、批大小、进程数无关，同一个 (seed, start node) 总是得到相同的路径
+
+转移分布与原来的 walker 相同：每一步在未访问过的后继中均匀选择，没有未访问后继时停止。
+
+用法：
+    paths = batch_random_walks(store, start_nodes, num_walks=5, max_steps=5, seed=42)
+    paths[start][walk_id] -> List[int]
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖
+    np = None
+
+MASK64 = (1 << 64) - 1
+_GAMMA = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_INV_2_53 = 1.0 / (1 << 53)
+
+
+def _splitmix64(x: int) -> int:
+    z = (x + _GAMMA) & MASK64
+    z = ((z ^ (z >> 30)) * _MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * _MIX2) & MASK64
+    return z ^ (z >> 31)
+
+
+def walk_key(seed: int, start: int, walk_id: int) -> int:
+    """一条游走的随机流 key，只由 (seed, start node, walk_id) 决定"""
+    return _splitmix64(_splitmix64(_splitmix64(seed & MASK64) ^ start) ^ walk_id)
+
+
+def derive_seed(seed: int, node_idx: int, stream: int = 0) -> int:
+    """
+    由 (全局 seed, node index) 派生的 node 级随机种子（例如 merge 用的 random.Random），
+    与游走使用的随机流互不重叠（stream 区分同一 node 的多个用途）
+    """
+    return walk_key(seed, node_idx, (1 << 63) | stream)
+
+
+def counter_uniform(key: int, step: int) -> float:
+    """[0, 1) 上的均匀数，key 来自 walk_key"""
+    return (_splitmix64(key ^ step) >> 11) * _INV_2_53
+
+
+def _splitmix64_np(x):
+    z = x + np.uint64(_GAMMA)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+def _walk_keys_np(seed: int, starts, walk_ids):
+    base = np.uint64(_splitmix64(seed & MASK64))
+    keys = _splitmix64_np(base ^ starts.astype(np.uint64))
+    return _splitmix64_np(keys ^ walk_ids.astype(np.uint64))
+
+
+def _counter_uniform_np(keys, step: int):
+    z = _splitmix64_np(keys ^ np.uint64(step))
+    return (z >> np.uint64(11)).astype(np.float64) * _INV_2_53
+
+
+def _walks_python(
+    offsets: Sequence[int],
+    targets: Sequence[int],
+    starts: Sequence[int],
+    walk_ids: Sequence[int],
+    max_steps: int,
+    seed: int,
+) -> List[List[int]]:
+    paths = []
+    for start, walk_id in zip(starts, walk_ids):
+        key = walk_key(seed, start, walk_id)
+        path = [start]
+        current = start
+        for step in range(max_steps):
+            unvisited = [n for n in targets[offsets[current]:offsets[current + 1]] if n not in path]
+            if not unvisited:
+                break
+            current = unvisited[int(counter_uniform(key, step) * len(unvisited))]
+            path.append(current)
+        paths.append(path)
+    return paths
+
+
+def _walks_numpy(offsets, targets, starts, walk_ids, max_steps: int, seed: int) -> List[List[int]]:
+    num_walks = len(starts)
+    paths = np.full((num_walks, max_steps + 1), -1, dtype=np.int64)
+    paths[:, 0] = starts
+    lengths = np.ones(num_walks, dtype=np.int64)
+    keys = _walk_keys_np(seed, starts, walk_ids)
+    active = np.arange(num_walks)
+
+    for step in range(max_steps):
+        current = paths[active, step]
+        lo = offsets[current]
+        deg = offsets[current + 1] - lo
+        has_neighbors = deg > 0
+        active, lo, deg = active[has_neighbors], lo[has_neighbors], deg[has_neighbors]
+        if active.size == 0:
+            break
+
+        # 展开所有活跃游走的候选边：seg[j] 是第 j 个候选所属的游走（在 active 中的位置）
+        seg = np.repeat(np.arange(active.size), deg)
+        seg_start = np.cumsum(deg) - deg
+        cand = targets[lo[seg] + (np.arange(seg.size) - seg_start[seg])]
+        free = ~(cand[:, None] == paths[active[seg], :step + 1]).any(axis=1)
+
+        count = np.bincount(seg, weights=free, minlength=active.size).astype(np.int64)
+        pick = np.floor(_counter_uniform_np(keys[active], step) * count).astype(np.int64)
+
+        # 每个候选在所属游走的未访问邻居中的秩（0-based）
+        free_int = free.astype(np.int64)
+        csum = np.cumsum(free_int)
+        before = csum[seg_start] - free_int[seg_start]
+        rank = csum - before[seg] - 1
+        chosen = free & (rank == pick[seg])
+
+        next_node = np.full(active.size, -1, dtype=np.int64)
+        next_node[seg[chosen]] = cand[chosen]
+        moved = count > 0
+        active = active[moved]
+        paths[active, step + 1] = next_node[moved]
+        lengths[active] += 1
+
+    return [paths[i, :lengths[i]].tolist() for i in range(num_walks)]
+
+
+def walk_csr(store, exclude_types: Iterable[str] = ("prerequisite",), use_numpy: Optional[bool] = None) -> Tuple:
+    """游走用的 (offsets, targets)：numpy 可用时返回 ndarray，否则返回 graph_store 的序列"""
+    offsets, targets = store.filtered_csr(exclude_types)
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return np.asarray(offsets, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+    return offsets, targets
+
+
+def batch_random_walks(
+    store,
+    start_nodes: Iterable[int],
+    num_walks: int,
+    max_steps: int,
+    seed: int = 42,
+    exclude_types: Iterable[str] = ("prerequisite",),
+    chunk_size: int = 1 << 16,
+    use_numpy: Optional[bool] = None,
+    csr: Optional[Tuple] = None,
+) -> Dict[int, List[List[int]]]:
+    """
+    从每个起点各走 num_walks 条无环随机游走。
+
+    Args:
+        store: graph_store.GraphStore
+        start_nodes: 起点 node index
+        num_walks: 每个起点的游走条数
+        max_steps: 每条游走的最大步数（路径长度 <= max_steps + 1）
+        seed: 全局随机种子
+        exclude_types: 游走时忽略的边类型（与 load_graph_for_walk 一致，默认忽略 prerequisite）
+        chunk_size: numpy 实现每批同步推进的游走条数（控制内存）
+        use_numpy: None 表示有 numpy 就用
+        csr: 预先构建好的 walk_csr(...) 结果（多次调用时复用）
+
+    Returns:
+        {start_node: [path_of_walk_0, path_of_walk_1, ...]}
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    offsets, targets = csr if csr is not None else walk_csr(store, exclude_types, use_numpy=use_numpy)
+    start_nodes = list(start_nodes)
+    starts = [s for s in start_nodes for _ in range(num_walks)]
+    walk_ids = [w for _ in start_nodes for w in range(num_walks)]
+
+    flat: List[List[int]] = []
+    for lo in range(0, len(starts), chunk_size):
+        chunk_starts = starts[lo:lo + chunk_size]
+        chunk_walk_ids = walk_ids[lo:lo + chunk_size]
+        if use_numpy:
+            flat.extend(_walks_numpy(
+                offsets, targets,
+                np.asarray(chunk_starts, dtype=np.int64), np.asarray(chunk_walk_ids, dtype=np.int64),
+                max_steps, seed,
+            ))
+        else:
+            flat.extend(_walks_python(offsets, targets, chunk_starts, chunk_walk_ids, max_steps, seed))
+
+    return {
+        start: flat[i * num_walks:(i + 1) * num_walks]
+        for i, start in enumerate(start_nodes)
+    }
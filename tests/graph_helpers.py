@@ -0,0 +1,55 @@
+"""
+测试共用的小图构造：make_graph 生成 graph JSON（与 build_graph_v1 的输出结构相同），make_store 直接得到 GraphStore。
+
+边可以写成 (source, target)、(source, target, dependency_type)、(source, target, dependency_type, confidence)，
+缺省的依赖类型为 "full"、置信度为 confidence 参数；需要额外字段（如 param_mapping）时直接给 edge dict。
+"""
+
+import os
+import sys
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from graph_store import GraphStore, serialize_graph
+
+
+def make_edge(edge, confidence=1.0):
+    if isinstance(edge, dict):
+        return dict(edge)
+    source, target, *rest = edge
+    return {
+        "source": source,
+        "target": target,
+        "dependency_type": rest[0] if rest else "full",
+        "confidence": rest[1] if len(rest) > 1 else confidence,
+    }
+
+
+def make_graph(edges, num_nodes=None, names=None, confidence=1.0, name_prefix="tool_"):
+    """
+    Args:
+        edges: 边列表（见模块说明）
+        num_nodes: node 数；默认取 names 的长度，或边中出现的最大下标 + 1
+        names: 各 node 的函数名；默认 f"{name_prefix}{i}"
+        confidence: 没有写明置信度的边使用的置信度
+    """
+    edges = [make_edge(edge, confidence) for edge in edges]
+    if num_nodes is None:
+        num_nodes = len(names) if names is not None else 1 + max(max(e["source"], e["target"]) for e in edges)
+    if names is None:
+        names = [f"{name_prefix}{i}" for i in range(num_nodes)]
+    return {
+        "version": "1.0.0",
+        "nodes": [{"index": i, "function_schema": {"function": {"name": name}}} for i, name in enumerate(names)],
+        "edges": edges,
+    }
+
+
+def make_store(edges, num_nodes=None, **kwargs):
+    """make_graph 的结果直接序列化成 GraphStore"""
+    return GraphStore(serialize_graph(make_graph(edges, num_nodes, **kwargs)))
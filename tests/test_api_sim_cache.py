@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import asyncio
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from api_sim_cache import SimulationCache, simulation_key
+
+
+class FakeSimulator:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"result": {"value": self.calls}, "token_usage": {"total_tokens": 100}}
+
+
+class TestSimulationCache(unittest.TestCase):
+
+    def simulate(self, cache, simulator, params=None, context="code"):
+        return asyncio.run(cache.get_or_simulate("get_weather", params or {"city": "Paris"}, context, simulator))
+
+    def test_key_is_canonical(self):
+        self.assertEqual(
+            simulation_key("t", {"a": 1, "b": [1, 2]}, "c"),
+            simulation_key("t", {"b": [1, 2], "a": 1}, "c"),
+        )
+        self.assertNotEqual(simulation_key("t", {"a": 1}, "c"), simulation_key("t", {"a": 1}, "c2"))
+
+    def test_always_reuses_first_result(self):
+        cache = SimulationCache(":memory:", policy="always")
+        simulator = FakeSimulator()
+        first = self.simulate(cache, simulator)
+        second = self.simulate(cache, simulator)
+        self.assertEqual(simulator.calls, 1)
+        self.assertEqual(second["result"], first["result"])
+        self.assertTrue(second["cache_hit"])
+        self.assertEqual(second["token_usage"]["total_tokens"], 0)
+        self.simulate(cache, simulator, context="regenerated code")
+        self.assertEqual(simulator.calls, 2)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["saved_tokens"]), (1, 2, 100))
+
+    def test_variants_fill_then_reuse(self):
+        cache = SimulationCache(":memory:", policy="variants", max_variants=3, seed=0)
+        simulator = FakeSimulator()
+        results = [self.simulate(cache, simulator)["result"]["value"] for _ in range(20)]
+        self.assertEqual(results[:3], [1, 2, 3])
+        self.assertEqual(simulator.calls, 3)
+        self.assertLessEqual(set(results[3:]), {1, 2, 3})
+
+    def test_sample_policy_mixes_new_and_cached(self):
+        cache = SimulationCache(":memory:", policy="sample", max_variants=4, reuse_probability=0.5, seed=1)
+        simulator = FakeSimulator()
+        for _ in range(50):
+            self.simulate(cache, simulator)
+        self.assertGreater(simulator.calls, 1)
+        self.assertLessEqual(simulator.calls, 4)
+        self.assertEqual(len(cache.variants(simulation_key("get_weather", {"city": "Paris"}, "code"))), simulator.calls)
+
+
+    def simulate_concurrently(self, cache, simulator, n):
+        async def main():
+            return await asyncio.gather(*[
+                cache.get_or_simulate("get_weather", {"city": "Paris"}, "code", simulator) for _ in range(n)
+            ])
+        return asyncio.run(main())
+
+    def test_concurrent_misses_simulate_once_per_key(self):
+        cache = SimulationCache(":memory:", policy="always")
+        simulator = FakeSimulator(delay=0.01)
+        results = self.simulate_concurrently(cache, simulator, 5)
+        self.assertEqual(simulator.calls, 1)
+        self.assertEqual([r["cache_hit"] for r in results], [False, True, True, True, True])
+        self.assertEqual(len(cache.variants(simulation_key("get_weather", {"city": "Paris"}, "code"))), 1)
+        self.assertEqual(cache._key_locks, {})
+
+    def test_concurrent_misses_respect_variant_cap(self):
+        cache = SimulationCache(":memory:", policy="variants", max_variants=2, seed=0)
+        simulator = FakeSimulator(delay=0.01)
+        self.simulate_concurrently(cache, simulator, 6)
+        self.assertEqual(simulator.calls, 2)
+        self.assertEqual(len(cache.variants(simulation_key("get_weather", {"city": "Paris"}, "code"))), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
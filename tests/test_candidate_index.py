@@ -0,0 +1,173 @@
+import unittest
+import random
+import sys
+import os
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from candidate_index import (
+    LabelInvertedIndex,
+    mine_candidates_raw,
+    mine_candidates_tiered,
+    mine_delta_candidates_raw,
+    mine_window_shifts_raw,
+)
+from benchmark_candidate_index import make_synthetic_catalog
+
+
+# Reference implementations: the original O(n^2) loops from graph.py
+def raw_pairwise(nodes, max_candidates=None):
+    node_labels = []
+    for node in nodes:
+        c = node.get("classification", {})
+        labels = set()
+        if c.get("primary_label", "").strip():
+            labels.add(c["primary_label"].strip())
+        for s in c.get("secondary_labels", []):
+            if s and s.strip():
+                labels.add(s.strip())
+        node_labels.append(labels)
+    result = {}
+    for i in range(len(nodes)):
+        cands = [j for j in range(len(nodes)) if j != i and node_labels[i] & node_labels[j]]
+        if max_candidates is not None:
+            cands = cands[:max_candidates]
+        result[i] = cands
+    return result
+
+
+def tiered_pairwise(nodes, min_candidates=30):
+    primary = []
+    secondary = []
+    for node in nodes:
+        c = node.get("classification", {})
+        primary.append(c.get("primary_label", "").strip())
+        secondary.append({s.strip() for s in (c.get("secondary_labels", []) or []) if s and s.strip()})
+    n = len(nodes)
+    result = {}
+    for i in range(n):
+        cands, used = [], set()
+        if primary[i]:
+            for j in range(n):
+                if j != i and primary[j] == primary[i]:
+                    cands.append(j)
+                    used.add(j)
+        if len(cands) < min_candidates and secondary[i]:
+            for j in range(n):
+                if j == i or j in used:
+                    continue
+                if primary[j] and primary[j] in secondary[i]:
+                    cands.append(j)
+                    used.add(j)
+                    if len(cands) >= min_candidates:
+                        break
+        if len(cands) < min_candidates and secondary[i]:
+            for j in range(n):
+                if j == i or j in used:
+                    continue
+                if secondary[j] and (secondary[i] & secondary[j]):
+                    cands.append(j)
+                    used.add(j)
+                    if len(cands) >= min_candidates:
+                        break
+        if len(cands) < min_candidates:
+            remaining = [j for j in range(n) if j != i and j not in used]
+            needed = min_candidates - len(cands)
+            if remaining and needed > 0:
+                extra = random.sample(remaining, min(needed, len(remaining)))
+                cands.extend(extra)
+        result[i] = cands
+    return result
+
+
+class TestLabelInvertedIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Many labels keeps primary tiers small so the secondary and random tiers are exercised
+        self.nodes = make_synthetic_catalog(600, num_labels=400, seed=7)
+
+    def test_raw_matches_pairwise(self):
+        for use_bitset in (False, True):
+            index = LabelInvertedIndex(self.nodes, use_bitset=use_bitset)
+            for max_candidates in (None, 5, 40):
+                self.assertEqual(
+                    mine_candidates_raw(index, max_candidates=max_candidates),
+                    raw_pairwise(self.nodes, max_candidates=max_candidates),
+                )
+
+    def test_delta_matches_full_mining_restricted_to_dirty(self):
+        # few labels -> long match lists, so truncation makes the candidate relation asymmetric
+        nodes = make_synthetic_catalog(300, num_labels=20, seed=11)
+        index = LabelInvertedIndex(nodes)
+        dirty = {3, 150, 299}
+        for max_candidates in (None, 10):
+            full = mine_candidates_raw(index, max_candidates=max_candidates)
+            expected = {}
+            for i, candidates in full.items():
+                kept = [j for j in candidates if i in dirty or j in dirty]
+                if kept:
+                    expected[i] = kept
+            self.assertEqual(mine_delta_candidates_raw(index, dirty, max_candidates=max_candidates), expected)
+        self.assertEqual(mine_delta_candidates_raw(index, set(), max_candidates=10), {})
+
+    def test_window_shifts_make_incremental_pairs_match_full_rebuild(self):
+        old_nodes = make_synthetic_catalog(300, num_labels=20, seed=11)
+        # 删除两个 node（后面的 node 全部前移一位），修改一个，再新增一个
+        new_nodes = [node for i, node in enumerate(old_nodes) if i not in (5, 40)]
+        new_nodes[100] = {**new_nodes[100], "classification": {"primary_label": "label_0", "secondary_labels": []}}
+        new_nodes.append(make_synthetic_catalog(1, num_labels=20, seed=5)[0])
+        new_nodes[-1] = {**new_nodes[-1], "function_schema": {"function": {"name": "tool_new"}}}
+        old_names = [node["function_schema"]["function"]["name"] for node in old_nodes]
+        new_names = [node["function_schema"]["function"]["name"] for node in new_nodes]
+        dirty = {100, len(new_nodes) - 1}
+        stale = {new_names[d] for d in dirty} | {old_names[5], old_names[40]}
+        old_index, new_index = LabelInvertedIndex(old_nodes), LabelInvertedIndex(new_nodes)
+
+        def name_pairs(candidates, names):
+            return {(names[i], names[j]) for i, cands in candidates.items() for j in cands}
+
+        max_candidates = 10
+        windows, entered = mine_window_shifts_raw(old_index, old_names, new_index, new_names, dirty, max_candidates)
+        self.assertTrue(windows)
+        self.assertTrue(entered)
+
+        # 旧 pair 中两端都没有变化、且 target 仍在窗口内的直接保留；其余来自 delta 和新进入窗口的 pair
+        window_names = {new_names[j]: {new_names[x] for x in window} for j, window in windows.items()}
+        carried = {
+            (src, tgt) for src, tgt in name_pairs(mine_candidates_raw(old_index, max_candidates), old_names)
+            if src not in stale and tgt not in stale and (src not in window_names or tgt in window_names[src])
+        }
+        judged = name_pairs(mine_delta_candidates_raw(new_index, dirty, max_candidates), new_names)
+        judged |= name_pairs(entered, new_names)
+        self.assertFalse(carried & judged)
+        self.assertEqual(carried | judged, name_pairs(mine_candidates_raw(new_index, max_candidates), new_names))
+
+        # 不截断时窗口不会移动
+        self.assertEqual(mine_window_shifts_raw(old_index, old_names, new_index, new_names, dirty, None), ({}, {}))
+
+    def test_tiered_matches_pairwise_for_fixed_seed(self):
+        index = LabelInvertedIndex(self.nodes)
+        for min_candidates in (3, 30):
+            random.seed(42)
+            expected = tiered_pairwise(self.nodes, min_candidates=min_candidates)
+            random.seed(42)
+            actual, _, _, _ = mine_candidates_tiered(index, min_candidates=min_candidates)
+            self.assertEqual(actual, expected)
+
+    def test_tiered_small_catalog_uses_pool_sampling(self):
+        # n <= 21 makes random.sample iterate the whole population
+        nodes = make_synthetic_catalog(15, num_labels=50, seed=3)
+        random.seed(1)
+        expected = tiered_pairwise(nodes, min_candidates=10)
+        random.seed(1)
+        actual, _, _, _ = mine_candidates_tiered(LabelInvertedIndex(nodes), min_candidates=10)
+        self.assertEqual(actual, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
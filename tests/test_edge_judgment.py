@@ -0,0 +1,131 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from edge_judgment import assemble_batch_results, parse_edge_judgment, split_candidate_blocks, split_token_usage
+
+BATCH_OUTPUT = """### CANDIDATE 1
+HAS_EDGE: true
+DEPENDENCY_TYPE: full
+PARAM_MAPPING: {"path": "file_path"}
+REASONING: the returned path is the download target
+
+### CANDIDATE 2
+HAS_EDGE: false
+DEPENDENCY_TYPE: none
+PARAM_MAPPING: NONE
+REASONING: unrelated
+
+### CANDIDATE 3
+HAS_EDGE: true
+DEPENDENCY_TYPE: partial
+PARAM_MAPPING: {"path": 
+REASONING: mapping got cut off
+"""
+
+
+class TestParseEdgeJudgment(unittest.TestCase):
+
+    def test_parses_all_fields(self):
+        judgment, errors = parse_edge_judgment(
+            "HAS_EDGE: yes\nCONFIDENCE: 0.8\nDEPENDENCY_TYPE: Partial\n"
+            "PARAM_MAPPING: {\"result.items\": \"ids\"}\nREASONING: items feed ids"
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(judgment, {
+            "has_edge": True,
+            "confidence": 0.8,
+            "dependency_type": "partial",
+            "param_mapping": {"result.items": "ids"},
+            "reasoning": "items feed ids",
+        })
+
+    def test_reports_missing_has_edge_and_bad_mapping(self):
+        judgment, errors = parse_edge_judgment("DEPENDENCY_TYPE: full\nPARAM_MAPPING: {oops\nCONFIDENCE: high")
+        self.assertFalse(judgment["has_edge"])
+        self.assertEqual(judgment["param_mapping"], {})
+        self.assertEqual(judgment["confidence"], 0.0)
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(any("PARAM_MAPPING" in e for e in errors))
+        self.assertIn("missing HAS_EDGE", errors)
+
+
+class TestSplitCandidateBlocks(unittest.TestCase):
+
+    def test_splits_on_headers(self):
+        blocks = split_candidate_blocks("preamble\n" + BATCH_OUTPUT)
+        self.assertEqual(sorted(blocks), [1, 2, 3])
+        self.assertIn("unrelated", blocks[2])
+        self.assertNotIn("CANDIDATE", blocks[1])
+
+    def test_header_variants_and_duplicates(self):
+        text = "CANDIDATE 1\nHAS_EDGE: true\n## candidate C2\nHAS_EDGE: false\n### CANDIDATE 1\nHAS_EDGE: false\n"
+        blocks = split_candidate_blocks(text)
+        self.assertEqual(sorted(blocks), [1, 2])
+        # 重复编号保留第一个
+        self.assertIn("true", blocks[1])
+        self.assertEqual(split_candidate_blocks("HAS_EDGE: true"), {})
+
+    def test_split_token_usage_preserves_totals(self):
+        shares = split_token_usage({"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}, 4)
+        self.assertEqual([s["prompt_tokens"] for s in shares], [3, 3, 2, 2])
+        self.assertEqual(sum(s["total_tokens"] for s in shares), 15)
+
+
+class TestAssembleBatchResults(unittest.TestCase):
+
+    def assemble(self, response_text, num_candidates, parse_errors=None):
+        fallback_calls = []
+
+        def make_result(i, judgment, token_share):
+            return {**judgment, "candidate": i, "token_usage": token_share}
+
+        async def judge_single(i):
+            fallback_calls.append(i)
+            return {"has_edge": False, "reasoning": "single", "candidate": i, "token_usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}}
+
+        usage = {"prompt_tokens": 40, "completion_tokens": 20, "total_tokens": 60}
+        on_parse_error = (lambda: parse_errors.append(response_text)) if parse_errors is not None else None
+        results = asyncio.run(assemble_batch_results(
+            response_text, usage, num_candidates, make_result, judge_single, on_parse_error=on_parse_error,
+        ))
+        return results, fallback_calls
+
+    def test_unparseable_and_missing_blocks_fall_back_per_pair(self):
+        parse_errors = []
+        results, fallback_calls = self.assemble(BATCH_OUTPUT, 4, parse_errors)
+        self.assertEqual(parse_errors, [BATCH_OUTPUT])
+        # 块 3 的 PARAM_MAPPING 不是合法 JSON，块 4 缺失
+        self.assertEqual(fallback_calls, [2, 3])
+        self.assertEqual([r["candidate"] for r in results], [0, 1, 2, 3])
+        self.assertEqual(results[0]["param_mapping"], {"path": "file_path"})
+        self.assertFalse(results[1]["has_edge"])
+        self.assertEqual(results[2]["reasoning"], "single")
+        self.assertEqual(results[0]["token_usage"]["total_tokens"], 15)
+        # 回退的 pair：单独判断的消耗 + 批量请求分摊的部分
+        self.assertEqual(results[3]["token_usage"]["total_tokens"], 110 + 15)
+        self.assertEqual(sum(r["token_usage"]["total_tokens"] for r in results), 60 + 2 * 110)
+        # 一次批量请求 + 两次单独判断
+        self.assertEqual([r["judge_requests"] for r in results], [1, 0, 1, 1])
+
+    def test_failed_request_falls_back_for_every_candidate(self):
+        parse_errors = []
+        results, fallback_calls = self.assemble("", 3, parse_errors)
+        self.assertEqual(fallback_calls, [0, 1, 2])
+        # 请求失败时没有可删除的响应
+        self.assertEqual(parse_errors, [])
+        self.assertTrue(all(r["reasoning"] == "single" for r in results))
+        # 失败的批量请求不计
+        self.assertEqual(sum(r["judge_requests"] for r in results), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
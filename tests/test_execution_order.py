@@ -0,0 +1,99 @@
+import unittest
+import asyncio
+import sys
+import os
+from unittest import mock
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from execution_order import FunctionDependencies, execution_levels, path_dependency_edges
+from graph_helpers import make_store
+
+try:
+    import backward_to_query_magnet
+except Exception:  # 加载时需要 config.yaml 和 openai / yaml 等依赖
+    backward_to_query_magnet = None
+
+
+class TestExecutionLevels(unittest.TestCase):
+
+    def test_graph_levels(self):
+        # f0 -> f2, f1 -> f2, f2 -> f3；f4 独立
+        deps = FunctionDependencies(make_store([(0, 2, "full"), (1, 2, "partial"), (2, 3, "prerequisite")], 5, name_prefix="f"))
+        self.assertEqual(
+            execution_levels(["f3", "f2", "f4", "f1", "f0"], deps),
+            [["f4", "f1", "f0"], ["f2"], ["f3"]],
+        )
+
+    def test_no_dependency_info_keeps_sequential_order(self):
+        self.assertEqual(execution_levels(["b", "a"]), [["b"], ["a"]])
+        self.assertEqual(execution_levels(["b", "a"], FunctionDependencies()), [["b", "a"]])
+        self.assertEqual(execution_levels([]), [])
+
+    def test_cycles_are_broken_in_original_order(self):
+        deps = FunctionDependencies(edges=[("a", "b"), ("b", "a"), ("b", "c")])
+        self.assertEqual(execution_levels(["b", "a", "c"], deps), [["b"], ["a", "c"]])
+
+    def test_path_edges(self):
+        path_data = {
+            "original_path_names": ["f0", "f1"],
+            "insert_logs": [{"source_func_name": "f1", "nested_func_name": "f5"}],
+        }
+        # 游走路径上相邻（f0, f1）不算依赖，只有 Insert 的 source -> nested
+        self.assertEqual(path_dependency_edges(path_data), [("f1", "f5")])
+        deps = FunctionDependencies().with_path_edges(path_data)
+        self.assertEqual(execution_levels(["f5", "f1", "f0"], deps), [["f1", "f0"], ["f5"]])
+        # 相邻函数之间的依赖来自依赖图
+        deps = FunctionDependencies(make_store([(0, 1, "full")], 6, name_prefix="f")).with_path_edges(path_data)
+        self.assertEqual(execution_levels(["f5", "f1", "f0"], deps), [["f0"], ["f1"], ["f5"]])
+
+
+@unittest.skipIf(backward_to_query_magnet is None, "backward_to_query_magnet unavailable (needs config.yaml / openai / yaml)")
+class TestForwardLevels(unittest.TestCase):
+
+    def test_levels_run_concurrently_and_see_earlier_outputs(self):
+        in_flight = {"params": 0, "execute": 0}
+        max_in_flight = {"params": 0, "execute": 0}
+        contexts = {}
+
+        async def track(kind):
+            in_flight[kind] += 1
+            max_in_flight[kind] = max(max_in_flight[kind], in_flight[kind])
+            await asyncio.sleep(0.01)
+            in_flight[kind] -= 1
+
+        async def generate_single_func_params(turn_query, func_name, available_context, tool_schemas):
+            contexts[func_name] = list(available_context)
+            await track("params")
+            return {"parameters": {"name": func_name}, "params_source": {}, "token_usage": {"total_tokens": 1}}
+
+        async def execute_function_call(func_name, parameters, tool_schemas):
+            await track("execute")
+            return {"function": func_name, "output": f"{func_name}-out"}
+
+        # f0、f1 互不依赖（同一层），f2 依赖 f0
+        deps = FunctionDependencies(make_store([(0, 2, "full")], 3, name_prefix="f"))
+        with mock.patch.object(backward_to_query_magnet, "generate_single_func_params", generate_single_func_params), \
+                mock.patch.object(backward_to_query_magnet, "execute_function_call", execute_function_call):
+            result = asyncio.run(backward_to_query_magnet.forward_with_sequential_execution(
+                0, "query", ["f2", "f1", "f0"], [[{"function": "h", "output": "history"}]], {}, dependencies=deps,
+            ))
+
+        self.assertEqual(result["execution_levels"], [["f1", "f0"], ["f2"]])
+        self.assertEqual([call["function"] for call in result["tool_calls"]], ["f1", "f0", "f2"])
+        self.assertEqual(max_in_flight, {"params": 2, "execute": 2})
+        # 第二层能看到历史和第一层的输出，第一层只能看到历史
+        self.assertEqual([item["output"] for item in contexts["f0"]], ["history"])
+        self.assertEqual([item["output"] for item in contexts["f2"]], ["history", "f1-out", "f0-out"])
+        self.assertEqual(result["token_usage"]["total_tokens"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import asyncio
+import sys
+import os
+import tempfile
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from filter_cache import FilterOutputCache, is_cacheable_filter_result
+
+PARAMS = {"type": "object", "properties": {"city": {"type": "string"}}}
+OUTPUT = {"fields": [{"name": "city"}, {"name": "temp"}]}
+
+
+class FakeFilter:
+    """按调用顺序返回 reasonings 中的 filter_reasoning"""
+
+    def __init__(self, *reasonings):
+        self.reasonings = list(reasonings)
+        self.calls = 0
+
+    async def __call__(self, node_name, node_params, node_output_schema):
+        reasoning = self.reasonings[min(self.calls, len(self.reasonings) - 1)]
+        self.calls += 1
+        await asyncio.sleep(0)
+        return {"fields": [{"name": "temp"}], "filter_reasoning": reasoning, "filtered_param_names": ["city"]}
+
+
+class TestFilterOutputCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp.name, "filter_cache.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get(self, cache, times=1):
+        async def run():
+            return [await cache.get_or_compute("get_weather", PARAMS, OUTPUT) for _ in range(times)]
+        return asyncio.run(run())
+
+    def test_is_cacheable(self):
+        self.assertTrue(is_cacheable_filter_result({"filter_reasoning": "city is an input"}))
+        self.assertTrue(is_cacheable_filter_result({"fields": []}))
+        self.assertFalse(is_cacheable_filter_result({"filter_reasoning": "Error occurred: timeout"}))
+        self.assertFalse(is_cacheable_filter_result({"filter_reasoning": "Parse error: not json"}))
+        self.assertFalse(is_cacheable_filter_result(None))
+
+    def test_success_is_cached_and_persisted(self):
+        compute = FakeFilter("city is an input")
+        cache = FilterOutputCache(self.cache_file, compute=compute, model="m")
+        results = self.get(cache, times=2)
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(cache.summary()["filter_cache_hits"], 1)
+
+        reloaded = FilterOutputCache(self.cache_file, compute=FakeFilter("unused"), model="m")
+        self.get(reloaded)
+        self.assertEqual(reloaded.compute.calls, 0)
+        # 换模型后旧结果不再命中
+        other_model = FilterOutputCache(self.cache_file, compute=FakeFilter("x"), model="other")
+        self.get(other_model)
+        self.assertEqual(other_model.compute.calls, 1)
+
+    def test_append_after_truncated_line(self):
+        cache = FilterOutputCache(self.cache_file, compute=FakeFilter("city is an input"), model="m")
+        self.get(cache)
+        with open(self.cache_file, "a", encoding="utf-8") as f:
+            f.write('{"key": "get_weather:')
+
+        resumed = FilterOutputCache(self.cache_file, compute=FakeFilter("x"), model="other")
+        self.get(resumed)
+        self.assertEqual(resumed.compute.calls, 1)
+        # 半行被截掉，新记录从新行开始；两条记录都能重新加载
+        reloaded = FilterOutputCache(self.cache_file, compute=FakeFilter("unused"), model="m")
+        self.assertEqual(len(reloaded.entries), 2)
+        with open(self.cache_file, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_error_results_are_not_cached(self):
+        for reasoning in ("Error occurred: timeout", "Parse error: {not json"):
+            with self.subTest(reasoning=reasoning):
+                cache_file = os.path.join(self.tmp.name, f"{reasoning[:5]}.jsonl")
+                compute = FakeFilter(reasoning, "city is an input")
+                cache = FilterOutputCache(cache_file, compute=compute, model="m")
+                first, second, third = self.get(cache, times=3)
+                self.assertEqual(first["filter_reasoning"], reasoning)
+                # 出错结果不缓存，下一次重新计算；成功后才命中缓存
+                self.assertEqual(second["filter_reasoning"], "city is an input")
+                self.assertEqual(third, second)
+                self.assertEqual(compute.calls, 2)
+                with open(cache_file, encoding="utf-8") as f:
+                    self.assertEqual(len(f.readlines()), 1)
+
+    def test_concurrent_callers_share_one_computation(self):
+        compute = FakeFilter("Parse error: {not json")
+        cache = FilterOutputCache(None, compute=compute, model="m")
+
+        async def run():
+            return await asyncio.gather(*[cache.get_or_compute("get_weather", PARAMS, OUTPUT) for _ in range(3)])
+
+        results = asyncio.run(run())
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(cache.summary()["filter_cache_inflight_hits"], 2)
+        self.assertEqual(cache.entries, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
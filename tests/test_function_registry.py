@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from function_registry import FunctionRegistry, api_function_name, extract_api_parts
+
+TOOL_INFO_DIR = os.path.join(project_root, "graph-toucan", "tool_info")
+STATEFUL_DIR = os.path.join(TOOL_INFO_DIR, "generated_functions_stateful_v1")
+STATE_MANAGER_DIR = os.path.join(project_root, "graph-toucan", "new_feature")
+
+TOOL_SOURCE = '''import json
+
+CALLS = []
+
+
+def call_external_api(tool_name: str):
+    """Return weather for a city."""
+    return {}
+
+
+def get_weather_Tool(city: str):
+    CALLS.append(city)
+    return {"city": city, "api": call_external_api("get-weather")}
+'''
+
+
+def write(directory, name, source):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        f.write(source)
+
+
+class TestFunctionRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.stateful_dir = os.path.join(self.tmp.name, "generated_functions_stateful_v1")
+        self.plain_dir = os.path.join(self.tmp.name, "generated_functions_v1")
+        write(self.plain_dir, "get_weather.py", TOOL_SOURCE)
+        write(self.plain_dir, "broken.py", "raise ValueError('boom')\n")
+        write(self.stateful_dir, "broken.py", TOOL_SOURCE.replace("get_weather_Tool", "broken"))
+        # stateful 版本无法加载时回退到 generated_functions_v1 中的同名文件
+        write(self.stateful_dir, "flaky.py", "def flaky() -> Dict:\n    return {}\n")
+        write(self.plain_dir, "flaky.py", TOOL_SOURCE.replace("get_weather_Tool", "flaky"))
+        self.registry = FunctionRegistry([self.stateful_dir, self.plain_dir], cache_size=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resolves_variants_and_caches(self):
+        loaded = self.registry.load("get-weather")
+        self.assertEqual(self.registry.resolve("get-weather"), [os.path.join(self.plain_dir, "get_weather.py")])
+        self.assertEqual(loaded.func("Paris")["city"], "Paris")
+        self.assertEqual(loaded.api_info["docstring"], "Return weather for a city.")
+        self.assertNotIn("call_external_api(tool_name", loaded.source_without_api)
+
+        again = self.registry.load("get-weather")
+        self.assertIs(again.module, loaded.module)
+        self.assertEqual(again.module.CALLS, ["Paris"])
+        self.assertEqual((self.registry.hits, self.registry.misses), (1, 1))
+
+    def test_stateful_dir_takes_precedence_and_lru_evicts(self):
+        self.assertEqual(self.registry.load("broken").file_path, os.path.join(self.stateful_dir, "broken.py"))
+        self.registry.load("get-weather")
+        self.registry.load("broken")
+        self.assertEqual(self.registry.misses, 3)
+
+    def test_falls_back_to_next_dir_when_load_fails(self):
+        self.assertEqual(
+            self.registry.resolve("flaky"),
+            [os.path.join(self.stateful_dir, "flaky.py"), os.path.join(self.plain_dir, "flaky.py")],
+        )
+        self.assertEqual(self.registry.load("flaky").file_path, os.path.join(self.plain_dir, "flaky.py"))
+
+    def test_missing_function(self):
+        with self.assertRaises(RuntimeError):
+            self.registry.load("no-such-tool")
+
+    def test_extract_api_parts(self):
+        api_info, source = extract_api_parts("def f():\n    pass\n")
+        self.assertIsNone(api_info)
+        self.assertEqual(source, "def f():\n    pass\n")
+
+
+
+class TestStatefulTools(unittest.TestCase):
+    """tool_info/generated_functions_stateful_v1 中真实的 stateful tool"""
+
+    def test_loads_with_state_manager_and_wrapped_api(self):
+        registry = FunctionRegistry([STATEFUL_DIR], import_paths=[STATE_MANAGER_DIR])
+        loaded = registry.load("text-editor-mcp-server-text_editor")
+        self.assertEqual(loaded.file_path, os.path.join(STATEFUL_DIR, "text-editor-mcp-server-text_editor.py"))
+        self.assertEqual(type(loaded.module.sys_state).__module__, "state_manager")
+        self.assertEqual(api_function_name(loaded.module), "_original_call_external_api")
+        # 模拟的是被包装的原始 API（docstring 在它上面），包装中的 sys_state 副作用保留在源码里
+        self.assertIn("- content (str)", loaded.api_info["docstring"])
+        self.assertNotIn("def _original_call_external_api", loaded.source_without_api)
+        self.assertIn("def call_external_api(tool_name: str, **kwargs)", loaded.source_without_api)
+        self.assertIn("sys_state.write_file", loaded.source_without_api)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import asyncio
+import hashlib
+import sys
+import os
+from unittest import mock
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from benchmark_candidate_index import make_synthetic_catalog
+from candidate_index import LabelInvertedIndex, mine_candidates_raw
+
+try:
+    import graph_incremental
+    from graph import graph_node_record
+except Exception:  # graph.py 加载时需要 config.yaml 和 openai / yaml 等依赖
+    graph_incremental = None
+
+
+def name_of(node):
+    return node["function_schema"]["function"]["name"]
+
+
+def fake_judge(source, target):
+    """确定性的边判断：只取决于两端的函数名"""
+    return hashlib.sha256(f"{name_of(source)}->{name_of(target)}".encode()).digest()[0] % 3 == 0
+
+
+async def fake_build_graph_v1(nodes, sampled_candidates, progress_file=None, **kwargs):
+    edges = [
+        {"source": src, "target": tgt, "confidence": 1.0, "dependency_type": "full", "param_mapping": {}}
+        for src, candidates in sampled_candidates.items()
+        for tgt in candidates
+        if fake_judge(nodes[src], nodes[tgt])
+    ]
+    return {"edges": edges, "edge_details": [dict(edge) for edge in edges], "token_usage_summary": {}}
+
+
+def edge_names(graph):
+    names = [node["id"] for node in graph["nodes"]]
+    return sorted((names[e["source"]], names[e["target"]]) for e in graph["edges"])
+
+
+@unittest.skipIf(graph_incremental is None, "graph_incremental unavailable (needs config.yaml / openai / yaml)")
+class TestUpdateGraphIncremental(unittest.TestCase):
+
+    def build_full(self, nodes, max_candidates):
+        candidates = mine_candidates_raw(LabelInvertedIndex(nodes), max_candidates=max_candidates)
+        graph = asyncio.run(fake_build_graph_v1(nodes, candidates))
+        graph.update(version="1.0.0", nodes=[graph_node_record(i, node) for i, node in enumerate(nodes)])
+        return graph
+
+    def test_node_removal_matches_full_rebuild(self):
+        old_nodes = make_synthetic_catalog(200, num_labels=15, seed=3)
+        old_graph = self.build_full(old_nodes, max_candidates=8)
+        # 删除靠前的 node：后面所有 node 的 index 前移，窗口被截断的 node 会有新 candidate 挤进来
+        new_nodes = old_nodes[:4] + old_nodes[5:]
+
+        with mock.patch.object(graph_incremental, "build_graph_v1", fake_build_graph_v1):
+            graph = asyncio.run(graph_incremental.update_graph_incremental(old_graph, new_nodes, max_candidates=8))
+
+        self.assertEqual(graph["incremental_update"]["removed"], [name_of(old_nodes[4])])
+        self.assertGreater(graph["incremental_update"]["shifted_windows"], 0)
+        self.assertEqual(edge_names(graph), edge_names(self.build_full(new_nodes, max_candidates=8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from graph_store import load_graph_store
+from graph_helpers import make_graph, make_store
+
+
+NAMES = ["search_files", "download_file", "share_file", "get_weather"]
+EDGES = [
+    (0, 2, "partial", 0.7),
+    (1, 2, "prerequisite", 0.6),
+    {"source": 0, "target": 1, "dependency_type": "full", "confidence": 0.9, "param_mapping": {"fileId": "file_id"}},
+]
+
+
+class TestGraphStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = make_store(EDGES, names=NAMES)
+
+    def test_successors_keep_json_order(self):
+        self.assertEqual(self.store.successors(0), [2, 1])
+        self.assertEqual(self.store.successors(1, exclude_types=("prerequisite",)), [])
+        self.assertEqual(self.store.successors(3), [])
+
+    def test_adjacency_matches_dict_of_lists(self):
+        adj = self.store.adjacency(exclude_types=("prerequisite",))
+        self.assertEqual(dict(adj), {0: [2, 1]})
+        self.assertEqual(adj.get(1, []), [])
+        self.assertEqual(dict(self.store.adjacency()), {0: [2, 1], 1: [2]})
+
+    def test_edge_lookup_and_attributes(self):
+        self.assertTrue(self.store.has_edge(0, 1))
+        self.assertFalse(self.store.has_edge(1, 0))
+        edge = self.store.edge(self.store.find_edge(0, 1))
+        self.assertEqual(edge["dependency_type"], "full")
+        self.assertEqual(edge["confidence"], 0.9)
+        self.assertEqual(edge["param_mapping"], {"fileId": "file_id"})
+        self.assertEqual(len(self.store.edges(exclude_types=("prerequisite",))), 2)
+
+    def test_duplicate_edges_last_wins(self):
+        store = make_store(EDGES + [(0, 1, "partial", 0.4)], names=NAMES)
+        edge = store.edge(store.find_edge(0, 1))
+        self.assertEqual(edge["dependency_type"], "partial")
+        self.assertEqual(edge["confidence"], 0.4)
+
+    def test_names(self):
+        self.assertEqual(self.store.name(2), "share_file")
+        self.assertEqual(self.store.name_to_index()["get_weather"], 3)
+
+    def test_load_writes_and_reuses_mmap_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph_path = os.path.join(tmp, "graph.json")
+            with open(graph_path, "w", encoding="utf-8") as f:
+                json.dump(make_graph(EDGES, names=NAMES), f)
+
+            store = load_graph_store(graph_path)
+            self.assertTrue(os.path.exists(graph_path + ".csr"))
+            self.assertEqual(store.successors(0), [2, 1])
+            store.close()
+
+            store = load_graph_store(graph_path)
+            self.assertEqual(store.path, graph_path + ".csr")
+            self.assertEqual(store.num_edges, 3)
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
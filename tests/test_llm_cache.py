@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from llm_cache import CachedAsyncClient, LLMResponseCache, request_key
+
+try:
+    from openai.types.chat import ChatCompletion
+except ImportError:
+    ChatCompletion = None
+
+
+def _namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_namespace(v) for v in value]
+    return value
+
+
+def make_completion(content):
+    """与上游返回的对象同类型：安装了 openai 时是真实的 ChatCompletion"""
+    data = {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 1700000000,
+        "model": "test-model",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+    if ChatCompletion is not None:
+        return ChatCompletion.model_validate(data)
+    return _namespace(data)
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return make_completion(f"answer {self.calls}")
+
+
+class FakeClient:
+    def __init__(self):
+        self.completions = FakeCompletions()
+        self.chat = SimpleNamespace(completions=self.completions)
+
+
+def make_request(temperature=0.0, **extra):
+    return {
+        "model": "test-model",
+        "messages": [{"role": "user", "content": "hello"}],
+        "temperature": temperature,
+        **extra,
+    }
+
+
+class TestLLMResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeClient()
+        self.client = CachedAsyncClient(self.fake, LLMResponseCache(":memory:"), stage="test")
+
+    def create(self, **kwargs):
+        return asyncio.run(self.client.chat.completions.create(**kwargs))
+
+    def test_deterministic_calls_are_cached(self):
+        first = self.create(**make_request())
+        second = self.create(**make_request(timeout=30))
+        self.assertEqual(self.fake.completions.calls, 1)
+        self.assertEqual(second.choices[0].message.content, first.choices[0].message.content)
+        # 命中没有花费 token：usage 为 0，原来的用量只计入 saved tokens
+        self.assertEqual(second.usage.total_tokens, 0)
+        self.assertEqual(second.usage.prompt_tokens, 0)
+        summary = self.client.cache_summary()
+        self.assertEqual((summary["llm_cache_hits"], summary["llm_cache_misses"]), (1, 1))
+        self.assertEqual(summary["llm_cache_saved_tokens"], 15)
+
+    def test_sampling_calls_bypass_unless_opted_in(self):
+        self.create(**make_request(temperature=0.7))
+        self.create(**make_request(temperature=0.7))
+        self.assertEqual(self.fake.completions.calls, 2)
+        self.assertEqual(self.client.cache_summary()["llm_cache_bypassed"], 2)
+
+        self.create(cache=True, **make_request(temperature=0.7))
+        self.create(cache=True, **make_request(temperature=0.7))
+        self.assertEqual(self.fake.completions.calls, 3)
+
+    def test_invalidate_after_parse_failure(self):
+        self.create(**make_request())
+        self.assertTrue(self.client.invalidate(**make_request(timeout=30)))
+        self.assertFalse(self.client.invalidate(**make_request()))
+        # 采样请求没有写入缓存，也就没有可删除的条目
+        self.assertFalse(self.client.invalidate(**make_request(temperature=0.7)))
+        second = self.create(**make_request())
+        self.assertEqual(self.fake.completions.calls, 2)
+        self.assertEqual(second.choices[0].message.content, "answer 2")
+        self.assertEqual(self.client.cache_summary()["llm_cache_invalidated"], 1)
+
+    def test_unreadable_hit_falls_through_to_upstream(self):
+        key = request_key(make_request())
+        self.client.cache.set(key, "{\"choices\": [", model="test-model", stage="test")
+        completion = self.create(**make_request())
+        self.assertEqual(self.fake.completions.calls, 1)
+        self.assertEqual(completion.choices[0].message.content, "answer 1")
+        summary = self.client.cache_summary()
+        self.assertEqual((summary["llm_cache_hits"], summary["llm_cache_misses"]), (0, 1))
+        self.assertEqual(summary["llm_cache_invalidated"], 1)
+        # 上游的响应重新写入缓存，下一次正常命中
+        self.assertEqual(self.create(**make_request()).choices[0].message.content, "answer 1")
+        self.assertEqual(self.fake.completions.calls, 1)
+
+    @unittest.skipIf(ChatCompletion is None, "openai not installed")
+    def test_non_completion_hit_falls_through_to_upstream(self):
+        self.client.cache.set(request_key(make_request()), "{}", model="test-model", stage="test")
+        self.assertEqual(self.create(**make_request()).choices[0].message.content, "answer 1")
+        self.assertEqual(self.client.cache_summary()["llm_cache_invalidated"], 1)
+
+    def test_key_covers_semantic_params(self):
+        self.assertNotEqual(request_key(make_request()), request_key(make_request(max_tokens=10)))
+        self.assertEqual(request_key(make_request()), request_key(make_request(extra_headers={"x": "1"})))
+
+    def test_eviction(self):
+        cache = LLMResponseCache(":memory:", ttl_seconds=None, max_entries=2)
+        for i in range(3):
+            cache.set(f"k{i}", "{}")
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get("k0"))
+        self.assertEqual(cache.stats()["entries"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from llm_coalesce import CoalescingAsyncClient
+
+
+class SlowCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {
+            "content": kwargs["messages"][0]["content"],
+            "call": self.calls,
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+        }
+
+
+def make_client(**kwargs):
+    completions = SlowCompletions()
+    client = CoalescingAsyncClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), **kwargs)
+    return client, completions
+
+
+def request(content="hello", temperature=0.0, **extra):
+    return {"model": "m", "messages": [{"role": "user", "content": content}], "temperature": temperature, **extra}
+
+
+class TestCoalescingAsyncClient(unittest.TestCase):
+
+    def run_all(self, client, requests):
+        async def main():
+            return await asyncio.gather(*(client.chat.completions.create(**r) for r in requests))
+        return asyncio.run(main())
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        client, completions = make_client()
+        results = self.run_all(client, [request(), request(), request("other")])
+        self.assertEqual(completions.calls, 2)
+        self.assertEqual((results[0]["content"], results[0]["call"]), (results[1]["content"], results[1]["call"]))
+        self.assertIsNot(results[0], results[1])
+        # 一次实际请求只计一次 token：等待者拿到的副本 usage 为 0
+        self.assertEqual(results[0]["usage"]["total_tokens"], 7)
+        self.assertEqual(results[1]["usage"], {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+        summary = client.coalesce_summary()
+        self.assertEqual((summary["llm_coalesced"], summary["llm_coalesced_saved_tokens"]), (1, 7))
+        self.assertEqual(client.inflight, {})
+
+    def test_excluded_fields_do_not_split_key(self):
+        client, completions = make_client(exclude_params=["metadata"])
+        self.run_all(client, [request(metadata={"path": 1}), request(metadata={"path": 2})])
+        self.assertEqual(completions.calls, 1)
+
+    def test_sampling_requests_are_not_coalesced_by_default(self):
+        client, completions = make_client()
+        self.run_all(client, [request(temperature=1.0), request(temperature=1.0)])
+        self.assertEqual(completions.calls, 2)
+        self.run_all(client, [request(temperature=1.0, coalesce=True), request(temperature=1.0, coalesce=True)])
+        self.assertEqual(completions.calls, 3)
+
+    def test_errors_propagate_to_all_waiters(self):
+        class FailingCompletions:
+            calls = 0
+
+            async def create(self, **kwargs):
+                FailingCompletions.calls += 1
+                await asyncio.sleep(0.01)
+                raise RuntimeError("boom")
+
+        client = CoalescingAsyncClient(SimpleNamespace(chat=SimpleNamespace(completions=FailingCompletions())))
+
+        async def main():
+            return await asyncio.gather(
+                client.chat.completions.create(**request()),
+                client.chat.completions.create(**request()),
+                return_exceptions=True,
+            )
+        results = asyncio.run(main())
+        self.assertEqual(FailingCompletions.calls, 1)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from llm_scheduler import SlidingWindowScheduler, batch_token_counter, default_token_counter
+
+
+async def collect(scheduler, items, worker, stop_after=None):
+    results = []
+    async for item, result in scheduler.run(items, worker):
+        results.append((item, result))
+        if stop_after is not None and len(results) >= stop_after:
+            scheduler.stop()
+            break
+    return results
+
+
+class TestSlidingWindowScheduler(unittest.TestCase):
+
+    def test_window_refills_without_batch_barrier(self):
+        in_flight = 0
+        peak = 0
+        started = []
+
+        async def worker(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            started.append(item)
+            # item 0 is slow; with a batch barrier items 3.. would wait for it
+            await asyncio.sleep(0.2 if item == 0 else 0.01)
+            in_flight -= 1
+            return {"item": item}
+
+        scheduler = SlidingWindowScheduler(max_concurrency=3)
+        results = asyncio.run(collect(scheduler, range(10), worker))
+
+        self.assertEqual(sorted(item for item, _ in results), list(range(10)))
+        self.assertEqual(peak, 3)
+        # the slow item finishes last, everything else streamed past it
+        self.assertEqual(results[-1][0], 0)
+        self.assertEqual(scheduler.summary()["completed"], 10)
+
+    def test_exceptions_are_yielded_as_results(self):
+        async def worker(item):
+            if item % 2:
+                raise ValueError(f"bad {item}")
+            return item
+
+        results = dict(asyncio.run(collect(SlidingWindowScheduler(max_concurrency=2), range(4), worker)))
+        self.assertEqual(results[0], 0)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[3], ValueError)
+
+    def test_stop_cancels_in_flight_and_pending(self):
+        submitted = []
+
+        async def worker(item):
+            submitted.append(item)
+            await asyncio.sleep(0 if item == 0 else 10)
+            return item
+
+        scheduler = SlidingWindowScheduler(max_concurrency=4)
+        results = asyncio.run(collect(scheduler, range(100), worker, stop_after=1))
+
+        self.assertEqual([item for item, _ in results], [0])
+        self.assertTrue(scheduler.stopped)
+        self.assertLessEqual(len(submitted), 5)
+
+    def test_token_budget_blocks_dispatch(self):
+        async def run():
+            scheduler = SlidingWindowScheduler(max_concurrency=2, max_tokens_per_minute=100)
+
+            async def worker(item):
+                return {"token_usage": {"total_tokens": 150}}
+
+            results = []
+            async for item, _ in scheduler.run(range(5), worker):
+                results.append(item)
+                if scheduler._window_tokens >= 100:
+                    # budget exhausted: the scheduler must sleep before dispatching more
+                    break
+            return scheduler, results
+
+        scheduler, results = asyncio.run(run())
+        self.assertGreaterEqual(scheduler._window_tokens, 100)
+        self.assertLess(scheduler.submitted, 5)
+
+    def test_reservations_bound_concurrent_burst(self):
+        in_flight = 0
+        peak = 0
+
+        async def worker(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"token_usage": {"total_tokens": 50}}
+
+        async def run():
+            scheduler = SlidingWindowScheduler(
+                max_concurrency=10, max_tokens_per_minute=300, token_estimator=lambda item: 100,
+            )
+            results = []
+            async for item, _ in scheduler.run(range(10), worker):
+                results.append(item)
+                if len(results) == 4:
+                    break
+            return scheduler, results
+
+        scheduler, results = asyncio.run(run())
+        # 估计 100 / 请求、预算 300：同一时刻最多 3 个请求在飞，而不是 max_concurrency 个
+        self.assertEqual(peak, 3)
+        # 完成的请求释放预留，窗口里记录的是实际消耗的 50
+        self.assertEqual(scheduler._window_tokens, 200)
+        self.assertLessEqual(scheduler.submitted, 5)
+
+    def test_default_estimate_follows_completed_usage(self):
+        scheduler = SlidingWindowScheduler(max_concurrency=1, max_tokens_per_minute=1000, initial_token_estimate=400)
+        self.assertEqual(scheduler._estimate_tokens("item"), 400)
+        scheduler._record_tokens({"token_usage": {"total_tokens": 100}})
+        scheduler._record_tokens({"token_usage": {"total_tokens": 300}})
+        self.assertEqual(scheduler._estimate_tokens("item"), 200)
+
+    def test_batch_token_counter_sums_list_results(self):
+        group = [{"token_usage": {"total_tokens": 40}}, {"token_usage": None}, ValueError("boom"), {"token_usage": {"total_tokens": 60}}]
+        self.assertEqual(default_token_counter(group), 0)
+        self.assertEqual(batch_token_counter(group), 100)
+        self.assertEqual(batch_token_counter({"token_usage": {"total_tokens": 7}}), 7)
+
+        async def run():
+            scheduler = SlidingWindowScheduler(max_concurrency=1, max_tokens_per_minute=100, token_counter=batch_token_counter)
+
+            async def worker(item):
+                return [{"token_usage": {"total_tokens": 60}}, {"token_usage": {"total_tokens": 60}}]
+
+            async for _ in scheduler.run(range(3), worker):
+                break
+            return scheduler
+
+        scheduler = asyncio.run(run())
+        self.assertEqual(scheduler._window_tokens, 120)
+
+    def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            SlidingWindowScheduler(max_concurrency=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import sys
+import os
+import json
+import random
+import tempfile
+from collections import Counter
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from path_counting import PathCounter, sample_paths_to_file
+from path_stream import iter_records, iter_walk_paths
+from graph_helpers import make_graph, make_store
+
+
+# DAG：0 -> 1/2/3，1 -> 2/4，2 -> 4（两种依赖类型），3 -> 4，4 -> 5；5 -> 0 是 prerequisite，会被过滤
+EDGES = [
+    (0, 1, "full"), (0, 2, "partial"), (0, 3, "full"), (1, 2, "full"), (1, 4, "full"),
+    (2, 4, "full"), (2, 4, "partial"), (3, 4, "partial"), (4, 5, "full"), (5, 0, "prerequisite"),
+]
+
+
+def brute_force(adj, start, max_length):
+    paths = []
+    stack = [[start]]
+    while stack:
+        path = stack.pop()
+        if len(path) > 1:
+            paths.append(tuple(path))
+        if len(path) - 1 < max_length:
+            for t in set(adj.get(path[-1], ())):
+                stack.append(path + [t])
+    return paths
+
+
+class TestPathCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.store = make_store(EDGES, 6)
+        self.adj = self.store.adjacency(exclude_types=("prerequisite",))
+
+    def test_counts_match_enumeration(self):
+        counter = PathCounter(self.store, max_length=4)
+        expected = [p for v in range(6) for p in brute_force(self.adj, v, 4)]
+        self.assertEqual(counter.total, len(expected))
+        self.assertEqual(counter.count(0, 3), sum(1 for p in expected if p[0] == 0 and len(p) == 4))
+        self.assertEqual(sum(counter.totals_by_length().values()), counter.total)
+        # unrank 是到全部路径的双射
+        self.assertEqual(sorted(tuple(counter.unrank(r)) for r in range(counter.total)), sorted(expected))
+
+    def test_uniform_sampling(self):
+        counter = PathCounter(self.store, max_length=3, min_length=2)
+        rng = random.Random(1)
+        samples = Counter(tuple(p) for p in counter.sample(counter.total * 300, rng, unique=False))
+        self.assertEqual(len(samples), counter.total)
+        self.assertLess(max(samples.values()) / min(samples.values()), 1.6)
+
+        unique = counter.sample(counter.total + 5, rng)
+        self.assertEqual(len({tuple(p) for p in unique}), counter.total)
+
+    def test_unique_sampling_beyond_maxsize(self):
+        # 70 个节点的完全 DAG：路径总数约 2^69，超过 sys.maxsize
+        n = 70
+        edges = [(s, t, "full") for s in range(n) for t in range(s + 1, n)]
+        counter = PathCounter(make_store(edges, n), max_length=n)
+        self.assertGreater(counter.total, sys.maxsize)
+        paths = counter.sample(50, random.Random(3))
+        self.assertEqual(len({tuple(p) for p in paths}), 50)
+        self.assertTrue(all(a < b for p in paths for a, b in zip(p, p[1:])))
+
+    def test_rejects_cycles(self):
+        store = make_store(EDGES[:-1] + [(5, 0, "full")], 6)
+        with self.assertRaises(ValueError):
+            PathCounter(store, max_length=3)
+
+    def test_sample_paths_to_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph_path = os.path.join(tmp, "graph.json")
+            output_path = os.path.join(tmp, "paths.jsonl")
+            with open(graph_path, "w") as f:
+                json.dump(make_graph(EDGES, 6), f)
+            report = sample_paths_to_file(graph_path, output_path, num_paths=5, max_length=3, seed=3)
+            paths = [record["node_indices"] for _, _, _, record in iter_walk_paths(output_path)]
+            self.assertEqual(len(set(map(tuple, paths))), 5)
+            self.assertEqual(report["num_sampled"], 5)
+            self.assertEqual(list(iter_records(output_path))[-1]["statistics"]["total_paths"], report["total_paths"])
+
+
+if __name__ == '__main__':
+    unittest.main()
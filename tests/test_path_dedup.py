@@ -0,0 +1,79 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from path_dedup import GlobalPathDeduper, canonical_hash, dedup_walk_file
+from path_stream import RecordWriter, iter_records, iter_walk_paths
+
+PATHS = {
+    0: [[0, 1, 2, 3], [0, 1]],
+    1: [[1, 2, 3], [1, 2, 4]],
+    2: [[2, 3]],
+    5: [[5, 1, 2]],
+}
+
+
+def write_walks(path):
+    with RecordWriter(path, kind="walk_paths") as writer:
+        for node_idx, paths in PATHS.items():
+            writer.write({"type": "node", "node_idx": node_idx, "name": f"tool_{node_idx}"})
+            for walk_id, p in enumerate(paths, 1):
+                writer.write({"type": "path", "node_idx": node_idx, "walk_id": walk_id, "node_indices": p})
+
+
+class TestGlobalPathDeduper(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp.name, "paths.jsonl")
+        write_walks(self.input_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def kept(self, subsumption):
+        deduper = GlobalPathDeduper(subsumption=subsumption)
+        return [record["node_indices"] for _, _, _, record in deduper.iter_unique(self.input_path)], deduper
+
+    def test_subsumption_modes(self):
+        self.assertEqual(self.kept("none")[0], [p for paths in PATHS.values() for p in paths])
+        self.assertEqual(self.kept("prefix")[0], [[0, 1, 2, 3], [1, 2, 3], [1, 2, 4], [2, 3], [5, 1, 2]])
+        self.assertEqual(self.kept("suffix")[0], [[0, 1, 2, 3], [0, 1], [1, 2, 4], [5, 1, 2]])
+        kept, deduper = self.kept("subpath")
+        self.assertEqual(kept, [[0, 1, 2, 3], [1, 2, 4], [5, 1, 2]])
+        stats = deduper.stats()
+        self.assertEqual((stats["input_paths"], stats["subsumed_paths"]), (6, 3))
+        self.assertEqual(
+            stats["estimated_tokens_saved"],
+            sum(deduper.estimate_tokens(p) for p in ([0, 1], [1, 2, 3], [2, 3])),
+        )
+
+    def test_exact_duplicates_across_nodes(self):
+        deduper = GlobalPathDeduper()
+        self.assertTrue(deduper.accept([3, 4]))
+        self.assertFalse(deduper.accept([3, 4]))
+        self.assertTrue(deduper.accept([4, 3]))
+        self.assertEqual(deduper.stats()["exact_duplicates"], 1)
+        self.assertEqual(canonical_hash([1, 2]), canonical_hash((1, 2)))
+
+    def test_dedup_walk_file(self):
+        output_path = os.path.join(self.tmp.name, "dedup.jsonl.gz")
+        stats = dedup_walk_file(self.input_path, output_path, subsumption="subpath")
+        self.assertEqual(stats["kept_paths"], 3)
+        self.assertEqual(
+            [(n, name, r["node_indices"]) for n, name, _, r in iter_walk_paths(output_path)],
+            [(0, "tool_0", [0, 1, 2, 3]), (1, "tool_1", [1, 2, 4]), (5, "tool_5", [5, 1, 2])],
+        )
+        self.assertEqual(list(iter_records(output_path))[-1]["statistics"]["kept_paths"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
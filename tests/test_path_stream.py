@@ -0,0 +1,171 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from path_stream import RecordWriter, iter_records, iter_walk_paths, iter_fsp_paths, read_header
+from random_walker import run_walks_from_all_nodes_with_dedup
+from generate_fsp_v2 import generate_fsp_v2
+from graph_helpers import make_graph
+
+
+EDGES = [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3), (3, 4)]
+
+
+class TestRecordStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_compressed(self):
+        path = os.path.join(self.tmp.name, "out", "paths.jsonl.gz")
+        with RecordWriter(path, kind="walk_paths", meta={"seed": 1}) as writer:
+            for i in range(3):
+                writer.write({"type": "path", "i": i})
+            writer.set_statistics({"n": 3})
+        records = list(iter_records(path))
+        self.assertEqual(records[0]["meta"], {"seed": 1})
+        self.assertEqual([r["i"] for r in records[1:-1]], [0, 1, 2])
+        self.assertEqual(records[-1]["statistics"], {"n": 3})
+        self.assertEqual(read_header(path)["kind"], "walk_paths")
+
+    def test_follow_consumes_while_writing(self):
+        path = os.path.join(self.tmp.name, "paths.jsonl")
+        writer = RecordWriter(path, kind="walk_paths")
+        writer.write({"type": "path", "i": 0})
+        writer.flush()
+
+        def finish():
+            time.sleep(0.05)
+            writer.write({"type": "path", "i": 1})
+            writer.close()
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        records = list(iter_records(path, follow=True, poll_interval=0.01, timeout=5))
+        thread.join()
+        self.assertEqual([r["type"] for r in records], ["header", "path", "path", "summary"])
+
+    def test_aborted_file_has_no_summary(self):
+        path = os.path.join(self.tmp.name, "paths.jsonl")
+        with self.assertRaises(RuntimeError):
+            with RecordWriter(path, kind="walk_paths") as writer:
+                writer.write({"type": "path"})
+                raise RuntimeError("boom")
+        self.assertNotIn("summary", [r["type"] for r in iter_records(path)])
+
+
+class TestWalkPipelineFormats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.graph_path = os.path.join(self.tmp.name, "graph.json")
+        self.mapping_path = os.path.join(self.tmp.name, "node_candidates_mapping.json")
+        with open(self.graph_path, "w", encoding="utf-8") as f:
+            json.dump(make_graph(EDGES, 5, confidence=0.9), f)
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            json.dump({"node_to_candidates": {"tool_0": ["tool_4"], "tool_2": ["tool_4"]}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def walk(self, save_path):
+        return run_walks_from_all_nodes_with_dedup(
+            graph_path=self.graph_path,
+            max_steps=3,
+            num_walks_per_node=4,
+            seed=3,
+            log_path=None,
+            save_json_path=save_path,
+            merge_probability=0.5,
+            candidates_mapping_path=self.mapping_path,
+            walk_engine="batch",
+        )
+
+    def test_jsonl_matches_legacy_json(self):
+        json_path = os.path.join(self.tmp.name, "path_v1.json")
+        jsonl_path = os.path.join(self.tmp.name, "path_v1.jsonl.gz")
+        legacy = self.walk(json_path)
+        streamed = self.walk(jsonl_path)
+        self.assertEqual(streamed["node_results"], {})
+        self.assertEqual(streamed["total_merges"], legacy["total_merges"])
+        self.assertEqual(
+            [(n, name, i, r["node_indices"]) for n, name, i, r in iter_walk_paths(json_path)],
+            [(n, name, i, r["node_indices"]) for n, name, i, r in iter_walk_paths(jsonl_path)],
+        )
+
+        fsp_json = os.path.join(self.tmp.name, "fsp_v2.json")
+        fsp_jsonl = os.path.join(self.tmp.name, "fsp_v2.jsonl")
+        generate_fsp_v2(json_path, fsp_json, self.graph_path, seed=7)
+        generate_fsp_v2(jsonl_path, fsp_jsonl, self.graph_path, seed=7)
+        self.assertEqual(list(iter_fsp_paths(fsp_json)), list(iter_fsp_paths(fsp_jsonl)))
+
+    def test_fsp_parallel_and_resume(self):
+        walk_path = os.path.join(self.tmp.name, "path_v1.jsonl")
+        self.walk(walk_path)
+        serial = os.path.join(self.tmp.name, "fsp_serial.jsonl")
+        parallel = os.path.join(self.tmp.name, "fsp_parallel.jsonl")
+        generate_fsp_v2(walk_path, serial, self.graph_path, seed=7, chunk_size=3)
+        generate_fsp_v2(walk_path, parallel, self.graph_path, seed=7, num_workers=2, chunk_size=1)
+        expected = list(iter_fsp_paths(serial))
+        self.assertEqual(list(iter_fsp_paths(parallel)), expected)
+
+        # 模拟中断：保留 header + 前两条路径 + 第三条写了一半
+        with open(serial, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        resumed = os.path.join(self.tmp.name, "fsp_resumed.jsonl")
+        with open(resumed, "w", encoding="utf-8") as f:
+            f.writelines(lines[:3])
+            f.write(lines[3][:20])
+        generate_fsp_v2(walk_path, resumed, self.graph_path, seed=7, resume=True)
+        self.assertEqual(list(iter_fsp_paths(resumed)), expected)
+        self.assertEqual(list(iter_records(resumed))[-1], list(iter_records(serial))[-1])
+
+    def test_fsp_resume_checks_header_meta(self):
+        walk_path = os.path.join(self.tmp.name, "path_v1.jsonl")
+        self.walk(walk_path)
+        serial = os.path.join(self.tmp.name, "fsp_serial.jsonl")
+        generate_fsp_v2(walk_path, serial, self.graph_path, seed=7)
+        with open(serial, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        resumed = os.path.join(self.tmp.name, "fsp_resumed.jsonl")
+        with open(resumed, "w", encoding="utf-8") as f:
+            f.writelines(lines[:2])
+        with self.assertRaisesRegex(ValueError, "seed"):
+            generate_fsp_v2(walk_path, resumed, self.graph_path, seed=8, resume=True)
+        with self.assertRaisesRegex(ValueError, "merge_probability"):
+            generate_fsp_v2(walk_path, resumed, self.graph_path, seed=7, merge_probability=0.9, resume=True)
+        # 不匹配时不会改动已有输出
+        with open(resumed, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readlines(), lines[:2])
+
+    def test_fsp_resume_empty_output_starts_fresh(self):
+        walk_path = os.path.join(self.tmp.name, "path_v1.jsonl")
+        self.walk(walk_path)
+        serial = os.path.join(self.tmp.name, "fsp_serial.jsonl")
+        generate_fsp_v2(walk_path, serial, self.graph_path, seed=7)
+        resumed = os.path.join(self.tmp.name, "fsp_resumed.jsonl")
+        # header 写到一半就被中断
+        with open(resumed, "w", encoding="utf-8") as f:
+            f.write('{"type": "hea')
+        generate_fsp_v2(walk_path, resumed, self.graph_path, seed=7, resume=True)
+        self.assertEqual(list(iter_records(resumed)), list(iter_records(serial)))
+
+
+if __name__ == '__main__':
+    unittest.main()
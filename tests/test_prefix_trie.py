@@ -0,0 +1,116 @@
+import unittest
+import asyncio
+import sys
+import os
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from prefix_trie import PrefixTrie, TrieResult, run_subtree
+
+
+def as_steps(keys):
+    return [(key, {"key": key}) for key in keys]
+
+
+class TestPrefixTrie(unittest.TestCase):
+
+    def setUp(self):
+        self.sequences = [
+            ["a", "b", "c"],
+            ["a", "b", "d"],
+            ["a", "b"],
+            ["a", "e"],
+            ["x", "b"],
+        ]
+        self.trie = PrefixTrie()
+        for keys in self.sequences:
+            self.trie.add(as_steps(keys))
+
+    def run_trie(self, fail_on=None):
+        calls = []
+        self.nodes = []
+
+        async def step(state, node):
+            key = node.payload["key"]
+            calls.append((node.depth, key))
+            self.nodes.append(node)
+            if key == fail_on:
+                raise ValueError(f"boom at {key}")
+            await asyncio.sleep(0)
+            state.append(key)
+            return {"key": key, "history": list(state), "tokens": 10}
+
+        results = asyncio.run(run_subtree(self.trie.root, [], step))
+        return results, calls
+
+    def test_stats(self):
+        stats = self.trie.stats()
+        self.assertEqual(stats["num_paths"], 5)
+        self.assertEqual(stats["num_groups"], 2)
+        self.assertEqual(stats["total_steps"], 12)
+        # a, a/b, a/b/c, a/b/d, a/e, x, x/b
+        self.assertEqual(stats["unique_steps"], 7)
+        self.assertEqual(stats["shared_steps"], 5)
+
+    def test_each_prefix_runs_once_and_fans_out(self):
+        results, calls = self.run_trie()
+        self.assertEqual(len(calls), 7)
+        self.assertEqual(len({id(node) for node in self.nodes}), 7)
+        for path_id, keys in enumerate(self.sequences):
+            result = results[path_id]
+            self.assertIsInstance(result, TrieResult)
+            self.assertEqual([r["key"] for r in result.records], keys)
+            # 分叉后的状态互不影响：每个 step 看到的历史恰好是本路径的前缀
+            self.assertEqual(result.records[-1]["history"], keys)
+
+    def test_owner_pays_for_shared_steps(self):
+        results, _ = self.run_trie()
+        self.assertEqual(results[0].owned, [True, True, True])
+        self.assertEqual(results[1].owned, [False, False, True])
+        self.assertEqual(results[2].owned, [False, False])
+        self.assertEqual(results[3].owned, [False, True])
+        self.assertEqual(results[4].owned, [True, True])
+        self.assertEqual(results[2].shared_steps, 2)
+        charged = sum(
+            r["tokens"] for result in results.values() for r, owned in zip(result.records, result.owned) if owned
+        )
+        self.assertEqual(charged, 7 * 10)
+
+    def test_failure_propagates_to_subtree_only(self):
+        results, calls = self.run_trie(fail_on="b")
+        for path_id in (0, 1, 2, 4):
+            self.assertIsInstance(results[path_id], ValueError)
+        self.assertIsInstance(results[3], TrieResult)
+        # 失败 node 之后的 step 不再执行
+        self.assertNotIn((2, "c"), calls)
+
+    def test_semaphore_and_empty_path(self):
+        trie = PrefixTrie()
+        empty_id = trie.add([])
+        trie.add(as_steps(["a"]))
+        active = []
+        peak = []
+
+        async def step(state, node):
+            active.append(node.key)
+            peak.append(len(active))
+            await asyncio.sleep(0)
+            active.pop()
+            return node.key
+
+        async def main():
+            return await run_subtree(trie.root, [], step, semaphore=asyncio.Semaphore(1))
+
+        results = asyncio.run(main())
+        self.assertEqual(results[empty_id].records, [])
+        self.assertEqual(results[1].records, ["a"])
+        self.assertEqual(max(peak), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import json
+import sys
+import os
+import tempfile
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from progress_journal import ProgressJournal, keyed_progress_file
+
+
+def make_record(src, tgt, has_edge):
+    edge = {"source": src, "target": tgt, "confidence": 0.0, "dependency_type": "full", "param_mapping": {}}
+    return {
+        "pair": [src, tgt],
+        "pair_names": [f"f{src}", f"f{tgt}"],
+        "token_usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        "edge": edge if has_edge else None,
+        "edge_detail": dict(edge, reasoning="r") if has_edge else None,
+    }
+
+
+class TestProgressJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.progress_file = os.path.join(self.tmp_dir.name, "graph_v1_progress.json")
+        self.journal = ProgressJournal(self.progress_file, compact_every=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_replay_rebuilds_state(self):
+        self.journal.append_batch([make_record(0, 1, True), make_record(0, 2, False)])
+        self.journal.append_batch([make_record(1, 2, True)])
+
+        state = ProgressJournal(self.progress_file).load()
+        self.assertEqual(state["processed_pairs_by_name"], [["f0", "f1"], ["f0", "f2"], ["f1", "f2"]])
+        self.assertEqual([(e["source"], e["target"]) for e in state["edges"]], [(0, 1), (1, 2)])
+        self.assertEqual(len(state["edge_details"]), 2)
+        self.assertEqual(state["token_usage_summary"]["successful_calls"], 3)
+        self.assertEqual(state["token_usage_summary"]["total_tokens"], 36)
+        self.assertEqual(state["progress"]["processed_batches"], 2)
+
+    def test_batched_records_count_requests_and_pairs_separately(self):
+        # 一次批量请求判断三个 pair（请求计在第一个 pair 上），其中一个 pair 回退单独判断
+        records = [make_record(0, 1, True), make_record(0, 2, False), make_record(0, 3, False)]
+        for record, judge_requests in zip(records, (1, 0, 1)):
+            record["judge_requests"] = judge_requests
+        self.journal.append_batch(records)
+
+        stats = ProgressJournal(self.progress_file).load()["token_usage_summary"]
+        self.assertEqual(stats["successful_calls"], 2)
+        self.assertEqual(stats["judged_pairs"], 3)
+
+    def test_truncated_trailing_record_is_dropped(self):
+        self.journal.append_batch([make_record(0, 1, True)])
+        with open(self.journal.journal_file, "a", encoding="utf-8") as f:
+            f.write('{"type": "pair", "pair": [5, ')
+
+        state = self.journal.load()
+        self.assertEqual(state["processed_pairs"], [[0, 1]])
+
+        # appending after the repair must still produce a valid journal
+        self.journal.append_batch([make_record(2, 3, False)])
+        state = self.journal.load()
+        self.assertEqual(state["processed_pairs"], [[0, 1], [2, 3]])
+
+    def test_compaction_then_crash_before_truncate_is_idempotent(self):
+        self.journal.append_batch([make_record(0, 1, True)])
+        snapshot = self.journal.load()
+        with open(self.journal.journal_file, "r", encoding="utf-8") as f:
+            journal_before = f.read()
+
+        self.journal.compact(snapshot)
+        with open(self.progress_file, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["processed_pairs"], [[0, 1]])
+        self.assertEqual(os.path.getsize(self.journal.journal_file), 0)
+
+        # simulate a crash between os.replace and the journal truncation
+        with open(self.journal.journal_file, "w", encoding="utf-8") as f:
+            f.write(journal_before)
+        state = self.journal.load()
+        self.assertEqual(state["processed_pairs"], [[0, 1]])
+        self.assertEqual(len(state["edges"]), 1)
+        self.assertEqual(state["token_usage_summary"]["successful_calls"], 1)
+        self.assertEqual(state["progress"]["processed_batches"], 1)
+
+    def test_snapshot_sequence_skips_already_compacted_records(self):
+        self.journal.append_batch([make_record(0, 1, True)])
+        self.journal.append_batch([make_record(0, 2, False)])
+        snapshot = self.journal.load()
+        with open(self.journal.journal_file, "r", encoding="utf-8") as f:
+            journal_before = f.read()
+        self.journal.compact(snapshot)
+        with open(self.progress_file, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["progress"]["journal_seq"], 4)
+
+        # crash before truncation, then a new run appends after the stale records
+        with open(self.journal.journal_file, "w", encoding="utf-8") as f:
+            f.write(journal_before)
+        resumed = ProgressJournal(self.progress_file, compact_every=2)
+        resumed.load()
+        resumed.append_batch([make_record(1, 2, True)])
+
+        state = ProgressJournal(self.progress_file).load()
+        self.assertEqual(state["progress"]["processed_batches"], 3)
+        self.assertEqual(state["processed_pairs"], [[0, 1], [0, 2], [1, 2]])
+        self.assertEqual(state["token_usage_summary"]["successful_calls"], 3)
+        self.assertEqual(len(state["edges"]), 2)
+        self.assertEqual(state["progress"]["journal_seq"], 6)
+
+    def test_keyed_progress_files_isolate_runs(self):
+        base = os.path.join(self.tmp_dir.name, "incremental_progress.json")
+        run1 = {"old_graph": "g1", "dirty": ["f1"]}
+        run2 = {"old_graph": "g2", "dirty": ["f2"]}
+        file1 = keyed_progress_file(base, run1)
+        self.assertEqual(file1, keyed_progress_file(base, dict(reversed(list(run1.items())))))
+        self.assertNotEqual(file1, keyed_progress_file(base, run2))
+        self.assertTrue(file1.endswith(".json"))
+
+        # run 1 is interrupted after one batch: rerunning with the same inputs resumes it
+        ProgressJournal(file1).append_batch([make_record(1, 0, True)])
+        self.assertEqual(ProgressJournal(keyed_progress_file(base, run1)).load()["processed_pairs"], [[1, 0]])
+
+        # run 1 finishes and merges: its progress is cleared
+        journal1 = ProgressJournal(file1)
+        journal1.compact(journal1.load())
+        journal1.clear()
+        self.assertFalse(journal1.exists())
+        self.assertFalse(os.path.exists(file1 + ".tmp"))
+
+        # run 2 (another graph / changed node) starts from empty progress
+        journal2 = ProgressJournal(keyed_progress_file(base, run2))
+        self.assertFalse(journal2.exists())
+        state = journal2.load()
+        self.assertEqual(state["processed_pairs"], [])
+        self.assertEqual(state["edges"], [])
+
+    def test_should_compact(self):
+        self.assertFalse(self.journal.should_compact(1))
+        self.assertTrue(self.journal.should_compact(2))
+        self.assertFalse(ProgressJournal(self.progress_file, compact_every=0).should_compact(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
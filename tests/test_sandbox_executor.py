@@ -0,0 +1,456 @@
+import unittest
+import asyncio
+import builtins
+import io
+import sys
+import os
+import tempfile
+import time
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+import sandbox_executor
+from sandbox_executor import SandboxError, SandboxPool, SandboxTimeout, assign_tools
+from function_registry import FunctionRegistry
+from tool_session import ToolSession, bind_session_state, uses_session_state
+
+STATE_MANAGER_DIR = os.path.join(project_root, "graph-toucan", "new_feature")
+STATE_MANAGER_PATH = os.path.join(STATE_MANAGER_DIR, "state_manager.py")
+STATEFUL_FUNCTIONS_DIR = os.path.join(project_root, "graph-toucan", "tool_info", "generated_functions_stateful_v1")
+TEXT_EDITOR = "text-editor-mcp-server-text_editor"
+
+# stateful tool：与 tool_info/generated_functions_stateful_v1 相同，通过 state_manager.sys_state 读写状态
+STATEFUL_TOOL_HEADER = '''import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+from state_manager import sys_state
+'''
+STATEFUL_TOOLS = {
+    "save_note.py": STATEFUL_TOOL_HEADER + '''
+
+def save_note(path: str, content: str):
+    sys_state.write_file(path, content)
+    return {"pid": os.getpid()}
+''',
+    "list_notes.py": STATEFUL_TOOL_HEADER + '''
+
+def list_notes():
+    return {"files": sorted(p for p in sys_state.list_files() if p.startswith("/notes/")), "pid": os.getpid()}
+''',
+}
+
+TOOLS = {
+    "get_weather.py": '''import os
+
+
+def call_external_api(tool_name: str):
+    """Return weather for a city."""
+    return {}
+
+
+def get_weather(city: str):
+    return {"city": city, "api": call_external_api("get_weather"), "pid": os.getpid(), "cwd": os.getcwd()}
+''',
+    "write_note.py": '''def write_note(path: str, text: str = "hi"):
+    with open(path, "w") as f:
+        f.write(text)
+    return {"written": path}
+''',
+    "slow_tool.py": '''import time
+
+
+def slow_tool(seconds: float = 0.3):
+    time.sleep(seconds)
+    return {"slept": seconds}
+''',
+    "swallow_tool.py": '''def swallow_tool():
+    while True:
+        try:
+            sum(range(1000))
+        except Exception:
+            pass
+''',
+    "stuck_tool.py": '''import signal
+import time
+
+
+def stuck_tool():
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+    time.sleep(30)
+''',
+    "no_args_tool.py": '''def no_args_tool(tool_name, limit=3):
+    return {"tool_name": tool_name, "limit": limit, "callback": lambda: 1}
+''',
+}
+
+
+class TestSandboxPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.func_dir = os.path.join(cls.tmp.name, "functions")
+        cls.safe_dir = os.path.join(cls.tmp.name, "safe")
+        os.makedirs(cls.func_dir)
+        for name, source in TOOLS.items():
+            with open(os.path.join(cls.func_dir, name), "w", encoding="utf-8") as f:
+                f.write(source)
+        cls.pool = SandboxPool([cls.func_dir], cls.safe_dir, num_workers=2, timeout=1.0, memory_limit_mb=512)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        cls.tmp.cleanup()
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_runs_in_worker_with_mocked_api(self):
+        result = self.run_async(self.pool.run("get_weather", {"city": "Paris"}, {"temp": 21}, replace_api=True))
+        self.assertEqual(result["city"], "Paris")
+        self.assertEqual(result["api"], {"temp": 21})
+        self.assertNotEqual(result["pid"], os.getpid())
+        self.assertEqual(os.path.realpath(result["cwd"]), os.path.realpath(self.safe_dir))
+
+    def test_file_access_restricted_to_safe_dir(self):
+        result = self.run_async(self.pool.run("write_note", {"path": "note.txt"}))
+        self.assertTrue(os.path.exists(os.path.join(self.safe_dir, "note.txt")))
+        self.assertEqual(result["written"], "note.txt")
+
+        outside = os.path.join(self.tmp.name, "outside.txt")
+        with self.assertRaises(SandboxError) as ctx:
+            self.run_async(self.pool.run("write_note", {"path": outside}))
+        self.assertIn("PermissionError", str(ctx.exception))
+        self.assertFalse(os.path.exists(outside))
+        # 父进程的 open 没有被替换
+        self.assertIs(builtins.open, io.open)
+
+    def test_calls_run_in_parallel(self):
+        pool = SandboxPool([self.func_dir], self.safe_dir, num_workers=2, timeout=2.0, spill_threshold=1)
+        pool.start()
+        try:
+            async def run_all():
+                return await asyncio.gather(*[pool.run("slow_tool", {"seconds": 0.4}) for _ in range(2)])
+
+            t0 = time.perf_counter()
+            results = self.run_async(run_all())
+            elapsed = time.perf_counter() - t0
+        finally:
+            pool.shutdown()
+        self.assertEqual([r["slept"] for r in results], [0.4, 0.4])
+        self.assertEqual(pool.spills, 1)
+        self.assertLess(elapsed, 0.75)
+
+    def test_preload_and_affinity(self):
+        pool = SandboxPool([self.func_dir], self.safe_dir, num_workers=2, timeout=2.0, preload_per_worker=1)
+        try:
+            pool.start()
+            report = self.run_async(pool.preload(["get_weather"] * 3 + ["slow_tool"] * 2 + ["write_note", "missing_tool"]))
+            self.assertEqual(report["num_tools"], 4)
+            # 每个 worker 只预加载调用最多的 1 个 module（get_weather / slow_tool），missing_tool 只分配不加载
+            self.assertEqual(report["num_preloaded"], 2)
+            self.assertEqual(report["failed"], [])
+            # 预加载时 worker 已经确定了实际加载的文件，resolve 不再需要往返 worker
+            self.assertEqual(self.run_async(pool.resolve("get_weather")), os.path.join(self.func_dir, "get_weather.py"))
+            self.assertNotEqual(pool.route("get_weather"), pool.route("slow_tool"))
+            self.assertEqual(len(report["startup_seconds"]), 2)
+            home = pool.route("get_weather")
+
+            async def run_all():
+                return await asyncio.gather(*[
+                    pool.run("get_weather", {"city": c}, {"temp": 1}, replace_api=True) for c in ("A", "B", "C")
+                ])
+
+            results = self.run_async(run_all())
+            self.assertEqual(len({r["pid"] for r in results}), 1)
+            self.assertEqual(pool.route("get_weather"), home)
+            stats = pool.stats()
+            self.assertEqual(stats["module_cache_hits"], 3)
+            self.assertEqual(stats["preloaded_modules"], 2)
+            self.assertIn("module cache hit rate=100.00%", pool.format_summary())
+        finally:
+            pool.shutdown()
+
+    def test_worker_creation_does_not_block_event_loop(self):
+        pool = SandboxPool([self.func_dir], self.safe_dir, num_workers=1, timeout=2.0)
+        create_worker = pool._create_worker
+
+        def slow_create_worker(w):
+            time.sleep(0.2)
+            return create_worker(w)
+
+        pool._create_worker = slow_create_worker
+        try:
+            async def main():
+                ticks = []
+
+                async def heartbeat():
+                    while True:
+                        ticks.append(time.perf_counter())
+                        await asyncio.sleep(0.001)
+
+                beat = asyncio.create_task(heartbeat())
+                await asyncio.sleep(0)
+                t0 = time.perf_counter()
+                # 还没有 worker：第一次调用在线程中创建 worker
+                result = await pool.run("slow_tool", {"seconds": 0.01})
+                elapsed = time.perf_counter() - t0
+                beat.cancel()
+                return result, ticks, elapsed
+
+            result, ticks, elapsed = self.run_async(main())
+        finally:
+            pool.shutdown()
+        self.assertEqual(result["slept"], 0.01)
+        # 事件循环在等待 worker 启动期间仍然在运行其他 task：任意两次 heartbeat 的间隔都远小于整个调用
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        self.assertGreater(len(ticks), 2)
+        self.assertGreater(elapsed, 0.2)
+        self.assertLess(max(gaps), 0.1)
+
+    def test_timeout_not_swallowed_by_tool(self):
+        with self.assertRaises(SandboxTimeout):
+            self.run_async(self.pool.run("swallow_tool", None))
+        # worker 仍然可用
+        result = self.run_async(self.pool.run("slow_tool", {"seconds": 0.01}))
+        self.assertEqual(result["slept"], 0.01)
+
+    def test_stuck_worker_restarts_pool(self):
+        restarts = self.pool.restarts
+        original_grace = sandbox_executor.HARD_TIMEOUT_GRACE
+        sandbox_executor.HARD_TIMEOUT_GRACE = 0.5
+        try:
+            with self.assertRaises(SandboxTimeout):
+                self.run_async(self.pool.run("stuck_tool", None))
+        finally:
+            sandbox_executor.HARD_TIMEOUT_GRACE = original_grace
+        self.assertEqual(self.pool.restarts, restarts + 1)
+        result = self.run_async(self.pool.run("slow_tool", {"seconds": 0.01}))
+        self.assertEqual(result["slept"], 0.01)
+
+    def test_default_params_and_unpicklable_result(self):
+        result = self.run_async(self.pool.run("no_args_tool", {}))
+        self.assertEqual(result["tool_name"], "no_args_tool")
+        self.assertEqual(result["limit"], 3)
+        self.assertIsInstance(result["callback"], str)
+
+    def test_missing_function(self):
+        with self.assertRaises(RuntimeError):
+            self.run_async(self.pool.run("does_not_exist", {}))
+
+
+class TestSessionState(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.func_dir = os.path.join(cls.tmp.name, "functions")
+        lib_dir = os.path.join(cls.tmp.name, "lib")
+        os.makedirs(cls.func_dir)
+        os.makedirs(lib_dir)
+        with open(STATE_MANAGER_PATH, "r", encoding="utf-8") as src, \
+                open(os.path.join(lib_dir, "state_manager.py"), "w", encoding="utf-8") as dst:
+            dst.write(src.read())
+        for name, source in dict(STATEFUL_TOOLS, **{"slow_tool.py": TOOLS["slow_tool.py"]}).items():
+            with open(os.path.join(cls.func_dir, name), "w", encoding="utf-8") as f:
+                f.write(source)
+        cls.safe_dir = os.path.join(cls.tmp.name, "safe")
+        cls.pool = SandboxPool([cls.func_dir], cls.safe_dir, num_workers=2, timeout=2.0, spill_threshold=0)
+        cls.pool.start()
+        # 写和读的 tool 分到不同的 worker
+        asyncio.run(cls.pool.preload(["save_note"] * 2 + ["list_notes"]))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        cls.tmp.cleanup()
+
+    def test_state_follows_session_across_workers(self):
+        self.assertNotEqual(self.pool.route("save_note"), self.pool.route("list_notes"))
+
+        async def main():
+            session_a, session_b = ToolSession(), ToolSession()
+            saved = await self.pool.run("save_note", {"path": "/notes/a", "content": "x"}, session=session_a)
+            forked = session_a.fork()
+            await self.pool.run("save_note", {"path": "/notes/b", "content": "y"}, session=forked)
+            listed_a = await self.pool.run("list_notes", {}, session=session_a)
+            listed_fork = await self.pool.run("list_notes", {}, session=forked)
+            listed_b = await self.pool.run("list_notes", {}, session=session_b)
+            return saved, listed_a, listed_fork, listed_b, session_b
+
+        saved, listed_a, listed_fork, listed_b, session_b = asyncio.run(main())
+        self.assertNotEqual(saved["pid"], listed_a["pid"])
+        self.assertEqual(listed_a["files"], ["/notes/a"])
+        self.assertEqual(listed_fork["files"], ["/notes/a", "/notes/b"])
+        # 另一个会话从全新的状态开始
+        self.assertEqual(listed_b["files"], [])
+        self.assertIsNotNone(session_b.state)
+
+    def test_stateless_tool_and_failure_keep_session_state(self):
+        async def main():
+            session = ToolSession()
+            await self.pool.run("slow_tool", {"seconds": 0}, session=session)
+            self.assertIsNone(session.state)
+            await self.pool.run("save_note", {"path": "/notes/a", "content": "x"}, session=session)
+            state = session.state
+            with self.assertRaises(SandboxError):
+                await self.pool.run("save_note", {"path": "/notes/b"}, session=session)
+            self.assertIs(session.state, state)
+
+        asyncio.run(main())
+
+    def test_bind_session_state_in_process(self):
+        registry = FunctionRegistry([self.func_dir])
+        save, listing = registry.load("save_note"), registry.load("list_notes")
+        self.assertTrue(uses_session_state(save.source_without_api))
+        self.assertFalse(uses_session_state(TOOLS["slow_tool.py"]))
+        self.assertIsNone(bind_session_state(registry.load("slow_tool").module, None))
+
+        binding = bind_session_state(save.module, None)
+        try:
+            save.func("/notes/a", "x")
+            state = binding.dumps()
+        finally:
+            binding.release()
+        # 没有会话时仍然使用进程的全局状态，且没有被会话中的写入污染
+        self.assertEqual(listing.func()["files"], [])
+        binding = bind_session_state(listing.module, state)
+        try:
+            self.assertEqual(listing.func()["files"], ["/notes/a"])
+        finally:
+            binding.release()
+
+
+class TestRealStatefulTool(unittest.TestCase):
+    """tool_info/generated_functions_stateful_v1 中真实的 stateful tool（call_external_api 包装 + sys_state）"""
+
+    API_OUTPUT = {"success": True, "message": "ok", "content": "simulated"}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.pool = SandboxPool(
+            [STATEFUL_FUNCTIONS_DIR], os.path.join(cls.tmp.name, "safe"), num_workers=1, timeout=5.0,
+            import_paths=[STATE_MANAGER_DIR],
+        )
+        cls.pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        cls.tmp.cleanup()
+
+    def editor_call(self, command, path, **extra):
+        return {"command": command, "description": "test", "path": path, **extra}
+
+    def test_wrapper_runs_on_mocked_original_api(self):
+        async def main():
+            await self.pool.run(
+                TEXT_EDITOR, self.editor_call("create", "/notes/global.txt", file_text="hello"),
+                self.API_OUTPUT, replace_api=True,
+            )
+            return await self.pool.run(
+                TEXT_EDITOR, self.editor_call("view", "/notes/global.txt"), self.API_OUTPUT, replace_api=True,
+            )
+
+        viewed = asyncio.run(main())
+        # mock 替换的是被包装的 _original_call_external_api，包装把 sys_state 中的内容注入到模拟输出上
+        self.assertEqual(viewed, {"success": True, "message": "ok", "content": "hello"})
+        self.assertEqual(self.API_OUTPUT["content"], "simulated")
+
+    def test_session_state_travels_with_calls(self):
+        async def view(path, session=None):
+            result = await self.pool.run(
+                TEXT_EDITOR, self.editor_call("view", path), self.API_OUTPUT, replace_api=True, session=session,
+            )
+            return result["content"]
+
+        async def main():
+            session, other = ToolSession(), ToolSession()
+            await self.pool.run(
+                TEXT_EDITOR, self.editor_call("create", "/notes/session.txt", file_text="mine"),
+                self.API_OUTPUT, replace_api=True, session=session,
+            )
+            # worker 重建后状态仍在会话里（状态不保存在 worker 进程中）
+            self.pool._restart(0, self.pool._executors[0])
+            return (
+                await view("/notes/session.txt", session),
+                await view("/notes/session.txt", other),
+                await view("/notes/session.txt"),
+                session,
+            )
+
+        mine, other, no_session, session = asyncio.run(main())
+        self.assertEqual(mine, "mine")
+        self.assertEqual(other, "simulated")
+        self.assertEqual(no_session, "simulated")
+        self.assertIsNotNone(session.state)
+
+
+class TestAssignTools(unittest.TestCase):
+
+    def test_balances_by_call_count(self):
+        assigned = assign_tools({"a": 10, "b": 6, "c": 5, "d": 1}, 2)
+        self.assertEqual(assigned, [["a", "d"], ["b", "c"]])
+        self.assertEqual(assign_tools({}, 3), [[], [], []])
+
+
+class TestApiParts(unittest.TestCase):
+
+    def test_api_parts_does_not_execute_module(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "side_effect.py"), "w", encoding="utf-8") as f:
+                f.write(
+                    "raise SystemExit('executed')\n\n\n"
+                    "def call_external_api(tool_name: str):\n    \"\"\"Doc.\"\"\"\n    return {}\n\n\n"
+                    "def side_effect():\n    return call_external_api('x')\n"
+                )
+            registry = FunctionRegistry([tmp])
+            api_info, source = registry.api_parts("side_effect", registry.resolve("side_effect")[0])
+            self.assertEqual(api_info["docstring"], "Doc.")
+            self.assertNotIn("def call_external_api", source)
+            with self.assertRaises(RuntimeError):
+                registry.api_parts("missing", os.path.join(tmp, "missing.py"))
+
+    def test_parent_parses_the_file_the_worker_loads(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            func_dir = os.path.join(tmp, "functions")
+            os.makedirs(func_dir)
+            # 第一个候选文件加载失败，load 回退到第二个；父进程解析的必须是第二个
+            with open(os.path.join(func_dir, "flaky-tool.py"), "w", encoding="utf-8") as f:
+                f.write(
+                    "import module_that_does_not_exist\n\n\n"
+                    "def call_external_api(tool_name: str):\n    \"\"\"First.\"\"\"\n    return {}\n"
+                )
+            with open(os.path.join(func_dir, "flaky_tool.py"), "w", encoding="utf-8") as f:
+                f.write(
+                    "def call_external_api(tool_name: str):\n    \"\"\"Second.\"\"\"\n    return {}\n\n\n"
+                    "def flaky_tool():\n    return {\"api\": call_external_api(\"flaky-tool\")}\n"
+                )
+            registry = FunctionRegistry([func_dir])
+            pool = SandboxPool([func_dir], os.path.join(tmp, "safe"), num_workers=1, timeout=2.0)
+            try:
+                async def main():
+                    file_path = await pool.resolve("flaky-tool")
+                    api_info, _ = registry.api_parts("flaky-tool", file_path)
+                    result = await pool.run("flaky-tool", {}, {"from": "mock"}, replace_api=True)
+                    return file_path, api_info, result
+
+                file_path, api_info, result = asyncio.run(main())
+                with self.assertRaises(RuntimeError):
+                    asyncio.run(pool.resolve("no_such_tool"))
+            finally:
+                pool.shutdown()
+            self.assertEqual(file_path, os.path.join(func_dir, "flaky_tool.py"))
+            self.assertEqual(api_info["docstring"], "Second.")
+            self.assertEqual(result["api"], {"from": "mock"})
+
+
+if __name__ == "__main__":
+    unittest.main()
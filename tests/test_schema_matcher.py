@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from schema_matcher import StaticSchemaMatcher, normalize_type, split_name_tokens, flatten_output_fields
+
+
+def make_tool(name, properties, required=None, output_fields=None):
+    return {
+        "function_schema": {
+            "function": {
+                "name": name,
+                "parameters": {"type": "object", "properties": properties, "required": required or []},
+            }
+        },
+        "output_schema": {"fields": output_fields or []},
+    }
+
+
+class TestSchemaMatcherHelpers(unittest.TestCase):
+
+    def test_name_normalization(self):
+        self.assertEqual(split_name_tokens("fileIds"), ("file", "id"))
+        self.assertEqual(split_name_tokens("file_id"), ("file", "id"))
+        self.assertEqual(split_name_tokens("HTTPStatus"), ("http", "status"))
+        self.assertEqual(split_name_tokens("categories"), ("category",))
+
+    def test_type_normalization(self):
+        self.assertEqual(normalize_type("List[Dict[str, Any]]"), ("array", "object"))
+        self.assertEqual(normalize_type("Optional[int]"), ("integer", "any"))
+        self.assertEqual(normalize_type(["string", "null"]), ("string", "any"))
+
+    def test_dotted_path_flattening(self):
+        flat = flatten_output_fields([
+            {"name": "result", "type": "Dict", "fields": [{"name": "items", "type": "List[str]"}]},
+        ])
+        self.assertEqual([f["path"] for f in flat], ["result", "result.items"])
+        self.assertEqual(flat[1]["leaf_tokens"], ("item",))
+
+
+class TestStaticSchemaMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = StaticSchemaMatcher()
+        self.search = make_tool(
+            "search_files", {"query": {"type": "string"}}, required=["query"],
+            output_fields=[
+                {"name": "query", "type": "str"},
+                {"name": "fileId", "type": "str"},
+                {"name": "total_count", "type": "int"},
+            ],
+        )
+
+    def test_exact_match_is_accepted_with_mapping(self):
+        download = make_tool("download_file", {"file_id": {"type": "string"}}, required=["file_id"])
+        match = self.matcher.score_pair(self.search, download)
+        self.assertEqual(match["decision"], "accept")
+        self.assertEqual(match["dependency_type"], "full")
+        self.assertEqual(match["param_mapping"], {"fileId": "file_id"})
+
+    def test_pass_through_output_is_ignored(self):
+        # "query" is both an input and an output of the node, so it must not drive a match
+        other_search = make_tool("web_search", {"query": {"type": "string"}}, required=["query"])
+        self.assertEqual(self.matcher.score_pair(self.search, other_search)["decision"], "skip")
+
+    def test_partial_coverage_goes_to_llm(self):
+        share = make_tool(
+            "share_file",
+            {"file_id": {"type": "string"}, "email": {"type": "string"}},
+            required=["file_id", "email"],
+        )
+        match = self.matcher.score_pair(self.search, share)
+        self.assertEqual(match["decision"], "llm")
+        self.assertEqual(match["param_mapping"], {"fileId": "file_id"})
+
+    def test_incompatible_type_lowers_score(self):
+        toggle = make_tool("toggle", {"total_count": {"type": "boolean"}}, required=["total_count"])
+        self.assertEqual(self.matcher.score_pair(self.search, toggle)["decision"], "skip")
+
+    def test_partition(self):
+        download = make_tool("download_file", {"file_id": {"type": "string"}}, required=["file_id"])
+        weather = make_tool("get_weather", {"city": {"type": "string"}}, required=["city"])
+        tasks = [(0, 1, self.search, download), (0, 2, self.search, weather)]
+        to_judge, accepted, skipped = self.matcher.partition(tasks)
+        self.assertEqual(to_judge, [])
+        self.assertEqual([t[1] for t, _ in accepted], [1])
+        self.assertEqual([t[1] for t, _ in skipped], [2])
+        self.assertEqual(self.matcher.summary()["static_skipped"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import asyncio
+import copy
+import sys
+import os
+import tempfile
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+
+from prefix_trie import PrefixTrie, run_subtree
+from sandbox_executor import SandboxPool
+from tool_session import ToolSession, current_session, start_session, use_session
+
+STATE_MANAGER_DIR = os.path.join(project_root, "graph-toucan", "new_feature")
+STATEFUL_FUNCTIONS_DIR = os.path.join(project_root, "graph-toucan", "tool_info", "generated_functions_stateful_v1")
+TEXT_EDITOR = "text-editor-mcp-server-text_editor"
+
+
+async def fake_stateful_call(key):
+    """模拟 execute_function_call：在当前会话上执行一次 stateful 调用"""
+    session = current_session()
+    async with session.lock:
+        state = session.state or b""
+        await asyncio.sleep(0)
+        session.state = state + key.encode()
+
+
+class TestToolSession(unittest.TestCase):
+
+    def test_fork_and_deepcopy_are_independent(self):
+        async def main():
+            session = ToolSession(b"a")
+            forked = copy.deepcopy({"session": session})["session"]
+            self.assertIsNot(forked, session)
+            self.assertIsNot(forked.lock, session.lock)
+            forked.state += b"b"
+            return session.state, forked.state
+
+        self.assertEqual(asyncio.run(main()), (b"a", b"ab"))
+
+    def test_sessions_are_task_local_and_shared_with_subtasks(self):
+        async def path(keys):
+            start_session()
+            # 同一 turn 中并发执行的函数（asyncio.gather 的子 task）共享路径的会话
+            await asyncio.gather(*[fake_stateful_call(key) for key in keys])
+            return current_session().state
+
+        async def main():
+            return await asyncio.gather(path("ab"), path("c"))
+
+        first, second = asyncio.run(main())
+        self.assertEqual(sorted(first.decode()), ["a", "b"])
+        self.assertEqual(second, b"c")
+        self.assertIsNone(current_session())
+
+    def test_trie_forks_session_with_history(self):
+        trie = PrefixTrie()
+        sequences = [["a", "b"], ["a", "c"], ["x"]]
+        for keys in sequences:
+            trie.add([(key, {"key": key}) for key in keys])
+
+        async def step(state, node):
+            use_session(state["session"])
+            await fake_stateful_call(node.payload["key"])
+            state["history"].append(node.payload["key"])
+            return (list(state["history"]), current_session().state)
+
+        async def main():
+            outcomes = {}
+            for group in trie.root.children.values():
+                outcomes.update(await run_subtree(group, {"history": [], "session": ToolSession()}, step))
+            return outcomes
+
+        outcomes = asyncio.run(main())
+        for path_id, keys in enumerate(sequences):
+            history, state = outcomes[path_id].records[-1]
+            self.assertEqual(history, keys)
+            # 会话状态恰好是本路径前缀上的写入，兄弟分支和其他组的写入不可见
+            self.assertEqual(state, "".join(keys).encode())
+
+
+
+class TestTrieWithStatefulTool(unittest.TestCase):
+    """前缀树分叉后，两个分支用真实的 stateful tool 修改同一份状态，互不可见"""
+
+    API_OUTPUT = {"success": True, "message": "ok", "content": "simulated"}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = SandboxPool(
+            [STATEFUL_FUNCTIONS_DIR], os.path.join(self.tmp.name, "safe"), num_workers=2, timeout=5.0,
+            import_paths=[STATE_MANAGER_DIR],
+        )
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.shutdown()
+        self.tmp.cleanup()
+
+    def test_branches_mutate_same_state_independently(self):
+        # 每个 turn：(command, file_text)；所有 turn 操作同一个文件
+        sequences = [
+            [("create", "base"), ("create", "left"), ("view", None)],
+            [("create", "base"), ("create", "right"), ("view", None)],
+            [("create", "base"), ("view", None)],
+        ]
+        trie = PrefixTrie()
+        for turns in sequences:
+            trie.add([((command, text), {"command": command, "file_text": text}) for command, text in turns])
+
+        async def step(state, node):
+            # 与 backward_to_query_magnet.process_fsp_prefix_group 相同：先装上本前缀的会话再执行 turn
+            use_session(state["session"])
+            parameters = {"command": node.payload["command"], "description": "test", "path": "/notes/shared.txt"}
+            if node.payload["file_text"] is not None:
+                parameters["file_text"] = node.payload["file_text"]
+            result = await self.pool.run(
+                TEXT_EDITOR, parameters, self.API_OUTPUT, replace_api=True, session=current_session(),
+            )
+            return result.get("content")
+
+        async def main():
+            # 一次只执行一个 step：两个分支的写入都发生在各自的 view 之前
+            semaphore = asyncio.Semaphore(1)
+            outcomes = {}
+            for group in trie.root.children.values():
+                outcomes.update(await run_subtree(group, {"session": ToolSession()}, step, semaphore=semaphore))
+            return outcomes
+
+        outcomes = asyncio.run(main())
+        self.assertEqual([outcomes[i].records[-1] for i in range(len(sequences))], ["left", "right", "base"])
+
+
+if __name__ == "__main__":
+    unittest.main()
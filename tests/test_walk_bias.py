@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import json
+import random
+import tempfile
+from collections import Counter
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from graph_store import GraphStore, load_graph_store, serialize_graph
+from walk_bias import WalkBias, alias_cache_path, biased_random_walk_from_node, load_alias_tables
+from graph_helpers import make_graph
+
+
+STAR = make_graph([
+    (0, 1, "full", 0.9), (0, 2, "full", 0.3), (0, 3, "partial", 0.9), (0, 4, "prerequisite", 1.0),
+])
+
+
+class TestAliasTables(unittest.TestCase):
+
+    def test_static_weights(self):
+        store = GraphStore(serialize_graph(STAR))
+        bias = WalkBias(confidence_power=1.0, dependency_type_weights={"partial": 0.0})
+        tables = load_alias_tables(store, bias, use_cache=False)
+        self.assertEqual(list(tables.successors(0)), [1, 2])
+
+        rng = random.Random(0)
+        counts = Counter(
+            biased_random_walk_from_node(0, tables, bias, max_steps=1, rng=rng)[1] for _ in range(6000)
+        )
+        self.assertAlmostEqual(counts[1] / 6000, 0.75, delta=0.03)
+        self.assertEqual(set(counts), {1, 2})
+
+    def test_inverse_visit_frequency_prefers_unvisited(self):
+        store = GraphStore(serialize_graph(STAR))
+        bias = WalkBias(visit_power=2.0)
+        tables = load_alias_tables(store, bias, use_cache=False)
+        visit_counts = {1: 10, 2: 10}
+        rng = random.Random(1)
+        counts = Counter(
+            biased_random_walk_from_node(0, tables, bias, max_steps=1, rng=rng, visit_counts=visit_counts)[1]
+            for _ in range(2000)
+        )
+        # 3 的权重是 1，1 / 2 的权重是 1 / 121
+        self.assertGreater(counts[3] / 2000, 0.95)
+
+    def test_walks_stay_simple(self):
+        graph = make_graph([(0, 1, "full", 1.0), (1, 0, "full", 1.0), (1, 2, "full", 1.0), (2, 0, "full", 1.0)])
+        store = GraphStore(serialize_graph(graph))
+        bias = WalkBias(inout_q=0.5, visit_power=1.0)
+        tables = load_alias_tables(store, bias, use_cache=False)
+        rng = random.Random(2)
+        for _ in range(200):
+            path = biased_random_walk_from_node(0, tables, bias, max_steps=5, rng=rng, visit_counts={})
+            self.assertEqual(path, [0, 1, 2])
+
+    def test_cache_is_reused_and_invalidated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            graph_path = os.path.join(tmp, "graph.json")
+            with open(graph_path, "w", encoding="utf-8") as f:
+                json.dump(STAR, f)
+            store = load_graph_store(graph_path)
+            bias = WalkBias(confidence_power=1.0)
+            cache_path = alias_cache_path(store, bias)
+            tables = load_alias_tables(store, bias)
+            self.assertTrue(os.path.exists(cache_path))
+            self.assertEqual(tables.path, cache_path)
+            self.assertEqual(list(load_alias_tables(store, bias).successors(0)), [1, 2, 3])
+            self.assertNotEqual(alias_cache_path(store, WalkBias(confidence_power=2.0)), cache_path)
+
+            # 图变化后 fingerprint 不同，缓存被重建
+            changed = GraphStore(serialize_graph(make_graph([(0, 2, "full", 1.0)])), path=store.path)
+            self.assertEqual(list(load_alias_tables(changed, bias).successors(0)), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import random
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+from random_walker import random_walk_from_node
+from walk_coverage import CoverageScheduler, CoverageTargets
+from graph_helpers import make_store
+
+
+class TestCoverageScheduler(unittest.TestCase):
+
+    def setUp(self):
+        # node 0 是 hub；4 -> 5 只能从 4 出发或经过 4 走到
+        edges = [(0, t, "full") for t in range(1, 5)] + [(4, 5, "partial"), (1, 2, "full"), (2, 6, "prerequisite")]
+        self.store = make_store(edges, 7)
+        self.adj = self.store.adjacency(exclude_types=("prerequisite",))
+        self.rng = random.Random(0)
+
+    def walk(self, idx):
+        return random_walk_from_node(idx, self.adj, max_steps=3, rng=self.rng)
+
+    def test_stops_when_targets_met(self):
+        scheduler = CoverageScheduler(self.store, CoverageTargets(node_coverage=1.0, edge_coverage=1.0, patience=10),
+                                      max_walks_per_node=10)
+        node_paths = scheduler.run(range(7), self.walk)
+        self.assertEqual(scheduler.stop_reason, "targets_met")
+        self.assertEqual(scheduler.edge_coverage, 1.0)
+        self.assertEqual(scheduler.num_walk_edges, 6)
+        self.assertEqual(scheduler.num_walk_nodes, 6)
+        # 没有出边的 node 只在第 0 轮走一次
+        self.assertEqual(len(node_paths[5]), 1)
+        self.assertLess(scheduler.total_walks, 7 * 10)
+
+        report = scheduler.report({i: f"tool_{i}" for i in range(7)})
+        self.assertEqual(report["num_uncovered_nodes"], 0)
+        self.assertEqual(report["total_walks"], sum(h["walks"] for h in report["history"]))
+        self.assertEqual(report["unique_paths"], len({tuple(p) for paths in node_paths.values() for p in paths}))
+
+    def test_budget(self):
+        scheduler = CoverageScheduler(self.store, CoverageTargets(max_total_walks=3), max_walks_per_node=10)
+        node_paths = scheduler.run(range(7), self.walk)
+        self.assertEqual(scheduler.stop_reason, "budget")
+        self.assertEqual(sum(len(paths) for paths in node_paths.values()), 3)
+
+    def test_under_covered_nodes_score_higher(self):
+        scheduler = CoverageScheduler(self.store, max_walks_per_node=10)
+        scheduler.observe([0, 1, 2])
+        scores = scheduler.scores(range(7))
+        self.assertGreater(scores[0], scores[4])
+        self.assertNotIn(1, scores)
+        self.assertNotIn(5, scores)
+
+    def test_parallel_edges_form_one_unit(self):
+        store = make_store([(0, 1, "full"), (0, 1, "partial"), (1, 2, "full")], 3)
+        adj = store.adjacency()
+        scheduler = CoverageScheduler(store, CoverageTargets(node_coverage=1.0, edge_coverage=1.0, patience=10),
+                                      max_walks_per_node=10, exclude_types=())
+        self.assertEqual(scheduler.num_walk_edges, 2)
+        scheduler.run(range(3), lambda idx: random_walk_from_node(idx, adj, max_steps=3, rng=self.rng))
+        self.assertEqual(scheduler.stop_reason, "targets_met")
+        self.assertEqual(scheduler.edge_coverage, 1.0)
+        self.assertEqual(scheduler._uncovered_out(0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import sys
+import os
+import json
+import random
+import tempfile
+from collections import Counter
+
+# Paths setup
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+src_dir = os.path.join(project_root, "graph-toucan", "src")
+if src_dir not in sys.path:
+    sys.path.append(src_dir)
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+import walk_engine
+from walk_engine import batch_random_walks
+from random_walker import MergeCandidateIndex, run_walks_from_all_nodes_with_dedup
+from graph_helpers import make_graph, make_store
+
+
+EDGES = [
+    (0, 1, "full"), (0, 2, "partial"), (0, 3, "full"),
+    (1, 2, "full"), (1, 4, "prerequisite"),
+    (2, 0, "full"), (2, 3, "partial"),
+    (3, 1, "full"),
+]
+
+
+class TestBatchRandomWalks(unittest.TestCase):
+
+    def setUp(self):
+        self.store = make_store(EDGES, 5, confidence=0.9)
+        self.adj = self.store.adjacency(exclude_types=("prerequisite",))
+
+    def test_paths_are_simple_and_follow_edges(self):
+        paths = batch_random_walks(self.store, range(5), num_walks=20, max_steps=4, seed=7, use_numpy=False)
+        for start, walks in paths.items():
+            for path in walks:
+                self.assertEqual(path[0], start)
+                self.assertEqual(len(path), len(set(path)))
+                for u, v in zip(path, path[1:]):
+                    self.assertIn(v, self.adj.get(u, []))
+        self.assertEqual(paths[4], [[4]] * 20)
+
+    def test_reproducible_per_start_node(self):
+        full = batch_random_walks(self.store, range(5), num_walks=10, max_steps=4, seed=3, use_numpy=False)
+        single = batch_random_walks(self.store, [2], num_walks=10, max_steps=4, seed=3, chunk_size=3,
+                                    use_numpy=False)
+        self.assertEqual(full[2], single[2])
+
+    def test_same_distribution_as_sequential_walker(self):
+        # 第一步在未访问的后继中均匀选择：0 -> {1, 2, 3} 各约 1/3
+        paths = batch_random_walks(self.store, [0], num_walks=3000, max_steps=1, seed=11, use_numpy=False)
+        counts = Counter(path[1] for path in paths[0])
+        for node in (1, 2, 3):
+            self.assertAlmostEqual(counts[node] / 3000, 1 / 3, delta=0.05)
+
+    @unittest.skipIf(walk_engine.np is None, "numpy not installed")
+    def test_numpy_matches_python(self):
+        kwargs = dict(num_walks=50, max_steps=4, seed=random.randint(0, 1000))
+        self.assertEqual(
+            batch_random_walks(self.store, range(5), use_numpy=True, chunk_size=64, **kwargs),
+            batch_random_walks(self.store, range(5), use_numpy=False, **kwargs),
+        )
+
+
+class TestParallelWalks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.graph_path = os.path.join(self.tmp.name, "graph.json")
+        self.mapping_path = os.path.join(self.tmp.name, "node_candidates_mapping.json")
+        with open(self.graph_path, "w", encoding="utf-8") as f:
+            json.dump(make_graph(EDGES, 5, confidence=0.9), f)
+        with open(self.mapping_path, "w", encoding="utf-8") as f:
+            json.dump({"node_to_candidates": {f"tool_{i}": [f"tool_{(i + 2) % 5}"] for i in range(5)}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_walks(self, **kwargs):
+        return run_walks_from_all_nodes_with_dedup(
+            graph_path=self.graph_path,
+            max_steps=3,
+            num_walks_per_node=4,
+            seed=5,
+            log_path=None,
+            merge_probability=0.5,
+            candidates_mapping_path=self.mapping_path,
+            **kwargs,
+        )["node_results"]
+
+    def test_output_identical_for_any_worker_count(self):
+        in_process = self.run_walks(walk_engine="batch", shard_size=2)
+        parallel = self.run_walks(walk_engine="batch", num_workers=3, shard_size=1)
+        self.assertEqual(in_process, parallel)
+        self.assertEqual(list(parallel), [str(i) for i in range(5)])
+
+    def test_sequential_engine_rejects_workers(self):
+        with self.assertRaises(ValueError):
+            self.run_walks(walk_engine="sequential", num_workers=2)
+
+
+class TestMergeCandidateIndex(unittest.TestCase):
+
+    def setUp(self):
+        # tool_5 与 tool_1 同名（index 1 / 5 都叫 tool_1），"missing" 不在图中
+        self.index_to_name = {0: "tool_0", 1: "tool_1", 2: "tool_2", 3: "tool_3", 5: "tool_1"}
+        self.name_to_index = {name: idx for idx, name in self.index_to_name.items()}
+        self.index = MergeCandidateIndex(
+            {"tool_0": ["tool_1", "tool_2", "missing"], "tool_2": ["tool_1", "tool_3"]},
+            self.name_to_index,
+            self.index_to_name,
+        )
+
+    def test_candidates_are_indices_and_path_members_are_excluded(self):
+        self.assertEqual(self.index.candidates, {0: (5, 2), 2: (5, 3)})
+        # index 1 与候选 tool_1（index 5）同名，按名字视为已在路径中
+        merged = self.index.merge_path([0, 1], random.Random(0), merge_probability=1.0)
+        self.assertEqual(merged["merged_path"], [0, 2, 1])
+        self.assertEqual(merged["merge_info"][0]["merged_candidate"], "tool_2")
+        self.assertEqual(merged["num_merges"], 1)
+
+    def test_batch_matches_per_path(self):
+        paths = [[0, 2], [2], [0, 3, 2]]
+        batch = self.index.merge_batch([(paths, random.Random(1)), (paths[:1], random.Random(2))], 0.5)
+        self.assertEqual(batch[0], self.index.merge_paths(paths, random.Random(1), 0.5))
+        self.assertEqual(batch[1], self.index.merge_paths(paths[:1], random.Random(2), 0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()